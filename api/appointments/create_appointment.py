@@ -33,6 +33,7 @@ from api.appointments.template_language_resolution import (
 )
 from api.modules.whatsapp.template_sync import resolve_effective_template_buttons_json
 from api.utils.babel_compat import format_datetime
+from api.utils.dashboard_snapshot import invalidate_dashboard_snapshot
 from api.utils.calendar_feature_flags import (
     client_can_use_google_calendar_sync,
     client_can_use_manual_appointment_creation,
@@ -1315,6 +1316,7 @@ async def create_appointment(payload: CreateAppointmentPayload):
     appointment_id = appointment["id"]
 
     logger.info(f"✅ Appointment created: {appointment_id}")
+    invalidate_dashboard_snapshot(str(payload.client_id), reason="appointment_created")
 
     try:
         _capture_inline_contact_consent(payload)
@@ -15,6 +15,7 @@ from api.compliance.email_marketing_standard import (
 )
 from api.authz import authorize_client_request, get_current_user_id
 from api.config.config import supabase
+from api.utils.dashboard_snapshot import invalidate_dashboard_snapshot
 from api.modules.whatsapp.template_sync import (
     build_client_template_name,
     decode_template_buttons_json,
@@ -591,6 +592,7 @@ def create_message_template(payload: CreateTemplatePayload, request: Request):
                     payload.meta_template_id,
                 )
 
+        invalidate_dashboard_snapshot(str(payload.client_id), reason="message_template_created")
         return {
             "success": True,
             "template": res.data[0],
@@ -859,6 +861,7 @@ def update_message_template(
                     template_id,
                 )
 
+        invalidate_dashboard_snapshot(existing.get("client_id"), reason="message_template_updated")
         return {
             "success": True,
             "template": res.data[0],
@@ -900,6 +903,7 @@ def delete_message_template(template_id: uuid.UUID, request: Request):
                 detail="Template not found"
             )
 
+        invalidate_dashboard_snapshot(template_row.get("client_id"), reason="message_template_deactivated")
         return {
             "success": True,
             "message": "Template deactivated",
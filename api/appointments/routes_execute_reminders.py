@@ -1,7 +1,10 @@
 from fastapi import APIRouter, Request
 from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
+import asyncio
 import logging
+import os
+import time
 
 from api.modules.assistant_rag.supabase_client import supabase
 from api.modules.whatsapp.whatsapp_sender import (
@@ -11,6 +14,7 @@ from api.modules.whatsapp.template_sync import resolve_effective_template_button
 from api.modules.calendar.send_confirmation_email import send_confirmation_email
 from api.appointments.cancel_link_tokens import build_cancel_link, generate_cancel_token
 from api.appointments.template_language_resolution import resolve_locale_for_rendering
+from api.compliance.outbound_policy import outbound_policy_batch
 from api.internal_auth import require_internal_request
 from api.utils.babel_compat import format_datetime
 
@@ -18,6 +22,14 @@ router = APIRouter()
 logger = logging.getLogger(__name__)
 LANGUAGE_TO_LOCALE = {"es": "es_MX", "en": "en_US"}
 MAX_REMINDER_LAG_MINUTES = 20
+REMINDER_CLAIM_BATCH_SIZE = max(1, int(os.getenv("EVOLVIAN_REMINDER_CLAIM_BATCH_SIZE") or "100"))
+REMINDER_SEND_CONCURRENCY = max(1, int(os.getenv("EVOLVIAN_REMINDER_SEND_CONCURRENCY") or "8"))
+# El cron corre cada minuto: drenamos lotes hasta agotar este presupuesto.
+REMINDER_RUN_BUDGET_SECONDS = max(1, int(os.getenv("EVOLVIAN_REMINDER_RUN_BUDGET_SECONDS") or "50"))
+STATUS_UPDATE_CHUNK_SIZE = 200
+# Los estados finales se escriben en grupos chicos mientras el lote avanza: si el
+# proceso muere, a lo sumo quedan en `processing` los recordatorios en vuelo.
+REMINDER_STATUS_FLUSH_SIZE = max(1, int(os.getenv("EVOLVIAN_REMINDER_STATUS_FLUSH_SIZE") or "10"))
 
 
 def get_client_locale(client_id: str) -> str:
@@ -68,12 +80,14 @@ def format_scheduled_time(
     iso_utc: str,
     client_id: str,
     locale_code: str = "es_MX",
+    *,
+    client_tz: ZoneInfo | None = None,
 ) -> str:
     try:
         iso_utc = iso_utc.replace("Z", "+00:00")
         dt_utc = datetime.fromisoformat(iso_utc)
 
-        client_tz = get_client_timezone(client_id)
+        client_tz = client_tz or get_client_timezone(client_id)
         dt_local = dt_utc.astimezone(client_tz)
 
         return format_datetime(
@@ -92,7 +106,14 @@ def format_scheduled_time(
         return ""
 
 
-def render_template(body: str, appointment: dict, locale_code: str) -> str:
+def render_template(
+    body: str,
+    appointment: dict,
+    locale_code: str,
+    *,
+    client_tz: ZoneInfo | None = None,
+    company_name: str | None = None,
+) -> str:
     scheduled_time_label = ""
     appointment_date = ""
     appointment_time = ""
@@ -100,6 +121,9 @@ def render_template(body: str, appointment: dict, locale_code: str) -> str:
     client_id = appointment.get("client_id")
     safe_client_id = client_id or ""
     cancel_link = str(appointment.get("_cancel_appointment_link") or "").strip()
+    client_tz = client_tz or get_client_timezone(safe_client_id)
+    if company_name is None:
+        company_name = get_client_company_name(safe_client_id)
     cancel_button_html = (
         f"<a href=\"{cancel_link}\" "
         "style=\"display:inline-block;padding:10px 16px;background:#f8fafc;color:#334155;"
@@ -112,10 +136,11 @@ def render_template(body: str, appointment: dict, locale_code: str) -> str:
             scheduled_time,
             safe_client_id,
             locale_code,
+            client_tz=client_tz,
         )
         try:
             dt_utc = datetime.fromisoformat(str(scheduled_time).replace("Z", "+00:00"))
-            dt_local = dt_utc.astimezone(get_client_timezone(safe_client_id))
+            dt_local = dt_utc.astimezone(client_tz)
             appointment_date = format_datetime(
                 dt_local,
                 "EEEE, MMMM dd yyyy" if str(locale_code).lower().startswith("en") else "EEEE dd 'de' MMMM yyyy",
@@ -133,14 +158,14 @@ def render_template(body: str, appointment: dict, locale_code: str) -> str:
     return (
         body
         .replace("{{user_name}}", appointment.get("user_name", "") or "")
-        .replace("{{company_name}}", get_client_company_name(safe_client_id))
+        .replace("{{company_name}}", company_name)
         .replace("{{scheduled_time}}", scheduled_time_label or "")
         .replace("{{appointment_date}}", appointment_date or "")
         .replace("{{appointment_time}}", appointment_time or "")
         .replace(
             "{{current_date}}",
             format_datetime(
-                datetime.now(get_client_timezone(safe_client_id)),
+                datetime.now(client_tz),
                 "EEEE, MMMM dd yyyy" if str(locale_code).lower().startswith("en") else "EEEE dd 'de' MMMM yyyy",
                 locale=locale_code,
             ),
@@ -232,404 +257,563 @@ def build_reminder_parameters(
 
 
 # =====================================================
-# Endpoint
+# Batch helpers
 # =====================================================
-@router.post("/reminders/execute")
-async def execute_pending_reminders(request: Request):
-    require_internal_request(request)
+def _chunked(values: list, size: int):
+    for index in range(0, len(values), size):
+        yield values[index:index + size]
 
-    now = datetime.now(timezone.utc)
-    logger.info("⏱️ REMINDER EXECUTION START | now=%s", now.isoformat())
 
-    response = (
+def _parse_utc(raw) -> datetime:
+    parsed = datetime.fromisoformat(str(raw).replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def _is_missing_claim_rpc(exc: Exception) -> bool:
+    msg = str(exc).lower()
+    return "claim_pending_reminders" in msg and (
+        "does not exist" in msg or "could not find" in msg or "schema cache" in msg or "not found" in msg
+    )
+
+
+def _claim_reminder_batch(now: datetime, limit: int) -> list[dict]:
+    """
+    Reclama hasta `limit` recordatorios vencidos en un solo round-trip.
+    El RPC usa `for update skip locked`, así que ejecuciones solapadas del cron
+    nunca reciben la misma fila. Sin el RPC, caemos a select + update condicionado.
+    """
+    try:
+        res = supabase.rpc(
+            "claim_pending_reminders",
+            {"p_now": now.isoformat(), "p_limit": limit},
+        ).execute()
+        return [row for row in (res.data or []) if isinstance(row, dict)]
+    except Exception as exc:
+        if not _is_missing_claim_rpc(exc):
+            raise
+        logger.warning("⚠️ claim_pending_reminders RPC missing; using fallback claim")
+
+    pending_res = (
         supabase
         .table("appointment_reminders")
-        .select("*")
+        .select("id")
         .eq("status", "pending")
         .lte("scheduled_at", now.isoformat())
         .order("scheduled_at")
+        .limit(limit)
+        .execute()
+    )
+    ids = [row["id"] for row in (pending_res.data or []) if row.get("id")]
+    if not ids:
+        return []
+
+    claim_res = (
+        supabase
+        .table("appointment_reminders")
+        .update({
+            "status": "processing",
+            "updated_at": now.isoformat(),
+        })
+        .in_("id", ids)
+        .eq("status", "pending")
         .execute()
     )
+    return [row for row in (claim_res.data or []) if isinstance(row, dict)]
+
+
+def _write_reminder_statuses(outcomes: dict[str, str], now: datetime) -> None:
+    """Un update por estado final (sent/failed/cancelled) en lugar de uno por fila."""
+    by_status: dict[str, list[str]] = {}
+    for reminder_id, status in outcomes.items():
+        by_status.setdefault(status, []).append(reminder_id)
+
+    for status, ids in by_status.items():
+        for chunk in _chunked(ids, STATUS_UPDATE_CHUNK_SIZE):
+            try:
+                supabase.table("appointment_reminders").update({
+                    "status": status,
+                    "updated_at": now.isoformat(),
+                }).in_("id", chunk).execute()
+            except Exception:
+                logger.exception(
+                    "❌ REMINDER STATUS WRITE FAILED | status=%s | count=%s",
+                    status,
+                    len(chunk),
+                )
+
+
+class _ReminderRunCache:
+    """
+    Lookups de una ejecución del cron: citas, plantillas y datos del tenant
+    se cargan en bloque con `in_` para todo el lote reclamado.
+    """
+
+    def __init__(self):
+        self.appointments: dict[str, dict] = {}
+        self.templates: dict[str, dict] = {}
+        self.meta_templates: dict[str, dict] = {}
+        self.timezones: dict[str, ZoneInfo] = {}
+        self.company_names: dict[str, str] = {}
+
+    @staticmethod
+    def _rows_by(table: str, fields: str, key: str, values: set, **filters) -> dict[str, dict]:
+        values = sorted(str(value) for value in values if value)
+        rows: dict[str, dict] = {}
+        for chunk in _chunked(values, STATUS_UPDATE_CHUNK_SIZE):
+            try:
+                query = supabase.table(table).select(fields).in_(key, chunk)
+                for field, value in filters.items():
+                    query = query.eq(field, value)
+                res = query.execute()
+            except Exception as e:
+                logger.warning("⚠️ Reminder prefetch failed | table=%s | error=%s", table, e)
+                continue
+            for row in res.data or []:
+                if isinstance(row, dict) and row.get(key):
+                    rows[str(row[key])] = row
+        return rows
+
+    def prefetch(self, reminders: list[dict]) -> None:
+        appointment_ids = {r.get("appointment_id") for r in reminders} - set(self.appointments)
+        template_ids = {r.get("template_id") for r in reminders} - set(self.templates)
+        client_ids = {r.get("client_id") for r in reminders} - set(self.timezones)
+
+        self.appointments.update(self._rows_by("appointments", "*", "id", appointment_ids))
+        templates = self._rows_by("message_templates", "*", "id", template_ids, is_active=True)
+        self.templates.update(templates)
+
+        meta_ids = {t.get("meta_template_id") for t in templates.values()} - set(self.meta_templates)
+        self.meta_templates.update(
+            self._rows_by(
+                "meta_approved_templates",
+                "id, parameter_count, language, is_active, buttons_json",
+                "id",
+                meta_ids,
+                is_active=True,
+            )
+        )
+
+        if not client_ids:
+            return
+        settings = self._rows_by("client_settings", "client_id, language, timezone", "client_id", client_ids)
+        profiles = self._rows_by("client_profile", "client_id, company_name", "client_id", client_ids)
+        clients = self._rows_by("clients", "id, name", "id", client_ids)
+
+        for client_id in client_ids:
+            client_id = str(client_id)
+            row = settings.get(client_id) or {}
+            try:
+                self.timezones[client_id] = ZoneInfo(row.get("timezone") or "UTC")
+            except Exception:
+                self.timezones[client_id] = ZoneInfo("UTC")
+
+            lang = str(row.get("language") or "es").strip().lower()
+            company_name = (
+                str((profiles.get(client_id) or {}).get("company_name") or "").strip()
+                or str((clients.get(client_id) or {}).get("name") or "").strip()
+            )
+            self.company_names[client_id] = company_name or (
+                "your company" if lang.startswith("en") else "su empresa"
+            )
+
+    def policy_recipients(self, reminders: list[dict]) -> list[tuple]:
+        """(client_id, email, phone) tal como cada envío los pasa a la política de salida."""
+        recipients = []
+        for reminder in reminders:
+            appointment = self.appointment(reminder.get("appointment_id")) or {}
+            email = appointment.get("user_email")
+            if reminder.get("channel") == "whatsapp":
+                recipients.append((reminder.get("client_id"), email, appointment.get("user_phone")))
+            else:
+                recipients.append((reminder.get("client_id"), email, None))
+        return recipients
+
+    def appointment(self, appointment_id) -> dict | None:
+        return self.appointments.get(str(appointment_id))
+
+    def template(self, template_id, client_id) -> dict | None:
+        template = self.templates.get(str(template_id))
+        if template and str(template.get("client_id")) == str(client_id):
+            return template
+        return None
 
-    reminders = response.data or []
-    logger.info("📥 Pending reminders fetched | count=%s", len(reminders))
+    def meta_template(self, meta_template_id) -> dict | None:
+        return self.meta_templates.get(str(meta_template_id))
 
-    processed = sent = failed = skipped = 0
+    def timezone(self, client_id) -> ZoneInfo:
+        return self.timezones.get(str(client_id)) or get_client_timezone(client_id)
 
-    for reminder in reminders:
-        processed += 1
+    def company_name(self, client_id) -> str:
+        return self.company_names.get(str(client_id)) or get_client_company_name(client_id)
 
-        reminder_id = reminder["id"]
-        appointment_id = reminder["appointment_id"]
-        client_id = reminder["client_id"]
-        channel = reminder["channel"]
 
-        # Claim reminder atomically to avoid duplicate sends in overlapping cron runs.
+def _precheck_reminder(reminder: dict, appointment: dict | None, now: datetime) -> str | None:
+    """Devuelve 'cancelled' si el recordatorio llega tarde o la cita ya pasó."""
+    reminder_id = reminder["id"]
+
+    # Skip stale reminders that are too late (prevents clustered sends after cron outages).
+    scheduled_at_raw = reminder.get("scheduled_at")
+    if scheduled_at_raw:
         try:
-            claim_res = (
-                supabase
-                .table("appointment_reminders")
-                .update({
-                    "status": "processing",
-                    "updated_at": now.isoformat(),
-                })
-                .eq("id", reminder_id)
-                .eq("status", "pending")
-                .execute()
+            scheduled_at_dt = _parse_utc(scheduled_at_raw)
+            if now - scheduled_at_dt > timedelta(minutes=MAX_REMINDER_LAG_MINUTES):
+                logger.info(
+                    "⏭️ REMINDER SKIPPED (stale lag) | reminder_id=%s | scheduled_at=%s | now=%s | lag_minutes=%s",
+                    reminder_id,
+                    scheduled_at_dt.isoformat(),
+                    now.isoformat(),
+                    int((now - scheduled_at_dt).total_seconds() // 60),
+                )
+                return "cancelled"
+        except Exception:
+            logger.exception(
+                "⚠️ Failed parsing reminder scheduled_at for stale check | reminder_id=%s | raw=%s",
+                reminder_id,
+                scheduled_at_raw,
             )
-            claimed_rows = claim_res.data or []
-            if not claimed_rows:
-                skipped += 1
+
+    # Skip overdue reminders for appointments that already passed.
+    scheduled_time_raw = (appointment or {}).get("scheduled_time")
+    if scheduled_time_raw:
+        try:
+            appointment_dt = _parse_utc(scheduled_time_raw)
+            if appointment_dt <= now:
                 logger.info(
-                    "⏭️ REMINDER SKIPPED (already claimed/processed) | id=%s",
+                    "⏭️ REMINDER SKIPPED (appointment already passed) | reminder_id=%s | appointment_id=%s | appointment_time=%s",
                     reminder_id,
+                    reminder.get("appointment_id"),
+                    appointment_dt.isoformat(),
                 )
-                continue
+                return "cancelled"
         except Exception:
-            skipped += 1
             logger.exception(
-                "❌ REMINDER CLAIM FAILED | id=%s | appointment_id=%s | client_id=%s",
+                "⚠️ Failed parsing appointment scheduled_time for reminder skip check | reminder_id=%s | appointment_id=%s | raw=%s",
                 reminder_id,
-                appointment_id,
-                client_id,
+                reminder.get("appointment_id"),
+                scheduled_time_raw,
             )
-            continue
 
-        logger.info(
-            "🔔 Processing reminder | id=%s | client_id=%s | channel=%s",
-            reminder_id,
-            client_id,
-            channel,
+    return None
+
+
+async def _send_whatsapp_reminder(reminder: dict, appointment: dict, template: dict, cache: _ReminderRunCache) -> None:
+    reminder_id = reminder["id"]
+    client_id = reminder["client_id"]
+
+    phone = appointment.get("user_phone")
+    if not phone:
+        raise Exception("Missing phone")
+
+    # =====================================================
+    # META TEMPLATE FLOW
+    # =====================================================
+    meta_template_id = template.get("meta_template_id")
+    if not meta_template_id:
+        raise Exception(
+            "Legacy WhatsApp reminder template is not allowed. "
+            "Template must reference meta_approved_templates via meta_template_id."
         )
 
-        try:
-            # Skip stale reminders that are too late (prevents clustered sends after cron outages).
-            scheduled_at_raw = reminder.get("scheduled_at")
-            if scheduled_at_raw:
-                try:
-                    scheduled_at_dt = datetime.fromisoformat(
-                        str(scheduled_at_raw).replace("Z", "+00:00")
-                    )
-                    if scheduled_at_dt.tzinfo is None:
-                        scheduled_at_dt = scheduled_at_dt.replace(tzinfo=timezone.utc)
-                    else:
-                        scheduled_at_dt = scheduled_at_dt.astimezone(timezone.utc)
-
-                    if now - scheduled_at_dt > timedelta(minutes=MAX_REMINDER_LAG_MINUTES):
-                        skipped += 1
-                        logger.info(
-                            "⏭️ REMINDER SKIPPED (stale lag) | reminder_id=%s | scheduled_at=%s | now=%s | lag_minutes=%s",
-                            reminder_id,
-                            scheduled_at_dt.isoformat(),
-                            now.isoformat(),
-                            int((now - scheduled_at_dt).total_seconds() // 60),
-                        )
-                        supabase.table("appointment_reminders").update({
-                            "status": "cancelled",
-                            "updated_at": now.isoformat(),
-                        }).eq("id", reminder_id).execute()
-                        continue
-                except Exception:
-                    logger.exception(
-                        "⚠️ Failed parsing reminder scheduled_at for stale check | reminder_id=%s | raw=%s",
-                        reminder_id,
-                        scheduled_at_raw,
-                    )
-
-            # -------------------------------------------------
-            # 1️⃣ Load Appointment
-            # -------------------------------------------------
-            appointment_res = (
-                supabase
-                .table("appointments")
-                .select("*")
-                .eq("id", appointment_id)
-                .single()
-                .execute()
-            )
+    template_name = template.get("template_name")
+    if not template_name:
+        raise Exception("Template missing template_name")
 
-            appointment = appointment_res.data
-            if not appointment:
-                raise Exception("Appointment not found")
+    meta_template = cache.meta_template(meta_template_id)
+    if not meta_template:
+        raise Exception(
+            "Meta approved template metadata not found: "
+            f"template_name={template_name}, meta_template_id={meta_template_id}"
+        )
 
-            # Skip overdue reminders for appointments that already passed.
-            scheduled_time_raw = appointment.get("scheduled_time")
-            if scheduled_time_raw:
-                try:
-                    appointment_dt = datetime.fromisoformat(
-                        str(scheduled_time_raw).replace("Z", "+00:00")
-                    )
-                    if appointment_dt.tzinfo is None:
-                        appointment_dt = appointment_dt.replace(tzinfo=timezone.utc)
-                    else:
-                        appointment_dt = appointment_dt.astimezone(timezone.utc)
-
-                    if appointment_dt <= now:
-                        skipped += 1
-                        logger.info(
-                            "⏭️ REMINDER SKIPPED (appointment already passed) | reminder_id=%s | appointment_id=%s | appointment_time=%s",
-                            reminder_id,
-                            appointment_id,
-                            appointment_dt.isoformat(),
-                        )
-                        supabase.table("appointment_reminders").update({
-                            "status": "cancelled",
-                            "updated_at": now.isoformat(),
-                        }).eq("id", reminder_id).execute()
-                        continue
-                except Exception:
-                    logger.exception(
-                        "⚠️ Failed parsing appointment scheduled_time for reminder skip check | reminder_id=%s | appointment_id=%s | raw=%s",
-                        reminder_id,
-                        appointment_id,
-                        scheduled_time_raw,
-                    )
-
-            # -------------------------------------------------
-            # 2️⃣ Load Template
-            # -------------------------------------------------
-            template_res = (
-                supabase
-                .table("message_templates")
-                .select("*")
-                .eq("id", reminder["template_id"])
-                .eq("client_id", client_id)
-                .eq("is_active", True)
-                .single()
-                .execute()
-            )
+    expected_params = meta_template["parameter_count"]
+    language_code = meta_template["language"]
+    locale_code = language_code
 
-            template = template_res.data
-            if not template:
-                raise Exception("Template not found or inactive")
+    raw_user_name = appointment.get("user_name") or "Cliente"
+    raw_type = appointment.get("appointment_type") or ""
+    raw_time = appointment.get("scheduled_time")
 
-            logger.info(
-                "🧩 Template resolved | id=%s | name=%s",
-                template["id"],
-                template.get("template_name"),
-            )
+    user_name = raw_user_name.strip() or "Cliente"
 
-            send_ok = False
+    details_parts = []
 
-            # =====================================================
-            # WHATSAPP
-            # =====================================================
-            if channel == "whatsapp":
+    if raw_type.strip():
+        details_parts.append(raw_type.strip())
 
-                phone = appointment.get("user_phone")
-                if not phone:
-                    raise Exception("Missing phone")
-
-                # =====================================================
-                # META TEMPLATE FLOW
-                # =====================================================
-                meta_template_id = template.get("meta_template_id")
-                if not meta_template_id:
-                    raise Exception(
-                        "Legacy WhatsApp reminder template is not allowed. "
-                        "Template must reference meta_approved_templates via meta_template_id."
-                    )
-
-                template_name = template.get("template_name")
-                if not template_name:
-                    raise Exception("Template missing template_name")
-
-                meta_res = (
-                    supabase
-                    .table("meta_approved_templates")
-                    .select("parameter_count, language, is_active, buttons_json")
-                    .eq("id", meta_template_id)
-                    .eq("is_active", True)
-                    .single()
-                    .execute()
-                )
+    if raw_time:
+        formatted_time = format_scheduled_time(
+            raw_time,
+            client_id,
+            locale_code,
+            client_tz=cache.timezone(client_id),
+        )
+        if formatted_time.strip():
+            details_parts.append(formatted_time)
+
+    appointment_details = " - ".join(details_parts).strip()
+    if not appointment_details:
+        appointment_details = "Cita programada"
+
+    parameters = build_reminder_parameters(
+        expected_params,
+        user_name=user_name,
+        company_name=cache.company_name(client_id),
+        appointment_details=appointment_details,
+        appointment_type=raw_type,
+    )
 
-                meta_template = meta_res.data
-                if not meta_template:
-                    raise Exception(
-                        "Meta approved template metadata not found: "
-                        f"template_name={template_name}, meta_template_id={meta_template_id}"
-                    )
-
-                expected_params = meta_template["parameter_count"]
-                language_code = meta_template["language"]
-                locale_code = language_code
-
-                raw_user_name = appointment.get("user_name") or "Cliente"
-                raw_type = appointment.get("appointment_type") or ""
-                raw_time = appointment.get("scheduled_time")
-
-                user_name = raw_user_name.strip() or "Cliente"
-
-                details_parts = []
-
-                if raw_type.strip():
-                    details_parts.append(raw_type.strip())
-
-                if raw_time:
-                    formatted_time = format_scheduled_time(
-                        raw_time,
-                        client_id,
-                        locale_code,
-                    )
-                    if formatted_time.strip():
-                        details_parts.append(formatted_time)
-
-                appointment_details = " - ".join(details_parts).strip()
-                if not appointment_details:
-                    appointment_details = "Cita programada"
-
-                parameters = build_reminder_parameters(
-                    expected_params,
-                    user_name=user_name,
-                    company_name=get_client_company_name(client_id),
-                    appointment_details=appointment_details,
-                    appointment_type=raw_type,
-                )
+    if expected_params != len(parameters):
+        raise Exception(
+            f"Parameter count mismatch | expected={expected_params} | got={len(parameters)}"
+        )
 
-                if expected_params != len(parameters):
-                    raise Exception(
-                        f"Parameter count mismatch | expected={expected_params} | got={len(parameters)}"
-                    )
+    logger.info(
+        "📤 Sending META TEMPLATE | reminder_id=%s | template=%s | params=%s",
+        reminder_id,
+        template_name,
+        parameters,
+    )
+    effective_buttons_json = resolve_effective_template_buttons_json(
+        canonical_buttons_json=meta_template.get("buttons_json") if isinstance(meta_template, dict) else None,
+        local_buttons_json=template.get("buttons_json"),
+    )
 
-                logger.info(
-                    "📤 Sending META TEMPLATE | reminder_id=%s | template=%s | params=%s",
-                    reminder_id,
-                    template_name,
-                    parameters,
-                )
-                effective_buttons_json = resolve_effective_template_buttons_json(
-                    canonical_buttons_json=meta_template.get("buttons_json") if isinstance(meta_template, dict) else None,
-                    local_buttons_json=template.get("buttons_json"),
-                )
+    send_result = await send_whatsapp_template_for_client(
+        client_id=client_id,
+        to_number=phone,
+        template_name=template_name,
+        language_code=language_code,
+        parameters=parameters,
+        buttons_json=effective_buttons_json,
+        purpose="reminder",
+        recipient_email=appointment.get("user_email"),
+        policy_source="appointments_execute_reminders",
+        policy_source_id=reminder_id,
+    )
+    if not (send_result and send_result.get("success")):
+        raise Exception(
+            f"Meta template send failed: {(send_result or {}).get('error', 'unknown error')}"
+        )
 
-                send_result = await send_whatsapp_template_for_client(
-                    client_id=client_id,
-                    to_number=phone,
-                    template_name=template_name,
-                    language_code=language_code,
-                    parameters=parameters,
-                    buttons_json=effective_buttons_json,
-                    purpose="reminder",
-                    recipient_email=appointment.get("user_email"),
-                    policy_source="appointments_execute_reminders",
-                    policy_source_id=reminder_id,
-                )
-                send_ok = bool(send_result and send_result.get("success"))
-                if not send_ok:
-                    raise Exception(
-                        f"Meta template send failed: {(send_result or {}).get('error', 'unknown error')}"
-                    )
-
-            # =====================================================
-            # EMAIL
-            # =====================================================
-            elif channel == "email":
 
-                email = appointment.get("user_email")
-                if not email:
-                    raise Exception("Missing email")
+def _send_email_reminder(reminder: dict, appointment: dict, template: dict, cache: _ReminderRunCache) -> None:
+    reminder_id = reminder["id"]
+    client_id = reminder["client_id"]
 
-                _, locale_code = resolve_locale_for_rendering(
-                    client_id=client_id,
-                    appointment=appointment,
-                    template_row=template,
-                )
-                date_str = ""
-                hour_str = ""
-                try:
-                    scheduled_raw = appointment.get("scheduled_time")
-                    if scheduled_raw:
-                        dt_utc = datetime.fromisoformat(str(scheduled_raw).replace("Z", "+00:00"))
-                        dt_local = dt_utc.astimezone(get_client_timezone(client_id))
-                        date_str = format_datetime(dt_local, "yyyy-MM-dd", locale=locale_code)
-                        hour_str = format_datetime(dt_local, "HH:mm", locale=locale_code)
-                except Exception:
-                    date_str = ""
-                    hour_str = ""
-
-                cancel_link = ""
-                try:
-                    token = generate_cancel_token(
-                        client_id=client_id,
-                        appointment_id=str(appointment.get("id") or ""),
-                        recipient_email=email,
-                    )
-                    if token:
-                        cancel_link = build_cancel_link(token)
-                except Exception:
-                    cancel_link = ""
-
-                appointment_for_render = dict(appointment or {})
-                appointment_for_render["_cancel_appointment_link"] = cancel_link
-                rendered_body = render_template(
-                    template.get("body", "") or "",
-                    appointment_for_render,
-                    locale_code,
-                )
-                rendered_subject = (
-                    (template.get("label") or "").replace("\r", " ").replace("\n", " ").strip()
-                    or ("⏰ Appointment reminder" if str(locale_code).lower().startswith("en") else "⏰ Recordatorio de tu cita")
-                )
+    email = appointment.get("user_email")
+    if not email:
+        raise Exception("Missing email")
 
-                logger.info(
-                    "📧 EMAIL reminder send | to=%s | reminder_id=%s | cancel_link=%s",
-                    email,
-                    reminder_id,
-                    "yes" if cancel_link else "no",
-                )
+    client_tz = cache.timezone(client_id)
+    _, locale_code = resolve_locale_for_rendering(
+        client_id=client_id,
+        appointment=appointment,
+        template_row=template,
+    )
+    date_str = ""
+    hour_str = ""
+    try:
+        scheduled_raw = appointment.get("scheduled_time")
+        if scheduled_raw:
+            dt_utc = datetime.fromisoformat(str(scheduled_raw).replace("Z", "+00:00"))
+            dt_local = dt_utc.astimezone(client_tz)
+            date_str = format_datetime(dt_local, "yyyy-MM-dd", locale=locale_code)
+            hour_str = format_datetime(dt_local, "HH:mm", locale=locale_code)
+    except Exception:
+        date_str = ""
+        hour_str = ""
+
+    cancel_link = ""
+    try:
+        token = generate_cancel_token(
+            client_id=client_id,
+            appointment_id=str(appointment.get("id") or ""),
+            recipient_email=email,
+        )
+        if token:
+            cancel_link = build_cancel_link(token)
+    except Exception:
+        cancel_link = ""
+
+    appointment_for_render = dict(appointment or {})
+    appointment_for_render["_cancel_appointment_link"] = cancel_link
+    rendered_body = render_template(
+        template.get("body", "") or "",
+        appointment_for_render,
+        locale_code,
+        client_tz=client_tz,
+        company_name=cache.company_name(client_id),
+    )
+    rendered_subject = (
+        (template.get("label") or "").replace("\r", " ").replace("\n", " ").strip()
+        or ("⏰ Appointment reminder" if str(locale_code).lower().startswith("en") else "⏰ Recordatorio de tu cita")
+    )
 
-                send_ok = bool(
-                    send_confirmation_email(
-                        to_email=email,
-                        date_str=date_str,
-                        hour_str=hour_str,
-                        html_body=rendered_body,
-                        subject=rendered_subject,
-                        client_id=client_id,
-                        user_name=appointment.get("user_name"),
-                        appointment_type=appointment.get("appointment_type"),
-                        purpose="reminder",
-                    )
-                )
-                if not send_ok:
-                    raise Exception("Email reminder send failed")
+    logger.info(
+        "📧 EMAIL reminder send | to=%s | reminder_id=%s | cancel_link=%s",
+        email,
+        reminder_id,
+        "yes" if cancel_link else "no",
+    )
+
+    send_ok = bool(
+        send_confirmation_email(
+            to_email=email,
+            date_str=date_str,
+            hour_str=hour_str,
+            html_body=rendered_body,
+            subject=rendered_subject,
+            client_id=client_id,
+            user_name=appointment.get("user_name"),
+            appointment_type=appointment.get("appointment_type"),
+            purpose="reminder",
+        )
+    )
+    if not send_ok:
+        raise Exception("Email reminder send failed")
 
+
+async def _dispatch_reminder(
+    reminder: dict,
+    cache: _ReminderRunCache,
+    now: datetime,
+    semaphore: asyncio.Semaphore,
+) -> str:
+    """Procesa un recordatorio ya reclamado y devuelve su estado final."""
+    reminder_id = reminder["id"]
+    appointment_id = reminder["appointment_id"]
+    client_id = reminder["client_id"]
+    channel = reminder["channel"]
+
+    logger.info(
+        "🔔 Processing reminder | id=%s | client_id=%s | channel=%s",
+        reminder_id,
+        client_id,
+        channel,
+    )
+
+    try:
+        # -------------------------------------------------
+        # 1️⃣ Load Appointment
+        # -------------------------------------------------
+        appointment = cache.appointment(appointment_id)
+        skip_status = _precheck_reminder(reminder, appointment, now)
+        if skip_status:
+            return skip_status
+        if not appointment:
+            raise Exception("Appointment not found")
+
+        # -------------------------------------------------
+        # 2️⃣ Load Template
+        # -------------------------------------------------
+        template = cache.template(reminder.get("template_id"), client_id)
+        if not template:
+            raise Exception("Template not found or inactive")
+
+        logger.info(
+            "🧩 Template resolved | id=%s | name=%s",
+            template["id"],
+            template.get("template_name"),
+        )
+
+        async with semaphore:
+            if channel == "whatsapp":
+                await _send_whatsapp_reminder(reminder, appointment, template, cache)
+            elif channel == "email":
+                # SMTP/Resend es bloqueante: lo sacamos del event loop.
+                await asyncio.to_thread(_send_email_reminder, reminder, appointment, template, cache)
             else:
                 raise Exception(f"Unsupported channel: {channel}")
 
-            if not send_ok:
-                raise Exception("Provider send failed")
+        logger.info("✅ REMINDER SENT | id=%s", reminder_id)
+        return "sent"
 
-            supabase.table("appointment_reminders").update({
-                "status": "sent",
-                "updated_at": now.isoformat(),
-            }).eq("id", reminder_id).execute()
+    except Exception:
+        logger.exception(
+            "❌ REMINDER FAILED | id=%s | appointment_id=%s | client_id=%s",
+            reminder_id,
+            appointment_id,
+            client_id,
+        )
+        return "failed"
 
-            sent += 1
-            logger.info("✅ REMINDER SENT | id=%s", reminder_id)
 
+# =====================================================
+# Endpoint
+# =====================================================
+@router.post("/reminders/execute")
+async def execute_pending_reminders(request: Request):
+    require_internal_request(request)
+
+    now = datetime.now(timezone.utc)
+    logger.info("⏱️ REMINDER EXECUTION START | now=%s", now.isoformat())
+
+    deadline = time.monotonic() + REMINDER_RUN_BUDGET_SECONDS
+    semaphore = asyncio.Semaphore(REMINDER_SEND_CONCURRENCY)
+    cache = _ReminderRunCache()
+    processed = sent = failed = skipped = batches = 0
+
+    # Drenamos el backlog por lotes hasta vaciarlo o agotar el presupuesto del cron.
+    while time.monotonic() < deadline:
+        try:
+            reminders = _claim_reminder_batch(now, REMINDER_CLAIM_BATCH_SIZE)
         except Exception:
-            failed += 1
+            logger.exception("❌ REMINDER CLAIM FAILED | batch=%s", batches + 1)
+            break
 
-            logger.exception(
-                "❌ REMINDER FAILED | id=%s | appointment_id=%s | client_id=%s",
-                reminder_id,
-                appointment_id,
-                client_id,
-            )
+        if not reminders:
+            break
+
+        batches += 1
+        logger.info("📥 Reminders claimed | batch=%s | count=%s", batches, len(reminders))
+
+        cache.prefetch(reminders)
+        outcomes: dict[str, str] = {}
+        unwritten: dict[str, str] = {}
+
+        async def _dispatch_with_id(reminder: dict) -> tuple[str, str]:
+            return str(reminder["id"]), await _dispatch_reminder(reminder, cache, now, semaphore)
+
+        try:
+            with outbound_policy_batch(cache.policy_recipients(reminders)):
+                # Las tasks copian el contexto al crearse: deben nacer dentro del lote de política.
+                tasks = [asyncio.ensure_future(_dispatch_with_id(reminder)) for reminder in reminders]
+                try:
+                    for finished in asyncio.as_completed(tasks):
+                        reminder_id, status = await finished
+                        outcomes[reminder_id] = status
+                        unwritten[reminder_id] = status
+                        if len(unwritten) >= REMINDER_STATUS_FLUSH_SIZE:
+                            flushing, unwritten = unwritten, {}
+                            await asyncio.to_thread(_write_reminder_statuses, flushing, now)
+                finally:
+                    for task in tasks:
+                        if not task.done():
+                            task.cancel()
+        finally:
+            _write_reminder_statuses(unwritten, now)
+
+        processed += len(reminders)
+        for status in outcomes.values():
+            if status == "sent":
+                sent += 1
+            elif status == "failed":
+                failed += 1
+            else:
+                skipped += 1
 
-            supabase.table("appointment_reminders").update({
-                "status": "failed",
-                "updated_at": now.isoformat(),
-            }).eq("id", reminder_id).execute()
+        if len(reminders) < REMINDER_CLAIM_BATCH_SIZE:
+            break
 
     logger.info(
-        "📊 REMINDER SUMMARY | processed=%s | sent=%s | failed=%s | skipped=%s",
+        "📊 REMINDER SUMMARY | processed=%s | sent=%s | failed=%s | skipped=%s | batches=%s",
         processed,
         sent,
         failed,
         skipped,
+        batches,
     )
 
     return {
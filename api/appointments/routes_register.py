@@ -4,6 +4,7 @@ from api.modules.assistant_rag.supabase_client import supabase
 from datetime import datetime
 from api.authz import authorize_client_request
 from api.internal_auth import has_valid_internal_token
+from api.utils.dashboard_snapshot import invalidate_dashboard_snapshot
 
 router = APIRouter() #d
 
@@ -37,6 +38,8 @@ async def make_register_appointment(data: MakeRegisterAppointment, request: Requ
         if not result.data:
             raise HTTPException(status_code=500, detail="Failed to create appointment")
 
+        invalidate_dashboard_snapshot(data.client_id, reason="appointment_registered")
+
         return {
             "appointment_id": result.data[0]["id"],
             "status": "created"
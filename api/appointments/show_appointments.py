@@ -2,7 +2,6 @@
 
 from datetime import datetime, timezone
 import logging
-import re
 from typing import Optional
 from uuid import UUID
 
@@ -12,11 +11,11 @@ from pydantic import BaseModel, EmailStr
 from api.authz import authorize_client_request
 from api.config.config import supabase
 from api.appointments.template_language_resolution import normalize_language_preferences
+from api.utils.contact_identity import strict_e164
 
 router = APIRouter(prefix="/appointments", tags=["Appointments"])
 
 logger = logging.getLogger(__name__)
-E164_PHONE_RE = re.compile(r"^\+[1-9]\d{7,14}$")
 
 
 class AppointmentClientPayload(BaseModel):
@@ -50,19 +49,7 @@ def _normalize_email(email) -> Optional[str]:
 
 
 def _normalize_phone(phone) -> Optional[str]:
-    if phone is None:
-        return None
-    raw = str(phone).strip()
-    if not raw:
-        return None
-
-    raw = raw.replace(" ", "").replace("-", "").replace("(", "").replace(")", "")
-    if raw.startswith("00"):
-        raw = f"+{raw[2:]}"
-
-    if not E164_PHONE_RE.fullmatch(raw):
-        return None
-    return raw
+    return strict_e164(phone)
 
 
 def _normalize_name(name) -> str:
@@ -9,6 +9,7 @@ from datetime import datetime, timedelta
 from ..modules.assistant_rag.supabase_client import supabase
 from api.oauth_state import decode_signed_state
 from api.utils.calendar_feature_flags import client_can_use_google_calendar_sync
+from api.utils.dashboard_snapshot import invalidate_dashboard_snapshot
 
 # ✅ Prefijo /api para que coincida con las rutas del frontend
 router = APIRouter(prefix="/api", tags=["Calendar"])
@@ -262,6 +263,7 @@ async def google_calendar_callback(request: Request, code: str = None, state: st
         }
 
         supabase.table("calendar_integrations").upsert(data, on_conflict="client_id").execute()
+        invalidate_dashboard_snapshot(client_id, reason="calendar_connected")
         logging.info(f"✅ Calendar tokens saved successfully for client {client_id}")
     except Exception:
         logging.exception("❌ Failed to save tokens to Supabase")
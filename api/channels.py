@@ -9,6 +9,7 @@ from fastapi import APIRouter, HTTPException, Query, Request
 from pydantic import BaseModel
 from api.modules.assistant_rag.supabase_client import supabase
 from api.authz import authorize_client_request
+from api.utils.dashboard_snapshot import invalidate_dashboard_snapshot
 from api.security.whatsapp_token_crypto import (
     encrypt_whatsapp_token,
     is_encrypted_whatsapp_token,
@@ -312,6 +313,7 @@ async def upsert_meta_app_channel(payload: MetaAppChannelUpsertPayload, request:
             }
             supabase.table("channels").insert(insert_payload).execute()
 
+        invalidate_dashboard_snapshot(client_id, reason="meta_app_channel_connected")
         return {
             "success": True,
             "client_id": client_id,
@@ -358,6 +360,7 @@ async def disconnect_meta_app_channel(payload: MetaAppChannelDisconnectPayload,
             .execute()
         )
 
+        invalidate_dashboard_snapshot(client_id, reason="meta_app_channel_disconnected")
         return {
             "success": True,
             "client_id": client_id,
@@ -7,6 +7,7 @@ import time
 import httpx
 from api.modules.assistant_rag.supabase_client import supabase
 from api.authz import authorize_client_request
+from api.utils.dashboard_snapshot import invalidate_dashboard_snapshot
 from api.utils.effective_plan import (
     get_client_override_plan_id,
     normalize_plan_id,
@@ -385,6 +386,7 @@ async def upsert_client_settings(request: Request):
                 raise
 
         if response.data:
+            invalidate_dashboard_snapshot(payload.client_id, reason="client_settings_saved")
             print("✅ Configuración guardada correctamente para client_id:", payload.client_id)
             return JSONResponse(
                 content={"message": "Configuración guardada correctamente.", "settings": response.data[0]}
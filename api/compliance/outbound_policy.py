@@ -4,9 +4,12 @@ import logging
 import os
 import re
 import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from threading import Lock
+from typing import Any, Iterable
 
 from api.config.config import supabase
 from api.privacy_dsr import split_details_and_metadata
@@ -14,6 +17,10 @@ from api.privacy_dsr import split_details_and_metadata
 logger = logging.getLogger(__name__)
 
 TERMINAL_DSAR_STATUSES = {"withdrawn", "denied"}
+POLICY_PREFETCH_CHUNK_SIZE = 100
+# No mayor que el max-rows de PostgREST (1000 por defecto): una página corta marca el final.
+POLICY_PREFETCH_PAGE_SIZE = 1000
+POLICY_AUDIT_FLUSH_SIZE = 200
 
 
 @dataclass
@@ -68,13 +75,16 @@ def _parse_iso(raw: Any) -> datetime | None:
     return parsed.astimezone(timezone.utc)
 
 
+POLICY_SETTINGS_FIELDS = "require_email_consent,require_phone_consent,require_terms_consent,consent_renewal_days"
+CONSENT_FIELDS = "id,consent_at,email,phone,accepted_terms,accepted_email_marketing"
+OPT_OUT_FIELDS = "id,request_type,status,created_at,details"
+
+
 def _load_policy_settings(client_id: str) -> PolicySettings:
     try:
         res = (
             supabase.table("client_settings")
-            .select(
-                "require_email_consent,require_phone_consent,require_terms_consent,consent_renewal_days"
-            )
+            .select(POLICY_SETTINGS_FIELDS)
             .eq("client_id", client_id)
             .limit(1)
             .execute()
@@ -82,7 +92,11 @@ def _load_policy_settings(client_id: str) -> PolicySettings:
         row = (res.data or [{}])[0]
     except Exception:
         row = {}
+    return _policy_settings_from_row(row)
+
 
+def _policy_settings_from_row(row: dict[str, Any]) -> PolicySettings:
+    row = row or {}
     renewal_days = int(row.get("consent_renewal_days") or 90)
     renewal_days = max(1, min(renewal_days, 3650))
 
@@ -118,7 +132,7 @@ def _load_latest_contact_consent(
 
     query = (
         supabase.table("widget_consents")
-        .select("id,consent_at,email,phone,accepted_terms,accepted_email_marketing")
+        .select(CONSENT_FIELDS)
         .eq("client_id", client_id)
         .order("consent_at", desc=True)
         .limit(1)
@@ -132,7 +146,10 @@ def _load_latest_contact_consent(
         row = (query.execute().data or [None])[0] or {}
     except Exception:
         row = {}
+    return _consent_snapshot_from_row(row)
 
+
+def _consent_snapshot_from_row(row: dict[str, Any]) -> ConsentSnapshot:
     consent_at = _parse_iso(row.get("consent_at"))
     return ConsentSnapshot(
         consent_id=str(row.get("id")) if row.get("id") else None,
@@ -161,43 +178,47 @@ def _load_marketing_opt_out(email: str | None, *, client_id: str | None = None)
     try:
         res = (
             supabase.table("public_privacy_requests")
-            .select("id,request_type,status,created_at,details")
+            .select(OPT_OUT_FIELDS)
             .eq("email", email)
             .eq("request_type", "marketing_opt_out")
             .order("created_at", desc=True)
             .limit(50)
             .execute()
         )
-        rows = res.data or []
-        latest_applicable: dict[str, Any] | None = None
-        latest_scope_client_id: str | None = None
+        return _applicable_opt_out(res.data or [], client_id=client_id)
+    except Exception:
+        return None
 
-        for row in rows:
-            if not row:
-                continue
-            scoped_client_id = _extract_opt_out_client_id(row.get("details"))
-            if client_id and scoped_client_id and str(scoped_client_id) != str(client_id):
-                continue
-            latest_applicable = row
-            latest_scope_client_id = scoped_client_id
-            break
 
-        if not latest_applicable:
-            return None
+def _applicable_opt_out(rows: list[dict[str, Any]], *, client_id: str | None) -> dict[str, Any] | None:
+    """rows: solicitudes del email, más reciente primero."""
+    latest_applicable: dict[str, Any] | None = None
+    latest_scope_client_id: str | None = None
 
-        status = str(latest_applicable.get("status") or "pending").strip().lower()
-        if status in TERMINAL_DSAR_STATUSES:
-            return None
+    for row in rows:
+        if not row:
+            continue
+        scoped_client_id = _extract_opt_out_client_id(row.get("details"))
+        if client_id and scoped_client_id and str(scoped_client_id) != str(client_id):
+            continue
+        latest_applicable = row
+        latest_scope_client_id = scoped_client_id
+        break
 
-        return {
-            "id": latest_applicable.get("id"),
-            "status": status,
-            "created_at": latest_applicable.get("created_at"),
-            "client_id": latest_scope_client_id,
-        }
-    except Exception:
+    if not latest_applicable:
+        return None
+
+    status = str(latest_applicable.get("status") or "pending").strip().lower()
+    if status in TERMINAL_DSAR_STATUSES:
         return None
 
+    return {
+        "id": latest_applicable.get("id"),
+        "status": status,
+        "created_at": latest_applicable.get("created_at"),
+        "client_id": latest_scope_client_id,
+    }
+
 
 def evaluate_policy_decision(
     *,
@@ -277,6 +298,235 @@ def evaluate_policy_decision(
     return True, None, expires_at
 
 
+_MISS = object()
+_ACTIVE_BATCH: ContextVar["OutboundPolicyBatch | None"] = ContextVar(
+    "evolvian_outbound_policy_batch",
+    default=None,
+)
+
+
+def _chunked(values: list[str], size: int):
+    for index in range(0, len(values), size):
+        yield values[index:index + size]
+
+
+def _fetch_all_pages(build_query) -> list[dict[str, Any]]:
+    """Pagina con .range() hasta una página corta para no cachear resultados truncados."""
+    rows: list[dict[str, Any]] = []
+    offset = 0
+    while True:
+        page = build_query().range(offset, offset + POLICY_PREFETCH_PAGE_SIZE - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < POLICY_PREFETCH_PAGE_SIZE:
+            return rows
+        offset += POLICY_PREFETCH_PAGE_SIZE
+
+
+def _consent_recency_key(row: dict[str, Any]) -> tuple[bool, float]:
+    # Igual que `order by consent_at desc` en Postgres: los NULL van primero.
+    consent_at = _parse_iso(row.get("consent_at"))
+    return (consent_at is not None, -(consent_at.timestamp() if consent_at else 0.0))
+
+
+class OutboundPolicyBatch:
+    """
+    Insumos de política precargados para un lote de destinatarios (campaña,
+    corrida de recordatorios).
+
+    Los destinatarios se registran por adelantado y se cargan de forma
+    perezosa en la primera evaluación: settings una vez por tenant, consents y
+    opt-outs con consultas `in_` por bloques (paginadas). Lo que no quedó cubierto (o cuya
+    consulta falló) se resuelve con los loaders por destinatario de siempre.
+    Los eventos de auditoría se acumulan y se insertan en bloque.
+    """
+
+    def __init__(self, *, supabase_client: Any = None):
+        self._db = supabase_client or supabase
+        self._lock = Lock()
+        self._pending: dict[str, dict[str, set[str]]] = {}
+        self._settings: dict[str, PolicySettings] = {}
+        self._consents: dict[tuple[str, str, str], list[dict[str, Any]]] = {}
+        self._opt_outs: dict[str, list[dict[str, Any]]] = {}
+        self._audit_rows: list[dict[str, Any]] = []
+
+    def add_recipients(self, recipients: Iterable[tuple[str, str | None, str | None]]) -> None:
+        """recipients: tuplas (client_id, email, phone)."""
+        with self._lock:
+            for client_id, email, phone in recipients or ():
+                if not client_id:
+                    continue
+                client_id = str(client_id)
+                pending = self._pending.setdefault(client_id, {"emails": set(), "phones": set()})
+                email = _normalize_email(email)
+                phone = _normalize_phone(phone)
+                # Con email el consent se busca por email (y se filtra por phone en memoria).
+                if email:
+                    if (client_id, "email", email) not in self._consents:
+                        pending["emails"].add(email)
+                elif phone and (client_id, "phone", phone) not in self._consents:
+                    pending["phones"].add(phone)
+
+    # -------------------------------------------------
+    # Prefetch
+    # -------------------------------------------------
+    def _ensure_loaded(self) -> None:
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            self._load_settings([client_id for client_id in pending if client_id not in self._settings])
+            for client_id, keys in pending.items():
+                self._load_consents(client_id, "email", sorted(keys["emails"]))
+                self._load_consents(client_id, "phone", sorted(keys["phones"]))
+            self._load_opt_outs(
+                sorted({email for keys in pending.values() for email in keys["emails"]} - set(self._opt_outs))
+            )
+
+    def _load_settings(self, client_ids: list[str]) -> None:
+        for chunk in _chunked(sorted(client_ids), POLICY_PREFETCH_CHUNK_SIZE):
+            try:
+                res = (
+                    self._db.table("client_settings")
+                    .select(f"client_id,{POLICY_SETTINGS_FIELDS}")
+                    .in_("client_id", chunk)
+                    .execute()
+                )
+            except Exception as e:
+                logger.warning("⚠️ Outbound policy settings prefetch failed: %s", e)
+                continue
+            rows = {str(row.get("client_id")): row for row in res.data or [] if isinstance(row, dict)}
+            for client_id in chunk:
+                self._settings[client_id] = _policy_settings_from_row(rows.get(client_id) or {})
+
+    def _load_consents(self, client_id: str, field: str, values: list[str]) -> None:
+        for chunk in _chunked(values, POLICY_PREFETCH_CHUNK_SIZE):
+            try:
+                data = _fetch_all_pages(
+                    lambda: self._db.table("widget_consents")
+                    .select(CONSENT_FIELDS)
+                    .eq("client_id", client_id)
+                    .in_(field, chunk)
+                    .order("id")
+                )
+            except Exception as e:
+                logger.warning("⚠️ Outbound policy consent prefetch failed | client_id=%s | error=%s", client_id, e)
+                continue
+            grouped: dict[str, list[dict[str, Any]]] = {value: [] for value in chunk}
+            for row in data:
+                if isinstance(row, dict) and row.get(field) in grouped:
+                    grouped[row[field]].append(row)
+            for value, rows in grouped.items():
+                self._consents[(client_id, field, value)] = sorted(rows, key=_consent_recency_key)
+
+    def _load_opt_outs(self, emails: list[str]) -> None:
+        for chunk in _chunked(emails, POLICY_PREFETCH_CHUNK_SIZE):
+            try:
+                data = _fetch_all_pages(
+                    lambda: self._db.table("public_privacy_requests")
+                    .select(f"email,{OPT_OUT_FIELDS}")
+                    .in_("email", chunk)
+                    .eq("request_type", "marketing_opt_out")
+                    .order("created_at", desc=True)
+                    .order("id")
+                )
+            except Exception as e:
+                logger.warning("⚠️ Outbound policy opt-out prefetch failed: %s", e)
+                continue
+            grouped: dict[str, list[dict[str, Any]]] = {email: [] for email in chunk}
+            for row in data:
+                if isinstance(row, dict) and row.get("email") in grouped:
+                    grouped[row["email"]].append(row)
+            for email, rows in grouped.items():
+                rows.sort(
+                    key=lambda row: _parse_iso(row.get("created_at")) or datetime.min.replace(tzinfo=timezone.utc),
+                    reverse=True,
+                )
+                self._opt_outs[email] = rows
+
+    # -------------------------------------------------
+    # Lookups (devuelven _MISS si el lote no cubre al destinatario)
+    # -------------------------------------------------
+    def settings_for(self, client_id: str) -> Any:
+        self._ensure_loaded()
+        return self._settings.get(str(client_id), _MISS)
+
+    def consent_for(self, client_id: str, email: str | None, phone: str | None) -> Any:
+        self._ensure_loaded()
+        if email:
+            rows = self._consents.get((str(client_id), "email", email))
+            if rows is None:
+                return _MISS
+            if phone:
+                rows = [row for row in rows if row.get("phone") == phone]
+        elif phone:
+            rows = self._consents.get((str(client_id), "phone", phone))
+            if rows is None:
+                return _MISS
+        else:
+            return _MISS
+        return _consent_snapshot_from_row(rows[0] if rows else {})
+
+    def opt_out_for(self, email: str | None, client_id: str) -> Any:
+        if not email:
+            return None
+        self._ensure_loaded()
+        rows = self._opt_outs.get(email)
+        if rows is None:
+            return _MISS
+        return _applicable_opt_out(rows, client_id=client_id)
+
+    # -------------------------------------------------
+    # Auditoría en bloque
+    # -------------------------------------------------
+    def buffer_audit(self, row: dict[str, Any]) -> None:
+        with self._lock:
+            self._audit_rows.append(row)
+            should_flush = len(self._audit_rows) >= POLICY_AUDIT_FLUSH_SIZE
+        if should_flush:
+            self.flush_audit()
+
+    def flush_audit(self) -> None:
+        with self._lock:
+            rows, self._audit_rows = self._audit_rows, []
+        for chunk_start in range(0, len(rows), POLICY_AUDIT_FLUSH_SIZE):
+            chunk = rows[chunk_start:chunk_start + POLICY_AUDIT_FLUSH_SIZE]
+            try:
+                _insert_history_rows_with_role_fallback(chunk, supabase_client=self._db)
+            except Exception as error:
+                logger.warning(
+                    "⚠️ Could not persist %s outbound policy audit events: %s",
+                    len(chunk),
+                    error,
+                )
+
+
+@contextmanager
+def outbound_policy_batch(
+    recipients: Iterable[tuple[str, str | None, str | None]] = (),
+    *,
+    supabase_client: Any = None,
+):
+    """
+    Activa un lote de política para el bloque: evaluate_outbound_policy y
+    log_outbound_policy_event lo usan sin cambiar sus firmas. Anidable: un
+    lote interno agrega sus destinatarios al externo.
+    """
+    current = _ACTIVE_BATCH.get()
+    if current is not None:
+        current.add_recipients(recipients)
+        yield current
+        return
+
+    batch = OutboundPolicyBatch(supabase_client=supabase_client)
+    batch.add_recipients(recipients)
+    token = _ACTIVE_BATCH.set(batch)
+    try:
+        yield batch
+    finally:
+        _ACTIVE_BATCH.reset(token)
+        batch.flush_audit()
+
+
 def evaluate_outbound_policy(
     *,
     client_id: str,
@@ -291,9 +541,16 @@ def evaluate_outbound_policy(
     email = _normalize_email(recipient_email)
     phone = _normalize_phone(recipient_phone)
 
-    settings = _load_policy_settings(client_id)
-    consent = _load_latest_contact_consent(client_id=client_id, email=email, phone=phone)
-    opt_out = _load_marketing_opt_out(email, client_id=client_id)
+    batch = _ACTIVE_BATCH.get()
+    settings = batch.settings_for(client_id) if batch else _MISS
+    if settings is _MISS:
+        settings = _load_policy_settings(client_id)
+    consent = batch.consent_for(client_id, email, phone) if batch else _MISS
+    if consent is _MISS:
+        consent = _load_latest_contact_consent(client_id=client_id, email=email, phone=phone)
+    opt_out = batch.opt_out_for(email, client_id) if batch else _MISS
+    if opt_out is _MISS:
+        opt_out = _load_marketing_opt_out(email, client_id=client_id)
 
     allowed, reason, expires_at = evaluate_policy_decision(
         channel=channel,
@@ -334,7 +591,40 @@ def evaluate_outbound_policy(
     }
 
 
-def _insert_history_with_role_fallback(base_payload: dict[str, Any]) -> None:
+def evaluate_outbound_policy_bulk(
+    *,
+    client_id: str,
+    channel: str,
+    purpose: str,
+    recipients: Iterable[dict[str, Any]],
+    source: str = "unknown",
+    source_id: str | None = None,
+    supabase_client: Any = None,
+) -> list[dict[str, Any]]:
+    """
+    Evalúa la política para una lista de destinatarios ({"email", "phone"})
+    con insumos precargados; devuelve un resultado por destinatario, en orden.
+    """
+    recipients = list(recipients or [])
+    with outbound_policy_batch(
+        [(client_id, r.get("email"), r.get("phone")) for r in recipients],
+        supabase_client=supabase_client,
+    ):
+        return [
+            evaluate_outbound_policy(
+                client_id=client_id,
+                channel=channel,
+                purpose=purpose,
+                recipient_email=r.get("email"),
+                recipient_phone=r.get("phone"),
+                source=source,
+                source_id=source_id,
+            )
+            for r in recipients
+        ]
+
+
+def _history_audit_roles() -> list[str]:
     preferred_role = str(
         os.getenv("EVOLVIAN_HISTORY_AUDIT_ROLE", "assistant") or "assistant"
     ).strip().lower()
@@ -344,9 +634,12 @@ def _insert_history_with_role_fallback(base_payload: dict[str, Any]) -> None:
     for fallback_role in ("assistant", "user"):
         if fallback_role not in roles_to_try:
             roles_to_try.append(fallback_role)
+    return roles_to_try
+
 
+def _insert_history_with_role_fallback(base_payload: dict[str, Any]) -> None:
     last_error: Exception | None = None
-    for role in roles_to_try:
+    for role in _history_audit_roles():
         payload = dict(base_payload)
         payload["role"] = role
         try:
@@ -361,6 +654,29 @@ def _insert_history_with_role_fallback(base_payload: dict[str, Any]) -> None:
         raise last_error
 
 
+def _insert_history_rows_with_role_fallback(
+    base_payloads: list[dict[str, Any]],
+    *,
+    supabase_client: Any = None,
+) -> None:
+    if not base_payloads:
+        return
+    db = supabase_client or supabase
+    last_error: Exception | None = None
+    for role in _history_audit_roles():
+        payloads = [{**payload, "role": role} for payload in base_payloads]
+        try:
+            db.table("history").insert(payloads).execute()
+            return
+        except Exception as error:
+            last_error = error
+            if "history_role_check" not in str(error).lower():
+                raise
+
+    if last_error:
+        raise last_error
+
+
 def log_outbound_policy_event(
     *,
     client_id: str,
@@ -387,19 +703,22 @@ def log_outbound_policy_event(
             "send_error": send_error,
             "policy": policy_result,
         }
-        _insert_history_with_role_fallback(
-            {
-                "client_id": client_id,
-                "session_id": proof_id or None,
-                "content": content,
-                "channel": channel,
-                "source_type": "compliance_outbound_policy",
-                "provider": "internal",
-                "source_id": policy_result.get("source_id"),
-                "status": send_status,
-                "metadata": metadata,
-                "created_at": datetime.now(timezone.utc).isoformat(),
-            }
-        )
+        row = {
+            "client_id": client_id,
+            "session_id": proof_id or None,
+            "content": content,
+            "channel": channel,
+            "source_type": "compliance_outbound_policy",
+            "provider": "internal",
+            "source_id": policy_result.get("source_id"),
+            "status": send_status,
+            "metadata": metadata,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        batch = _ACTIVE_BATCH.get()
+        if batch is not None:
+            batch.buffer_audit(row)
+        else:
+            _insert_history_with_role_fallback(row)
     except Exception as error:
         logger.warning("⚠️ Could not persist outbound policy audit event: %s", error)
@@ -9,6 +9,8 @@ if os.getenv("RENDER") is None:
 from supabase import create_client
 from supabase.lib.client_options import SyncClientOptions
 
+from api.utils.tracing import httpx_request_hook, httpx_response_hook
+
 # Variables de entorno
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
@@ -32,6 +34,8 @@ _supabase_httpx_client = httpx.Client(
     http2=False,
     timeout=httpx.Timeout(12.0, connect=4.0, read=10.0, write=10.0),
     limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=15.0),
+    # ⏱️ Un span "supabase.query" por request (tabla/RPC, status, latencia)
+    event_hooks={"request": [httpx_request_hook], "response": [httpx_response_hook]},
 )
 
 # Crear cliente Supabase con opciones de timeout y transporte estable
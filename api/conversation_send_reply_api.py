@@ -12,11 +12,13 @@ from pydantic import BaseModel
 
 from api.authz import authorize_client_request
 from api.modules.assistant_rag.supabase_client import supabase
+from api.modules.assistant_rag.session_events import record_history_event
 from api.modules.email_integration.gmail_oauth import send_reply as gmail_send_reply
 from api.modules.whatsapp.whatsapp_sender import (
     send_whatsapp_message_for_client,
     send_whatsapp_template_for_client,
 )
+from api.utils.contact_identity import phone_match_candidates
 from api.utils.feature_access import require_client_feature
 
 
@@ -103,18 +105,7 @@ def _normalize_iso_datetime(value: str | None) -> datetime | None:
 
 
 def _phone_candidates(value: str | None) -> list[str]:
-    digits = re.sub(r"\D", "", str(value or ""))
-    if not digits:
-        return []
-
-    candidates = {digits}
-    if digits.startswith("521") and len(digits) > 3:
-        candidates.add(f"52{digits[3:]}")
-    if digits.startswith("52") and len(digits) > 2:
-        candidates.add(f"521{digits[2:]}")
-
-    ordered = sorted(candidates, key=lambda x: (len(x), x))
-    return ordered
+    return phone_match_candidates(value, with_plus=False)
 
 
 def _build_whatsapp_session_candidates(session_id: str | None, phone: str | None) -> list[str]:
@@ -409,6 +400,17 @@ def _best_effort_insert_human_history(
             "created_at": datetime.now(timezone.utc).isoformat(),
         }
         supabase.table("history").insert(payload).execute()
+        # El log de la sesión también debe ver la respuesta humana (ruteo / redirects).
+        record_history_event(
+            client_id,
+            session_id,
+            role="assistant",
+            content=message,
+            channel=payload["channel"],
+            source_type="human_agent",
+            metadata=payload["metadata"],
+            supabase_client=supabase,
+        )
     except Exception as e:
         logger.warning("Could not insert human agent history | handoff_id=%s err=%s", handoff_id, e)
 
@@ -1,6 +1,8 @@
 import logging
 from datetime import datetime
 from api.modules.assistant_rag.supabase_client import supabase
+from api.modules.assistant_rag.session_events import record_history_event
+from api.utils.client_counters import record_history_counters
 
 logger = logging.getLogger(__name__)
 
@@ -47,6 +49,18 @@ async def log_history(
         }
 
         supabase.table("history").insert(history_payload).execute()
+        record_history_counters(client_id, role=role, channel=channel, supabase_client=supabase)
+        if session_id:
+            record_history_event(
+                client_id,
+                session_id,
+                role=role,
+                content=content,
+                channel=channel,
+                source_type=source_type,
+                metadata=metadata,
+                supabase_client=supabase,
+            )
 
         # ---------------------------------------------------------
         # 2️⃣ Incrementar usage diario (si existe función RPC)
@@ -7,13 +7,26 @@ from api.utils.effective_plan import (
     normalize_plan_id,
     resolve_effective_plan_id,
 )
+from api.utils.client_counters import get_client_counters
+from api.utils.dashboard_snapshot import load_dashboard_snapshot, store_dashboard_snapshot
+from concurrent.futures import ThreadPoolExecutor
+import json
 import logging
-from datetime import datetime
+import os
+from datetime import datetime, timezone
 import time
 import httpx
 
 router = APIRouter()
 
+# Pool acotado para las lecturas independientes del dashboard. Se comparte entre
+# requests para que N dashboards concurrentes no abran N*10 conexiones a PostgREST.
+DASHBOARD_QUERY_CONCURRENCY = max(1, int(os.getenv("EVOLVIAN_DASHBOARD_QUERY_CONCURRENCY") or "8"))
+_DASHBOARD_EXECUTOR = ThreadPoolExecutor(
+    max_workers=DASHBOARD_QUERY_CONCURRENCY,
+    thread_name_prefix="dashboard-query",
+)
+
 PLAN_ORDER = {
     "free": 1,
     "starter": 2,
@@ -174,6 +187,175 @@ def _recommended_external_channel_plan(current_plan_id: str, plans: list[dict])
     return {"id": best["id"], "name": best["name"]}
 
 
+def _settings_query(client_id: str):
+    return _with_retries(
+        lambda: (
+            supabase.table("client_settings")
+            .select(
+                "assistant_name, language, temperature, plan_id, show_powered_by, "
+                "subscription_start, subscription_end, cancellation_requested_at, scheduled_plan_id, "
+                "plans!client_settings_plan_id_fkey("
+                "id, name, max_messages, max_documents, is_unlimited, "
+                "show_powered_by, supports_chat, supports_email, supports_whatsapp, price_usd, "
+                "plan_features(feature, is_active)"
+                ")"
+            )
+            .eq("client_id", client_id)
+            .single()
+            .execute()
+        ),
+        op_name="dashboard.settings",
+    )
+
+
+def _usage_read_query(client_id: str) -> dict:
+    try:
+        usage_row = _with_retries(
+            lambda: (
+                supabase.table("client_usage")
+                .select("messages_used, documents_uploaded, last_used_at")
+                .eq("client_id", client_id)
+                .limit(1)
+                .execute()
+            ),
+            op_name="dashboard.usage_read",
+        )
+        return (usage_row.data or [{}])[0] if isinstance(usage_row.data, list) else (usage_row.data or {})
+    except Exception as usage_read_exc:
+        if _is_no_rows_error(usage_read_exc):
+            logging.info("ℹ️ client_usage sin registro para client_id=%s (se inicializa en memoria)", client_id)
+            return {}
+        raise
+
+
+def _count_query(table: str, client_id: str, *, op_name: str, select: str = "id", **filters):
+    def _query():
+        query = supabase.table(table).select(select, count="exact").eq("client_id", client_id)
+        for field, value in filters.items():
+            query = query.eq(field, value)
+        return query.limit(1).execute()
+
+    res = _with_retries(_query, op_name=op_name)
+    return getattr(res, "count", 0) or 0
+
+
+def _dashboard_read_tasks(client_id: str) -> dict:
+    """Lecturas independientes del dashboard; ninguna depende del resultado de otra."""
+    return {
+        "settings_query": lambda: _settings_query(client_id),
+        "override_plan_lookup": lambda: get_client_override_plan_id(client_id, supabase_client=supabase),
+        "client_counters_query": lambda: _with_retries(
+            lambda: get_client_counters(client_id, supabase_client=supabase),
+            op_name="dashboard.client_counters",
+        ),
+        "usage_read_query": lambda: _usage_read_query(client_id),
+        "channels_query": lambda: _with_retries(
+            lambda: supabase.table("channels").select("type").eq("client_id", client_id).execute(),
+            op_name="dashboard.channels",
+        ),
+        "plans_for_onboarding_query": lambda: _with_retries(
+            lambda: (
+                supabase.table("plans")
+                .select("id, name, supports_email, supports_whatsapp")
+                .execute()
+            ),
+            op_name="dashboard.plans_for_onboarding",
+        ),
+        "calendar_connected_query": lambda: _count_query(
+            "calendar_integrations",
+            client_id,
+            op_name="dashboard.calendar_connected",
+            select="client_id",
+            is_active=True,
+        ),
+        "templates_active_count_query": lambda: _count_query(
+            "message_templates",
+            client_id,
+            op_name="dashboard.templates_active_count",
+            is_active=True,
+        ),
+        "appointments_count_query": lambda: _count_query(
+            "appointments",
+            client_id,
+            op_name="dashboard.appointments_count",
+        ),
+        "history_preview_query": lambda: _with_retries(
+            lambda: (
+                supabase.table("history")
+                .select("content, created_at, channel, role")
+                .eq("client_id", client_id)
+                .eq("role", "user")
+                .not_.is_("content", None)
+                .neq("content", "")
+                .order("created_at", desc=True)
+                .limit(3)
+                .execute()
+            ),
+            op_name="dashboard.history_preview",
+        ),
+    }
+
+
+def _run_parallel(metrics: dict, tasks: dict) -> dict:
+    """
+    Ejecuta las lecturas en el pool acotado y devuelve {key: (result, exc)}.
+    Cada caller decide qué errores son bloqueantes, igual que en la versión secuencial.
+    """
+    futures = {
+        key: _DASHBOARD_EXECUTOR.submit(_run_timed, metrics, key, fn)
+        for key, fn in tasks.items()
+    }
+    outcomes = {}
+    for key, future in futures.items():
+        try:
+            outcomes[key] = (future.result(), None)
+        except Exception as exc:
+            outcomes[key] = (None, exc)
+    return outcomes
+
+
+def _required(outcomes: dict, key: str):
+    result, exc = outcomes[key]
+    if exc is not None:
+        raise exc
+    return result
+
+
+def _optional(outcomes: dict, key: str, default, label: str):
+    result, exc = outcomes[key]
+    if exc is not None:
+        logging.warning("⚠️ No se pudo calcular %s (non-blocking): %s", label, exc)
+        return default
+    return result
+
+
+def _server_timing_header(perf_ms: dict) -> str:
+    return ", ".join(
+        f"{key};dur={value}"
+        for key, value in perf_ms.items()
+        if isinstance(value, (int, float))
+    )
+
+
+def _emit_perf_metric(client_id: str, perf_ms: dict, *, snapshot: str, failed: bool = False) -> None:
+    metric = {
+        "metric": "dashboard_summary.perf_ms",
+        "client_id": client_id,
+        "snapshot": snapshot,
+        "failed": failed,
+        "perf_ms": perf_ms,
+    }
+    log = logging.error if failed else logging.info
+    log("⏱️ dashboard_summary timings | %s", json.dumps(metric, sort_keys=True))
+
+
+def _perf_headers(perf_ms: dict, *, snapshot: str) -> dict:
+    return {
+        "Server-Timing": _server_timing_header(perf_ms),
+        "X-Dashboard-Snapshot": snapshot,
+    }
+
+
 @router.get("/dashboard_summary")
 def dashboard_summary(request: Request, client_id: str = Query(...)):
     request_started = time.perf_counter()
@@ -182,30 +364,25 @@ def dashboard_summary(request: Request, client_id: str = Query(...)):
         _run_timed(perf_ms, "authorize_client_request", lambda: authorize_client_request(request, client_id))
         logging.info(f"📊 Obteniendo dashboard_summary para client_id={client_id}")
 
-        # 1️⃣ Configuración del asistente y plan
-        settings_res = _run_timed(
-            perf_ms,
-            "settings_query",
-            lambda: _with_retries(
-                lambda: (
-                    supabase.table("client_settings")
-                    .select(
-                        "assistant_name, language, temperature, plan_id, show_powered_by, "
-                        "subscription_start, subscription_end, cancellation_requested_at, scheduled_plan_id, "
-                        "plans!client_settings_plan_id_fkey("
-                        "id, name, max_messages, max_documents, is_unlimited, "
-                        "show_powered_by, supports_chat, supports_email, supports_whatsapp, price_usd, "
-                        "plan_features(feature, is_active)"
-                        ")"
-                    )
-                    .eq("client_id", client_id)
-                    .single()
-                    .execute()
-                ),
-                op_name="dashboard.settings",
-            ),
-        )
+        # 0️⃣ Snapshot materializado: una sola lectura si sigue vigente
+        refresh_docs = request.query_params.get("refresh_documents") == "1"
+        force_refresh = refresh_docs or request.query_params.get("refresh") == "1"
+        if not force_refresh:
+            snapshot = _run_timed(perf_ms, "snapshot_read", lambda: load_dashboard_snapshot(client_id))
+            if snapshot:
+                perf_ms["total"] = round((time.perf_counter() - request_started) * 1000, 1)
+                _emit_perf_metric(client_id, perf_ms, snapshot="hit")
+                return JSONResponse(
+                    content=snapshot["payload"],
+                    headers=_perf_headers(perf_ms, snapshot="hit"),
+                )
 
+        # 1️⃣ Lecturas independientes en paralelo (pool acotado)
+        computed_at = datetime.now(timezone.utc)
+        outcomes = _run_parallel(perf_ms, _dashboard_read_tasks(client_id))
+
+        # Configuración del asistente y plan
+        settings_res = _required(outcomes, "settings_query")
         if not settings_res.data:
             raise HTTPException(status_code=404, detail="client_id no encontrado")
 
@@ -213,13 +390,13 @@ def dashboard_summary(request: Request, client_id: str = Query(...)):
         plan = config.get("plans", {}) or {}
 
         base_plan_id = normalize_plan_id(plan.get("id") or config.get("plan_id"))
-        effective_plan_id = resolve_effective_plan_id(
+        override_plan_id = _required(outcomes, "override_plan_lookup")
+        strategic_override_active = bool(override_plan_id)
+        effective_plan_id = override_plan_id or base_plan_id or resolve_effective_plan_id(
             client_id,
             base_plan_id=base_plan_id,
             supabase_client=supabase,
         )
-        override_plan_id = get_client_override_plan_id(client_id, supabase_client=supabase)
-        strategic_override_active = bool(override_plan_id)
 
         if normalize_plan_id(plan.get("id")) != effective_plan_id:
             override_plan_res = _run_timed(
@@ -297,47 +474,13 @@ def dashboard_summary(request: Request, client_id: str = Query(...)):
         }
 
 
-        # 4️⃣ Contar mensajes de usuario (solo role=user)
-        msg_count_res = _run_timed(
-            perf_ms,
-            "history_count_query",
-            lambda: _with_retries(
-                lambda: (
-                    supabase.table("history")
-                    .select("id", count="exact")
-                    .eq("client_id", client_id)
-                    .eq("role", "user")
-                    .execute()
-                ),
-                op_name="dashboard.message_count",
-            ),
-        )
-        total_user_messages = getattr(msg_count_res, "count", 0) or 0
+        # 4️⃣ Mensajes de usuario (solo role=user) desde contadores mantenidos
+        counters = _required(outcomes, "client_counters_query")
+        total_user_messages = counters["user_messages"]
         logging.info(f"💬 Mensajes de usuario encontrados: {total_user_messages}")
 
         # 5️⃣ Leer uso actual (para fallback/caché)
-        try:
-            usage_row = _run_timed(
-                perf_ms,
-                "usage_read_query",
-                lambda: _with_retries(
-                    lambda: (
-                        supabase.table("client_usage")
-                        .select("messages_used, documents_uploaded, last_used_at")
-                        .eq("client_id", client_id)
-                        .limit(1)
-                        .execute()
-                    ),
-                    op_name="dashboard.usage_read",
-                ),
-            )
-            usage_data = (usage_row.data or [{}])[0] if isinstance(usage_row.data, list) else (usage_row.data or {})
-        except Exception as usage_read_exc:
-            if _is_no_rows_error(usage_read_exc):
-                logging.info("ℹ️ client_usage sin registro para client_id=%s (se inicializa en memoria)", client_id)
-                usage_data = {}
-            else:
-                raise
+        usage_data = _required(outcomes, "usage_read_query")
 
         usage = {
             "messages_used": total_user_messages,
@@ -346,31 +489,10 @@ def dashboard_summary(request: Request, client_id: str = Query(...)):
         }
 
         # 5.1️⃣ Reconcile documents count with document_metadata as source of truth.
-        try:
-            metadata_docs_res = _run_timed(
-                perf_ms,
-                "documents_count_metadata",
-                lambda: _with_retries(
-                    lambda: (
-                        supabase.table("document_metadata")
-                        .select("id", count="exact")
-                        .eq("client_id", client_id)
-                        .eq("is_active", True)
-                        .execute()
-                    ),
-                    op_name="dashboard.documents_metadata_count",
-                ),
-            )
-            metadata_docs_count = getattr(metadata_docs_res, "count", 0) or 0
-            usage["documents_uploaded"] = max(
-                int(usage["documents_uploaded"] or 0),
-                int(metadata_docs_count or 0),
-            )
-        except Exception as metadata_exc:
-            logging.warning(
-                "⚠️ No se pudo reconciliar documents_uploaded con metadata (non-blocking): %s",
-                metadata_exc,
-            )
+        usage["documents_uploaded"] = max(
+            int(usage["documents_uploaded"] or 0),
+            int(counters["active_documents"] or 0),
+        )
 
         # Escritura de usage en modo best-effort para no tirar el endpoint
         try:
@@ -392,7 +514,6 @@ def dashboard_summary(request: Request, client_id: str = Query(...)):
             logging.warning("⚠️ No se pudo sincronizar usage (non-blocking): %s", usage_exc)
 
         # 6️⃣ Contar documentos en bucket solo bajo demanda o sin caché
-        refresh_docs = request.query_params.get("refresh_documents") == "1"
         if refresh_docs or usage["documents_uploaded"] == 0:
             bucket_count = _run_timed(
                 perf_ms,
@@ -422,152 +543,38 @@ def dashboard_summary(request: Request, client_id: str = Query(...)):
                 logging.warning("⚠️ No se pudo guardar documents_uploaded (non-blocking): %s", docs_exc)
 
         # 7️⃣ Canales activos
-        channels_res = _run_timed(
-            perf_ms,
-            "channels_query",
-            lambda: _with_retries(
-                lambda: supabase.table("channels").select("type").eq("client_id", client_id).execute(),
-                op_name="dashboard.channels",
-            ),
-        )
+        channels_res = _required(outcomes, "channels_query")
         active_channels = [c["type"] for c in channels_res.data or []]
         all_channels = ["chat", "whatsapp", "email", "messenger", "instagram"]
         channels = {c: c in active_channels for c in all_channels}
 
         external_channel_upgrade_plan = None
         if not (plan_info.get("supports_whatsapp") or plan_info.get("supports_email")):
-            try:
-                plans_res = _run_timed(
-                    perf_ms,
-                    "plans_for_onboarding_query",
-                    lambda: _with_retries(
-                        lambda: (
-                            supabase.table("plans")
-                            .select("id, name, supports_email, supports_whatsapp")
-                            .execute()
-                        ),
-                        op_name="dashboard.plans_for_onboarding",
-                    ),
-                )
+            plans_res = _optional(
+                outcomes,
+                "plans_for_onboarding_query",
+                None,
+                "external_channel_upgrade_plan",
+            )
+            if plans_res is not None:
                 external_channel_upgrade_plan = _recommended_external_channel_plan(
                     plan_info.get("id"),
                     plans_res.data or [],
                 )
-            except Exception as plans_exc:
-                logging.warning(
-                    "⚠️ No se pudo calcular external_channel_upgrade_plan (non-blocking): %s",
-                    plans_exc,
-                )
 
         # 7.1️⃣ Señales de onboarding (uso real del widget)
-        widget_messages_res = _run_timed(
-            perf_ms,
-            "widget_messages_count_query",
-            lambda: _with_retries(
-                lambda: (
-                    supabase.table("history")
-                    .select("id", count="exact")
-                    .eq("client_id", client_id)
-                    .eq("role", "user")
-                    .eq("channel", "widget")
-                    .limit(1)
-                    .execute()
-                ),
-                op_name="dashboard.widget_messages_count",
-            ),
+        widget_messages_count = counters["widget_user_messages"]
+        calendar_connected = _optional(outcomes, "calendar_connected_query", 0, "calendar_connected") > 0
+        templates_active_count = _optional(
+            outcomes,
+            "templates_active_count_query",
+            0,
+            "templates_active_count",
         )
-        widget_messages_count = getattr(widget_messages_res, "count", 0) or 0
-
-        calendar_connected = False
-        try:
-            calendar_res = _run_timed(
-                perf_ms,
-                "calendar_connected_query",
-                lambda: _with_retries(
-                    lambda: (
-                        supabase.table("calendar_integrations")
-                        .select("client_id", count="exact")
-                        .eq("client_id", client_id)
-                        .eq("is_active", True)
-                        .limit(1)
-                        .execute()
-                    ),
-                    op_name="dashboard.calendar_connected",
-                ),
-            )
-            calendar_connected = (getattr(calendar_res, "count", 0) or 0) > 0
-        except Exception as calendar_exc:
-            logging.warning(
-                "⚠️ No se pudo calcular calendar_connected (non-blocking): %s",
-                calendar_exc,
-            )
-
-        templates_active_count = 0
-        try:
-            templates_res = _run_timed(
-                perf_ms,
-                "templates_active_count_query",
-                lambda: _with_retries(
-                    lambda: (
-                        supabase.table("message_templates")
-                        .select("id", count="exact")
-                        .eq("client_id", client_id)
-                        .eq("is_active", True)
-                        .limit(1)
-                        .execute()
-                    ),
-                    op_name="dashboard.templates_active_count",
-                ),
-            )
-            templates_active_count = getattr(templates_res, "count", 0) or 0
-        except Exception as templates_exc:
-            logging.warning(
-                "⚠️ No se pudo calcular templates_active_count (non-blocking): %s",
-                templates_exc,
-            )
-
-        appointments_count = 0
-        try:
-            appointments_res = _run_timed(
-                perf_ms,
-                "appointments_count_query",
-                lambda: _with_retries(
-                    lambda: (
-                        supabase.table("appointments")
-                        .select("id", count="exact")
-                        .eq("client_id", client_id)
-                        .limit(1)
-                        .execute()
-                    ),
-                    op_name="dashboard.appointments_count",
-                ),
-            )
-            appointments_count = getattr(appointments_res, "count", 0) or 0
-        except Exception as appointments_exc:
-            logging.warning(
-                "⚠️ No se pudo calcular appointments_count (non-blocking): %s",
-                appointments_exc,
-            )
+        appointments_count = _optional(outcomes, "appointments_count_query", 0, "appointments_count")
 
         # 8️⃣ Historial de usuario (últimos 3)
-        history_res = _run_timed(
-            perf_ms,
-            "history_preview_query",
-            lambda: _with_retries(
-                lambda: (
-                    supabase.table("history")
-                    .select("content, created_at, channel, role")
-                    .eq("client_id", client_id)
-                    .eq("role", "user")
-                    .not_.is_("content", None)
-                    .neq("content", "")
-                    .order("created_at", desc=True)
-                    .limit(3)
-                    .execute()
-                ),
-                op_name="dashboard.history_preview",
-            ),
-        )
+        history_res = _required(outcomes, "history_preview_query")
 
         history_preview = []
         for h in history_res.data or []:
@@ -596,34 +603,46 @@ def dashboard_summary(request: Request, client_id: str = Query(...)):
                     upgrade_suggestion = {"action": "contact_support", "email": "sales@evolvianai.com"}
 
         # ✅ Respuesta final (todo igual, solo agrega el nuevo campo)
+        payload = {
+            "plan": plan_info,
+            "usage": usage,
+            "channels": channels,
+            "onboarding_signals": {
+                "widget_messages_count": widget_messages_count,
+                "calendar_connected": calendar_connected,
+                "templates_active_count": templates_active_count,
+                "appointments_count": appointments_count,
+                "external_channel_upgrade_plan": external_channel_upgrade_plan,
+            },
+            "assistant_config": {
+                "assistant_name": config.get("assistant_name", "Evolvian"),
+                "language": config.get("language", "es"),
+                "temperature": config.get("temperature", 0.7),
+                "show_powered_by": config.get("show_powered_by", True),
+            },
+            "history_preview": history_preview,
+            "upgrade_suggestion": upgrade_suggestion,
+            "subscription_start": format_date(plan_info.get("subscription_start") or sub_data.get("subscription_start")),
+            "subscription_end": format_date(plan_info.get("subscription_end") or sub_data.get("subscription_end")),
+            "cancellation_status": cancellation_status,  # 🧩 nuevo campo aquí
+        }
+
         total_ms = round((time.perf_counter() - request_started) * 1000, 1)
         perf_ms["total"] = total_ms
-        logging.info("⏱️ dashboard_summary timings | client_id=%s | %s", client_id, perf_ms)
+        _emit_perf_metric(client_id, perf_ms, snapshot="miss")
+
+        # El snapshot se guarda fuera del camino crítico de la respuesta.
+        _DASHBOARD_EXECUTOR.submit(
+            store_dashboard_snapshot,
+            client_id,
+            payload,
+            perf_ms=dict(perf_ms),
+            computed_at=computed_at,
+        )
 
         return JSONResponse(
-            content={
-                "plan": plan_info,
-                "usage": usage,
-                "channels": channels,
-                "onboarding_signals": {
-                    "widget_messages_count": widget_messages_count,
-                    "calendar_connected": calendar_connected,
-                    "templates_active_count": templates_active_count,
-                    "appointments_count": appointments_count,
-                    "external_channel_upgrade_plan": external_channel_upgrade_plan,
-                },
-                "assistant_config": {
-                    "assistant_name": config.get("assistant_name", "Evolvian"),
-                    "language": config.get("language", "es"),
-                    "temperature": config.get("temperature", 0.7),
-                    "show_powered_by": config.get("show_powered_by", True),
-                },
-                "history_preview": history_preview,
-                "upgrade_suggestion": upgrade_suggestion,
-                "subscription_start": format_date(plan_info.get("subscription_start") or sub_data.get("subscription_start")),
-                "subscription_end": format_date(plan_info.get("subscription_end") or sub_data.get("subscription_end")),
-                "cancellation_status": cancellation_status,  # 🧩 nuevo campo aquí
-            }
+            content=payload,
+            headers=_perf_headers(perf_ms, snapshot="miss"),
         )
 
     except HTTPException:
@@ -631,6 +650,6 @@ def dashboard_summary(request: Request, client_id: str = Query(...)):
     except Exception as e:
         total_ms = round((time.perf_counter() - request_started) * 1000, 1)
         perf_ms["total"] = total_ms
-        logging.error("⏱️ dashboard_summary failed timings | client_id=%s | %s", client_id, perf_ms)
+        _emit_perf_metric(client_id, perf_ms, snapshot="miss", failed=True)
         logging.exception("❌ Error en /dashboard_summary")
         raise HTTPException(status_code=500, detail="Error al obtener el resumen del cliente.")
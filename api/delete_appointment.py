@@ -4,6 +4,7 @@ import requests
 import logging
 from api.modules.assistant_rag.supabase_client import supabase
 from api.authz import authorize_client_request
+from api.utils.dashboard_snapshot import invalidate_dashboard_snapshot
 
 router = APIRouter(tags=["Calendar"])
 logger = logging.getLogger("delete_appointment")
@@ -74,6 +75,7 @@ def delete_appointment(
         # 4️⃣ Delete from Supabase
         supabase.table("appointments").delete().eq("id", appointment_id).execute()
         logger.info("🧹 Appointment deleted from Supabase")
+        invalidate_dashboard_snapshot(client_id, reason="appointment_deleted")
 
         return JSONResponse(
             status_code=200,
@@ -1,28 +1,21 @@
 # api/delete_chunks_api.py
 
 from fastapi import APIRouter, Query, HTTPException, Request
-from pathlib import Path
-import shutil
 import logging
 
 from api.config.config import supabase
 from api.delete_file import delete_file_from_storage  # helper interno
 from api.authz import authorize_client_request
 from api.utils.paths import get_base_data_path
+from api.modules.vector_layout import clear_tenant_vectors
 from api.internal.reindex_single_client import reindex_client
+from api.utils.client_counters import increment_client_counters
+from api.utils.dashboard_snapshot import invalidate_dashboard_snapshot
+from api.utils.active_documents import invalidate_active_document_set
 
 router = APIRouter()
 
 
-def _candidate_chroma_paths(client_id: str) -> list[Path]:
-    """Compatibilidad: limpia la ruta actual y rutas legacy si existen."""
-    base_path = Path(get_base_data_path())
-    return [
-        base_path / f"chroma_{client_id}",    # ruta vigente
-        Path(f"./chroma_{client_id}"),        # ruta legacy
-        Path("chroma_db") / client_id,        # ruta legacy antigua
-    ]
-
 @router.delete("/delete_chunks")
 def delete_chunks(
     request: Request,
@@ -58,6 +51,8 @@ def delete_chunks(
             detail="Document metadata not found or already inactive"
         )
 
+    increment_client_counters(client_id, active_documents=-len(res.data), supabase_client=supabase)
+    invalidate_active_document_set(client_id, reason="document_deleted")
     logging.info(
         f"🧹 Document disabled | client_id={client_id} | path={storage_path}"
     )
@@ -65,21 +60,11 @@ def delete_chunks(
     # --------------------------------------------------
     # 2️⃣ Invalidate vectorstore (CACHE)
     # --------------------------------------------------
-    removed_any = False
-    for chroma_path in _candidate_chroma_paths(client_id):
-        try:
-            if chroma_path.exists():
-                shutil.rmtree(chroma_path)
-                removed_any = True
-                logging.info(f"🗑️ Vectorstore cache removed: {chroma_path}")
-        except Exception:
-            # Cache invalidation should never block deletion
-            logging.exception(
-                "⚠️ Failed to remove vectorstore cache path %s for client %s",
-                chroma_path,
-                client_id,
-            )
-    if not removed_any:
+    # Cache invalidation should never block deletion (errores ya se loguean).
+    cleared = clear_tenant_vectors(client_id, base_path=get_base_data_path())
+    for chroma_path in cleared:
+        logging.info(f"🗑️ Vectorstore cache removed: {chroma_path}")
+    if not cleared:
         logging.info(f"ℹ️ No vectorstore cache found for client {client_id}")
 
     # --------------------------------------------------
@@ -117,6 +102,8 @@ def delete_chunks(
             f"⚠️ Storage deletion failed (ignored) | path={storage_path}"
         )
 
+    invalidate_dashboard_snapshot(client_id, reason="document_deleted")
+
     return {
         "success": True,
         "message": "Document deleted correctly",
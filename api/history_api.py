@@ -9,6 +9,7 @@ from fastapi import APIRouter, Query, Request, HTTPException
 from fastapi.responses import JSONResponse
 
 from api.authz import authorize_client_request
+from api.modules.assistant_rag.keyword_matcher import SUBSTRING, KeywordMatcher
 from api.modules.assistant_rag.llm import openai_chat
 from api.modules.assistant_rag.supabase_client import supabase
 from api.utils.feature_access import require_client_feature
@@ -190,6 +191,10 @@ TOPIC_KEYWORDS = {
     },
 }
 
+TOPIC_MATCHER = KeywordMatcher(
+    {topic_key: (config["keywords"], SUBSTRING) for topic_key, config in TOPIC_KEYWORDS.items()}
+)
+
 STOPWORDS = {
     "about",
     "also",
@@ -416,13 +421,10 @@ def _detect_topics(user_messages: list[str], lang: str) -> list[dict[str, Any]]:
         if not normalized:
             continue
 
-        matched_topics = set()
-        for topic_key, topic_config in TOPIC_KEYWORDS.items():
-            if any(keyword in normalized for keyword in topic_config["keywords"]):
-                matched_topics.add(topic_key)
-
-        for topic_key in matched_topics:
-            topic_counts[topic_key] += 1
+        hits = TOPIC_MATCHER.scan(normalized)
+        for topic_key in TOPIC_KEYWORDS:
+            if topic_key in hits:
+                topic_counts[topic_key] += 1
 
         for token in re.findall(r"[A-Za-zÀ-ÿ0-9]{4,}", normalized):
             if token in STOPWORDS or token.isdigit():
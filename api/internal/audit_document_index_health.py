@@ -5,13 +5,18 @@ from pathlib import Path
 
 from api.config.config import supabase
 from api.utils.paths import get_base_data_path
+from api.modules.chroma_indexer import EMBEDDING_MODEL
+from api.modules.index_manifest import compare_with_metadata, load_manifest
+from api.modules.vector_layout import resolve_vector_location
 
 
 logging.basicConfig(level=logging.INFO)
 
 
 def _chroma_path(client_id: str) -> Path:
-    return Path(get_base_data_path()) / f"chroma_{client_id}"
+    """Directorio por tenant a inspeccionar (en shards: el sidecar del tenant)."""
+    location = resolve_vector_location(client_id, base_path=get_base_data_path())
+    return Path(location.sidecar_dir if location.sharded else location.persist_dir)
 
 
 def _path_has_files(path: Path) -> bool:
@@ -25,7 +30,7 @@ def _path_has_files(path: Path) -> bool:
 def audit_document_index_health() -> dict:
     rows = (
         supabase.table("document_metadata")
-        .select("client_id, storage_path, indexed_at")
+        .select("id, client_id, storage_path, indexed_at")
         .eq("is_active", True)
         .execute()
     ).data or []
@@ -42,9 +47,11 @@ def audit_document_index_health() -> dict:
                 "client_id": client_id,
                 "active_docs": 0,
                 "missing_indexed_at": [],
+                "_active_rows": [],
             },
         )
         client_summary["active_docs"] += 1
+        client_summary["_active_rows"].append(row)
         if not str(row.get("indexed_at") or "").strip():
             client_summary["missing_indexed_at"].append(
                 str(row.get("storage_path") or "").strip() or "<missing_storage_path>"
@@ -53,13 +60,30 @@ def audit_document_index_health() -> dict:
     at_risk_clients = []
     for client_summary in clients.values():
         chroma_path = _chroma_path(client_summary["client_id"])
+        active_rows = client_summary.pop("_active_rows")
         client_summary["chroma_path"] = str(chroma_path)
-        client_summary["chroma_exists"] = chroma_path.exists()
-        client_summary["chroma_has_files"] = _path_has_files(chroma_path)
         client_summary["risk_reasons"] = []
 
-        if client_summary["active_docs"] > 0 and not client_summary["chroma_has_files"]:
-            client_summary["risk_reasons"].append("missing_or_empty_chroma_index")
+        # Manifest escrito por el indexer: comparación en memoria, sin listar
+        # directorios. Tenants indexados antes del manifest caen al chequeo
+        # de directorio hasta su próximo reindex.
+        manifest = load_manifest(str(chroma_path))
+        client_summary["index_manifest"] = manifest is not None
+        if manifest is not None:
+            diff = compare_with_metadata(manifest, active_rows, embedding_model=EMBEDDING_MODEL)
+            client_summary.update(diff)
+            client_summary["chroma_has_files"] = True
+            if diff["missing_documents"]:
+                client_summary["risk_reasons"].append("documents_missing_from_index")
+            if diff["stale_document_versions"]:
+                client_summary["risk_reasons"].append("stale_document_versions")
+            if diff["embedding_model_mismatch"]:
+                client_summary["risk_reasons"].append("embedding_model_mismatch")
+        else:
+            client_summary["chroma_exists"] = chroma_path.exists()
+            client_summary["chroma_has_files"] = _path_has_files(chroma_path)
+            if client_summary["active_docs"] > 0 and not client_summary["chroma_has_files"]:
+                client_summary["risk_reasons"].append("missing_or_empty_chroma_index")
         if client_summary["missing_indexed_at"]:
             client_summary["risk_reasons"].append("missing_indexed_at")
 
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel, Field
+
+from api.config.config import supabase
+from api.internal_auth import require_internal_request
+from api.utils.client_counters import (
+    list_clients_due_for_reconciliation,
+    reconcile_client_counters,
+)
+
+
+router = APIRouter(
+    prefix="/api/internal/counters",
+    tags=["Counters Internal"],
+)
+
+
+class CounterReconcilePayload(BaseModel):
+    client_ids: list[str] | None = None
+    max_clients: int = Field(default=50, ge=1, le=500)
+
+
+def _select_client_ids(payload: CounterReconcilePayload) -> list[str]:
+    if payload.client_ids:
+        return [
+            client_id.strip()
+            for client_id in payload.client_ids
+            if str(client_id or "").strip()
+        ][: payload.max_clients]
+
+    return list_clients_due_for_reconciliation(payload.max_clients, supabase_client=supabase)
+
+
+@router.post("/reconcile")
+def reconcile_counters(payload: CounterReconcilePayload, request: Request):
+    """
+    Corrige el drift de client_counters con conteos exactos.
+    Sin client_ids procesa primero los tenants con la reconciliación más antigua.
+    """
+    require_internal_request(request)
+
+    try:
+        client_ids = _select_client_ids(payload)
+    except Exception as error:  # noqa: BLE001
+        raise HTTPException(status_code=500, detail=f"counter_reconcile_select_failed: {error}") from error
+
+    results = []
+    failed = []
+    for client_id in client_ids:
+        try:
+            results.append(reconcile_client_counters(client_id, supabase_client=supabase))
+        except Exception as error:  # noqa: BLE001
+            failed.append({"client_id": client_id, "error": str(error)})
+
+    return {
+        "processed": len(results),
+        "drifted_clients": [result for result in results if result.get("drift")],
+        "failed": failed,
+        "snapshot_at": datetime.now(timezone.utc).isoformat(),
+    }
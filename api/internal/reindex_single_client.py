@@ -1,30 +1,19 @@
 # api/internal/reindex_single_client.py
 
 import logging
-import shutil
 import gc
 from datetime import datetime, timezone
-from pathlib import Path
 
 from api.config.config import supabase
 from api.modules.document_processor import process_file
 from api.modules.storage_utils import get_signed_url
+from api.modules.vector_layout import clear_tenant_vectors, resolve_vector_location
 from api.utils.paths import get_base_data_path
 
 
 logging.basicConfig(level=logging.INFO)
 
 
-def _candidate_chroma_paths(client_id: str) -> list[Path]:
-    """Compatibilidad con rutas vigentes y legacy del vectorstore."""
-    base_path = Path(get_base_data_path())
-    return [
-        base_path / f"chroma_{client_id}",
-        Path(f"./chroma_{client_id}"),
-        Path("chroma_db") / client_id,
-    ]
-
-
 def _mark_document_indexed(client_id: str, storage_path: str) -> None:
     supabase.table("document_metadata").update(
         {"indexed_at": datetime.now(timezone.utc).isoformat()}
@@ -36,7 +25,7 @@ def _mark_document_indexed(client_id: str, storage_path: str) -> None:
 def reindex_client(client_id: str) -> dict:
     logging.info("🔄 Reindexing client %s", client_id)
 
-    primary_chroma_path = str(Path(get_base_data_path()) / f"chroma_{client_id}")
+    primary_chroma_path = resolve_vector_location(client_id, base_path=get_base_data_path()).persist_dir
     summary = {
         "client_id": client_id,
         "status": "success",
@@ -48,22 +37,14 @@ def reindex_client(client_id: str) -> dict:
         "chroma_path": primary_chroma_path,
     }
 
-    for chroma_path in _candidate_chroma_paths(client_id):
-        try:
-            if chroma_path.exists():
-                logging.info("🧹 Removing existing vectorstore: %s", chroma_path)
-                shutil.rmtree(chroma_path)
-                summary["cleared_paths"].append(str(chroma_path))
-        except Exception:
-            logging.exception(
-                "⚠️ Failed removing vectorstore path %s for client %s",
-                chroma_path,
-                client_id,
-            )
+    cleared = clear_tenant_vectors(client_id, base_path=get_base_data_path())
+    for chroma_path in cleared:
+        logging.info("🧹 Removed existing vectorstore: %s", chroma_path)
+    summary["cleared_paths"].extend(cleared)
 
     response = (
         supabase.table("document_metadata")
-        .select("storage_path")
+        .select("id, storage_path")
         .eq("client_id", client_id)
         .eq("is_active", True)
         .execute()
@@ -92,6 +73,7 @@ def reindex_client(client_id: str) -> dict:
                 client_id=client_id,
                 storage_path=storage_path,
                 return_chunks=False,
+                document_id=doc.get("id"),
             )
             _mark_document_indexed(client_id, storage_path)
             summary["docs_reindexed"] += 1
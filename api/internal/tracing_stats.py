@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, Request
+
+from api.internal_auth import require_internal_request
+from api.utils import tracing
+
+
+router = APIRouter(
+    prefix="/api/internal/tracing",
+    tags=["Tracing Internal"],
+)
+
+
+@router.get("/stages")
+def tracing_stage_percentiles(request: Request, reset: bool = False):
+    """
+    p50/p95/p99 por etapa (supabase.query, retrieval.vector, llm.generate, …)
+    sobre la ventana en memoria de este proceso.
+    """
+    require_internal_request(request)
+
+    stages = tracing.stage_percentiles()
+    if reset:
+        tracing.reset_stage_stats()
+
+    return {
+        "stages": stages,
+        "window": tracing.TRACE_STATS_WINDOW,
+        "sample_rate": tracing.TRACE_SAMPLE_RATE,
+        "snapshot_at": datetime.now(timezone.utc).isoformat(),
+    }
@@ -26,6 +26,8 @@ import time
 from urllib.parse import urlencode, urlparse, parse_qsl, urlunparse
 from api.authz import get_current_user_id
 from api.oauth_state import decode_signed_state, encode_signed_state
+from api.utils.contact_identity import digits_to_e164
+from api.utils.dashboard_snapshot import invalidate_dashboard_snapshot
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -287,15 +289,7 @@ def _sanitize_phone_for_matching(value: str | None) -> str:
 
 
 def _normalize_to_e164(value: str | None) -> str | None:
-    raw = str(value or "").strip()
-    if not raw:
-        return None
-    digits = _sanitize_phone_for_matching(raw)
-    if not digits:
-        return None
-    if len(digits) < 10 or len(digits) > 15:
-        return None
-    return f"+{digits}"
+    return digits_to_e164(value)
 
 
 def _pick_candidate_phone(candidates: list[dict], preferred_phone: str | None = None) -> dict | None:
@@ -581,6 +575,7 @@ def _link_whatsapp_channel_for_client(
 
     if not getattr(channel_write_res, "data", None):
         raise HTTPException(status_code=500, detail="Error guardando canal")
+    invalidate_dashboard_snapshot(client_id, reason="whatsapp_linked")
 
     sync_summary = None
     if provider == "meta":
@@ -1188,6 +1183,7 @@ def unlink_whatsapp(payload: WhatsAppUnlinkPayload, request: Request):
         if not update_res.data:
             logger.warning(f"⚠️ No WhatsApp channel found to unlink for client {client_id}")
 
+        invalidate_dashboard_snapshot(client_id, reason="whatsapp_unlinked")
         logger.info(f"✅ WhatsApp unlinked for client {client_id}")
 
         return {
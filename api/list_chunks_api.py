@@ -5,6 +5,8 @@ from pathlib import Path
 import re
 from api.authz import authorize_client_request
 from api.utils.paths import get_base_data_path
+from api.modules.index_manifest import load_manifest
+from api.modules.vector_layout import resolve_vector_location
 
 router = APIRouter()
 SAFE_CLIENT_ID = re.compile(r"^[a-zA-Z0-9_-]{3,80}$")
@@ -17,10 +19,30 @@ def list_chunks(request: Request, client_id: str = Query(...)):
         if not SAFE_CLIENT_ID.fullmatch(client_id):
             raise HTTPException(status_code=400, detail="Invalid client_id format")
 
-        base_path = (CHROMA_ROOT / f"chroma_{client_id}").resolve()
+        location = resolve_vector_location(client_id, base_path=str(CHROMA_ROOT))
+        # En shards se listan los archivos propios del tenant (sidecar).
+        base_path = Path(location.sidecar_dir if location.sharded else location.persist_dir).resolve()
         if CHROMA_ROOT not in base_path.parents:
             raise HTTPException(status_code=400, detail="Invalid client_id path")
 
+        # Manifest del indexer: listado por documento / chunk sin recorrer disco.
+        manifest = load_manifest(str(base_path))
+        if manifest is not None:
+            documents = [
+                {"storage_path": storage_path, **entry}
+                for storage_path, entry in sorted((manifest.get("documents") or {}).items())
+            ]
+            return {
+                "exists": True,
+                "client_id": client_id,
+                "layout": location.layout,
+                "embedding_model": manifest.get("embedding_model"),
+                "updated_at": manifest.get("updated_at"),
+                "documents": documents,
+                "total_documents": len(documents),
+                "total_chunks": manifest.get("total_chunks", 0),
+            }
+
         if not base_path.exists() or not base_path.is_dir():
             return {"exists": False, "message": f"No hay vectores guardados para {client_id}"}
 
@@ -31,6 +53,7 @@ def list_chunks(request: Request, client_id: str = Query(...)):
         return {
             "exists": True,
             "client_id": client_id,
+            "layout": location.layout,
             "files": file_list,
             "total_files": len(file_list)
         }
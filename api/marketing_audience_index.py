@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from api.config.config import supabase
+
+
+logger = logging.getLogger(__name__)
+
+AUDIENCE_INDEX_TABLE = "marketing_audience_index"
+AUDIENCE_INDEX_STATE_TABLE = "marketing_audience_index_state"
+AUDIENCE_INDEX_WRITE_CHUNK_SIZE = 500
+AUDIENCE_INDEX_READ_CHUNK_SIZE = 1000
+AUDIENCE_INDEX_LOOKUP_CHUNK_SIZE = 120
+
+# Las fuentes se releen desde synced_at - skew: re-aplicar una fila es idempotente,
+# perder una por desfase de reloj no lo es.
+AUDIENCE_INDEX_WATERMARK_SKEW_SECONDS = 120
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def audience_index_enabled() -> bool:
+    raw = str(os.getenv("EVOLVIAN_MARKETING_AUDIENCE_INDEX", "true") or "").strip().lower()
+    return raw not in {"0", "false", "no", "off"}
+
+
+def audience_index_rebuild_seconds() -> int:
+    # Reconstrucción completa periódica: cubre borrados y cambios que no mueven timestamps.
+    return max(60, _env_int("EVOLVIAN_MARKETING_AUDIENCE_REBUILD_SECONDS", 6 * 3600))
+
+
+def is_missing_audience_index_table(exc: Exception) -> bool:
+    msg = str(exc).lower()
+    return AUDIENCE_INDEX_TABLE in msg and (
+        "does not exist" in msg or "relation" in msg or "schema cache" in msg or "not found" in msg
+    )
+
+
+def _parse_iso(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except Exception:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def _chunked(values: list, size: int):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# -------------------------------------------------
+# Estado por tenant
+# -------------------------------------------------
+def load_index_state(client_id: str, *, supabase_client: Any = None) -> Optional[dict[str, Any]]:
+    """Devuelve la fila de estado o None si el índice del tenant nunca se construyó."""
+    db = supabase_client or supabase
+    rows = (
+        db.table(AUDIENCE_INDEX_STATE_TABLE)
+        .select("client_id,synced_at,rebuilt_at,row_count")
+        .eq("client_id", client_id)
+        .limit(1)
+        .execute()
+    ).data or []
+    return rows[0] if rows else None
+
+
+def needs_full_rebuild(state: Optional[dict[str, Any]], *, now: datetime) -> bool:
+    if not state:
+        return True
+    rebuilt_at = _parse_iso(state.get("rebuilt_at"))
+    synced_at = _parse_iso(state.get("synced_at"))
+    if not rebuilt_at or not synced_at:
+        return True
+    return (now - rebuilt_at).total_seconds() >= audience_index_rebuild_seconds()
+
+
+def delta_since(state: dict[str, Any]) -> str:
+    synced_at = _parse_iso(state.get("synced_at")) or datetime.now(timezone.utc)
+    return (synced_at - timedelta(seconds=AUDIENCE_INDEX_WATERMARK_SKEW_SECONDS)).isoformat()
+
+
+def save_index_state(
+    client_id: str,
+    *,
+    synced_at: datetime,
+    rebuilt_at: Optional[Any],
+    row_count: Optional[int] = None,
+    supabase_client: Any = None,
+) -> None:
+    db = supabase_client or supabase
+    payload: dict[str, Any] = {
+        "client_id": client_id,
+        "synced_at": synced_at.isoformat(),
+        "rebuilt_at": rebuilt_at.isoformat() if isinstance(rebuilt_at, datetime) else rebuilt_at,
+    }
+    if row_count is not None:
+        payload["row_count"] = int(row_count)
+    db.table(AUDIENCE_INDEX_STATE_TABLE).upsert(payload, on_conflict="client_id").execute()
+
+
+# -------------------------------------------------
+# Escritura
+# -------------------------------------------------
+def upsert_index_rows(rows: list[dict[str, Any]], *, supabase_client: Any = None) -> None:
+    db = supabase_client or supabase
+    for chunk in _chunked(rows, AUDIENCE_INDEX_WRITE_CHUNK_SIZE):
+        db.table(AUDIENCE_INDEX_TABLE).upsert(chunk, on_conflict="client_id,recipient_key").execute()
+
+
+def delete_index_rows(client_id: str, recipient_keys: list[str], *, supabase_client: Any = None) -> None:
+    db = supabase_client or supabase
+    for chunk in _chunked(sorted(recipient_keys), AUDIENCE_INDEX_LOOKUP_CHUNK_SIZE):
+        db.table(AUDIENCE_INDEX_TABLE).delete().eq("client_id", client_id).in_("recipient_key", chunk).execute()
+
+
+# -------------------------------------------------
+# Lectura
+# -------------------------------------------------
+def load_index_keys(client_id: str, *, supabase_client: Any = None) -> set[str]:
+    db = supabase_client or supabase
+    keys: set[str] = set()
+    offset = 0
+    while True:
+        rows = (
+            db.table(AUDIENCE_INDEX_TABLE)
+            .select("recipient_key")
+            .eq("client_id", client_id)
+            .order("recipient_key")
+            .range(offset, offset + AUDIENCE_INDEX_READ_CHUNK_SIZE - 1)
+            .execute()
+        ).data or []
+        keys.update(str((row or {}).get("recipient_key") or "") for row in rows if (row or {}).get("recipient_key"))
+        if len(rows) < AUDIENCE_INDEX_READ_CHUNK_SIZE:
+            return keys
+        offset += AUDIENCE_INDEX_READ_CHUNK_SIZE
+
+
+def fetch_index_rows(
+    client_id: str,
+    *,
+    field: str,
+    values: list[str],
+    listed_only: bool = False,
+    supabase_client: Any = None,
+) -> list[dict[str, Any]]:
+    """Filas del índice cuyo `field` (recipient_key, email o phone) está en values."""
+    db = supabase_client or supabase
+    rows: list[dict[str, Any]] = []
+    for chunk in _chunked(sorted({str(value) for value in values if value}), AUDIENCE_INDEX_LOOKUP_CHUNK_SIZE):
+        query = db.table(AUDIENCE_INDEX_TABLE).select("recipient_key,contact").eq("client_id", client_id)
+        if listed_only:
+            query = query.eq("listed", True)
+        rows.extend(query.in_(field, chunk).execute().data or [])
+    return rows
+
+
+def _listed_query(db: Any, client_id: str, *, q: Optional[str], segment: Optional[str], fields: str, count: Optional[str] = None):
+    query = db.table(AUDIENCE_INDEX_TABLE)
+    query = query.select(fields, count=count) if count else query.select(fields)
+    query = query.eq("client_id", client_id).eq("listed", True)
+    if segment:
+        query = query.eq("segment", segment)
+    q_value = (q or "").strip().lower()
+    if q_value:
+        query = query.ilike("search_text", f"%{escape_like(q_value)}%")
+    return query
+
+
+def query_index_page(
+    client_id: str,
+    *,
+    q: Optional[str],
+    segment: Optional[str],
+    limit: int,
+    offset: int = 0,
+    supabase_client: Any = None,
+) -> tuple[list[dict[str, Any]], Optional[int]]:
+    """Página ordenada como la audiencia legacy (segmento, actividad desc, nombre, recipient_key)."""
+    db = supabase_client or supabase
+    res = (
+        _listed_query(db, client_id, q=q, segment=segment, fields="recipient_key,contact", count="exact")
+        .order("segment_rank")
+        .order("activity_epoch", desc=True)
+        .order("sort_name")
+        # Desempate único: sin él, OFFSET puede repetir u omitir filas empatadas entre páginas.
+        .order("recipient_key")
+        .range(offset, offset + max(1, limit) - 1)
+        .execute()
+    )
+    return list(res.data or []), getattr(res, "count", None)
+
+
+def iter_index_rows(
+    client_id: str,
+    *,
+    q: Optional[str] = None,
+    segment: Optional[str] = None,
+    supabase_client: Any = None,
+):
+    offset = 0
+    while True:
+        rows, _ = query_index_page(
+            client_id,
+            q=q,
+            segment=segment,
+            limit=AUDIENCE_INDEX_READ_CHUNK_SIZE,
+            offset=offset,
+            supabase_client=supabase_client,
+        )
+        yield from rows
+        if len(rows) < AUDIENCE_INDEX_READ_CHUNK_SIZE:
+            return
+        offset += AUDIENCE_INDEX_READ_CHUNK_SIZE
+
+
+def count_index_segments(
+    client_id: str,
+    segments: list[str],
+    *,
+    q: Optional[str] = None,
+    supabase_client: Any = None,
+) -> dict[str, int]:
+    db = supabase_client or supabase
+    counts: dict[str, int] = {}
+    for segment in segments:
+        res = (
+            _listed_query(db, client_id, q=q, segment=segment, fields="recipient_key", count="exact")
+            .limit(1)
+            .execute()
+        )
+        counts[segment] = int(getattr(res, "count", None) or 0)
+    return counts
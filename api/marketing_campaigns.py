@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import json
+import logging
 import os
 import re
 from datetime import datetime, timezone
@@ -18,16 +19,41 @@ from api.compliance.email_marketing_standard import (
     POSTAL_ADDRESS_TOKEN,
     UNSUBSCRIBE_TOKEN,
 )
+from api.compliance.outbound_policy import outbound_policy_batch
 from api.config.config import supabase
+from api.marketing_audience_index import (
+    AUDIENCE_INDEX_READ_CHUNK_SIZE,
+    audience_index_enabled,
+    count_index_segments,
+    delete_index_rows,
+    delta_since,
+    fetch_index_rows,
+    is_missing_audience_index_table,
+    iter_index_rows,
+    load_index_keys,
+    load_index_state,
+    needs_full_rebuild,
+    query_index_page,
+    save_index_state,
+    upsert_index_rows,
+)
 from api.modules.whatsapp.whatsapp_sender import send_whatsapp_template_for_client
 from api.modules.whatsapp.template_sync import sync_canonical_templates_for_client
 from api.modules.assistant_rag.llm import openai_chat
 from api.privacy_dsr import split_details_and_metadata
+from api.utils.contact_identity import (
+    PhoneAliasIndex,
+    marketing_phone_aliases,
+    normalize_phone_column,
+    normalize_phone_e164,
+    resolve_client_country_code,
+)
 from api.utils.feature_access import get_client_plan_id
 from api.compliance.marketing_consent_adapter import backfill_default_marketing_consents_for_contacts
 from api.security.unsubscribe_client_id_crypto import encrypt_unsubscribe_client_id
 
 router = APIRouter(prefix="/marketing", tags=["Marketing Campaigns"])
+logger = logging.getLogger(__name__)
 
 PLAN_ORDER = {"free": 0, "starter": 1, "premium": 2, "white_label": 3, "enterprise": 3}
 SEGMENT_ORDER = {"clients": 0, "leads": 1}
@@ -45,7 +71,21 @@ WHATSAPP_OPT_OUT_KEYWORDS = (
     "no mas",
     "no más",
 )
-_MEXICO_COUNTRY_ALIASES = {"mx", "mex", "mexico", "méxico"}
+
+CAMPAIGN_STATS_TABLE = "marketing_campaign_stats"
+CAMPAIGN_SUMMARY_STATUS_FIELDS = {
+    "sent": "sent_count",
+    "failed": "failed_count",
+    "blocked_policy": "blocked_policy_count",
+    "skipped": "skipped_count",
+}
+CAMPAIGN_SUMMARY_RESPONSE_FIELDS = (
+    "responses_count",
+    "interested_count",
+    "not_interested_count",
+    "opt_out_count",
+)
+CAMPAIGN_DETAIL_DEFAULT_LIMIT = 2000
 
 
 class CampaignCreatePayload(BaseModel):
@@ -114,95 +154,23 @@ def _normalize_email(value: Any) -> Optional[str]:
 
 @lru_cache(maxsize=512)
 def _get_client_country_code(client_id: str) -> str:
-    normalized_client_id = str(client_id or "").strip()
-    if not normalized_client_id:
-        return ""
-    try:
-        rows = (
-            supabase
-            .table("client_profile")
-            .select("country")
-            .eq("client_id", normalized_client_id)
-            .limit(1)
-            .execute()
-        ).data or []
-        if rows:
-            raw_country = str((rows[0] or {}).get("country") or "").strip().lower()
-            if raw_country in _MEXICO_COUNTRY_ALIASES:
-                return "MX"
-            if len(raw_country) == 2 and raw_country.isalpha():
-                return raw_country.upper()
-    except Exception:
-        pass
-    return ""
-
+    return resolve_client_country_code(client_id, supabase_client=supabase)
 
-def _normalize_phone(value: Any, *, client_id: Optional[str] = None) -> Optional[str]:
-    if value is None:
-        return None
-    raw = str(value).strip()
-    if not raw:
-        return None
-    cleaned = re.sub(r"[^\d+]", "", raw)
-    if not cleaned:
-        return None
-    if cleaned.startswith("00"):
-        cleaned = "+" + cleaned[2:]
 
-    digits = re.sub(r"\D", "", cleaned)
-    if not digits:
-        return None
+def _client_country(client_id: Optional[str]) -> str:
+    return _get_client_country_code(str(client_id or "").strip()) if client_id else ""
 
-    client_country = _get_client_country_code(str(client_id or "").strip()) if client_id else ""
-    if len(digits) == 10 and client_country == "MX":
-        digits = f"52{digits}"
 
-    # Normalize legacy MX format 521XXXXXXXXXX -> 52XXXXXXXXXX
-    if digits.startswith("521") and len(digits) == 13:
-        digits = "52" + digits[3:]
-    if len(digits) == 10:
-        return None
+def _normalize_phone(value: Any, *, client_id: Optional[str] = None) -> Optional[str]:
+    return normalize_phone_e164(value, country_code=_client_country(client_id), strict_mx=True)
 
-    # Basic E.164 sanity checks.
-    if len(digits) < 10 or len(digits) > 15:
-        return None
-    # Mexico numbers in E.164 should be country code 52 + 10 digits.
-    if digits.startswith("52") and len(digits) != 12:
-        return None
 
-    return f"+{digits}"
+def _normalize_phone_column(values: list[Any], *, client_id: Optional[str] = None) -> list[Optional[str]]:
+    return normalize_phone_column(values, country_code=_client_country(client_id), strict_mx=True)
 
 
 def _marketing_phone_lookup_aliases(value: Any, *, client_id: Optional[str] = None) -> list[str]:
-    normalized = _normalize_phone(value, client_id=client_id)
-    raw = str(normalized or value or "").strip()
-    digits = re.sub(r"\D", "", raw)
-    aliases: set[str] = set()
-
-    if normalized:
-        aliases.add(normalized)
-
-    if not digits:
-        return []
-
-    aliases.add(digits)
-    aliases.add(f"+{digits}")
-
-    if digits.startswith("52") and len(digits) == 12:
-        local_digits = digits[2:]
-        aliases.add(local_digits)
-        aliases.add(f"+{local_digits}")
-        aliases.add(f"521{local_digits}")
-        aliases.add(f"+521{local_digits}")
-    elif digits.startswith("521") and len(digits) == 13:
-        mx_digits = f"52{digits[3:]}"
-        aliases.add(mx_digits)
-        aliases.add(f"+{mx_digits}")
-        local_digits = mx_digits[2:]
-        aliases.add(local_digits)
-        aliases.add(f"+{local_digits}")
-
-    return sorted(alias for alias in aliases if alias)
+    return marketing_phone_aliases(value, country_code=_client_country(client_id), strict_mx=True)
 
 
 def _normalize_name(value: Any) -> Optional[str]:
@@ -1010,41 +978,75 @@ def _resolve_marketing_policy_reason(
     return None
 
 
-def _load_marketing_contact_state_maps(client_id: str) -> tuple[dict[str, dict[str, Any]], dict[str, dict[str, Any]]]:
+def _load_marketing_contact_state_maps(
+    client_id: str,
+    *,
+    emails: Optional[list[str]] = None,
+    phones: Optional[list[str]] = None,
+) -> tuple[dict[str, dict[str, Any]], PhoneAliasIndex]:
+    fields = (
+        "normalized_email,normalized_phone,interest_status,"
+        "email_unsubscribed,whatsapp_unsubscribed,last_seen_at"
+    )
     try:
-        rows = (
-            supabase.table("marketing_contacts")
-            .select(
-                "normalized_email,normalized_phone,interest_status,"
-                "email_unsubscribed,whatsapp_unsubscribed,last_seen_at"
-            )
-            .eq("client_id", client_id)
-            .limit(5000)
-            .execute()
-        ).data or []
+        if emails is None and phones is None:
+            rows = (
+                supabase.table("marketing_contacts")
+                .select(fields)
+                .eq("client_id", client_id)
+                .limit(5000)
+                .execute()
+            ).data or []
+        else:
+            # Solo los contactos pedidos (sync incremental del índice de audiencia).
+            rows = []
+            for column, values in (("normalized_email", emails or []), ("normalized_phone", phones or [])):
+                ordered = sorted({str(value) for value in values if value})
+                for start in range(0, len(ordered), 120):
+                    rows.extend(
+                        (
+                            supabase.table("marketing_contacts")
+                            .select(fields)
+                            .eq("client_id", client_id)
+                            .in_(column, ordered[start : start + 120])
+                            .execute()
+                        ).data
+                        or []
+                    )
     except Exception as exc:
         if _is_missing_marketing_contacts_table(exc):
-            return {}, {}
+            return {}, PhoneAliasIndex()
         raise
 
     by_email: dict[str, dict[str, Any]] = {}
-    by_phone: dict[str, dict[str, Any]] = {}
-    for row in rows:
+    by_phone: PhoneAliasIndex = PhoneAliasIndex(country_code=_client_country(client_id), strict_mx=True)
+    normalized_phones = _normalize_phone_column(
+        [(row or {}).get("normalized_phone") for row in rows],
+        client_id=client_id,
+    )
+    for row, normalized_phone in zip(rows, normalized_phones):
         normalized_email = _normalize_email((row or {}).get("normalized_email"))
         if normalized_email:
             by_email[normalized_email] = row or {}
-
-        normalized_phone = _normalize_phone((row or {}).get("normalized_phone"), client_id=client_id)
-        if not normalized_phone:
-            continue
-        for alias in _marketing_phone_lookup_aliases(normalized_phone, client_id=client_id):
-            by_phone[alias] = row or {}
+        if normalized_phone:
+            by_phone.add(normalized_phone, row or {})
 
     return by_email, by_phone
 
 
-def _apply_marketing_contact_state(pool: dict[str, dict[str, Any]], *, client_id: str) -> None:
-    by_email, by_phone = _load_marketing_contact_state_maps(client_id)
+def _apply_marketing_contact_state(pool: dict[str, dict[str, Any]], *, client_id: str, restrict: bool = False) -> None:
+    if restrict:
+        emails = [email for email in (_normalize_email(row.get("email")) for row in pool.values()) if email]
+        phones = [
+            alias
+            for row in pool.values()
+            for alias in _marketing_phone_lookup_aliases(row.get("phone"), client_id=client_id)
+        ]
+        if not emails and not phones:
+            return
+        by_email, by_phone = _load_marketing_contact_state_maps(client_id, emails=emails, phones=phones)
+    else:
+        by_email, by_phone = _load_marketing_contact_state_maps(client_id)
     if not by_email and not by_phone:
         return
 
@@ -1054,10 +1056,7 @@ def _apply_marketing_contact_state(pool: dict[str, dict[str, Any]], *, client_id
         if normalized_email:
             matched_state = by_email.get(normalized_email)
         if not matched_state:
-            for alias in _marketing_phone_lookup_aliases(row.get("phone"), client_id=client_id):
-                matched_state = by_phone.get(alias)
-                if matched_state:
-                    break
+            matched_state = by_phone.lookup(row.get("phone"))
         if not matched_state:
             continue
 
@@ -1067,15 +1066,31 @@ def _apply_marketing_contact_state(pool: dict[str, dict[str, Any]], *, client_id
         row["marketing_state_last_seen_at"] = (matched_state or {}).get("last_seen_at")
 
 
-def _load_campaign_delivery_stats(client_id: str) -> dict[str, dict[str, Any]]:
+def _load_campaign_delivery_stats(client_id: str, recipient_keys: Optional[list[str]] = None) -> dict[str, dict[str, Any]]:
+    fields = "recipient_key,campaign_id,send_status,sent_at,updated_at"
     try:
-        rows = (
-            supabase.table("marketing_campaign_recipients")
-            .select("recipient_key,campaign_id,send_status,sent_at,updated_at")
-            .eq("client_id", client_id)
-            .limit(5000)
-            .execute()
-        ).data or []
+        if recipient_keys is None:
+            rows = (
+                supabase.table("marketing_campaign_recipients")
+                .select(fields)
+                .eq("client_id", client_id)
+                .limit(5000)
+                .execute()
+            ).data or []
+        else:
+            rows = []
+            ordered_keys = sorted({str(key) for key in recipient_keys if key})
+            for start in range(0, len(ordered_keys), 120):
+                rows.extend(
+                    (
+                        supabase.table("marketing_campaign_recipients")
+                        .select(fields)
+                        .eq("client_id", client_id)
+                        .in_("recipient_key", ordered_keys[start : start + 120])
+                        .execute()
+                    ).data
+                    or []
+                )
     except Exception:
         return {}
 
@@ -1210,23 +1225,26 @@ def _merge_contact(pool: dict[str, dict], *, key: str, name: Optional[str], emai
         row["consent_phone_present"] = bool(consent_phone_present)
 
 
-def _load_contacts_audience(client_id: str) -> list[dict[str, Any]]:
+def _collect_contact_pool(client_id: str, *, since: Optional[str] = None) -> dict[str, dict[str, Any]]:
+    """
+    Fusiona las cuatro fuentes de contactos por recipient_key. Con `since` solo
+    lee las filas cambiadas desde entonces (sync incremental del índice).
+    """
     pool: dict[str, dict[str, Any]] = {}
-    consent_renewal_days = _load_marketing_consent_renewal_days(client_id)
-    now_epoch = datetime.now(timezone.utc).timestamp()
     client_contacts_for_backfill: list[dict[str, Any]] = []
 
-    appointment_clients = (
-        supabase.table("appointment_clients")
-        .select("user_name,user_email,user_phone,updated_at,created_at")
-        .eq("client_id", client_id)
-        .order("updated_at", desc=True)
-        .execute()
-    )
+    def _source_rows(table: str, fields: str, order_by: str, changed_column: str) -> list[dict[str, Any]]:
+        query = supabase.table(table).select(fields).eq("client_id", client_id)
+        if since:
+            query = query.gte(changed_column, since)
+        return query.order(order_by, desc=True).execute().data or []
 
-    for raw in appointment_clients.data or []:
+    rows = _source_rows(
+        "appointment_clients", "user_name,user_email,user_phone,updated_at,created_at", "updated_at", "updated_at"
+    )
+    phones = _normalize_phone_column([raw.get("user_phone") for raw in rows], client_id=client_id)
+    for raw, phone in zip(rows, phones):
         email = _normalize_email(raw.get("user_email"))
-        phone = _normalize_phone(raw.get("user_phone"), client_id=client_id)
         name = _normalize_name(raw.get("user_name"))
         key = _recipient_key(email, phone, name)
         if not key:
@@ -1244,16 +1262,12 @@ def _load_contacts_audience(client_id: str) -> list[dict[str, Any]]:
         )
         client_contacts_for_backfill.append({"email": email, "phone": phone})
 
-    appointments = (
-        supabase.table("appointments")
-        .select("user_name,user_email,user_phone,scheduled_time,created_at")
-        .eq("client_id", client_id)
-        .order("scheduled_time", desc=True)
-        .execute()
+    rows = _source_rows(
+        "appointments", "user_name,user_email,user_phone,scheduled_time,created_at", "scheduled_time", "created_at"
     )
-    for raw in appointments.data or []:
+    phones = _normalize_phone_column([raw.get("user_phone") for raw in rows], client_id=client_id)
+    for raw, phone in zip(rows, phones):
         email = _normalize_email(raw.get("user_email"))
-        phone = _normalize_phone(raw.get("user_phone"), client_id=client_id)
         name = _normalize_name(raw.get("user_name"))
         key = _recipient_key(email, phone, name)
         if not key:
@@ -1271,26 +1285,23 @@ def _load_contacts_audience(client_id: str) -> list[dict[str, Any]]:
         )
         client_contacts_for_backfill.append({"email": email, "phone": phone})
 
-    try:
-        backfill_default_marketing_consents_for_contacts(
-            client_id=client_id,
-            contacts=client_contacts_for_backfill,
-            source="marketing_clients_auto",
-        )
-    except Exception:
-        # Non-blocking: audience should still load even if backfill fails.
-        pass
+    if client_contacts_for_backfill:
+        try:
+            backfill_default_marketing_consents_for_contacts(
+                client_id=client_id,
+                contacts=client_contacts_for_backfill,
+                source="marketing_clients_auto",
+            )
+        except Exception:
+            # Non-blocking: audience should still load even if backfill fails.
+            pass
 
-    widget_consents = (
-        supabase.table("widget_consents")
-        .select("email,phone,accepted_terms,accepted_email_marketing,consent_at")
-        .eq("client_id", client_id)
-        .order("consent_at", desc=True)
-        .execute()
+    rows = _source_rows(
+        "widget_consents", "email,phone,accepted_terms,accepted_email_marketing,consent_at", "consent_at", "consent_at"
     )
-    for raw in widget_consents.data or []:
+    phones = _normalize_phone_column([raw.get("phone") for raw in rows], client_id=client_id)
+    for raw, phone in zip(rows, phones):
         email = _normalize_email(raw.get("email"))
-        phone = _normalize_phone(raw.get("phone"), client_id=client_id)
         key = _recipient_key(email, phone, None)
         if not key:
             continue
@@ -1311,16 +1322,15 @@ def _load_contacts_audience(client_id: str) -> list[dict[str, Any]]:
             consent_phone_present=bool(phone),
         )
 
-    handoff_consents = (
-        supabase.table("conversation_handoff_requests")
-        .select("contact_name,contact_email,contact_phone,accepted_terms,accepted_email_marketing,created_at")
-        .eq("client_id", client_id)
-        .order("created_at", desc=True)
-        .execute()
+    rows = _source_rows(
+        "conversation_handoff_requests",
+        "contact_name,contact_email,contact_phone,accepted_terms,accepted_email_marketing,created_at",
+        "created_at",
+        "updated_at",
     )
-    for raw in handoff_consents.data or []:
+    phones = _normalize_phone_column([raw.get("contact_phone") for raw in rows], client_id=client_id)
+    for raw, phone in zip(rows, phones):
         email = _normalize_email(raw.get("contact_email"))
-        phone = _normalize_phone(raw.get("contact_phone"), client_id=client_id)
         name = _normalize_name(raw.get("contact_name"))
         key = _recipient_key(email, phone, name)
         if not key:
@@ -1342,86 +1352,130 @@ def _load_contacts_audience(client_id: str) -> list[dict[str, Any]]:
             consent_phone_present=bool(phone),
         )
 
+    return pool
+
+
+def _apply_audience_signals(pool: dict[str, dict[str, Any]], *, client_id: str, restrict: bool = False) -> None:
+    """Opt-outs, estado de marketing_contacts y envíos previos sobre las filas del pool."""
     candidate_emails = [_normalize_email((row or {}).get("email")) for row in pool.values()]
     opted_out_emails = _load_opted_out_emails_for_client(client_id, [e for e in candidate_emails if e])
-    _apply_marketing_contact_state(pool, client_id=client_id)
-    delivery_stats_by_recipient = _load_campaign_delivery_stats(client_id)
+    _apply_marketing_contact_state(pool, client_id=client_id, restrict=restrict)
+    delivery_stats_by_recipient = _load_campaign_delivery_stats(
+        client_id,
+        recipient_keys=list(pool) if restrict else None,
+    )
 
-    items: list[dict[str, Any]] = []
-    for _, row in pool.items():
+    for row in pool.values():
         delivery_stats = delivery_stats_by_recipient.get(str(row.get("recipient_key") or "").strip()) or {}
         row["campaigns_sent_count"] = int(delivery_stats.get("campaigns_sent_count") or 0)
         row["email_campaigns_sent_count"] = int(delivery_stats.get("email_campaigns_sent_count") or 0)
         row["whatsapp_campaigns_sent_count"] = int(delivery_stats.get("whatsapp_campaigns_sent_count") or 0)
         row["last_campaign_sent_at"] = delivery_stats.get("last_campaign_sent_at")
         row["last_campaign_channel"] = delivery_stats.get("last_campaign_channel")
-        if row.get("has_client_source"):
-            row["segment"] = "clients"
-        elif row.get("marketing_opt_in"):
-            row["segment"] = "leads"
-        else:
-            # Keep audience focused on requested labels only.
-            continue
 
         email = _normalize_email(row.get("email"))
-        is_opted_out = bool(email and email in opted_out_emails)
-        row["is_opted_out"] = is_opted_out
-        row["selection_blocked"] = False
-        row["selection_blocked_reason"] = None
+        row["is_opted_out"] = bool(email and email in opted_out_emails)
 
-        # Lead with opt-out should disappear from audience.
-        if row.get("segment") == "leads" and is_opted_out:
-            continue
-        # Client with opt-out should remain visible but blocked/unlinked.
-        if row.get("segment") == "clients" and is_opted_out:
-            row["selection_blocked"] = True
-            row["selection_blocked_reason"] = "opt_out"
-            row["opt_out_label_en"] = "Opt-out"
-            row["opt_out_label_es"] = "Desvinculado"
-
-        row["policy_reason_email"] = _resolve_marketing_policy_reason(
-            channel="email",
-            email=email,
-            phone=_normalize_phone(row.get("phone"), client_id=client_id),
-            is_opted_out=is_opted_out,
-            consent_at=row.get("latest_consent_at"),
-            consent_terms_accepted=bool(row.get("consent_terms_accepted")),
-            consent_email_marketing_accepted=bool(row.get("consent_email_marketing_accepted")),
-            consent_email_present=bool(row.get("consent_email_present")),
-            consent_phone_present=bool(row.get("consent_phone_present")),
-            consent_renewal_days=consent_renewal_days,
-            now_epoch=now_epoch,
-        )
-        row["policy_reason_whatsapp"] = _resolve_marketing_policy_reason(
-            channel="whatsapp",
-            email=email,
-            phone=_normalize_phone(row.get("phone"), client_id=client_id),
-            is_opted_out=is_opted_out,
-            consent_at=row.get("latest_consent_at"),
-            consent_terms_accepted=bool(row.get("consent_terms_accepted")),
-            consent_email_marketing_accepted=bool(row.get("consent_email_marketing_accepted")),
-            consent_email_present=bool(row.get("consent_email_present")),
-            consent_phone_present=bool(row.get("consent_phone_present")),
+
+def _audience_segment(row: dict[str, Any]) -> Optional[str]:
+    if row.get("has_client_source"):
+        return "clients"
+    if row.get("marketing_opt_in"):
+        return "leads"
+    # Keep audience focused on requested labels only.
+    return None
+
+
+def _finalize_audience_row(
+    row: dict[str, Any],
+    *,
+    client_id: str,
+    consent_renewal_days: int,
+    now_epoch: float,
+) -> Optional[dict[str, Any]]:
+    segment = _audience_segment(row)
+    if not segment:
+        return None
+    row["segment"] = segment
+
+    email = _normalize_email(row.get("email"))
+    is_opted_out = bool(row.get("is_opted_out"))
+    row["is_opted_out"] = is_opted_out
+    row["selection_blocked"] = False
+    row["selection_blocked_reason"] = None
+
+    # Lead with opt-out should disappear from audience.
+    if row.get("segment") == "leads" and is_opted_out:
+        return None
+    # Client with opt-out should remain visible but blocked/unlinked.
+    if row.get("segment") == "clients" and is_opted_out:
+        row["selection_blocked"] = True
+        row["selection_blocked_reason"] = "opt_out"
+        row["opt_out_label_en"] = "Opt-out"
+        row["opt_out_label_es"] = "Desvinculado"
+
+    row["policy_reason_email"] = _resolve_marketing_policy_reason(
+        channel="email",
+        email=email,
+        phone=_normalize_phone(row.get("phone"), client_id=client_id),
+        is_opted_out=is_opted_out,
+        consent_at=row.get("latest_consent_at"),
+        consent_terms_accepted=bool(row.get("consent_terms_accepted")),
+        consent_email_marketing_accepted=bool(row.get("consent_email_marketing_accepted")),
+        consent_email_present=bool(row.get("consent_email_present")),
+        consent_phone_present=bool(row.get("consent_phone_present")),
+        consent_renewal_days=consent_renewal_days,
+        now_epoch=now_epoch,
+    )
+    row["policy_reason_whatsapp"] = _resolve_marketing_policy_reason(
+        channel="whatsapp",
+        email=email,
+        phone=_normalize_phone(row.get("phone"), client_id=client_id),
+        is_opted_out=is_opted_out,
+        consent_at=row.get("latest_consent_at"),
+        consent_terms_accepted=bool(row.get("consent_terms_accepted")),
+        consent_email_marketing_accepted=bool(row.get("consent_email_marketing_accepted")),
+        consent_email_present=bool(row.get("consent_email_present")),
+        consent_phone_present=bool(row.get("consent_phone_present")),
+        consent_renewal_days=consent_renewal_days,
+        now_epoch=now_epoch,
+    )
+    row["consent_missing_or_expired"] = bool(
+        row.get("policy_reason_email") == "missing_or_expired_marketing_consent"
+        or row.get("policy_reason_whatsapp") == "missing_or_expired_marketing_consent"
+    )
+
+    label_en, label_es = _segment_label(row["segment"])
+    row["label_en"] = label_en
+    row["label_es"] = label_es
+    row["sources"] = sorted(list(row.get("sources", set())))
+    row["channels"] = sorted(list(row.get("channels", set())))
+    row.pop("latest_consent_at", None)
+    row.pop("consent_terms_accepted", None)
+    row.pop("consent_email_marketing_accepted", None)
+    row.pop("consent_email_present", None)
+    row.pop("consent_phone_present", None)
+    row.setdefault("entity_type", "contact")
+    return row
+
+
+def _load_contacts_audience(client_id: str) -> list[dict[str, Any]]:
+    consent_renewal_days = _load_marketing_consent_renewal_days(client_id)
+    now_epoch = datetime.now(timezone.utc).timestamp()
+
+    pool = _collect_contact_pool(client_id)
+    _apply_audience_signals(pool, client_id=client_id)
+
+    items: list[dict[str, Any]] = []
+    for row in pool.values():
+        finalized = _finalize_audience_row(
+            row,
+            client_id=client_id,
             consent_renewal_days=consent_renewal_days,
             now_epoch=now_epoch,
         )
-        row["consent_missing_or_expired"] = bool(
-            row.get("policy_reason_email") == "missing_or_expired_marketing_consent"
-            or row.get("policy_reason_whatsapp") == "missing_or_expired_marketing_consent"
-        )
-
-        label_en, label_es = _segment_label(row["segment"])
-        row["label_en"] = label_en
-        row["label_es"] = label_es
-        row["sources"] = sorted(list(row.get("sources", set())))
-        row["channels"] = sorted(list(row.get("channels", set())))
-        row.pop("latest_consent_at", None)
-        row.pop("consent_terms_accepted", None)
-        row.pop("consent_email_marketing_accepted", None)
-        row.pop("consent_email_present", None)
-        row.pop("consent_phone_present", None)
-        row.setdefault("entity_type", "contact")
-        items.append(row)
+        if finalized:
+            items.append(finalized)
 
     return items
 
@@ -1455,6 +1509,262 @@ def _load_audience(*, client_id: str, q: Optional[str], segment: Optional[str])
     return items
 
 
+# -------------------------------------------------
+# Índice materializado de audiencia
+# -------------------------------------------------
+def _audience_index_row(client_id: str, row: dict[str, Any]) -> dict[str, Any]:
+    segment = _audience_segment(row)
+    listed = bool(segment) and not (segment == "leads" and bool(row.get("is_opted_out")))
+    contact = dict(row)
+    contact["sources"] = sorted(row.get("sources") or [])
+    contact["channels"] = sorted(row.get("channels") or [])
+    search_parts = (row.get("recipient_name"), row.get("email"), row.get("phone"), row.get("recipient_key"))
+    return {
+        "client_id": client_id,
+        "recipient_key": row["recipient_key"],
+        "email": _normalize_email(row.get("email")),
+        "phone": row.get("phone"),
+        "segment": segment,
+        "listed": listed,
+        "segment_rank": SEGMENT_ORDER.get(segment or "leads", 99),
+        "activity_epoch": _as_epoch(row.get("last_activity_at")),
+        "sort_name": str(row.get("recipient_name") or "").lower(),
+        "search_text": "\n".join(str(part or "").lower() for part in search_parts),
+        "contact": contact,
+        "updated_at": _now_iso(),
+    }
+
+
+def _contact_from_index(stored: dict[str, Any]) -> dict[str, Any]:
+    contact = dict((stored or {}).get("contact") or {})
+    contact["sources"] = set(contact.get("sources") or [])
+    contact["channels"] = set(contact.get("channels") or [])
+    return contact
+
+
+def _merge_pool_rows(row: dict[str, Any], existing: dict[str, Any]) -> None:
+    """Une una fila ya indexada con la misma clave recién leída de las fuentes."""
+    # Identidad: gana lo recién leído; lo indexado solo completa campos vacíos.
+    for field in ("recipient_name", "email", "phone"):
+        if not row.get(field) and existing.get(field):
+            row[field] = existing[field]
+    row["sources"] = set(row.get("sources") or set()) | set(existing.get("sources") or set())
+    row["channels"] = set(row.get("channels") or set()) | set(existing.get("channels") or set())
+    row["marketing_opt_in"] = bool(row.get("marketing_opt_in")) or bool(existing.get("marketing_opt_in"))
+    row["has_client_source"] = bool(row.get("has_client_source")) or bool(existing.get("has_client_source"))
+    if _as_epoch(existing.get("last_activity_at")) > _as_epoch(row.get("last_activity_at")):
+        row["last_activity_at"] = existing.get("last_activity_at")
+    if _as_epoch(existing.get("latest_consent_at")) > _as_epoch(row.get("latest_consent_at")):
+        for field in (
+            "latest_consent_at",
+            "consent_terms_accepted",
+            "consent_email_marketing_accepted",
+            "consent_email_present",
+            "consent_phone_present",
+        ):
+            row[field] = existing.get(field)
+    for field in ("interest_status", "email_unsubscribed", "whatsapp_unsubscribed", "marketing_state_last_seen_at"):
+        if field in existing:
+            row[field] = existing[field]
+
+
+def _paged_signal_rows(build_query, *, table: str) -> list[dict[str, Any]]:
+    """
+    Lee todas las filas de una consulta de señales por páginas. Una tabla
+    inexistente no tiene cambios; cualquier otro error se propaga para que el
+    sync no avance la marca de agua con señales incompletas.
+    """
+    rows: list[dict[str, Any]] = []
+    offset = 0
+    while True:
+        try:
+            page = (
+                build_query()
+                .range(offset, offset + AUDIENCE_INDEX_READ_CHUNK_SIZE - 1)
+                .execute()
+            ).data or []
+        except Exception as exc:
+            msg = str(exc).lower()
+            if table in msg and ("does not exist" in msg or "schema cache" in msg):
+                return rows
+            raise
+        rows.extend(page)
+        if len(page) < AUDIENCE_INDEX_READ_CHUNK_SIZE:
+            return rows
+        offset += AUDIENCE_INDEX_READ_CHUNK_SIZE
+
+
+def _audience_signal_changes(client_id: str, *, since: str) -> tuple[set[str], set[str], set[str]]:
+    """Emails, teléfonos y recipient_keys cuyas señales (opt-out, estado, envíos) cambiaron."""
+    emails: set[str] = set()
+    phones: set[str] = set()
+    recipient_keys: set[str] = set()
+    rows = _paged_signal_rows(
+        lambda: supabase.table("public_privacy_requests")
+        .select("id,email")
+        .eq("request_type", "marketing_opt_out")
+        .gte("created_at", since)
+        .order("id"),
+        table="public_privacy_requests",
+    )
+    emails.update(e for e in (_normalize_email((row or {}).get("email")) for row in rows) if e)
+    rows = _paged_signal_rows(
+        lambda: supabase.table("marketing_contacts")
+        .select("id,normalized_email,normalized_phone")
+        .eq("client_id", client_id)
+        .gte("updated_at", since)
+        .order("id"),
+        table="marketing_contacts",
+    )
+    for row in rows:
+        email = _normalize_email((row or {}).get("normalized_email"))
+        if email:
+            emails.add(email)
+        phones.update(_marketing_phone_lookup_aliases((row or {}).get("normalized_phone"), client_id=client_id))
+    rows = _paged_signal_rows(
+        lambda: supabase.table("marketing_campaign_recipients")
+        .select("id,recipient_key")
+        .eq("client_id", client_id)
+        .gte("updated_at", since)
+        .order("id"),
+        table="marketing_campaign_recipients",
+    )
+    recipient_keys.update(str((row or {}).get("recipient_key")) for row in rows if (row or {}).get("recipient_key"))
+    return emails, phones, recipient_keys
+
+
+def _sync_audience_index(client_id: str) -> bool:
+    """
+    Pone al día el índice del tenant: reconstrucción completa si no existe o
+    venció, si no solo las filas cuyas fuentes o señales cambiaron desde el
+    último sync. Devuelve False si el índice no está disponible.
+    """
+    if not audience_index_enabled():
+        return False
+    started_at = datetime.now(timezone.utc)
+    try:
+        state = load_index_state(client_id)
+        signals = None
+        if not needs_full_rebuild(state, now=started_at):
+            since = delta_since(state)
+            try:
+                signals = _audience_signal_changes(client_id, since=since)
+            except Exception as exc:
+                # Sin señales completas no se puede avanzar la marca de agua: se reconstruye.
+                logger.warning(
+                    "⚠️ Marketing audience signal delta failed, rebuilding | client_id=%s | error=%s", client_id, exc
+                )
+        if signals is None:
+            pool = _collect_contact_pool(client_id)
+            _apply_audience_signals(pool, client_id=client_id)
+            upsert_index_rows([_audience_index_row(client_id, row) for row in pool.values()])
+            removed = load_index_keys(client_id) - set(pool)
+            if removed:
+                delete_index_rows(client_id, list(removed))
+            save_index_state(client_id, synced_at=started_at, rebuilt_at=started_at, row_count=len(pool))
+            return True
+
+        emails, phones, recipient_keys = signals
+        pool = _collect_contact_pool(client_id, since=since)
+        existing_rows = (
+            fetch_index_rows(client_id, field="recipient_key", values=list(set(pool) | recipient_keys))
+            + fetch_index_rows(client_id, field="email", values=list(emails))
+            + fetch_index_rows(client_id, field="phone", values=list(phones))
+        )
+        for stored in existing_rows:
+            existing = _contact_from_index(stored)
+            key = str(existing.get("recipient_key") or (stored or {}).get("recipient_key") or "")
+            if not key:
+                continue
+            if key in pool:
+                _merge_pool_rows(pool[key], existing)
+            else:
+                pool[key] = existing
+
+        if pool:
+            _apply_audience_signals(pool, client_id=client_id, restrict=True)
+            upsert_index_rows([_audience_index_row(client_id, row) for row in pool.values()])
+        save_index_state(client_id, synced_at=started_at, rebuilt_at=state.get("rebuilt_at"))
+        return True
+    except Exception as exc:
+        if not is_missing_audience_index_table(exc):
+            logger.warning("⚠️ Marketing audience index sync failed | client_id=%s | error=%s", client_id, exc)
+        return False
+
+
+def _finalize_index_rows(client_id: str, stored_rows) -> list[dict[str, Any]]:
+    consent_renewal_days = _load_marketing_consent_renewal_days(client_id)
+    now_epoch = datetime.now(timezone.utc).timestamp()
+    items: list[dict[str, Any]] = []
+    for stored in stored_rows:
+        finalized = _finalize_audience_row(
+            _contact_from_index(stored),
+            client_id=client_id,
+            consent_renewal_days=consent_renewal_days,
+            now_epoch=now_epoch,
+        )
+        if finalized:
+            items.append(finalized)
+    return items
+
+
+def _load_audience_page(
+    *,
+    client_id: str,
+    q: Optional[str],
+    segment: Optional[str],
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> tuple[list[dict[str, Any]], dict[str, int], int]:
+    """Página de audiencia (items, counts, total) leída del índice; legacy si no está disponible."""
+    segments = [segment] if segment in ALLOWED_SEGMENTS else sorted(ALLOWED_SEGMENTS)
+    counts = {"clients": 0, "leads": 0}
+    if _sync_audience_index(client_id):
+        try:
+            counts.update(count_index_segments(client_id, segments, q=q))
+            if limit:
+                rows, total = query_index_page(client_id, q=q, segment=segment, limit=limit, offset=offset)
+            else:
+                rows = list(iter_index_rows(client_id, q=q, segment=segment))[offset:]
+                total = None
+            items = _finalize_index_rows(client_id, rows)
+            return items, counts, int(total if total is not None else sum(counts.values()))
+        except Exception as exc:
+            logger.warning("⚠️ Marketing audience index read failed | client_id=%s | error=%s", client_id, exc)
+            counts = {"clients": 0, "leads": 0}
+
+    items = _load_audience(client_id=client_id, q=q, segment=segment)
+    for row in items:
+        key = str(row.get("segment") or "")
+        if key in counts:
+            counts[key] += 1
+    total = len(items)
+    items = items[offset : offset + limit] if limit else items[offset:]
+    return items, counts, total
+
+
+def _load_send_audience(client_id: str, recipient_keys: Optional[list[str]]) -> dict[str, dict[str, Any]]:
+    """Audiencia por recipient_key para un envío: solo las claves elegidas cuando las hay."""
+    if _sync_audience_index(client_id):
+        try:
+            if recipient_keys:
+                rows = fetch_index_rows(
+                    client_id,
+                    field="recipient_key",
+                    values=[str(key or "").strip() for key in recipient_keys],
+                    listed_only=True,
+                )
+            else:
+                rows = list(iter_index_rows(client_id))
+            items = _finalize_index_rows(client_id, rows)
+            return {str(row.get("recipient_key")): row for row in items if row.get("recipient_key")}
+        except Exception as exc:
+            logger.warning("⚠️ Marketing audience index read failed | client_id=%s | error=%s", client_id, exc)
+
+    audience = _load_audience(client_id=client_id, q=None, segment=None)
+    return {str(row.get("recipient_key")): row for row in audience if row.get("recipient_key")}
+
+
 def _load_campaign(client_id: str, campaign_id: str) -> dict[str, Any]:
     res = (
         supabase.table("marketing_campaigns")
@@ -1593,11 +1903,92 @@ def _log_campaign_event(*, client_id: str, campaign_id: str, recipient_key: str,
         return
 
 
+def _policy_batch_recipients(
+    campaign: dict[str, Any],
+    targets: list[dict[str, Any]],
+    *,
+    client_id: str,
+) -> list[tuple[str, Optional[str], Optional[str]]]:
+    """Destinatarios (client_id, email, phone) tal como el envío los pasa a la política."""
+    recipients: list[tuple[str, Optional[str], Optional[str]]] = []
+    for target in targets:
+        email = _normalize_email(target.get("email"))
+        if campaign.get("channel") == "email":
+            if email:
+                recipients.append((client_id, email, None))
+            continue
+        phone = _normalize_phone(str(target.get("phone") or "").strip(), client_id=client_id)
+        if phone:
+            recipients.append((client_id, email, phone))
+    return recipients
+
+
+def _is_missing_campaign_stats_table(exc: Exception) -> bool:
+    msg = str(exc).lower()
+    return CAMPAIGN_STATS_TABLE in msg and (
+        "does not exist" in msg or "relation" in msg or "schema cache" in msg or "not found" in msg
+    )
+
+
+def _empty_campaign_summary() -> dict[str, int]:
+    summary = {field: 0 for field in CAMPAIGN_SUMMARY_STATUS_FIELDS.values()}
+    summary.update({field: 0 for field in CAMPAIGN_SUMMARY_RESPONSE_FIELDS})
+    return summary
+
+
+def _campaign_summary_from_stats(row: dict[str, Any]) -> dict[str, int]:
+    summary = _empty_campaign_summary()
+    status_counts = (row or {}).get("status_counts") or {}
+    if isinstance(status_counts, dict):
+        for status, field in CAMPAIGN_SUMMARY_STATUS_FIELDS.items():
+            summary[field] = int(status_counts.get(status) or 0)
+    for field in CAMPAIGN_SUMMARY_RESPONSE_FIELDS:
+        summary[field] = int((row or {}).get(field) or 0)
+    return summary
+
+
+def _load_campaign_stats_rows(client_id: str, campaign_ids: list[str]) -> Optional[dict[str, dict[str, Any]]]:
+    """
+    Contadores materializados por campaña (ver docs/sql/2026-10-19_marketing_campaign_stats.sql).
+    None si la tabla aún no existe: el llamador recae en el conteo legacy.
+    """
+    try:
+        rows = (
+            supabase.table(CAMPAIGN_STATS_TABLE)
+            .select("campaign_id,status_counts,event_counts," + ",".join(CAMPAIGN_SUMMARY_RESPONSE_FIELDS))
+            .eq("client_id", client_id)
+            .in_("campaign_id", campaign_ids)
+            .execute()
+        ).data or []
+    except Exception as exc:
+        if _is_missing_campaign_stats_table(exc):
+            return None
+        raise
+    return {
+        str((row or {}).get("campaign_id") or "").strip(): row or {}
+        for row in rows
+        if str((row or {}).get("campaign_id") or "").strip()
+    }
+
+
 def _load_campaign_summary_map(client_id: str, campaign_ids: list[str]) -> dict[str, dict[str, int]]:
     normalized_ids = [str(campaign_id or "").strip() for campaign_id in campaign_ids if str(campaign_id or "").strip()]
     if not normalized_ids:
         return {}
 
+    stats_rows = _load_campaign_stats_rows(client_id, normalized_ids)
+    if stats_rows is None:
+        return _count_campaign_summary_map(client_id, normalized_ids)
+    # Sin fila = la campaña todavía no tiene destinatarios ni eventos.
+    return {campaign_id: _campaign_summary_from_stats(stats_rows.get(campaign_id) or {}) for campaign_id in normalized_ids}
+
+
+def _count_campaign_summary_map(client_id: str, campaign_ids: list[str]) -> dict[str, dict[str, int]]:
+    """Conteo legacy sobre recipients/events; solo cuando marketing_campaign_stats no existe."""
+    normalized_ids = [str(campaign_id or "").strip() for campaign_id in campaign_ids if str(campaign_id or "").strip()]
+    if not normalized_ids:
+        return {}
+
     summaries: dict[str, dict[str, Any]] = {
         campaign_id: {
             "sent_count": 0,
@@ -1697,21 +2088,26 @@ def get_marketing_audience(
     client_id: str = Query(...),
     q: Optional[str] = Query(None),
     segment: Optional[Literal["clients", "leads"]] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    offset: int = Query(0, ge=0),
 ):
     try:
         authorize_client_request(request, client_id)
         _ensure_premium_access(client_id)
-        rows = _load_audience(client_id=client_id, q=q, segment=segment)
-
-        counts = {"clients": 0, "leads": 0}
-        for row in rows:
-            key = str(row.get("segment") or "")
-            if key in counts:
-                counts[key] += 1
+        rows, counts, total = _load_audience_page(
+            client_id=client_id,
+            q=q,
+            segment=segment,
+            limit=limit,
+            offset=offset,
+        )
 
         return {
             "items": rows,
             "counts": counts,
+            "total": total,
+            "limit": limit,
+            "offset": offset,
         }
     except HTTPException:
         raise
@@ -1870,40 +2266,62 @@ def list_campaigns(
 
 
 @router.get("/campaigns/{campaign_id}")
-def get_campaign_detail(request: Request, campaign_id: str, client_id: str = Query(...)):
+def get_campaign_detail(
+    request: Request,
+    campaign_id: str,
+    client_id: str = Query(...),
+    limit: Optional[int] = Query(None, ge=1, le=CAMPAIGN_DETAIL_DEFAULT_LIMIT),
+    offset: int = Query(0, ge=0),
+):
     try:
         authorize_client_request(request, client_id)
         _ensure_premium_access(client_id)
 
         campaign = _load_campaign(client_id, campaign_id)
+        page_size = limit or CAMPAIGN_DETAIL_DEFAULT_LIMIT
         recipients_res = (
             supabase.table("marketing_campaign_recipients")
-            .select("*")
+            .select("*", count="exact")
             .eq("client_id", client_id)
             .eq("campaign_id", campaign_id)
             .order("updated_at", desc=True)
-            .limit(2000)
+            .range(offset, offset + page_size - 1)
             .execute()
         )
-        response_events_res = (
-            supabase.table("marketing_campaign_events")
-            .select("recipient_key,event_type,created_at")
-            .eq("client_id", client_id)
-            .eq("campaign_id", campaign_id)
-            .in_("event_type", ["interest", "interest_yes", "interest_no", "opt_out"])
-            .order("created_at", desc=True)
-            .limit(2000)
-            .execute()
+        recipient_rows = recipients_res.data or []
+        total = getattr(recipients_res, "count", None)
+        if total is None:
+            total = offset + len(recipient_rows)
+
+        # Solo las respuestas de los destinatarios de esta página.
+        page_keys = sorted(
+            {
+                str((row or {}).get("recipient_key") or "").strip()
+                for row in recipient_rows
+                if str((row or {}).get("recipient_key") or "").strip()
+            }
         )
         latest_response_by_recipient: dict[str, dict[str, Any]] = {}
-        for event in response_events_res.data or []:
-            recipient_key = str((event or {}).get("recipient_key") or "").strip()
-            if not recipient_key or recipient_key in latest_response_by_recipient:
-                continue
-            latest_response_by_recipient[recipient_key] = event or {}
+        chunk_size = 120
+        for start in range(0, len(page_keys), chunk_size):
+            response_events_res = (
+                supabase.table("marketing_campaign_events")
+                .select("recipient_key,event_type,created_at")
+                .eq("client_id", client_id)
+                .eq("campaign_id", campaign_id)
+                .in_("recipient_key", page_keys[start : start + chunk_size])
+                .in_("event_type", ["interest", "interest_yes", "interest_no", "opt_out"])
+                .order("created_at", desc=True)
+                .execute()
+            )
+            for event in response_events_res.data or []:
+                recipient_key = str((event or {}).get("recipient_key") or "").strip()
+                if not recipient_key or recipient_key in latest_response_by_recipient:
+                    continue
+                latest_response_by_recipient[recipient_key] = event or {}
 
         recipients = []
-        for row in recipients_res.data or []:
+        for row in recipient_rows:
             recipient_key = str((row or {}).get("recipient_key") or "").strip()
             response_event = latest_response_by_recipient.get(recipient_key) or {}
             enriched_row = dict(row or {})
@@ -1911,9 +2329,23 @@ def get_campaign_detail(request: Request, campaign_id: str, client_id: str = Que
             enriched_row["response_at"] = response_event.get("created_at")
             recipients.append(enriched_row)
 
+        stats_rows = _load_campaign_stats_rows(client_id, [campaign_id])
+        if stats_rows is None:
+            summary = _count_campaign_summary_map(client_id, [campaign_id]).get(campaign_id) or _empty_campaign_summary()
+            event_counts: dict[str, int] = {}
+        else:
+            stats_row = stats_rows.get(campaign_id) or {}
+            summary = _campaign_summary_from_stats(stats_row)
+            event_counts = stats_row.get("event_counts") or {}
+
         return {
             "campaign": campaign,
             "recipients": recipients,
+            "summary": summary,
+            "event_counts": event_counts,
+            "total": int(total),
+            "limit": page_size,
+            "offset": offset,
         }
     except HTTPException:
         raise
@@ -2352,8 +2784,7 @@ async def send_campaign(request: Request, campaign_id: str, payload: CampaignSen
         if str(campaign.get("channel") or "").lower() == "whatsapp":
             _ensure_whatsapp_channel_connected(payload.client_id)
 
-        audience = _load_audience(client_id=payload.client_id, q=None, segment=None)
-        audience_by_key = {str(row.get("recipient_key")): row for row in audience if row.get("recipient_key")}
+        audience_by_key = _load_send_audience(payload.client_id, payload.recipient_keys)
 
         targets: list[dict[str, Any]] = []
         if payload.recipient_keys is not None and len(payload.recipient_keys) == 0:
@@ -2409,175 +2840,159 @@ async def send_campaign(request: Request, campaign_id: str, payload: CampaignSen
         company_postal_address = _load_company_postal_address(payload.client_id)
         owner_email = _load_owner_email(auth_user_id)
 
-        for target in targets:
-            recipient_key = str(target.get("recipient_key") or "").strip()
-            if not recipient_key:
-                continue
-
-            base_row = {
-                "client_id": payload.client_id,
-                "campaign_id": campaign_id,
-                "recipient_key": recipient_key,
-                "recipient_name": target.get("recipient_name"),
-                "email": target.get("email"),
-                "phone": target.get("phone"),
-                "segment": target.get("segment"),
-                "send_status": "pending",
-                "updated_at": _now_iso(),
-            }
+        policy_recipients = (
+            [] if payload.dry_run else _policy_batch_recipients(campaign, targets, client_id=payload.client_id)
+        )
+        with outbound_policy_batch(policy_recipients):
+            for target in targets:
+                recipient_key = str(target.get("recipient_key") or "").strip()
+                if not recipient_key:
+                    continue
 
-            if payload.dry_run:
-                _upsert_campaign_recipient(base_row)
-                summary["skipped"] += 1
-                continue
+                base_row = {
+                    "client_id": payload.client_id,
+                    "campaign_id": campaign_id,
+                    "recipient_key": recipient_key,
+                    "recipient_name": target.get("recipient_name"),
+                    "email": target.get("email"),
+                    "phone": target.get("phone"),
+                    "segment": target.get("segment"),
+                    "send_status": "pending",
+                    "updated_at": _now_iso(),
+                }
 
-            if campaign.get("channel") == "email":
-                recipient_email = _normalize_email(target.get("email"))
-                if not recipient_email:
-                    base_row.update({"send_status": "skipped", "send_error": "missing_email"})
+                if payload.dry_run:
                     _upsert_campaign_recipient(base_row)
                     summary["skipped"] += 1
                     continue
 
-                unsubscribe_url = _build_unsubscribe_url(payload.unsubscribe_base_url, recipient_email, payload.client_id)
-                tracking_cta_url = (
-                    _build_campaign_interest_tracking_url(
-                        campaign_id=campaign_id,
-                        channel="email",
-                        recipient_key=recipient_key,
+                if campaign.get("channel") == "email":
+                    recipient_email = _normalize_email(target.get("email"))
+                    if not recipient_email:
+                        base_row.update({"send_status": "skipped", "send_error": "missing_email"})
+                        _upsert_campaign_recipient(base_row)
+                        summary["skipped"] += 1
+                        continue
+
+                    unsubscribe_url = _build_unsubscribe_url(payload.unsubscribe_base_url, recipient_email, payload.client_id)
+                    tracking_cta_url = (
+                        _build_campaign_interest_tracking_url(
+                            campaign_id=campaign_id,
+                            channel="email",
+                            recipient_key=recipient_key,
+                        )
+                        if _normalize_redirect_url(campaign.get("cta_url"))
+                        else None
                     )
-                    if _normalize_redirect_url(campaign.get("cta_url"))
-                    else None
-                )
 
-                # Lazy import to avoid optional-module import failures during startup.
-                from api.modules.email_integration.gmail_oauth import send_reply as gmail_send_reply
+                    # Lazy import to avoid optional-module import failures during startup.
+                    from api.modules.email_integration.gmail_oauth import send_reply as gmail_send_reply
+
+                    email_payload = {
+                        "client_id": payload.client_id,
+                        "to_email": recipient_email,
+                        "subject": campaign.get("subject") or campaign.get("name") or "Marketing campaign",
+                        "html": _render_campaign_html(campaign, target, cta_url_override=tracking_cta_url),
+                        "purpose": "marketing",
+                        "campaign_id": campaign_id,
+                        "campaign_owner_email": owner_email,
+                        "unsubscribe_url": unsubscribe_url,
+                        "company_postal_address": company_postal_address,
+                        "policy_source": "marketing_campaign_send",
+                        "source_id": campaign_id,
+                    }
 
-                email_payload = {
-                    "client_id": payload.client_id,
-                    "to_email": recipient_email,
-                    "subject": campaign.get("subject") or campaign.get("name") or "Marketing campaign",
-                    "html": _render_campaign_html(campaign, target, cta_url_override=tracking_cta_url),
-                    "purpose": "marketing",
-                    "campaign_id": campaign_id,
-                    "campaign_owner_email": owner_email,
-                    "unsubscribe_url": unsubscribe_url,
-                    "company_postal_address": company_postal_address,
-                    "policy_source": "marketing_campaign_send",
-                    "source_id": campaign_id,
-                }
+                    try:
+                        send_resp = await gmail_send_reply(email_payload, request)
+                        send_json = _to_json_response_payload(send_resp)
 
-                try:
-                    send_resp = await gmail_send_reply(email_payload, request)
-                    send_json = _to_json_response_payload(send_resp)
-
-                    provider_message_id = send_json.get("message_id")
-                    base_row.update(
-                        {
-                            "send_status": "sent",
-                            "provider": "gmail",
-                            "provider_message_id": provider_message_id,
-                            "sent_at": _now_iso(),
-                            "send_error": None,
-                            "policy_proof_id": None,
-                        }
-                    )
-                    _upsert_campaign_recipient(base_row)
-                    _log_campaign_event(
-                        client_id=payload.client_id,
-                        campaign_id=campaign_id,
-                        recipient_key=recipient_key,
-                        event_type="sent",
-                        metadata={"provider": "gmail", "provider_message_id": provider_message_id},
-                    )
-                    summary["sent"] += 1
-                except HTTPException as exc:
-                    detail = exc.detail
-                    if isinstance(detail, dict) and detail.get("code") == "OUTBOUND_POLICY_BLOCKED":
+                        provider_message_id = send_json.get("message_id")
                         base_row.update(
                             {
-                                "send_status": "blocked_policy",
-                                "send_error": detail.get("reason"),
-                                "policy_proof_id": detail.get("proof_id"),
+                                "send_status": "sent",
                                 "provider": "gmail",
+                                "provider_message_id": provider_message_id,
+                                "sent_at": _now_iso(),
+                                "send_error": None,
+                                "policy_proof_id": None,
                             }
                         )
-                        summary["blocked_policy"] += 1
-                    else:
+                        _upsert_campaign_recipient(base_row)
+                        _log_campaign_event(
+                            client_id=payload.client_id,
+                            campaign_id=campaign_id,
+                            recipient_key=recipient_key,
+                            event_type="sent",
+                            metadata={"provider": "gmail", "provider_message_id": provider_message_id},
+                        )
+                        summary["sent"] += 1
+                    except HTTPException as exc:
+                        detail = exc.detail
+                        if isinstance(detail, dict) and detail.get("code") == "OUTBOUND_POLICY_BLOCKED":
+                            base_row.update(
+                                {
+                                    "send_status": "blocked_policy",
+                                    "send_error": detail.get("reason"),
+                                    "policy_proof_id": detail.get("proof_id"),
+                                    "provider": "gmail",
+                                }
+                            )
+                            summary["blocked_policy"] += 1
+                        else:
+                            base_row.update(
+                                {
+                                    "send_status": "failed",
+                                    "send_error": str(detail),
+                                    "provider": "gmail",
+                                }
+                            )
+                            summary["failed"] += 1
+                        _upsert_campaign_recipient(base_row)
+                        _log_campaign_event(
+                            client_id=payload.client_id,
+                            campaign_id=campaign_id,
+                            recipient_key=recipient_key,
+                            event_type=base_row["send_status"],
+                            metadata={"error": base_row.get("send_error"), "policy_proof_id": base_row.get("policy_proof_id")},
+                        )
+
+                else:
+                    raw_phone = str(target.get("phone") or "").strip()
+                    recipient_phone = _normalize_phone(raw_phone, client_id=payload.client_id)
+                    if not recipient_phone:
                         base_row.update(
                             {
-                                "send_status": "failed",
-                                "send_error": str(detail),
-                                "provider": "gmail",
+                                "send_status": "skipped",
+                                "send_error": "invalid_phone_format" if raw_phone else "missing_phone",
                             }
                         )
+                        _upsert_campaign_recipient(base_row)
+                        summary["skipped"] += 1
+                        continue
+
+                    template_name = str(campaign.get("meta_template_name") or "").strip()
+                    if not template_name:
+                        base_row.update({"send_status": "failed", "send_error": "missing_meta_template_name"})
+                        _upsert_campaign_recipient(base_row)
                         summary["failed"] += 1
-                    _upsert_campaign_recipient(base_row)
-                    _log_campaign_event(
-                        client_id=payload.client_id,
-                        campaign_id=campaign_id,
-                        recipient_key=recipient_key,
-                        event_type=base_row["send_status"],
-                        metadata={"error": base_row.get("send_error"), "policy_proof_id": base_row.get("policy_proof_id")},
+                        continue
+
+                    language_code = _format_locale(campaign.get("language_family"))
+                    template_has_header = bool(campaign.get("whatsapp_has_image_header"))
+                    header_image_url = campaign_image_url if template_has_header else None
+                    button_url_parameters = (
+                        [quote_plus(recipient_key)]
+                        if (_normalize_redirect_url(campaign.get("cta_url")) and campaign_has_url_button)
+                        else None
                     )
-
-            else:
-                raw_phone = str(target.get("phone") or "").strip()
-                recipient_phone = _normalize_phone(raw_phone, client_id=payload.client_id)
-                if not recipient_phone:
-                    base_row.update(
-                        {
-                            "send_status": "skipped",
-                            "send_error": "invalid_phone_format" if raw_phone else "missing_phone",
-                        }
-                    )
-                    _upsert_campaign_recipient(base_row)
-                    summary["skipped"] += 1
-                    continue
-
-                template_name = str(campaign.get("meta_template_name") or "").strip()
-                if not template_name:
-                    base_row.update({"send_status": "failed", "send_error": "missing_meta_template_name"})
-                    _upsert_campaign_recipient(base_row)
-                    summary["failed"] += 1
-                    continue
-
-                language_code = _format_locale(campaign.get("language_family"))
-                template_has_header = bool(campaign.get("whatsapp_has_image_header"))
-                header_image_url = campaign_image_url if template_has_header else None
-                button_url_parameters = (
-                    [quote_plus(recipient_key)]
-                    if (_normalize_redirect_url(campaign.get("cta_url")) and campaign_has_url_button)
-                    else None
-                )
-                if campaign_image_url and not template_has_header:
-                    summary["image_skipped_no_header_template"] += 1
-                send_result = await send_whatsapp_template_for_client(
-                    client_id=payload.client_id,
-                    to_number=recipient_phone,
-                    template_name=template_name,
-                    parameters=[campaign_whatsapp_param],
-                    button_url_parameters=button_url_parameters,
-                    header_image_url=header_image_url,
-                    language_code=language_code,
-                    purpose="marketing",
-                    recipient_email=_normalize_email(target.get("email")),
-                    policy_source="marketing_campaign_send",
-                    policy_source_id=campaign_id,
-                )
-                header_fallback_used = False
-                button_fallback_no_url_param = False
-                if (
-                    not send_result.get("success")
-                    and button_url_parameters
-                    and _is_meta_template_parameter_error(send_result.get("error"))
-                ):
+                    if campaign_image_url and not template_has_header:
+                        summary["image_skipped_no_header_template"] += 1
                     send_result = await send_whatsapp_template_for_client(
                         client_id=payload.client_id,
                         to_number=recipient_phone,
                         template_name=template_name,
                         parameters=[campaign_whatsapp_param],
-                        button_url_parameters=None,
+                        button_url_parameters=button_url_parameters,
                         header_image_url=header_image_url,
                         language_code=language_code,
                         purpose="marketing",
@@ -2585,85 +3000,105 @@ async def send_campaign(request: Request, campaign_id: str, payload: CampaignSen
                         policy_source="marketing_campaign_send",
                         policy_source_id=campaign_id,
                     )
-                    button_fallback_no_url_param = bool(send_result.get("success"))
-                    if button_fallback_no_url_param:
-                        summary["button_fallback_no_url_param"] += 1
-                        campaign_has_url_button = False
-                        _disable_meta_template_url_buttons(campaign.get("meta_template_id"))
-                if not send_result.get("success") and header_image_url:
-                    raw_error_probe = str(send_result.get("error") or "").lower()
+                    header_fallback_used = False
+                    button_fallback_no_url_param = False
                     if (
-                        "header" in raw_error_probe
-                        or "component" in raw_error_probe
-                        or "parameter" in raw_error_probe
+                        not send_result.get("success")
+                        and button_url_parameters
+                        and _is_meta_template_parameter_error(send_result.get("error"))
                     ):
                         send_result = await send_whatsapp_template_for_client(
                             client_id=payload.client_id,
                             to_number=recipient_phone,
                             template_name=template_name,
                             parameters=[campaign_whatsapp_param],
-                            button_url_parameters=button_url_parameters,
-                            header_image_url=None,
+                            button_url_parameters=None,
+                            header_image_url=header_image_url,
                             language_code=language_code,
                             purpose="marketing",
                             recipient_email=_normalize_email(target.get("email")),
                             policy_source="marketing_campaign_send",
                             policy_source_id=campaign_id,
                         )
-                        header_fallback_used = bool(send_result.get("success"))
-                        if header_fallback_used:
-                            summary["image_fallback_no_header"] += 1
-                            _disable_meta_template_header(campaign.get("meta_template_id"))
-
-                if send_result.get("success"):
-                    base_row.update(
-                        {
-                            "send_status": "sent",
-                            "provider": "meta",
-                            "provider_message_id": send_result.get("meta_message_id"),
-                            "policy_proof_id": send_result.get("policy_proof_id"),
-                            "sent_at": _now_iso(),
-                        }
-                    )
-                    _upsert_campaign_recipient(base_row)
-                    _log_campaign_event(
-                        client_id=payload.client_id,
-                        campaign_id=campaign_id,
-                        recipient_key=recipient_key,
-                        event_type="sent",
-                        metadata={
-                            "provider": "meta",
-                            "provider_message_id": send_result.get("meta_message_id"),
-                            "policy_proof_id": send_result.get("policy_proof_id"),
-                            "header_fallback_no_image": header_fallback_used,
-                            "button_fallback_no_url_param": button_fallback_no_url_param,
-                            "header_template_missing": bool(campaign_image_url and not template_has_header),
-                        },
-                    )
-                    summary["sent"] += 1
-                else:
-                    raw_error = str(send_result.get("error") or "provider_send_failed")
-                    is_policy = raw_error.startswith("policy_blocked:")
-                    base_row.update(
-                        {
-                            "send_status": "blocked_policy" if is_policy else "failed",
-                            "send_error": raw_error.replace("policy_blocked:", "", 1) if is_policy else raw_error,
-                            "policy_proof_id": send_result.get("policy_proof_id"),
-                            "provider": "meta",
-                        }
-                    )
-                    _upsert_campaign_recipient(base_row)
-                    _log_campaign_event(
-                        client_id=payload.client_id,
-                        campaign_id=campaign_id,
-                        recipient_key=recipient_key,
-                        event_type=base_row["send_status"],
-                        metadata={"error": base_row.get("send_error"), "policy_proof_id": base_row.get("policy_proof_id")},
-                    )
-                    if is_policy:
-                        summary["blocked_policy"] += 1
+                        button_fallback_no_url_param = bool(send_result.get("success"))
+                        if button_fallback_no_url_param:
+                            summary["button_fallback_no_url_param"] += 1
+                            campaign_has_url_button = False
+                            _disable_meta_template_url_buttons(campaign.get("meta_template_id"))
+                    if not send_result.get("success") and header_image_url:
+                        raw_error_probe = str(send_result.get("error") or "").lower()
+                        if (
+                            "header" in raw_error_probe
+                            or "component" in raw_error_probe
+                            or "parameter" in raw_error_probe
+                        ):
+                            send_result = await send_whatsapp_template_for_client(
+                                client_id=payload.client_id,
+                                to_number=recipient_phone,
+                                template_name=template_name,
+                                parameters=[campaign_whatsapp_param],
+                                button_url_parameters=button_url_parameters,
+                                header_image_url=None,
+                                language_code=language_code,
+                                purpose="marketing",
+                                recipient_email=_normalize_email(target.get("email")),
+                                policy_source="marketing_campaign_send",
+                                policy_source_id=campaign_id,
+                            )
+                            header_fallback_used = bool(send_result.get("success"))
+                            if header_fallback_used:
+                                summary["image_fallback_no_header"] += 1
+                                _disable_meta_template_header(campaign.get("meta_template_id"))
+
+                    if send_result.get("success"):
+                        base_row.update(
+                            {
+                                "send_status": "sent",
+                                "provider": "meta",
+                                "provider_message_id": send_result.get("meta_message_id"),
+                                "policy_proof_id": send_result.get("policy_proof_id"),
+                                "sent_at": _now_iso(),
+                            }
+                        )
+                        _upsert_campaign_recipient(base_row)
+                        _log_campaign_event(
+                            client_id=payload.client_id,
+                            campaign_id=campaign_id,
+                            recipient_key=recipient_key,
+                            event_type="sent",
+                            metadata={
+                                "provider": "meta",
+                                "provider_message_id": send_result.get("meta_message_id"),
+                                "policy_proof_id": send_result.get("policy_proof_id"),
+                                "header_fallback_no_image": header_fallback_used,
+                                "button_fallback_no_url_param": button_fallback_no_url_param,
+                                "header_template_missing": bool(campaign_image_url and not template_has_header),
+                            },
+                        )
+                        summary["sent"] += 1
                     else:
-                        summary["failed"] += 1
+                        raw_error = str(send_result.get("error") or "provider_send_failed")
+                        is_policy = raw_error.startswith("policy_blocked:")
+                        base_row.update(
+                            {
+                                "send_status": "blocked_policy" if is_policy else "failed",
+                                "send_error": raw_error.replace("policy_blocked:", "", 1) if is_policy else raw_error,
+                                "policy_proof_id": send_result.get("policy_proof_id"),
+                                "provider": "meta",
+                            }
+                        )
+                        _upsert_campaign_recipient(base_row)
+                        _log_campaign_event(
+                            client_id=payload.client_id,
+                            campaign_id=campaign_id,
+                            recipient_key=recipient_key,
+                            event_type=base_row["send_status"],
+                            metadata={"error": base_row.get("send_error"), "policy_proof_id": base_row.get("policy_proof_id")},
+                        )
+                        if is_policy:
+                            summary["blocked_policy"] += 1
+                        else:
+                            summary["failed"] += 1
 
         final_status = campaign.get("status")
         if not payload.dry_run and summary["sent"] > 0:
@@ -3,17 +3,20 @@ from __future__ import annotations
 from datetime import datetime, timezone
 from functools import lru_cache
 import logging
-import re
 from typing import Any, Optional
 
 from api.config.config import supabase
+from api.utils.contact_identity import (
+    marketing_phone_aliases,
+    normalize_phone_e164,
+    resolve_client_country_code,
+)
 
 
 logger = logging.getLogger(__name__)
 
 MARKETING_CONTACTS_TABLE = "marketing_contacts"
 VALID_INTEREST_STATUSES = {"interested", "not_interested", "unknown"}
-_MEXICO_COUNTRY_ALIASES = {"mx", "mex", "mexico", "méxico"}
 
 
 def normalize_marketing_email(value: Any) -> Optional[str]:
@@ -23,53 +26,12 @@ def normalize_marketing_email(value: Any) -> Optional[str]:
 
 @lru_cache(maxsize=512)
 def _resolve_client_country_code(client_id: str) -> str:
-    normalized_client_id = str(client_id or "").strip()
-    if not normalized_client_id:
-        return ""
-    try:
-        rows = (
-            supabase
-            .table("client_profile")
-            .select("country")
-            .eq("client_id", normalized_client_id)
-            .limit(1)
-            .execute()
-        ).data or []
-        if not rows:
-            return ""
-        raw_country = str((rows[0] or {}).get("country") or "").strip().lower()
-        if not raw_country:
-            return ""
-        if raw_country in _MEXICO_COUNTRY_ALIASES:
-            return "MX"
-        if len(raw_country) == 2 and raw_country.isalpha():
-            return raw_country.upper()
-    except Exception:
-        logger.exception("Failed resolving client country | client_id=%s", normalized_client_id)
-    return ""
+    return resolve_client_country_code(client_id, supabase_client=supabase)
 
 
 def normalize_marketing_phone(value: Any, *, client_country_code: Optional[str] = None) -> Optional[str]:
-    raw = str(value or "").strip()
-    if not raw:
-        return None
-    cleaned = re.sub(r"[^\d+]", "", raw)
-    if cleaned.startswith("00"):
-        cleaned = "+" + cleaned[2:]
-    digits = re.sub(r"\D", "", cleaned)
-    if not digits:
-        return None
-    normalized_country = str(client_country_code or "").strip().upper()
     # Only infer +52 from local 10-digit numbers when the client is known to be in Mexico.
-    if len(digits) == 10 and normalized_country == "MX":
-        digits = f"52{digits}"
-    if digits.startswith("521") and len(digits) == 13:
-        digits = "52" + digits[3:]
-    if len(digits) == 10:
-        return None
-    if len(digits) < 10 or len(digits) > 15:
-        return None
-    return f"+{digits}"
+    return normalize_phone_e164(value, country_code=client_country_code or "")
 
 
 def _coerce_bool(value: Any) -> bool:
@@ -99,37 +61,7 @@ def _as_epoch(value: Any) -> float:
 
 
 def _marketing_phone_aliases(value: Any) -> list[str]:
-    raw = str(value or "").strip()
-    normalized = normalize_marketing_phone(raw, client_country_code="MX")
-    aliases: set[str] = set()
-
-    if normalized:
-        aliases.add(normalized)
-        digits = re.sub(r"\D", "", normalized)
-    else:
-        digits = re.sub(r"\D", "", raw)
-
-    if not digits:
-        return []
-
-    aliases.add(digits)
-    aliases.add(f"+{digits}")
-
-    if digits.startswith("52") and len(digits) == 12:
-        local_digits = digits[2:]
-        aliases.add(local_digits)
-        aliases.add(f"+{local_digits}")
-        aliases.add(f"521{local_digits}")
-        aliases.add(f"+521{local_digits}")
-    elif digits.startswith("521") and len(digits) == 13:
-        mx_digits = f"52{digits[3:]}"
-        aliases.add(mx_digits)
-        aliases.add(f"+{mx_digits}")
-        local_digits = mx_digits[2:]
-        aliases.add(local_digits)
-        aliases.add(f"+{local_digits}")
-
-    return sorted(alias for alias in aliases if alias)
+    return marketing_phone_aliases(value, country_code="MX")
 
 
 def _load_existing_contact(
@@ -9,6 +9,17 @@ import unicodedata
 from datetime import datetime, timedelta, time as dtime, timezone
 from api.modules.assistant_rag.prompts.calendar_prompt import get_calendar_prompt
 from api.modules.assistant_rag.llm import openai_chat
+from api.modules.assistant_rag.session_state import read_state, write_state
+from api.modules.assistant_rag.session_events import (
+    EVENT_FIELDS_COLLECTED,
+    EVENT_PHONE_CONFIRMATION_REQUESTED,
+    detect_lang_signal as _detect_lang_signal,
+    fields_event,
+    has_assistant_event,
+    load_session_events,
+    recent_events,
+    record_session_event,
+)
 from api.modules.assistant_rag.supabase_client import supabase
 from zoneinfo import ZoneInfo
 from api.modules.calendar.get_booked_slots import get_booked_slots
@@ -17,6 +28,7 @@ from api.appointments.create_appointment import (
     create_appointment as create_appointment_route,
 )
 from api.utils.babel_compat import format_datetime
+from api.utils.tracing import traced
 
 
 
@@ -100,25 +112,6 @@ def _is_valid_email(email: str) -> bool:
     return bool(pattern.match(email))
 
 
-def _detect_lang_signal(text: str) -> str | None:
-    t = (text or "").lower()
-    es_signals = {
-        "hola", "quiero", "agendar", "cita", "correo", "teléfono", "telefono",
-        "mañana", "viernes", "lunes", "martes", "miércoles", "miercoles", "jueves",
-        "confirmo", "sí", "si", "a las"
-    }
-    en_signals = {
-        "hello", "book", "appointment", "email", "phone", "tomorrow",
-        "friday", "monday", "tuesday", "wednesday", "thursday", "confirm",
-        "schedule", "call"
-    }
-    if any(c in t for c in "áéíóúñ¿¡") or any(w in t for w in es_signals):
-        return "es"
-    if any(w in t for w in en_signals):
-        return "en"
-    return None
-
-
 def _format_slot_for_lang(iso_str: str, tz_name: str, lang: str) -> str:
     dt = datetime.fromisoformat(iso_str.replace("Z", "+00:00"))
     target_tz = ZoneInfo(tz_name or "UTC")
@@ -506,7 +499,28 @@ def _is_on_conflict_constraint_error(exc: Exception) -> bool:
     )
 
 
-def _persist_conversation_state(
+def _fetch_conversation_state(client_id: str, session_id: str) -> dict:
+    res = (
+        supabase.table(CONVERSATION_STATE_TABLE)
+        .select("state")
+        .eq("client_id", client_id)
+        .eq("session_id", session_id)
+        .limit(1)
+        .execute()
+    )
+    return _coerce_dict(res.data[0]["state"]) if res and res.data else {}
+
+
+def _load_conversation_state(client_id: str, session_id: str) -> dict:
+    return read_state(
+        supabase,
+        client_id,
+        session_id,
+        lambda: _fetch_conversation_state(client_id, session_id),
+    )
+
+
+def _write_conversation_state(
     client_id: str,
     session_id: str,
     state: dict,
@@ -560,6 +574,31 @@ def _persist_conversation_state(
             return False
 
 
+def _persist_conversation_state(
+    client_id: str,
+    session_id: str,
+    state: dict,
+    *,
+    log_error: bool = True,
+) -> bool:
+    """Dentro de la unidad de trabajo del mensaje se difiere al flush final."""
+    if (state or {}).get("intent") == "calendar":
+        # Snapshot de campos en el log de la sesión: la recuperación no re-parsea history.
+        record_session_event(
+            client_id,
+            session_id,
+            fields_event(_coerce_dict(state.get("collected"))),
+            supabase_client=supabase,
+        )
+    return write_state(
+        supabase,
+        client_id,
+        session_id,
+        state or {},
+        lambda pending: _write_conversation_state(client_id, session_id, pending, log_error=log_error),
+    )
+
+
 def _is_yes(msg: str) -> bool:
     s = str(msg or "").strip().lower()
     if not s:
@@ -1520,8 +1559,19 @@ def _recover_calendar_state_from_history(
 ) -> dict:
     """
     Recupera estado mínimo del flujo de agenda desde history cuando
-    conversation_state no está disponible.
+    conversation_state no está disponible. Usa el log de eventos de la sesión
+    si tiene respuestas del asistente en la ventana; si no (sin log, o sesión
+    previa al log), history (hasta 60 filas).
     """
+    events = load_session_events(client_id, session_id, supabase_client=supabase)
+    if events is not None and has_assistant_event(events, channel=channel, max_age_minutes=max_age_minutes):
+        return _recover_calendar_state_from_events(
+            events,
+            channel,
+            fallback_lang,
+            max_age_minutes=max_age_minutes,
+        )
+
     try:
         res = (
             supabase.table("history")
@@ -1608,7 +1658,49 @@ def _recover_calendar_state_from_history(
 
     if not has_appointment_context:
         return {}
+    return _finalize_recovered_state(recovered, user_lang_signal, assistant_lang_signal)
+
+
+def _recover_calendar_state_from_events(
+    events: list,
+    channel: str,
+    fallback_lang: str,
+    *,
+    max_age_minutes: int,
+) -> dict:
+    recovered = {
+        "intent": "calendar",
+        "status": "collecting",
+        "collected": {},
+        "lang": fallback_lang,
+    }
+    has_appointment_context = False
+    user_lang_signal = None
+    assistant_lang_signal = None
+
+    for event in recent_events(events, channel=channel, max_age_minutes=max_age_minutes):
+        if event.get("type") == EVENT_FIELDS_COLLECTED:
+            has_appointment_context = True
+            recovered["collected"].update(_coerce_dict(event.get("fields")))
+            continue
+        if event.get("src") != "appointment":
+            continue
+
+        has_appointment_context = True
+        role = event.get("role")
+        if role == "user" and event.get("lang"):
+            user_lang_signal = event["lang"]
+        if role == "assistant" and event.get("lang"):
+            assistant_lang_signal = event["lang"]
+        if role == "assistant" and event.get("type") == EVENT_PHONE_CONFIRMATION_REQUESTED:
+            recovered["awaiting_whatsapp_phone_confirmation"] = True
+
+    if not has_appointment_context:
+        return {}
+    return _finalize_recovered_state(recovered, user_lang_signal, assistant_lang_signal)
 
+
+def _finalize_recovered_state(recovered: dict, user_lang_signal: str | None, assistant_lang_signal: str | None) -> dict:
     if user_lang_signal:
         recovered["lang"] = user_lang_signal
     elif assistant_lang_signal:
@@ -1691,6 +1783,7 @@ def _is_explicit_schedule_restart_message(message: str) -> bool:
 
 
 
+@traced("calendar.intent")
 async def handle_calendar_intent(client_id: str, message: str, session_id: str, channel: str, lang: str):
     logger.info(f"🧭 [LLM-Only Mode] Calendar intent for client_id={client_id}")
 
@@ -1712,15 +1805,7 @@ async def handle_calendar_intent(client_id: str, message: str, session_id: str,
     # 🧠 Load previous conversation state
     # ============================================================
     try:
-        res = (
-            supabase.table("conversation_state")
-            .select("state")
-            .eq("client_id", client_id)
-            .eq("session_id", session_id)
-            .limit(1)
-            .execute()
-        )
-        state = _coerce_dict(res.data[0]["state"]) if res and res.data else {}
+        state = _load_conversation_state(client_id, session_id)
     except Exception as e:
         logger.warning(f"⚠️ Could not load conversation state: {e}")
         state = {}
@@ -0,0 +1,167 @@
+"""
+Empaquetado del contexto RAG por presupuesto de tokens.
+
+- Cuenta tokens con tiktoken (encoding del modelo de chat).
+- Quita el solape del splitter entre chunks del mismo documento.
+- Descarta near-duplicates (Jaccard de tokens).
+- Respeta el orden de relevancia del retriever y corta en el límite de tokens.
+"""
+
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, List, Optional
+
+
+DEFAULT_CONTEXT_TOKEN_BUDGET = 2000
+# Prefijo de modelo → tokens para el bloque <information>.
+MODEL_CONTEXT_TOKEN_BUDGETS = {
+    "gpt-4o-mini": 2000,
+    "gpt-4o": 2400,
+    "gpt-4.1": 2400,
+    "gpt-4-turbo": 2400,
+    "gpt-3.5-turbo": 1500,
+}
+NEAR_DUPLICATE_JACCARD = 0.85
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 200
+MIN_TRUNCATED_TOKENS = 64
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_FALLBACK_PIECE_RE = re.compile(r"\s*\w{1,4}|\s*[^\w\s]", re.UNICODE)
+
+
+class _ApproxEncoding:
+    """
+    Fallback si tiktoken no puede cargar su BPE (p. ej. sin red en el arranque):
+    piezas de ≤4 caracteres de palabra, que aproximan bien el conteo BPE.
+    """
+
+    name = "approx"
+
+    def encode(self, text: str) -> List[str]:
+        return _FALLBACK_PIECE_RE.findall(text or "")
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
+
+
+@lru_cache(maxsize=8)
+def get_encoding(model: str):
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as exc:
+        logging.warning("⚠️ tiktoken no disponible para %s (%s); usando conteo aproximado", model, exc)
+        return _ApproxEncoding()
+
+
+def count_tokens(text: str, model: str) -> int:
+    return len(get_encoding(model).encode(text or ""))
+
+
+def context_token_budget(model: str) -> int:
+    override = (os.getenv("EVOLVIAN_RAG_CONTEXT_TOKENS") or "").strip()
+    if override.isdigit() and int(override) > 0:
+        return int(override)
+
+    normalized = (model or "").strip().lower()
+    for prefix in sorted(MODEL_CONTEXT_TOKEN_BUDGETS, key=len, reverse=True):
+        if normalized.startswith(prefix):
+            return MODEL_CONTEXT_TOKEN_BUDGETS[prefix]
+    return DEFAULT_CONTEXT_TOKEN_BUDGET
+
+
+@dataclass
+class PackedContext:
+    text: str = ""
+    docs: List[Any] = field(default_factory=list)
+    tokens: int = 0
+    budget: int = 0
+    dropped_duplicates: int = 0
+    trimmed_overlap_chars: int = 0
+
+
+def _doc_source(doc: Any) -> str:
+    metadata = getattr(doc, "metadata", None) or {}
+    return str(metadata.get("storage_path") or metadata.get("source") or "")
+
+
+def _strip_overlap(text: str, previous_texts: List[str]) -> tuple[str, int]:
+    """Quita el prefijo de `text` que repite el final de un chunk ya elegido."""
+    best = 0
+    for previous in previous_texts:
+        max_len = min(len(previous), len(text), MAX_OVERLAP_CHARS)
+        for size in range(max_len, MIN_OVERLAP_CHARS - 1, -1):
+            if previous.endswith(text[:size]):
+                best = max(best, size)
+                break
+    return (text[best:].lstrip(), best) if best else (text, 0)
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def pack_context(
+    docs: List[Any],
+    model: str,
+    budget_tokens: Optional[int] = None,
+) -> PackedContext:
+    """
+    Construye el bloque de contexto en orden de relevancia (el de `docs`)
+    hasta `budget_tokens`, sin solapes ni near-duplicates.
+    """
+    encoding = get_encoding(model)
+    budget = budget_tokens or context_token_budget(model)
+    packed = PackedContext(budget=budget)
+
+    parts: List[str] = []
+    chosen_by_source: dict[str, List[str]] = {}
+    chosen_token_sets: List[set] = []
+
+    for doc in docs or []:
+        text = (getattr(doc, "page_content", "") or "").strip()
+        if not text:
+            continue
+
+        source = _doc_source(doc)
+        text, trimmed = _strip_overlap(text, chosen_by_source.get(source, []))
+        if not text:
+            packed.dropped_duplicates += 1
+            continue
+
+        token_set = set(_WORD_RE.findall(text.lower()))
+        if any(_jaccard(token_set, other) >= NEAR_DUPLICATE_JACCARD for other in chosen_token_sets):
+            packed.dropped_duplicates += 1
+            continue
+
+        remaining = budget - packed.tokens
+        tokens = encoding.encode(text + "\n\n")
+        if len(tokens) > remaining:
+            if remaining < MIN_TRUNCATED_TOKENS:
+                break
+            # Último chunk: se corta en frontera de token y luego de palabra.
+            text = encoding.decode(tokens[:remaining]).rsplit(" ", 1)[0].rstrip()
+            tokens = encoding.encode(text + "\n\n")
+
+        packed.trimmed_overlap_chars += trimmed
+        parts.append(text)
+        packed.docs.append(doc)
+        packed.tokens += len(tokens)
+        chosen_by_source.setdefault(source, []).append(text)
+        chosen_token_sets.append(token_set)
+
+        if packed.tokens >= budget:
+            break
+
+    packed.text = "\n\n".join(parts) + ("\n\n" if parts else "")
+    return packed
@@ -7,6 +7,7 @@ from typing import List
 from langchain_community.document_loaders import PyPDFLoader, TextLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
+from api.modules.chunk_dedup import ChunkSignatureIndex, dedup_chunks
 
 
 def load_document(file_path: str) -> List[Document]:
@@ -40,4 +41,7 @@ def chunk_documents(docs: List[Document], chunk_size: int = 800, chunk_overlap:
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap
     )
-    return splitter.split_documents(docs)
+    chunks = splitter.split_documents(docs)
+    # Boilerplate repetido (headers / footers) se indexa una sola vez.
+    kept, _signatures, _report = dedup_chunks(chunks, document="", index=ChunkSignatureIndex())
+    return kept
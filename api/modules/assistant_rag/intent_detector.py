@@ -3,8 +3,11 @@ from __future__ import annotations
 import re
 import unicodedata
 from datetime import date
+from functools import lru_cache
 from typing import Any
 
+from api.modules.assistant_rag.keyword_matcher import SUBSTRING, KeywordHits, KeywordMatcher
+
 INTENT_CREATE_APPOINTMENT = "create_appointment"
 INTENT_CHECK_AVAILABILITY = "check_availability"
 INTENT_RESCHEDULE_APPOINTMENT = "reschedule_appointment"
@@ -226,23 +229,36 @@ def _normalize(text: str) -> str:
     return t
 
 
-def _contains_any(haystack: str, needles: set[str]) -> bool:
-    return any(n in haystack for n in needles)
+# Keywords y patrones ya vienen en forma normalizada (ascii, minúsculas).
+DETECTOR_KEYWORDS = KeywordMatcher(
+    {
+        "commercial": (COMMERCIAL_KEYWORDS, SUBSTRING),
+        "schedule_core": (SCHEDULE_CORE_TOKENS, SUBSTRING),
+        "create": (CREATE_PATTERNS, SUBSTRING),
+        "check_availability": (CHECK_AVAILABILITY_PATTERNS, SUBSTRING),
+        "reschedule": (RESCHEDULE_PATTERNS, SUBSTRING),
+        "cancel": (CANCEL_PATTERNS, SUBSTRING),
+        "confirm": (CONFIRM_PATTERNS, SUBSTRING),
+    }
+)
+
+
+@lru_cache(maxsize=512)
+def _keyword_hits(message_norm: str) -> KeywordHits:
+    return DETECTOR_KEYWORDS.scan(message_norm)
 
 
 def _looks_commercial_only(message_norm: str) -> bool:
-    return _contains_any(message_norm, COMMERCIAL_KEYWORDS) and not _contains_any(
-        message_norm,
-        SCHEDULE_CORE_TOKENS,
-    )
+    hits = _keyword_hits(message_norm)
+    return "commercial" in hits and "schedule_core" not in hits
 
 
 def _has_schedule_anchor(message_norm: str) -> bool:
-    return _contains_any(message_norm, SCHEDULE_CORE_TOKENS)
+    return "schedule_core" in _keyword_hits(message_norm)
 
 
-def _has_phrase(message_norm: str, phrases: tuple[str, ...]) -> bool:
-    return any(phrase in message_norm for phrase in phrases)
+def _has_phrase(message_norm: str, family: str) -> bool:
+    return family in _keyword_hits(message_norm)
 
 
 def _as_iso(dt: date) -> str:
@@ -406,7 +422,7 @@ def extract_appointment_entities(message: str, *, reference_date: date | None =
 
 
 def _is_cancel_intent(message_norm: str) -> bool:
-    if _has_phrase(message_norm, CANCEL_PATTERNS):
+    if _has_phrase(message_norm, "cancel"):
         return True
     if re.search(r"\b(cancel|cancelar|anular|anula)\b", message_norm) and (
         "cita" in message_norm or "appointment" in message_norm or "reserv" in message_norm
@@ -416,7 +432,7 @@ def _is_cancel_intent(message_norm: str) -> bool:
 
 
 def _is_reschedule_intent(message_norm: str) -> bool:
-    if _has_phrase(message_norm, RESCHEDULE_PATTERNS):
+    if _has_phrase(message_norm, "reschedule"):
         return True
     if re.search(r"\b(cambiar|mover|move|change|reschedule|reagendar|reprogramar)\b", message_norm) and (
         "cita" in message_norm or "appointment" in message_norm or "horario" in message_norm
@@ -428,7 +444,7 @@ def _is_reschedule_intent(message_norm: str) -> bool:
 def _is_confirm_intent(message_norm: str) -> bool:
     if message_norm.strip() in {"esta bien", "ok", "okay"}:
         return True
-    if _has_phrase(message_norm, CONFIRM_PATTERNS):
+    if _has_phrase(message_norm, "confirm"):
         return True
     if re.search(r"\b(si|yes)\b.*\b(ese|that one|that slot)\b", message_norm):
         return True
@@ -450,7 +466,7 @@ def _is_create_intent(message_norm: str, entities: dict[str, str]) -> bool:
         message_norm,
     ):
         return False
-    if _has_phrase(message_norm, CREATE_PATTERNS):
+    if _has_phrase(message_norm, "create"):
         return True
     if message_norm in {"agendar", "agenda", "reservar", "book", "schedule"}:
         return True
@@ -475,7 +491,7 @@ def _is_create_intent(message_norm: str, entities: dict[str, str]) -> bool:
 
 
 def _is_check_availability_intent(message_norm: str, entities: dict[str, str]) -> bool:
-    if _has_phrase(message_norm, CHECK_AVAILABILITY_PATTERNS):
+    if _has_phrase(message_norm, "check_availability"):
         return True
     if re.search(r"\bpuedo\b", message_norm) and entities.get("time") and "?" in message_norm:
         return True
@@ -13,14 +13,36 @@ from datetime import datetime, timezone
 import hashlib
 import json
 import logging
+from functools import lru_cache
 import re
-import unicodedata
 from typing import Any, Dict, Optional
 import traceback
 
 # === Dependencias del proyecto ===
 from api.modules.assistant_rag.supabase_client import supabase, save_history
+from api.modules.assistant_rag.keyword_matcher import (
+    SUBSTRING,
+    TOKEN,
+    WORD,
+    KeywordHits,
+    KeywordMatcher,
+    normalize_text,
+)
 from api.modules.assistant_rag.rag_pipeline import ask_question
+from api.modules.assistant_rag.session_state import read_state, session_state_unit, write_state
+from api.modules.assistant_rag.session_events import (
+    CALENDAR_COMPLETION_MARKERS,
+    CALENDAR_PROGRESS_EVENTS,
+    CALENDAR_PROGRESS_MARKERS,
+    EVENT_BOOKING_DONE,
+    EVENT_FIELDS_COLLECTED,
+    EVENT_SCOPE_REDIRECT,
+    has_assistant_event,
+    load_session_events,
+    recent_events,
+    session_event_unit,
+)
+from api.utils.tracing import traced
 
 logger = logging.getLogger(__name__)
 
@@ -167,26 +189,155 @@ CALENDAR_NAME_STOPWORDS = {
     "plan",
     "planes",
 }
-CALENDAR_COMPLETION_MARKERS = (
-    "tu cita ha sido registrada",
-    "your appointment has been registered",
-    "le escribe evolvian",
-    "si necesita cancelar",
-    "if you need to cancel",
+
+# Hint families del ruteo (antes se reconstruían en cada llamada a route_message).
+PRICING_HINTS = {
+    "plan", "planes", "pricing", "price", "prices", "subscription", "billing",
+    "precio", "precios", "suscripción", "suscripcion", "coste", "cost", "cuanto", "cuánto",
+}
+PRODUCT_HELP_HINTS = {
+    "instagram",
+    "instagrma",
+    "instgram",
+    "insttagrma",
+    "facebook",
+    "messenger",
+    "tiktok",
+    "integracion",
+    "integración",
+    "integrate",
+    "integration",
+    "instalar",
+    "isntalar",
+    "instalo",
+    "installation",
+    "setup",
+    "configurar",
+    "configuracion",
+    "configuración",
+}
+SCHEDULING_HINTS = {
+    "agendar", "reservar", "reagendar", "cita", "citas", "sesion", "sesión",
+    "book", "schedule", "appointment", "reschedule", "slot", "slots",
+    "horario", "horarios", "disponibilidad", "availability",
+}
+GREETINGS = ("hola", "buenas", "hey", "hi", "hello")
+GENERIC_INFO_HINTS = {
+    "información", "informacion", "planes", "precios", "ayuda", "gracias",
+    "servicios", "productos", "qué es", "que es"
+}
+# Palabras que indican que el usuario quiere SALIR del flujo de agenda
+EXIT_CALENDAR_KEYWORDS = {
+    "price", "prices", "plan", "plans", "premium", "starter", "free",
+    "cost", "how much", "billing", "upgrade", "downgrade",
+    "precio", "precios", "cuanto", "coste", "planes",
+    "instagram", "facebook", "messenger", "tiktok",
+    "instalar", "instalo", "instalacion", "installation",
+    "integracion", "integration", "setup", "configurar", "configuracion",
+}
+AUTO_REPLY_STRONG_MARKERS = (
+    "mensaje automatico",
+    "respuesta automatica",
+    "este es un mensaje automatico",
+    "auto reply",
+    "autoreply",
+    "out of office",
+    "away message",
+    "do not reply",
+    "noreply",
+    "no-reply",
+)
+AUTO_REPLY_INSTITUTIONAL_MARKERS = (
+    "gracias por comunicarte",
+    "gracias por comunicarse",
+    "gracias por contactarnos",
+    "gracias por comunicarte con",
+    "gracias por comunicarse con",
+    "thank you for contacting",
+    "thanks for contacting",
+    "thanks for reaching out",
+    "hemos recibido tu mensaje",
+    "recibimos tu mensaje",
+    "we received your message",
+    "como podemos ayudarte",
+    "how can we help you",
+    "can i help you",
+    "en breve te atendemos",
+    "en breve lo atendemos",
+    "en breve nos comunicaremos con usted",
+    "en breve nos comunicaremos contigo",
+    "en breve nos pondremos en contacto",
+    "te responderemos en breve",
+    "nos comunicaremos con usted",
+    "nos comunicaremos contigo",
+    "nuestro equipo te respondera",
+    "our team will reply",
+    "fuera de horario",
+    "horario de atencion",
+    "business hours",
+)
+WHATSAPP_HANDOFF_PHRASES = (
+    "quiero humano",
+    "agente humano",
+    "asesor humano",
+    "hablar con humano",
+    "hablar con agente",
+    "pasame con humano",
+    "pasame con un agente",
+    "persona real",
+    "quiero hablar con alguien",
+    "human agent",
+    "real person",
+    "talk to an agent",
+    "speak to an agent",
+    "connect me with support",
+)
+CAMPAIGN_INTEREST_MARKERS = (
+    "me interesa",
+    "interesado",
+    "interesada",
+    "que sigue",
+    "qué sigue",
+    "siguiente paso",
+    "quiero info",
+    "mas info",
+    "más info",
+    "asesor",
+    "advisor",
+    "follow up",
+    "followup",
 )
-CALENDAR_PROGRESS_MARKERS = (
-    "cual es tu nombre completo",
-    "gracias. cual es tu correo electronico",
-    "cual es tu numero de telefono",
-    "confirmas la cita",
-    "indicame cual prefieres",
-    "which one you prefer",
-    "what is your full name",
-    "what is your email",
-    "whatsapp phone number",
+
+
+def _compile_family(keywords, mode: str):
+    return ([normalize_text(keyword).strip() for keyword in keywords], mode)
+
+
+# Un solo autómata para todas las familias: cada mensaje se recorre una vez.
+ROUTING_KEYWORDS = KeywordMatcher(
+    {
+        "agenda": _compile_family(AGENDA_KEYWORDS, TOKEN),
+        "calendar_followup": _compile_family(CALENDAR_FOLLOWUP_KEYWORDS, WORD),
+        "non_scheduling_product": _compile_family(NON_SCHEDULING_PRODUCT_KEYWORDS, SUBSTRING),
+        "pricing": _compile_family(PRICING_HINTS, SUBSTRING),
+        "product_help": _compile_family(PRODUCT_HELP_HINTS, SUBSTRING),
+        "scheduling": _compile_family(SCHEDULING_HINTS, SUBSTRING),
+        "generic_info": _compile_family(GENERIC_INFO_HINTS, SUBSTRING),
+        "exit_calendar": _compile_family(EXIT_CALENDAR_KEYWORDS, SUBSTRING),
+        "auto_reply_strong": _compile_family(AUTO_REPLY_STRONG_MARKERS, SUBSTRING),
+        "auto_reply_institutional": _compile_family(AUTO_REPLY_INSTITUTIONAL_MARKERS, SUBSTRING),
+        "whatsapp_handoff": _compile_family(WHATSAPP_HANDOFF_PHRASES, SUBSTRING),
+        "campaign_interest": _compile_family(CAMPAIGN_INTEREST_MARKERS, WORD),
+    }
 )
 
 
+@lru_cache(maxsize=512)
+def _keyword_hits(message: str) -> KeywordHits:
+    """Familias presentes en el mensaje (una pasada; los helpers del mismo turno la reutilizan)."""
+    return ROUTING_KEYWORDS.scan(normalize_text(message))
+
+
 def _safe_hash(value: Any, *, length: int = 12) -> str:
     raw = str(value or "").strip()
     if not raw:
@@ -260,18 +411,7 @@ def looks_like_contact_block(message: str) -> bool:
 
 def contains_schedule_keywords(message: str) -> bool:
     """True si contiene palabras de agenda."""
-    normalized = _normalize_text(message)
-    for keyword in AGENDA_KEYWORDS:
-        token = _normalize_text(keyword)
-        if not token:
-            continue
-        if " " in token:
-            if token in normalized:
-                return True
-            continue
-        if re.search(rf"(?<!\w){re.escape(token)}(?!\w)", normalized):
-            return True
-    return False
+    return "agenda" in _keyword_hits(message or "")
 
 
 def _looks_like_person_name_for_calendar(message: str) -> bool:
@@ -303,8 +443,7 @@ def _looks_like_calendar_followup(message: str) -> bool:
     if _looks_like_person_name_for_calendar(message):
         return True
 
-    normalized = _normalize_text(message)
-    if any(re.search(rf"(?<!\w){re.escape(token)}(?!\w)", normalized) for token in CALENDAR_FOLLOWUP_KEYWORDS):
+    if "calendar_followup" in _keyword_hits(message):
         return True
 
     # Inputs como "mañana 9:00", "2026-03-10 09:00", "10/03/2026 9am".
@@ -317,8 +456,7 @@ def _looks_like_non_scheduling_product_query(message: str) -> bool:
     normalized = _normalize_text(message)
     if not normalized:
         return False
-    has_product_marker = any(marker in normalized for marker in NON_SCHEDULING_PRODUCT_KEYWORDS)
-    if not has_product_marker:
+    if "non_scheduling_product" not in _keyword_hits(message):
         return False
     # Keep booking path available for explicit scheduling requests.
     if contains_schedule_keywords(message) or _looks_like_calendar_followup(message) or looks_like_contact_block(message):
@@ -339,6 +477,18 @@ def _parse_created_at(raw_value: Any) -> Optional[datetime]:
         return None
 
 
+def _calendar_progress_from_events(events: list, channel: str, *, max_age_minutes: int) -> bool:
+    # Misma ventana que el fallback de history: los últimos 8 mensajes.
+    messages = [event for event in events if event.get("type") != EVENT_FIELDS_COLLECTED][-8:]
+    recent = recent_events(messages, channel=channel, max_age_minutes=max_age_minutes)
+    if any(event.get("type") == EVENT_BOOKING_DONE for event in recent):
+        return False
+    return any(
+        event.get("src") == "appointment" or event.get("type") in CALENDAR_PROGRESS_EVENTS
+        for event in recent
+    )
+
+
 def _has_recent_appointment_history(
     client_id: str,
     session_id: str,
@@ -350,7 +500,13 @@ def _has_recent_appointment_history(
     Fallback de resiliencia:
     si state falla en persistir/leer, usa history reciente para decidir
     si el usuario sigue en flujo de agenda.
+    Lee el log de eventos de la sesión; history si no hay log o si el log no
+    tiene respuestas del asistente en la ventana (p. ej. sesión previa al log).
     """
+    events = load_session_events(client_id, session_id, supabase_client=supabase)
+    if events is not None and has_assistant_event(events, channel=channel, max_age_minutes=max_age_minutes):
+        return _calendar_progress_from_events(events, channel, max_age_minutes=max_age_minutes)
+
     try:
         res = (
             supabase.table("history")
@@ -452,19 +608,28 @@ def _coerce_dict(val: Any) -> Dict:
             return {}
     return {}
 
+def _fetch_state_row(client_id: str, session_id: str) -> Dict:
+    res = (
+        supabase.table(CS_TABLE)
+        .select("state")
+        .eq("client_id", client_id)
+        .eq("session_id", session_id)
+        .limit(1)
+        .execute()
+    )
+    if not res or not getattr(res, "data", None):
+        return {}
+    return _coerce_dict(res.data[0].get("state"))
+
+
 def get_state(client_id: str, session_id: str) -> Dict:
     try:
-        res = (
-            supabase.table(CS_TABLE)
-            .select("state")
-            .eq("client_id", client_id)
-            .eq("session_id", session_id)
-            .limit(1)
-            .execute()
+        return read_state(
+            supabase,
+            client_id,
+            session_id,
+            lambda: _fetch_state_row(client_id, session_id),
         )
-        if not res or not getattr(res, "data", None):
-            return {}
-        return _coerce_dict(res.data[0].get("state"))
     except Exception as e:
         print(f"⚠️ get_state error: {e}")
         return {}
@@ -478,7 +643,7 @@ def _is_on_conflict_constraint_error(exc: Exception) -> bool:
     )
 
 
-def upsert_state(client_id: str, session_id: str, state: Dict) -> None:
+def _write_state_row(client_id: str, session_id: str, state: Dict) -> bool:
     payload = {
         "client_id": client_id,
         "session_id": session_id,
@@ -489,6 +654,7 @@ def upsert_state(client_id: str, session_id: str, state: Dict) -> None:
             payload,
             on_conflict="client_id,session_id",
         ).execute()
+        return True
     except Exception as e:
         if _is_on_conflict_constraint_error(e):
             try:
@@ -512,11 +678,23 @@ def upsert_state(client_id: str, session_id: str, state: Dict) -> None:
                 else:
                     supabase.table(CS_TABLE).insert(payload).execute()
                 print("⚠️ upsert_state fallback applied (missing on_conflict constraint)")
-                return
+                return True
             except Exception as fallback_exc:
                 print(f"⚠️ upsert_state fallback error: {fallback_exc}")
-                return
+                return False
         print(f"⚠️ upsert_state error: {e}")
+        return False
+
+
+def upsert_state(client_id: str, session_id: str, state: Dict) -> None:
+    """Dentro de session_state_unit() se acumula y se persiste una vez al final."""
+    write_state(
+        supabase,
+        client_id,
+        session_id,
+        state or {},
+        lambda pending: _write_state_row(client_id, session_id, pending),
+    )
 
 def get_active_intent(client_id: str, session_id: str) -> Optional[str]:
     state = get_state(client_id, session_id)
@@ -540,8 +718,7 @@ def _normalize_channel_name(raw: str | None) -> str:
 
 
 def _normalize_text(value: str) -> str:
-    normalized = unicodedata.normalize("NFKD", value or "")
-    return "".join(ch for ch in normalized if not unicodedata.combining(ch)).lower()
+    return normalize_text(value)
 
 
 def _detect_institutional_auto_reply(message: str, channel: str) -> dict[str, Any] | None:
@@ -553,50 +730,9 @@ def _detect_institutional_auto_reply(message: str, channel: str) -> dict[str, An
     if not text:
         return None
 
-    strong_markers = (
-        "mensaje automatico",
-        "respuesta automatica",
-        "este es un mensaje automatico",
-        "auto reply",
-        "autoreply",
-        "out of office",
-        "away message",
-        "do not reply",
-        "noreply",
-        "no-reply",
-    )
-    institutional_markers = (
-        "gracias por comunicarte",
-        "gracias por comunicarse",
-        "gracias por contactarnos",
-        "gracias por comunicarte con",
-        "gracias por comunicarse con",
-        "thank you for contacting",
-        "thanks for contacting",
-        "thanks for reaching out",
-        "hemos recibido tu mensaje",
-        "recibimos tu mensaje",
-        "we received your message",
-        "como podemos ayudarte",
-        "how can we help you",
-        "can i help you",
-        "en breve te atendemos",
-        "en breve lo atendemos",
-        "en breve nos comunicaremos con usted",
-        "en breve nos comunicaremos contigo",
-        "en breve nos pondremos en contacto",
-        "te responderemos en breve",
-        "nos comunicaremos con usted",
-        "nos comunicaremos contigo",
-        "nuestro equipo te respondera",
-        "our team will reply",
-        "fuera de horario",
-        "horario de atencion",
-        "business hours",
-    )
-    strong_hits = [marker for marker in strong_markers if marker in text]
-    institutional_hits = [marker for marker in institutional_markers if marker in text]
-
+    hits = _keyword_hits(message)
+    strong_hits = hits.keywords("auto_reply_strong")
+    institutional_hits = hits.keywords("auto_reply_institutional")
     if not strong_hits and len(institutional_hits) < 2:
         return None
 
@@ -611,23 +747,7 @@ def _is_whatsapp_handoff_request(message: str) -> bool:
     text = _normalize_text(message).strip()
     if not text:
         return False
-    phrases = (
-        "quiero humano",
-        "agente humano",
-        "asesor humano",
-        "hablar con humano",
-        "hablar con agente",
-        "pasame con humano",
-        "pasame con un agente",
-        "persona real",
-        "quiero hablar con alguien",
-        "human agent",
-        "real person",
-        "talk to an agent",
-        "speak to an agent",
-        "connect me with support",
-    )
-    return any(p in text for p in phrases)
+    return "whatsapp_handoff" in _keyword_hits(message)
 
 
 def _scope_redirect_message(lang: str) -> str:
@@ -680,22 +800,7 @@ def _is_campaign_interest_followup(message: str) -> bool:
     text = _normalize_text(message).strip()
     if not text:
         return False
-    markers = (
-        "me interesa",
-        "interesado",
-        "interesada",
-        "que sigue",
-        "qué sigue",
-        "siguiente paso",
-        "quiero info",
-        "mas info",
-        "más info",
-        "asesor",
-        "advisor",
-        "follow up",
-        "followup",
-    )
-    return any(re.search(rf"(?<!\w){re.escape(marker)}(?!\w)", text) for marker in markers)
+    return "campaign_interest" in _keyword_hits(message)
 
 
 def _get_active_campaign_interest_handoff(client_id: str, session_id: str) -> dict[str, Any] | None:
@@ -730,6 +835,19 @@ def _extract_phone_from_session(session_id: str) -> str | None:
 
 
 def _last_assistant_was_scope_redirect(client_id: str, session_id: str) -> bool:
+    events = load_session_events(client_id, session_id, supabase_client=supabase)
+    last_assistant = next(
+        (
+            event
+            for event in reversed(events or [])
+            if event.get("role") == "assistant" and event.get("ch") == "whatsapp"
+        ),
+        None,
+    )
+    # Sin respuesta del asistente en el log (sesión previa al log): se consulta history.
+    if last_assistant is not None:
+        return last_assistant.get("type") == EVENT_SCOPE_REDIRECT
+
     try:
         res = (
             supabase.table("history")
@@ -1031,6 +1149,7 @@ def _upsert_whatsapp_handoff(
 # ============================================================
 # 🚦 Router lógico
 # ============================================================
+@traced("message.route")
 def route_message(client_id: str, session_id: str, message: str, channel: str = "chat") -> str:
     """
     Devuelve: "calendar" | "rag"
@@ -1043,59 +1162,23 @@ def route_message(client_id: str, session_id: str, message: str, channel: str =
     RED = "\033[91m"
     RESET = "\033[0m"
 
-    text = (message or "").lower().strip()
-
-    PRICING_HINTS = {
-        "plan", "planes", "pricing", "price", "prices", "subscription", "billing",
-        "precio", "precios", "suscripción", "suscripcion", "coste", "cost", "cuanto", "cuánto",
-    }
-    PRODUCT_HELP_HINTS = {
-        "instagram",
-        "instagrma",
-        "instgram",
-        "insttagrma",
-        "facebook",
-        "messenger",
-        "tiktok",
-        "integracion",
-        "integración",
-        "integrate",
-        "integration",
-        "instalar",
-        "isntalar",
-        "instalo",
-        "installation",
-        "setup",
-        "configurar",
-        "configuracion",
-        "configuración",
-    }
-    SCHEDULING_HINTS = {
-        "agendar", "reservar", "reagendar", "cita", "citas", "sesion", "sesión",
-        "book", "schedule", "appointment", "reschedule", "slot", "slots",
-        "horario", "horarios", "disponibilidad", "availability",
-    }
+    text = _normalize_text(message).strip()
+    hits = _keyword_hits(message or "")
 
     # Priorizar preguntas comerciales simples (planes/precios) para evitar falsos positivos.
-    if any(k in text for k in PRICING_HINTS) and not any(k in text for k in SCHEDULING_HINTS):
+    if "pricing" in hits and "scheduling" not in hits:
         upsert_state(client_id, session_id, {"intent": None})
         return "rag"
-    if any(k in text for k in PRODUCT_HELP_HINTS) and not any(k in text for k in SCHEDULING_HINTS):
+    if "product_help" in hits and "scheduling" not in hits:
         upsert_state(client_id, session_id, {"intent": None})
         return "rag"
 
-    GREETINGS = {"hola", "buenas", "hey", "hi", "hello"}
-    GENERIC_INFO = {
-        "información", "informacion", "planes", "precios", "ayuda", "gracias",
-        "servicios", "productos", "qué es", "que es"
-    }
-
     # 🧠 Detectar agenda ANTES de ignorar saludos
     if detect_intent_to_schedule(message):
         print(f"{GREEN}📅 Schedule intent detected (ignoring greeting){RESET}")
     else:
         # 🧹 Saludos y preguntas generales → modo RAG
-        if any(text.startswith(g) for g in GREETINGS) or any(k in text for k in GENERIC_INFO):
+        if text.startswith(GREETINGS) or "generic_info" in hits:
             print(f"{YELLOW}🔄 Resetting intent for general message: '{message}'{RESET}")
             upsert_state(client_id, session_id, {"intent": None})
             return "rag"
@@ -1105,19 +1188,9 @@ def route_message(client_id: str, session_id: str, message: str, channel: str =
     active_intent = active_state.get("intent")
     status = active_state.get("status", "")
 
-    # 🆕 Palabras que indican que el usuario quiere SALIR del flujo de agenda
-    EXIT_CALENDAR_KEYWORDS = {
-        "price", "prices", "plan", "plans", "premium", "starter", "free",
-        "cost", "how much", "billing", "upgrade", "downgrade",
-        "precio", "precios", "cuanto", "coste", "planes",
-        "instagram", "facebook", "messenger", "tiktok",
-        "instalar", "instalo", "instalacion", "installation",
-        "integracion", "integration", "setup", "configurar", "configuracion",
-    }
-
+    # 🆕 ¿El usuario quiere SALIR del flujo de agenda? (EXIT_CALENDAR_KEYWORDS)
     def user_wants_to_exit_calendar(msg: str) -> bool:
-        t = _normalize_text(msg)
-        return any(k in t for k in EXIT_CALENDAR_KEYWORDS)
+        return "exit_calendar" in _keyword_hits(msg or "")
 
     def _is_truthy(val: Any, default: bool = True) -> bool:
         if val is None:
@@ -1267,6 +1340,7 @@ def route_message(client_id: str, session_id: str, message: str, channel: str =
 # ============================================================
 # 🎯 Orquestador principal (router + handlers)
 # ============================================================
+@traced("message.process")
 async def process_user_message(
     client_id: str,
     session_id: str,
@@ -1280,7 +1354,30 @@ async def process_user_message(
     - Detecta idioma
     - Enruta al calendario si aplica
     - Si no, usa el pipeline RAG
+
+    conversation_state se lee una vez y se persiste una vez por mensaje
+    (router + handler de calendario comparten la unidad de trabajo); los
+    eventos de la sesión se agregan con un solo append al final.
     """
+    with session_state_unit(), session_event_unit():
+        return await _process_user_message(
+            client_id,
+            session_id,
+            message,
+            channel=channel,
+            provider=provider,
+            return_metadata=return_metadata,
+        )
+
+
+async def _process_user_message(
+    client_id: str,
+    session_id: str,
+    message: str,
+    channel: str = "chat",
+    provider: str = "internal",
+    return_metadata: bool = False,
+):
     print(f"🤖 [Router] Processing message from {channel}: {message}")
     lang = detect_language(message)
     print(f"🌍 Detected language: {lang}")
@@ -0,0 +1,155 @@
+# api/modules/assistant_rag/keyword_matcher.py
+"""
+Matcher de keywords multi-familia (Aho-Corasick) para el ruteo de intents.
+
+Las familias (pricing, agenda, auto-reply, handoff, ...) se compilan una sola
+vez al importar el módulo que las declara. `scan()` recorre el texto una vez y
+devuelve todas las familias con coincidencias, respetando la semántica de
+cada una:
+
+- "substring": `keyword in text` (comportamiento histórico de los `any(...)`).
+- "word": límites de palabra, equivalente a `(?<!\\w)keyword(?!\\w)`.
+- "token": "word" para keywords de una palabra y substring para frases
+  (semántica de `contains_schedule_keywords`).
+
+El matcher no normaliza: el texto y las keywords deben venir en la misma
+forma (p. ej. ambos pasados por `normalize_text`).
+"""
+
+from __future__ import annotations
+
+import unicodedata
+from collections import deque
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+
+SUBSTRING = "substring"
+WORD = "word"
+TOKEN = "token"
+_MODES = {SUBSTRING, WORD, TOKEN}
+
+
+def normalize_text(value: str) -> str:
+    """NFKD sin acentos y en minúsculas (misma forma que usa el router)."""
+    normalized = unicodedata.normalize("NFKD", value or "")
+    return "".join(ch for ch in normalized if not unicodedata.combining(ch)).lower()
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class KeywordHits:
+    """Resultado de un scan: keywords por familia, en orden de declaración."""
+
+    __slots__ = ("_hits",)
+
+    def __init__(self, hits: Dict[str, List[str]]):
+        self._hits = hits
+
+    def __contains__(self, family: str) -> bool:
+        return family in self._hits
+
+    def __bool__(self) -> bool:
+        return bool(self._hits)
+
+    def any(self, *families: str) -> bool:
+        return any(family in self._hits for family in families)
+
+    def keywords(self, family: str) -> List[str]:
+        return list(self._hits.get(family) or [])
+
+    @property
+    def families(self) -> set[str]:
+        return set(self._hits)
+
+
+class KeywordMatcher:
+    """
+    Autómata Aho-Corasick sobre todas las keywords de todas las familias.
+
+    families: {nombre: (keywords, modo)}. Una misma keyword puede pertenecer a
+    varias familias (cada una con su modo).
+    """
+
+    def __init__(self, families: Mapping[str, Tuple[Iterable[str], str]]):
+        self._order: Dict[str, Dict[str, int]] = {}
+        # Nodo = índice en las listas; la raíz es 0.
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # outputs[nodo] = [(familia, keyword, requiere_límites)]
+        self._outputs: List[List[Tuple[str, str, bool]]] = [[]]
+
+        for family, (keywords, mode) in families.items():
+            if mode not in _MODES:
+                raise ValueError(f"Modo de matching desconocido para {family!r}: {mode!r}")
+            order = self._order.setdefault(family, {})
+            for keyword in keywords:
+                if not keyword or keyword in order:
+                    continue
+                order[keyword] = len(order)
+                bounded = mode == WORD or (mode == TOKEN and " " not in keyword)
+                self._add(keyword, (family, keyword, bounded))
+        self._build_failure_links()
+
+    def _add(self, keyword: str, output: Tuple[str, str, bool]) -> None:
+        node = 0
+        for ch in keyword:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            node = nxt
+        self._outputs[node].append(output)
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                # Salidas heredadas: sufijos que también son keywords.
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+
+    @property
+    def families(self) -> List[str]:
+        return list(self._order)
+
+    def scan(self, text: str) -> KeywordHits:
+        """Una pasada sobre `text`; devuelve todas las familias con coincidencias."""
+        found: Dict[str, set] = {}
+        if text:
+            goto, fail, outputs = self._goto, self._fail, self._outputs
+            length = len(text)
+            node = 0
+            for end, ch in enumerate(text):
+                while node and ch not in goto[node]:
+                    node = fail[node]
+                node = goto[node].get(ch, 0)
+                if not outputs[node]:
+                    continue
+                for family, keyword, bounded in outputs[node]:
+                    if bounded:
+                        start = end - len(keyword) + 1
+                        if start > 0 and _is_word_char(text[start - 1]):
+                            continue
+                        if end + 1 < length and _is_word_char(text[end + 1]):
+                            continue
+                    found.setdefault(family, set()).add(keyword)
+
+        hits = {
+            family: sorted(keywords, key=self._order[family].__getitem__)
+            for family, keywords in found.items()
+        }
+        return KeywordHits(hits)
+
+    def matches(self, text: str, family: str) -> bool:
+        return family in self.scan(text)
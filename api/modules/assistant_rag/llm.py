@@ -2,6 +2,8 @@ import os
 import logging
 from openai import OpenAI
 
+from api.utils.tracing import traced
+
 logger = logging.getLogger("llm")
 
 # Inicializa cliente OpenAI
@@ -15,6 +17,7 @@ CALENDAR_MODEL_FALLBACK = "gpt-4.1-mini"
 GLOBAL_FALLBACK_MODEL = "gpt-4o-mini"
 
 
+@traced("llm.chat")
 def openai_chat(
     messages,
     temperature: float = 0.1,
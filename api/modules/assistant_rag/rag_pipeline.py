@@ -12,6 +12,19 @@ import re
 import unicodedata
 from api.config.config import DEFAULT_CHAT_MODEL
 from api.utils.paths import get_base_data_path
+from api.utils.active_documents import get_active_document_set
+from api.utils.tracing import span, traced
+from api.modules.vector_layout import VectorLocation, resolve_vector_location
+from api.modules.chroma_indexer import EMBEDDING_MODEL, get_shard_vectorstore
+from api.modules.assistant_rag.context_packer import pack_context
+from api.modules.lexical_index import (
+    STOPWORDS,
+    content_terms,
+    is_exact_token,
+    load_lexical_index,
+    reciprocal_rank_fusion,
+    tokenize,
+)
 
 
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
@@ -36,6 +49,18 @@ from api.modules.assistant_rag.prompt_utils import (
 os.environ["ANONYMIZED_TELEMETRY"] = "false"
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+RETRIEVAL_K = 20
+LEXICAL_FAST_PATH_ENABLED = os.getenv("EVOLVIAN_LEXICAL_FAST_PATH", "true").lower() == "true"
+LEXICAL_FAST_PATH_MAX_TERMS = 6
+
+# Grounding de la respuesta contra el contexto empaquetado (0..1).
+# < GROUNDING_FALLBACK_SCORE → fallback; la confianza escala con el score.
+GROUNDING_FALLBACK_SCORE = float(os.getenv("EVOLVIAN_GROUNDING_FALLBACK_SCORE", "0.12"))
+GROUNDING_NGRAM = 2
+GROUNDING_TOKEN_WEIGHT = 0.6
+GROUNDING_EMBEDDING_WEIGHT = 0.3
+_GROUNDING_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
 LIMIT_OR_NO_DOCS_FALLBACK = {
     "es": (
         "Ahora mismo no puedo responder nuevas preguntas.\n\n"
@@ -73,6 +98,67 @@ def _normalize_for_lang_detection(text: str) -> str:
     )
 
 
+def _grounding_tokens(text: str) -> List[str]:
+    return [
+        tok
+        for tok in _GROUNDING_TOKEN_RE.findall(_normalize_for_lang_detection(text))
+        if len(tok) > 1 and tok not in STOPWORDS
+    ]
+
+
+def _ngram_hashes(tokens: List[str], n: int = GROUNDING_NGRAM) -> set[int]:
+    return {hash(tuple(tokens[i:i + n])) for i in range(len(tokens) - n + 1)}
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm_a = sum(x * x for x in a) ** 0.5
+    norm_b = sum(y * y for y in b) ** 0.5
+    return dot / (norm_a * norm_b) if norm_a and norm_b else 0.0
+
+
+def _grounding_score(
+    answer: str,
+    context_text: str,
+    *,
+    answer_embedding: Optional[List[float]] = None,
+    context_embedding: Optional[List[float]] = None,
+) -> float:
+    """
+    Qué tanto de la respuesta está respaldado por el contexto (0..1).
+    - cobertura: fracción de tokens de contenido de la respuesta presentes en el contexto
+    - overlap de n-gramas (hash de bigramas) para premiar frases copiadas del negocio
+    - coseno de embeddings solo si ya están en memoria (no se calculan aquí)
+    Todo en tiempo lineal: cada texto se normaliza y tokeniza una sola vez.
+    """
+    answer_tokens = _grounding_tokens(answer)
+    if not answer_tokens:
+        return 0.0
+    context_tokens = _grounding_tokens(context_text)
+    if not context_tokens:
+        return 0.0
+
+    context_set = set(context_tokens)
+    coverage = sum(1 for tok in answer_tokens if tok in context_set) / len(answer_tokens)
+
+    answer_ngrams = _ngram_hashes(answer_tokens)
+    if answer_ngrams:
+        ngram_overlap = len(answer_ngrams & _ngram_hashes(context_tokens)) / len(answer_ngrams)
+    else:
+        ngram_overlap = coverage
+
+    score = GROUNDING_TOKEN_WEIGHT * coverage + (1 - GROUNDING_TOKEN_WEIGHT) * ngram_overlap
+    if answer_embedding and context_embedding:
+        similarity = max(0.0, _cosine(answer_embedding, context_embedding))
+        score = (1 - GROUNDING_EMBEDDING_WEIGHT) * score + GROUNDING_EMBEDDING_WEIGHT * similarity
+    return max(0.0, min(1.0, score))
+
+
+def _grounding_confidence(score: float) -> float:
+    """Score de grounding → confidence_score; < 0.35 recomienda handoff."""
+    return round(min(0.95, 0.2 + 0.75 * score), 3)
+
+
 def _guess_lang_es_en(text: str) -> Optional[str]:
     """
     Heurística rápida y robusta para detectar ES / EN en mensajes cortos.
@@ -229,14 +315,15 @@ def _translate_text(text: str, target_lang: str) -> str:
 
     target_name = "Spanish" if target_lang == "es" else "English"
 
-    resp = llm_tr.invoke([
-        SystemMessage(
-            content="You are a translation engine. Return ONLY the translated text."
-        ),
-        HumanMessage(
-            content=f"Translate the following text to {target_name}:\n\n{text}"
-        )
-    ])
+    with span("llm.translate", target_lang=target_lang):
+        resp = llm_tr.invoke([
+            SystemMessage(
+                content="You are a translation engine. Return ONLY the translated text."
+            ),
+            HumanMessage(
+                content=f"Translate the following text to {target_name}:\n\n{text}"
+            )
+        ])
 
     translated = (resp.content or "").strip()
     return translated or text
@@ -276,12 +363,13 @@ Question:
 {retrieval_question}
 """.strip()
 
-    resp = llm_rw.invoke([
-        SystemMessage(
-            content="You rewrite questions for retrieval. Do not add new facts."
-        ),
-        HumanMessage(content=prompt)
-    ])
+    with span("llm.rewrite"):
+        resp = llm_rw.invoke([
+            SystemMessage(
+                content="You rewrite questions for retrieval. Do not add new facts."
+            ),
+            HumanMessage(content=prompt)
+        ])
 
     rewritten = (resp.content or "").strip()
     return rewritten or retrieval_question
@@ -290,40 +378,54 @@ def _has_active_documents(client_id: str) -> bool:
     """
     Fuente de verdad:
     Retorna True SOLO si el cliente tiene documentos activos.
+    Usa el set activo cacheado por tenant (sin round-trip en caliente).
     """
-    from api.config.config import supabase
-
-    res = (
-        supabase
-        .table("document_metadata")
-        .select("id")
-        .eq("client_id", client_id)
-        .eq("is_active", True)
-        .limit(1)
-        .execute()
-    )
-
-    return bool(res.data)
+    return bool(get_active_document_set(client_id))
 
 
 def _get_active_storage_paths(client_id: str) -> set[str]:
     """Devuelve rutas activas para reforzar aislamiento de documentos vigentes."""
-    from api.config.config import supabase
-
-    res = (
-        supabase
-        .table("document_metadata")
-        .select("storage_path")
-        .eq("client_id", client_id)
-        .eq("is_active", True)
-        .execute()
+    return set(get_active_document_set(client_id).storage_paths)
+
+
+def _open_vectorstore(location: VectorLocation):
+    """Por tenant se abre el directorio propio; en shards se reutiliza el Chroma del indexer."""
+    if location.sharded:
+        return get_shard_vectorstore(location)
+    return Chroma(
+        persist_directory=location.persist_dir,
+        embedding_function=OpenAIEmbeddings(model=EMBEDDING_MODEL),
+        collection_name=location.collection_name
     )
-    rows = res.data or []
-    return {
-        str(row.get("storage_path") or "").strip()
-        for row in rows
-        if str(row.get("storage_path") or "").strip()
-    }
+
+
+def _active_documents_filter(active_storage_paths: set[str]) -> Dict[str, Any]:
+    """
+    Filtro `where` de Chroma: solo chunks de documentos vigentes del tenant.
+    storage_path lleva el prefijo `<client_id>/`, así que también acota tenant
+    (los chunks legacy sin metadata client_id siguen siendo elegibles).
+    """
+    return {"storage_path": {"$in": sorted(active_storage_paths)}}
+
+
+def _lexical_fast_path_docs(question: str, lexical_hits: list) -> Optional[list]:
+    """
+    Consultas por palabra clave (SKU, precio, código…) que el índice BM25
+    resuelve por sí solo: se responde sin llamar a la API de embeddings.
+    """
+    if not LEXICAL_FAST_PATH_ENABLED or not lexical_hits:
+        return None
+
+    terms = content_terms(question)
+    exact_terms = {t for t in terms if is_exact_token(t)}
+    if not exact_terms or len(terms) > LEXICAL_FAST_PATH_MAX_TERMS:
+        return None
+
+    top_doc = lexical_hits[0][0]
+    if not exact_terms.issubset(set(tokenize(top_doc.page_content))):
+        return None
+
+    return [doc for doc, _score in lexical_hits]
 
 
 def _filter_retrieved_docs_for_client(
@@ -381,6 +483,7 @@ def _filter_retrieved_docs_for_client(
     return filtered_docs
 
 
+@traced("rag.ask")
 def ask_question(
     messages: Union[List[Dict[str, str]], str],
     client_id: str,
@@ -506,10 +609,11 @@ Rules:
 """.strip()
             )
 
-            resp = llm_direct.invoke([
-                system_direct,
-                HumanMessage(content=original_question)
-            ])
+            with span("llm.direct"):
+                resp = llm_direct.invoke([
+                    system_direct,
+                    HumanMessage(content=original_question)
+                ])
             answer = (resp.content or "").strip() or fallback
 
            
@@ -551,18 +655,18 @@ Rules:
         # -----------------------------------------------------
         # 🗂️ 2) Resolver path de vectorstore
         # -----------------------------------------------------
-        base_path = get_base_data_path()
-        client_data_path = os.path.join(base_path, f"chroma_{client_id}")
+        vector_location = resolve_vector_location(client_id, base_path=get_base_data_path())
 
         logging.info(
-            f"📂 Vectorstore path resolved (aligned with indexer): {client_data_path}"
+            f"📂 Vectorstore path resolved (aligned with indexer): {vector_location.persist_dir} "
+            f"[{vector_location.layout}]"
         )
 
 
         # -----------------------------------------------------
         # 🛡️ 3) Cache check → si no existe, NO RAG
         # -----------------------------------------------------
-        if not os.path.exists(client_data_path):
+        if not vector_location.has_index():
             fallback_limit = LIMIT_OR_NO_DOCS_FALLBACK.get(turn_lang, LIMIT_OR_NO_DOCS_FALLBACK["en"])
 
             if persist_history:
@@ -617,21 +721,45 @@ Rules:
         # =====================================================
         # 🔍 Recuperación (SIN re-embeddings)
         # =====================================================
-        vectordb = Chroma(
-            persist_directory=client_data_path,
-            embedding_function=OpenAIEmbeddings(),
-            collection_name=client_id
-        )
+        # El filtro de documentos vigentes va dentro de la query vectorial:
+        # MMR elige sus k candidatos solo entre chunks activos.
+        active_storage_paths = _get_active_storage_paths(client_id)
 
-        retriever = vectordb.as_retriever(
-            search_type="mmr",
-            search_kwargs={"k": 20, "lambda_mult": 0.5}
-        )
+        with span("retrieval.lexical") as lexical_span:
+            lexical_index = load_lexical_index(client_id, persist_dir=vector_location.sidecar_dir)
+            lexical_hits = (
+                lexical_index.search(rewritten_question, k=RETRIEVAL_K, allowed_paths=active_storage_paths)
+                if lexical_index
+                else []
+            )
+            lexical_span.set(hits=len(lexical_hits))
 
-        retrieved_docs = retriever.invoke(rewritten_question)
+        retrieved_docs = _lexical_fast_path_docs(rewritten_question, lexical_hits)
+        if retrieved_docs is not None:
+            logging.info("🔤 Lexical fast path (sin embeddings) | client_id=%s | hits=%s", client_id, len(retrieved_docs))
+        else:
+            vectordb = _open_vectorstore(vector_location)
+
+            retriever = vectordb.as_retriever(
+                search_type="mmr",
+                search_kwargs={
+                    "k": RETRIEVAL_K,
+                    "lambda_mult": 0.5,
+                    "filter": vector_location.where(_active_documents_filter(active_storage_paths)),
+                }
+            )
 
-        # Refuerzo: aislar solo chunks activos del cliente actual.
-        active_storage_paths = _get_active_storage_paths(client_id)
+            with span("retrieval.vector", k=RETRIEVAL_K) as vector_span:
+                retrieved_docs = retriever.invoke(rewritten_question)
+                vector_span.set(hits=len(retrieved_docs))
+
+            # Hybrid: fusión por rank (RRF) de vector + BM25.
+            if lexical_hits:
+                retrieved_docs = reciprocal_rank_fusion(
+                    [retrieved_docs, [doc for doc, _score in lexical_hits]]
+                )[:RETRIEVAL_K]
+
+        # Defensa en profundidad (en memoria, sin consultas extra).
         retrieved_docs = _filter_retrieved_docs_for_client(
             retrieved_docs,
             client_id=client_id,
@@ -654,20 +782,19 @@ Rules:
         # =====================================================
         # 🧩 Construir contexto
         # =====================================================
-        MAX_CHARS = 9000
-        context_text, total = "", 0
-
-        for d in retrieved_docs:
-            text = (d.page_content or "").strip()
-            if not text:
-                continue
-
-            remaining = MAX_CHARS - total
-            context_text += text[:remaining] + "\n\n"
-            total += len(text)
-
-            if total >= MAX_CHARS:
-                break
+        with span("rag.pack"):
+            packed = pack_context(retrieved_docs, DEFAULT_CHAT_MODEL)
+        context_text = packed.text
+        retrieved_docs = packed.docs or retrieved_docs
+        logging.info(
+            "🧩 Context packed | client_id=%s | chunks=%s | tokens=%s/%s | dropped_duplicates=%s | trimmed_overlap_chars=%s",
+            client_id,
+            len(packed.docs),
+            packed.tokens,
+            packed.budget,
+            packed.dropped_duplicates,
+            packed.trimmed_overlap_chars,
+        )
 
         sources = list({d.metadata.get("source", "unknown") for d in retrieved_docs})
 
@@ -714,10 +841,11 @@ Rules:
             temperature=temperature
         )
 
-        raw = llm.invoke([
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=human_prompt)
-        ])
+        with span("llm.generate", model=DEFAULT_CHAT_MODEL, context_tokens=packed.tokens):
+            raw = llm.invoke([
+                SystemMessage(content=system_prompt),
+                HumanMessage(content=human_prompt)
+            ])
 
         answer = (raw.content or "").strip() or fallback
 
@@ -733,9 +861,11 @@ Rules:
         logging.info(answer)
 
         anti_hallucination_fallback = False
-        if corpus_lang == turn_lang:
-            keywords = [w.lower() for w in context_text.split()[:80]]
-            if answer != fallback and not any(k in answer.lower() for k in keywords):
+        grounding_score: Optional[float] = None
+        if corpus_lang == turn_lang and answer != fallback:
+            grounding_score = _grounding_score(answer, context_text)
+            logging.info("🛡️ Grounding score | client_id=%s | score=%.3f", client_id, grounding_score)
+            if grounding_score < GROUNDING_FALLBACK_SCORE:
                 answer = fallback
                 anti_hallucination_fallback = True
 
@@ -764,10 +894,16 @@ Rules:
                     else "rag_fallback_response"
                 ),
             )
+        if grounding_score is None:
+            return _result(
+                answer,
+                confidence_score=0.82,
+                handoff_recommended=False,
+                confidence_reason="rag_answer_with_retrieval",
+            )
         return _result(
             answer,
-            confidence_score=0.82,
-            handoff_recommended=False,
+            confidence_score=_grounding_confidence(grounding_score),
             confidence_reason="rag_answer_with_retrieval",
         )
 
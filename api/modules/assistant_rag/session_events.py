@@ -0,0 +1,374 @@
+# api/modules/assistant_rag/session_events.py
+"""
+Log compacto de eventos por sesión (ring buffer) para el ruteo y la
+recuperación del flujo de agenda.
+
+Cada mensaje guardado en history agrega un evento tipado (slots ofrecidos,
+confirmación pedida, cita registrada, redirect de scope, ...) y el handler de
+calendario agrega snapshots de los campos recolectados. Las heurísticas leen
+una sola fila (`conversation_events`) en lugar de re-consultar y re-parsear
+history en cada mensaje.
+
+- Dentro de `session_event_unit()` (un mensaje entrante) los eventos quedan en
+  memoria y se agregan con un solo RPC por sesión al salir.
+- Tolerante a tabla/RPC ausentes: `load_session_events` devuelve None y los
+  llamadores vuelven al escaneo de history. También vuelven a history si el log
+  no tiene respuestas del asistente en la ventana (sesiones anteriores al log).
+"""
+
+import logging
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from api.config.config import supabase
+from api.modules.assistant_rag.keyword_matcher import normalize_text
+
+
+logger = logging.getLogger(__name__)
+
+SESSION_EVENTS_TABLE = "conversation_events"
+SESSION_EVENT_CAPACITY = int(os.getenv("EVOLVIAN_SESSION_EVENT_CAPACITY") or "32")
+
+EVENT_MESSAGE = "message"
+EVENT_SLOTS_OFFERED = "slots_offered"
+EVENT_CALENDAR_PROGRESS = "calendar_progress"
+EVENT_CONFIRMATION_REQUESTED = "confirmation_requested"
+EVENT_PHONE_CONFIRMATION_REQUESTED = "phone_confirmation_requested"
+EVENT_BOOKING_DONE = "booking_done"
+EVENT_SCOPE_REDIRECT = "scope_redirect"
+EVENT_FIELDS_COLLECTED = "fields_collected"
+
+# Eventos de mensaje que indican que la sesión sigue en flujo de agenda.
+CALENDAR_PROGRESS_EVENTS = {
+    EVENT_SLOTS_OFFERED,
+    EVENT_CALENDAR_PROGRESS,
+    EVENT_CONFIRMATION_REQUESTED,
+    EVENT_PHONE_CONFIRMATION_REQUESTED,
+}
+
+CALENDAR_COMPLETION_MARKERS = (
+    "tu cita ha sido registrada",
+    "your appointment has been registered",
+    "le escribe evolvian",
+    "si necesita cancelar",
+    "if you need to cancel",
+)
+CALENDAR_PROGRESS_MARKERS = (
+    "cual es tu nombre completo",
+    "gracias. cual es tu correo electronico",
+    "cual es tu numero de telefono",
+    "confirmas la cita",
+    "indicame cual prefieres",
+    "which one you prefer",
+    "what is your full name",
+    "what is your email",
+    "whatsapp phone number",
+)
+SLOTS_OFFERED_MARKERS = ("horarios disponibles", "available slots")
+CONFIRMATION_MARKERS = ("confirmas la cita", "do you confirm the appointment")
+PHONE_CONFIRMATION_MARKERS = (
+    "confirmas que ese es tu numero",
+    "do you confirm that's your number",
+    "do you confirm that is your number",
+)
+COLLECTED_FIELDS = ("user_name", "user_email", "user_phone", "scheduled_time")
+
+_PENDING: ContextVar[Optional[Dict[tuple, dict]]] = ContextVar("evolvian_session_events_unit", default=None)
+
+
+def _utcnow_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _is_missing_events_table(exc: Exception) -> bool:
+    msg = str(exc).lower()
+    return SESSION_EVENTS_TABLE in msg and (
+        "does not exist" in msg or "relation" in msg or "schema cache" in msg or "not found" in msg
+    )
+
+
+def normalize_channel(raw: str | None) -> str:
+    c = (raw or "chat").strip().lower()
+    if c in {"widget", "web", "chat_widget"}:
+        return "chat"
+    if "whatsapp" in c:
+        return "whatsapp"
+    return c
+
+
+def _normalize_content(text: str) -> str:
+    return " ".join(normalize_text(text).split())
+
+
+def detect_lang_signal(text: str) -> str | None:
+    t = (text or "").lower()
+    es_signals = {
+        "hola", "quiero", "agendar", "cita", "correo", "teléfono", "telefono",
+        "mañana", "viernes", "lunes", "martes", "miércoles", "miercoles", "jueves",
+        "confirmo", "sí", "si", "a las"
+    }
+    en_signals = {
+        "hello", "book", "appointment", "email", "phone", "tomorrow",
+        "friday", "monday", "tuesday", "wednesday", "thursday", "confirm",
+        "schedule", "call"
+    }
+    if any(c in t for c in "áéíóúñ¿¡") or any(w in t for w in es_signals):
+        return "es"
+    if any(w in t for w in en_signals):
+        return "en"
+    return None
+
+
+def classify_message(role: str, content: str, *, metadata: dict | None = None) -> str:
+    """Tipo de evento de un mensaje (el más específico gana)."""
+    policy = (metadata or {}).get("whatsapp_policy") if isinstance(metadata, dict) else None
+    if role == "assistant" and isinstance(policy, dict) and policy.get("event") == "out_of_scope_redirect":
+        return EVENT_SCOPE_REDIRECT
+
+    text = _normalize_content(content)
+    if any(marker in text for marker in CALENDAR_COMPLETION_MARKERS):
+        return EVENT_BOOKING_DONE
+    if role != "assistant":
+        return EVENT_MESSAGE
+    if any(marker in text for marker in PHONE_CONFIRMATION_MARKERS):
+        return EVENT_PHONE_CONFIRMATION_REQUESTED
+    if any(marker in text for marker in CONFIRMATION_MARKERS):
+        return EVENT_CONFIRMATION_REQUESTED
+    if any(marker in text for marker in SLOTS_OFFERED_MARKERS):
+        return EVENT_SLOTS_OFFERED
+    if any(marker in text for marker in CALENDAR_PROGRESS_MARKERS):
+        return EVENT_CALENDAR_PROGRESS
+    return EVENT_MESSAGE
+
+
+def message_event(
+    role: str,
+    content: str,
+    *,
+    channel: str | None,
+    source_type: str | None = None,
+    metadata: dict | None = None,
+) -> dict:
+    event = {
+        "type": classify_message(role, content, metadata=metadata),
+        "role": role,
+        "ch": normalize_channel(channel),
+        "at": _utcnow_iso(),
+    }
+    if str(source_type or "").strip().lower() == "appointment":
+        event["src"] = "appointment"
+    lang = detect_lang_signal(content)
+    if lang:
+        event["lang"] = lang
+    return event
+
+
+def fields_event(collected: dict | None, *, channel: str | None = None) -> dict | None:
+    fields = {key: collected[key] for key in COLLECTED_FIELDS if (collected or {}).get(key)}
+    if not fields:
+        return None
+    event = {"type": EVENT_FIELDS_COLLECTED, "fields": fields, "at": _utcnow_iso()}
+    if channel:
+        event["ch"] = normalize_channel(channel)
+    return event
+
+
+def _parse_at(raw: Any) -> Optional[datetime]:
+    try:
+        parsed = datetime.fromisoformat(str(raw or "").replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def recent_events(
+    events: List[dict],
+    *,
+    channel: str | None,
+    max_age_minutes: int,
+    now: datetime | None = None,
+) -> List[dict]:
+    """Eventos del canal dentro de la ventana, en orden cronológico."""
+    now_utc = now or datetime.now(timezone.utc)
+    normalized_channel = normalize_channel(channel) if channel else ""
+    out = []
+    for event in events:
+        if not isinstance(event, dict):
+            continue
+        created_at = _parse_at(event.get("at"))
+        if not created_at or (now_utc - created_at).total_seconds() / 60.0 > max_age_minutes:
+            continue
+        event_channel = event.get("ch") or ""
+        if normalized_channel and event_channel and event_channel != normalized_channel:
+            continue
+        out.append(event)
+    return out
+
+
+def has_assistant_event(events: List[dict], *, channel: str | None, max_age_minutes: int) -> bool:
+    """True si el log registra alguna respuesta del asistente del canal dentro de la ventana."""
+    return any(
+        event.get("role") == "assistant"
+        for event in recent_events(events, channel=channel, max_age_minutes=max_age_minutes)
+    )
+
+
+def load_session_events(client_id: str, session_id: str, *, supabase_client: Any = None) -> Optional[List[dict]]:
+    """
+    Log de la sesión (más viejo primero). None si la sesión no tiene log
+    todavía o la tabla no está disponible: el llamador usa history.
+    """
+    client = supabase_client or supabase
+    try:
+        res = (
+            client.table(SESSION_EVENTS_TABLE)
+            .select("events")
+            .eq("client_id", client_id)
+            .eq("session_id", session_id)
+            .limit(1)
+            .execute()
+        )
+    except Exception as exc:
+        if not _is_missing_events_table(exc):
+            logger.warning("⚠️ Could not load session events | session=%s | err=%s", str(session_id)[-8:], exc)
+        return None
+
+    rows = getattr(res, "data", None) or []
+    row = rows[0] if isinstance(rows, list) and rows else None
+    if not isinstance(row, dict) or not isinstance(row.get("events"), list):
+        return None
+    pending = (_PENDING.get() or {}).get((id(client), client_id, session_id))
+    return list(row["events"]) + (list(pending["events"]) if pending else [])
+
+
+def append_session_events(
+    client_id: str,
+    session_id: str,
+    events: List[dict],
+    *,
+    supabase_client: Any = None,
+) -> bool:
+    """Agrega al ring buffer (RPC atómico; read-modify-write si el RPC no existe)."""
+    events = [event for event in events or [] if event]
+    if not client_id or not session_id or not events:
+        return False
+
+    client = supabase_client or supabase
+    try:
+        client.rpc(
+            "append_conversation_events",
+            {
+                "p_client_id": str(client_id),
+                "p_session_id": str(session_id),
+                "p_events": events,
+                "p_capacity": SESSION_EVENT_CAPACITY,
+            },
+        ).execute()
+        return True
+    except Exception as rpc_exc:
+        logger.debug("append_conversation_events RPC unavailable, using upsert: %s", rpc_exc)
+
+    try:
+        res = (
+            client.table(SESSION_EVENTS_TABLE)
+            .select("events")
+            .eq("client_id", client_id)
+            .eq("session_id", session_id)
+            .limit(1)
+            .execute()
+        )
+        rows = getattr(res, "data", None) or []
+        current = rows[0].get("events") if rows and isinstance(rows[0], dict) else None
+        merged = (list(current) if isinstance(current, list) else []) + events
+        client.table(SESSION_EVENTS_TABLE).upsert(
+            {
+                "client_id": client_id,
+                "session_id": session_id,
+                "events": merged[-SESSION_EVENT_CAPACITY:],
+                "updated_at": _utcnow_iso(),
+            },
+            on_conflict="client_id,session_id",
+        ).execute()
+        return True
+    except Exception as exc:
+        if not _is_missing_events_table(exc):
+            logger.warning("⚠️ Could not append session events | session=%s | err=%s", str(session_id)[-8:], exc)
+        return False
+
+
+def record_session_event(
+    client_id: str,
+    session_id: str,
+    event: dict | None,
+    *,
+    supabase_client: Any = None,
+) -> None:
+    """Dentro de una unidad queda pendiente hasta el flush; fuera, append directo."""
+    if not event or not client_id or not session_id:
+        return
+    client = supabase_client or supabase
+    pending = _PENDING.get()
+    if pending is None:
+        append_session_events(client_id, session_id, [event], supabase_client=client)
+        return
+
+    entry = pending.setdefault(
+        (id(client), client_id, session_id),
+        {"client": client, "client_id": client_id, "session_id": session_id, "events": []},
+    )
+    buffered = entry["events"]
+    # Un snapshot de campos por turno: el último reemplaza al anterior.
+    if event.get("type") == EVENT_FIELDS_COLLECTED and buffered and buffered[-1].get("type") == EVENT_FIELDS_COLLECTED:
+        buffered[-1] = event
+        return
+    buffered.append(event)
+
+
+def record_history_event(
+    client_id: str,
+    session_id: str,
+    *,
+    role: str,
+    content: str,
+    channel: str | None,
+    source_type: str | None = None,
+    metadata: dict | None = None,
+    supabase_client: Any = None,
+) -> None:
+    try:
+        event = message_event(role, content, channel=channel, source_type=source_type, metadata=metadata)
+    except Exception as exc:
+        logger.warning("⚠️ Could not classify message for session events: %s", exc)
+        return
+    record_session_event(client_id, session_id, event, supabase_client=supabase_client)
+
+
+def flush_session_events(pending: Dict[tuple, dict]) -> None:
+    for entry in pending.values():
+        if entry["events"]:
+            append_session_events(
+                entry["client_id"],
+                entry["session_id"],
+                entry["events"],
+                supabase_client=entry["client"],
+            )
+        entry["events"] = []
+
+
+@contextmanager
+def session_event_unit():
+    """Un append por sesión para todo lo que ocurra dentro (anidable)."""
+    if _PENDING.get() is not None:
+        yield
+        return
+
+    pending: Dict[tuple, dict] = {}
+    token = _PENDING.set(pending)
+    try:
+        yield
+    finally:
+        _PENDING.reset(token)
+        flush_session_events(pending)
@@ -0,0 +1,228 @@
+# api/modules/assistant_rag/session_state.py
+"""
+Estado de sesión (conversation_state) con unidad de trabajo por request.
+
+- Dentro de `session_state_unit()` (un mensaje entrante): el estado se lee una
+  vez, las escrituras quedan en memoria y al salir se hace un solo upsert por
+  sesión modificada.
+- Fuera de una unidad: lectura con cache de proceso (TTL corto) y escritura
+  directa (write-through).
+- Cada escritura sube la versión de la entrada; si al hacer flush otra unidad
+  del mismo proceso ya escribió esa sesión, se registra el conflicto y gana la
+  última escritura (comportamiento previo). Entre procesos el TTL acota la
+  desactualización.
+
+El cache es por cliente de Supabase (WeakKeyDictionary): cambiar de cliente
+no comparte estado.
+"""
+
+import copy
+import logging
+import os
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+SESSION_STATE_CACHE_TTL_SECONDS = float(os.getenv("EVOLVIAN_SESSION_STATE_CACHE_TTL_SECONDS") or "20")
+SESSION_STATE_CACHE_MAX_ENTRIES = int(os.getenv("EVOLVIAN_SESSION_STATE_CACHE_MAX_ENTRIES") or "5000")
+
+
+@dataclass
+class _CacheEntry:
+    state: Dict
+    version: int
+    expires_at: float
+
+
+@dataclass
+class _UnitEntry:
+    client: Any
+    client_id: str
+    session_id: str
+    state: Dict
+    base_version: int
+    dirty: bool = False
+    persist: Optional[Callable[[Dict], bool]] = None
+
+
+@dataclass
+class _Unit:
+    entries: Dict[tuple, _UnitEntry] = field(default_factory=dict)
+
+
+_CACHES: "weakref.WeakKeyDictionary[Any, OrderedDict]" = weakref.WeakKeyDictionary()
+_LOCK = Lock()
+_CURRENT_UNIT: ContextVar[Optional[_Unit]] = ContextVar("evolvian_session_state_unit", default=None)
+
+
+def _client_cache(client: Any) -> Optional[OrderedDict]:
+    try:
+        cache = _CACHES.get(client)
+        if cache is None:
+            cache = _CACHES[client] = OrderedDict()
+        return cache
+    except TypeError:
+        # Cliente sin soporte de weakref: sin cache de proceso.
+        return None
+
+
+def _cached(client: Any, key: tuple) -> Optional[_CacheEntry]:
+    with _LOCK:
+        cache = _client_cache(client)
+        return cache.get(key) if cache is not None else None
+
+
+def _cache_put(client: Any, key: tuple, state: Dict, version: int) -> None:
+    if SESSION_STATE_CACHE_TTL_SECONDS <= 0:
+        return
+    with _LOCK:
+        cache = _client_cache(client)
+        if cache is None:
+            return
+        current = cache.get(key)
+        if current is not None and current.version > version:
+            return
+        cache[key] = _CacheEntry(
+            state=copy.deepcopy(state),
+            version=version,
+            expires_at=time.monotonic() + SESSION_STATE_CACHE_TTL_SECONDS,
+        )
+        cache.move_to_end(key)
+        while len(cache) > SESSION_STATE_CACHE_MAX_ENTRIES:
+            cache.popitem(last=False)
+
+
+def invalidate_session_state(client: Any, client_id: str, session_id: str) -> None:
+    with _LOCK:
+        cache = _client_cache(client)
+        if cache is not None:
+            cache.pop((client_id, session_id), None)
+
+
+def read_state(client: Any, client_id: str, session_id: str, fetch: Callable[[], Dict]) -> Dict:
+    """
+    Estado de la sesión (copia mutable). `fetch` lee la fila de Supabase y
+    debe lanzar excepción ante error (los errores no se cachean).
+    """
+    key = (client_id, session_id)
+    unit = _CURRENT_UNIT.get()
+    unit_key = (id(client), client_id, session_id)
+    if unit is not None and unit_key in unit.entries:
+        return copy.deepcopy(unit.entries[unit_key].state)
+
+    cached = _cached(client, key)
+    if cached is not None and cached.expires_at > time.monotonic():
+        state, version = copy.deepcopy(cached.state), cached.version
+    else:
+        state = fetch() or {}
+        version = cached.version if cached is not None else 0
+        _cache_put(client, key, state, version)
+
+    if unit is not None:
+        unit.entries[unit_key] = _UnitEntry(
+            client=client,
+            client_id=client_id,
+            session_id=session_id,
+            state=copy.deepcopy(state),
+            base_version=version,
+        )
+    return state
+
+
+def write_state(
+    client: Any,
+    client_id: str,
+    session_id: str,
+    state: Dict,
+    persist: Callable[[Dict], bool],
+) -> bool:
+    """Dentro de una unidad queda pendiente hasta el flush; fuera, write-through."""
+    unit = _CURRENT_UNIT.get()
+    if unit is not None:
+        unit_key = (id(client), client_id, session_id)
+        entry = unit.entries.get(unit_key)
+        if entry is None:
+            cached = _cached(client, (client_id, session_id))
+            entry = unit.entries[unit_key] = _UnitEntry(
+                client=client,
+                client_id=client_id,
+                session_id=session_id,
+                state={},
+                base_version=cached.version if cached is not None else 0,
+            )
+        entry.state = copy.deepcopy(state or {})
+        entry.dirty = True
+        entry.persist = persist
+        return True
+
+    return _persist(client, client_id, session_id, state or {}, persist, base_version=None)
+
+
+def _persist(
+    client: Any,
+    client_id: str,
+    session_id: str,
+    state: Dict,
+    persist: Callable[[Dict], bool],
+    *,
+    base_version: Optional[int],
+) -> bool:
+    key = (client_id, session_id)
+    cached = _cached(client, key)
+    current_version = cached.version if cached is not None else 0
+    if base_version is not None and current_version != base_version:
+        logger.warning(
+            "⚠️ conversation_state written concurrently in this process; last write wins | session=%s",
+            session_id[-8:],
+        )
+
+    ok = bool(persist(state))
+    if ok:
+        _cache_put(client, key, state, current_version + 1)
+    else:
+        invalidate_session_state(client, client_id, session_id)
+    return ok
+
+
+def flush_session_state(unit: _Unit) -> None:
+    for entry in unit.entries.values():
+        if not entry.dirty or entry.persist is None:
+            continue
+        try:
+            _persist(
+                entry.client,
+                entry.client_id,
+                entry.session_id,
+                entry.state,
+                entry.persist,
+                base_version=entry.base_version,
+            )
+        except Exception:
+            logger.exception("⚠️ Could not flush conversation_state | session=%s", entry.session_id[-8:])
+            invalidate_session_state(entry.client, entry.client_id, entry.session_id)
+        entry.dirty = False
+
+
+@contextmanager
+def session_state_unit():
+    """Una lectura y un upsert por sesión para todo lo que ocurra dentro (anidable)."""
+    if _CURRENT_UNIT.get() is not None:
+        yield _CURRENT_UNIT.get()
+        return
+
+    unit = _Unit()
+    token = _CURRENT_UNIT.set(unit)
+    try:
+        yield unit
+    finally:
+        _CURRENT_UNIT.reset(token)
+        # También ante excepción: antes cada escritura ya quedaba persistida.
+        flush_session_state(unit)
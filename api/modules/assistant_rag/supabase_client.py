@@ -8,6 +8,9 @@ from api.config.config import supabase
 from supabase import create_client, Client
 from typing import Optional, List
 from api.security.whatsapp_token_crypto import decrypt_whatsapp_token
+from api.utils.dashboard_snapshot import invalidate_dashboard_snapshot
+from api.utils.client_counters import record_history_counters
+from api.modules.assistant_rag.session_events import record_history_event
 
 
 # Configurar Stripe
@@ -155,6 +158,20 @@ def save_history(
             logging.error(f"❌ Error al guardar historial: {res}")
             return
 
+        # 🔢 Contadores mantenidos del tenant (dashboard / límites en O(1))
+        record_history_counters(client_id, role=role, channel=channel, supabase_client=supabase)
+        # 🧾 Log compacto de la sesión (ruteo / recuperación de agenda sin re-leer history)
+        record_history_event(
+            client_id,
+            session_id,
+            role=role,
+            content=content,
+            channel=channel,
+            source_type=source_type,
+            metadata=metadata,
+            supabase_client=supabase,
+        )
+
         # ---------------------------------------------------------
         # 🔢 Incrementar usage SOLO si es respuesta del assistant
         # (No contamos mensajes del usuario)
@@ -304,6 +321,7 @@ def link_channel_to_client(client_id: str, channel_type: str, value: str):
             "value": value,
             "client_id": client_id
         }).execute()
+        invalidate_dashboard_snapshot(client_id, reason="channel_linked")
 
         return insert.data[0]["id"]
 
@@ -530,6 +548,7 @@ async def update_client_plan_by_id(client_id: str, new_plan_id: str, subscriptio
             base_plan_id=update_payload.get("plan_id"),
             supabase_client=supabase,
         )
+        invalidate_dashboard_snapshot(client_id, reason="plan_updated")
 
     except Exception as e:
         print(f"🔥 Error en update_client_plan_by_id: {e}")
@@ -8,6 +8,7 @@ from api.modules.assistant_rag.supabase_client import supabase
 from api.authz import authorize_client_request
 from api.oauth_state import encode_signed_state
 from api.utils.calendar_feature_flags import client_can_use_google_calendar_sync
+from api.utils.dashboard_snapshot import invalidate_dashboard_snapshot
 
 router = APIRouter(tags=["Calendar"])
 
@@ -162,6 +163,7 @@ def disconnect_google_calendar(request: Request, client_id: str = Query(...)):
             .execute()
         )
 
+        invalidate_dashboard_snapshot(client_id, reason="calendar_disconnected")
         logging.info(f"🧹 Google Calendar disconnected for {client_id}")
         return {"success": True, "message": "Google Calendar disconnected successfully"}
 
@@ -11,6 +11,7 @@ from api.compliance.email_policy import (
     complete_email_send_audit,
 )
 from api.modules.assistant_rag.supabase_client import supabase
+from api.utils.tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -126,7 +127,8 @@ def notify_business_owner(
 
     # === 5️⃣ Send via Resend API ===
     try:
-        response = requests.post("https://api.resend.com/emails", headers=headers, json=body)
+        with span("outbound.email", provider="resend", client_id=client_id):
+            response = requests.post("https://api.resend.com/emails", headers=headers, json=body)
         if response.status_code >= 400:
             logger.error("❌ Failed to send email | status=%s", response.status_code)
             complete_email_send_audit(
@@ -12,6 +12,7 @@ from api.compliance.email_policy import (
     complete_email_send_audit,
 )
 from api.utils.calendar_feature_flags import client_can_use_google_calendar_sync
+from api.utils.dashboard_snapshot import invalidate_dashboard_snapshot
 
 # ============================================================
 # 🔧 Configuración
@@ -186,6 +187,7 @@ def schedule_event(payload: dict):
             "email_sent": False,
         }).execute()
         logger.info("💾 Appointment saved in Supabase")
+        invalidate_dashboard_snapshot(client_id, reason="appointment_scheduled")
 
         # 7️⃣ Send confirmation email (if SendGrid active)
         recipient_email = (user_email or owner_email or "").strip().lower()
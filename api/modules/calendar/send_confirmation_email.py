@@ -12,6 +12,7 @@ from api.compliance.email_policy import (
 )
 from api.config.config import supabase
 from api.modules.email_integration.gmail_oauth import get_gmail_service
+from api.utils.tracing import span
 
 RESEND_API_KEY = os.getenv("RESEND_API_KEY")
 logger = logging.getLogger(__name__)
@@ -368,19 +369,20 @@ def send_confirmation_email(
             )
         return False
 
-    response = requests.post(
-        "https://api.resend.com/emails",
-        headers={
-            "Authorization": f"Bearer {RESEND_API_KEY}",
-            "Content-Type": "application/json",
-        },
-        json={
-            "from": f"{sender_name} <noreply@notifications.evolvianai.com>",
-            "to": [to_email],
-            "subject": final_subject,
-            "html": final_html,
-        },
-    )
+    with span("outbound.email", provider="resend", client_id=client_id):
+        response = requests.post(
+            "https://api.resend.com/emails",
+            headers={
+                "Authorization": f"Bearer {RESEND_API_KEY}",
+                "Content-Type": "application/json",
+            },
+            json={
+                "from": f"{sender_name} <noreply@notifications.evolvianai.com>",
+                "to": [to_email],
+                "subject": final_subject,
+                "html": final_html,
+            },
+        )
 
     if response.status_code != 200:
         logger.error("❌ Error al enviar correo | status=%s", response.status_code)
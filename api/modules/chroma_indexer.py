@@ -2,14 +2,42 @@
 
 import os
 import logging
+from threading import Lock
 from typing import List, Optional
 from langchain_community.vectorstores import Chroma
 from langchain_openai import OpenAIEmbeddings
 from langchain.schema import Document
 from api.utils.paths import get_base_data_path
+from api.modules.lexical_index import append_to_lexical_index
+from api.modules.vector_layout import VectorLocation, resolve_vector_location
 
 
 CHROMA_INGEST_BATCH_SIZE = int(os.getenv("EVOLVIAN_CHROMA_INGEST_BATCH_SIZE") or "100")
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+
+def tenant_sidecar_dir(client_id: str) -> str:
+    """Directorio de los archivos por tenant (índice léxico, firmas de dedup)."""
+    return resolve_vector_location(client_id, base_path=get_base_data_path()).sidecar_dir
+
+
+_SHARED_STORES: dict[str, Chroma] = {}
+_SHARED_STORES_LOCK = Lock()
+
+
+def get_shard_vectorstore(location: VectorLocation) -> Chroma:
+    """Un Chroma abierto por shard y proceso: abrir un tenant no abre SQLite/HNSW nuevos."""
+    with _SHARED_STORES_LOCK:
+        vectordb = _SHARED_STORES.get(location.persist_dir)
+        if vectordb is None:
+            os.makedirs(location.persist_dir, exist_ok=True)
+            vectordb = Chroma(
+                persist_directory=location.persist_dir,
+                embedding_function=OpenAIEmbeddings(model=EMBEDDING_MODEL),
+                collection_name=location.collection_name,
+            )
+            _SHARED_STORES[location.persist_dir] = vectordb
+        return vectordb
 
 
 # ✅ Factoría centralizada para crear un Chroma con OpenAI Embeddings
@@ -21,13 +49,19 @@ def get_chroma_vectorstore(
     Crea un vectorstore Chroma usando OpenAIEmbeddings.
     
     Args:
-        client_id (Optional[str]): Si se pasa, se crea un directorio persistente aislado.
+        client_id (Optional[str]): Si se pasa, se crea un directorio persistente aislado
+            (o, con EVOLVIAN_VECTORSTORE_LAYOUT=sharded, se usa el shard del tenant).
         persist (bool): Si True, guarda en disco. Si False, mantiene en memoria.
 
     Returns:
         Chroma: Vectorstore listo para usarse como retriever o para persistir.
     """
-    embedding_model = OpenAIEmbeddings(model="text-embedding-3-small")
+    if client_id:
+        location = resolve_vector_location(client_id, base_path=get_base_data_path())
+        if location.sharded:
+            return get_shard_vectorstore(location)
+
+    embedding_model = OpenAIEmbeddings(model=EMBEDDING_MODEL)
 
     persist_dir = None
     collection_name = "default"
@@ -35,8 +69,7 @@ def get_chroma_vectorstore(
 
 
     if client_id:
-        base_path = get_base_data_path()
-        persist_dir = os.path.join(base_path, f"chroma_{client_id}")
+        persist_dir = location.persist_dir
         os.makedirs(persist_dir, exist_ok=True)
         collection_name = client_id
 
@@ -79,6 +112,13 @@ def save_to_chroma(chunks: List[Document], client_id: str):
             )
             vectordb.add_documents(batch)
 
+        # Índice BM25 junto al vectorstore (hybrid retrieval / fast path léxico).
+        try:
+            if getattr(vectordb, "_persist_directory", None):
+                append_to_lexical_index(chunks, client_id, persist_dir=tenant_sidecar_dir(client_id))
+        except Exception:
+            logging.exception("⚠️ No se pudo actualizar el índice léxico para %s", client_id)
+
         if client_id:
             vectordb.persist()
             logging.info("💾 Persistencia activada para %s", client_id)
@@ -0,0 +1,315 @@
+# api/modules/chunk_dedup.py
+
+import hashlib
+import json
+import logging
+import os
+from collections import Counter
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Iterable, List, Optional
+
+from langchain.schema import Document
+from api.modules.lexical_index import tokenize
+from api.config.config import supabase
+from api.utils.active_documents import get_active_document_set
+
+
+SIGNATURES_FILENAME = "chunk_signatures.jsonl"
+DEDUP_ENABLED = os.getenv("EVOLVIAN_CHUNK_DEDUP", "true").lower() == "true"
+# Jaccard estimado (MinHash) a partir del cual dos chunks son "casi iguales".
+NEAR_DUPLICATE_JACCARD = float(os.getenv("EVOLVIAN_DEDUP_JACCARD") or "0.85")
+MINHASH_PERMUTATIONS = 64
+# LSH: 16 bandas de 4 filas ⇒ pares con J ≥ 0.8 colisionan con prob. > 0.999.
+MINHASH_BANDS = 16
+SHINGLE_SIZE = 3
+# Chunks muy cortos dan estimaciones ruidosas: solo duplicado exacto.
+MIN_TOKENS_FOR_MINHASH = 12
+
+_ROWS_PER_BAND = MINHASH_PERMUTATIONS // MINHASH_BANDS
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_PERMUTATIONS = [
+    (
+        int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % (_MERSENNE_PRIME - 1) + 1,
+        int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE_PRIME,
+    )
+    for i in range(MINHASH_PERMUTATIONS)
+]
+_FILE_LOCK = Lock()
+
+
+def _stable_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=4).digest(), "big")
+
+
+def exact_hash(tokens: List[str]) -> str:
+    return hashlib.sha1(" ".join(tokens).encode("utf-8")).hexdigest()
+
+
+def minhash(tokens: List[str]) -> List[int]:
+    """Firma MinHash sobre shingles de SHINGLE_SIZE tokens."""
+    if len(tokens) < SHINGLE_SIZE:
+        shingles = {" ".join(tokens)}
+    else:
+        shingles = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+    hashes = [_stable_hash(shingle) for shingle in shingles]
+    return [
+        min(((a * value + b) % _MERSENNE_PRIME) & _MAX_HASH for value in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def estimated_jaccard(left: List[int], right: List[int]) -> float:
+    if not left or len(left) != len(right):
+        return 0.0
+    return sum(1 for x, y in zip(left, right) if x == y) / len(left)
+
+
+def _bands(signature: List[int]) -> List[tuple]:
+    return [
+        (band, tuple(signature[band * _ROWS_PER_BAND:(band + 1) * _ROWS_PER_BAND]))
+        for band in range(MINHASH_BANDS)
+    ]
+
+
+@dataclass
+class ChunkSignature:
+    exact: str
+    minhash: Optional[List[int]]
+    storage_path: str
+    # Versión indexada (document_id, o la ruta si no hay id).
+    document: str = ""
+
+    def to_json(self) -> dict:
+        return {
+            "exact": self.exact,
+            "minhash": self.minhash,
+            "storage_path": self.storage_path,
+            "document": self.document,
+        }
+
+
+@dataclass
+class DedupReport:
+    document: str
+    total_chunks: int = 0
+    kept_chunks: int = 0
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+    duplicate_sources: Counter = field(default_factory=Counter)
+
+    def as_dict(self) -> dict:
+        return {
+            "document": self.document,
+            "total_chunks": self.total_chunks,
+            "kept_chunks": self.kept_chunks,
+            "exact_duplicates": self.exact_duplicates,
+            "near_duplicates": self.near_duplicates,
+            "duplicate_sources": dict(self.duplicate_sources),
+        }
+
+
+class ChunkSignatureIndex:
+    """Firmas de los chunks ya indexados del tenant (exactas + bandas LSH de MinHash)."""
+
+    def __init__(self, signatures: Iterable[ChunkSignature] = ()):
+        self.signatures: List[ChunkSignature] = []
+        self.exact: dict[str, int] = {}
+        self.buckets: dict[tuple, List[int]] = {}
+        for signature in signatures:
+            self.add(signature)
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def add(self, signature: ChunkSignature) -> None:
+        index = len(self.signatures)
+        self.signatures.append(signature)
+        self.exact.setdefault(signature.exact, index)
+        if signature.minhash:
+            for band in _bands(signature.minhash):
+                self.buckets.setdefault(band, []).append(index)
+
+    def find_duplicate(
+        self,
+        candidate: ChunkSignature,
+        allowed_paths: Optional[set] = None,
+    ) -> Optional[tuple[ChunkSignature, bool]]:
+        """(firma existente, es_exacto) si el candidato ya está indexado, o None."""
+
+        def _allowed(existing: ChunkSignature) -> bool:
+            # Misma versión: siempre. Versiones previas de la misma ruta: nunca
+            # (se reemplazan). Otro documento: solo si sigue activo.
+            if existing.document == candidate.document:
+                return True
+            if existing.storage_path == candidate.storage_path:
+                return False
+            return allowed_paths is None or existing.storage_path in allowed_paths
+
+        exact_index = self.exact.get(candidate.exact)
+        if exact_index is not None and _allowed(self.signatures[exact_index]):
+            return self.signatures[exact_index], True
+
+        if not candidate.minhash:
+            return None
+        seen = set()
+        for band in _bands(candidate.minhash):
+            for index in self.buckets.get(band, ()):
+                if index in seen:
+                    continue
+                seen.add(index)
+                existing = self.signatures[index]
+                if (
+                    _allowed(existing)
+                    and estimated_jaccard(existing.minhash, candidate.minhash) >= NEAR_DUPLICATE_JACCARD
+                ):
+                    return existing, False
+        return None
+
+
+def signatures_path(persist_dir: str) -> str:
+    return os.path.join(persist_dir, SIGNATURES_FILENAME)
+
+
+def load_signature_index(persist_dir: Optional[str]) -> ChunkSignatureIndex:
+    if not persist_dir:
+        return ChunkSignatureIndex()
+    path = signatures_path(persist_dir)
+    signatures = []
+    try:
+        with open(path, encoding="utf-8") as handle:
+            for line in handle:
+                line = line.strip()
+                if line:
+                    row = json.loads(line)
+                    signatures.append(
+                        ChunkSignature(
+                            exact=row["exact"],
+                            minhash=row.get("minhash"),
+                            storage_path=row.get("storage_path") or "",
+                            document=row.get("document") or row.get("storage_path") or "",
+                        )
+                    )
+    except FileNotFoundError:
+        pass
+    except Exception:
+        logging.exception("⚠️ No se pudo leer el registro de firmas en %s", path)
+    return ChunkSignatureIndex(signatures)
+
+
+def append_signatures(signatures: List[ChunkSignature], persist_dir: Optional[str]) -> None:
+    """Se borra junto con Chroma en cada reindex, igual que el índice léxico."""
+    if not signatures or not persist_dir:
+        return
+    os.makedirs(persist_dir, exist_ok=True)
+    with _FILE_LOCK, open(signatures_path(persist_dir), "a", encoding="utf-8") as handle:
+        for signature in signatures:
+            handle.write(json.dumps(signature.to_json()) + "\n")
+
+
+def chunk_signature(chunk: Document, document: str = "") -> ChunkSignature:
+    metadata = chunk.metadata or {}
+    tokens = tokenize(chunk.page_content or "")
+    storage_path = str(metadata.get("storage_path") or "")
+    return ChunkSignature(
+        exact=exact_hash(tokens),
+        minhash=minhash(tokens) if len(tokens) >= MIN_TOKENS_FOR_MINHASH else None,
+        storage_path=storage_path or document,
+        document=str(metadata.get("document_id") or storage_path or document),
+    )
+
+
+def dedup_chunks(
+    chunks: List[Document],
+    *,
+    document: str,
+    index: ChunkSignatureIndex,
+    active_storage_paths: Optional[Iterable[str]] = None,
+) -> tuple[List[Document], List[ChunkSignature], DedupReport]:
+    """
+    Quita chunks duplicados / casi duplicados contra el índice del tenant y
+    contra el propio documento (headers, footers, boilerplate legal).
+    Devuelve (chunks a indexar, sus firmas, reporte); `index` queda actualizado.
+    """
+    report = DedupReport(document=document, total_chunks=len(chunks))
+    allowed = set(active_storage_paths) if active_storage_paths is not None else None
+    kept: List[Document] = []
+    kept_signatures: List[ChunkSignature] = []
+
+    for chunk in chunks:
+        signature = chunk_signature(chunk, document)
+        duplicate = index.find_duplicate(signature, allowed)
+        if duplicate is not None:
+            existing, is_exact = duplicate
+            if is_exact:
+                report.exact_duplicates += 1
+            else:
+                report.near_duplicates += 1
+            report.duplicate_sources[existing.storage_path] += 1
+            continue
+        index.add(signature)
+        kept.append(chunk)
+        kept_signatures.append(signature)
+
+    report.kept_chunks = len(kept)
+    return kept, kept_signatures, report
+
+
+def dedup_for_ingest(
+    chunks: List[Document],
+    client_id: str,
+    *,
+    persist_dir: Optional[str],
+    document: str,
+) -> tuple[List[Document], List[ChunkSignature], DedupReport]:
+    """
+    Dedup de ingesta por tenant: carga el registro de firmas junto al
+    vectorstore y filtra contra los documentos activos del cliente.
+    Las firmas devueltas se persisten con `append_signatures` una vez que
+    los chunks quedaron guardados en Chroma.
+    """
+    if not DEDUP_ENABLED:
+        return chunks, [], DedupReport(document=document, total_chunks=len(chunks), kept_chunks=len(chunks))
+
+    try:
+        active_paths = get_active_document_set(client_id).storage_paths
+    except Exception:
+        # Sin lista de activos solo deduplicamos dentro del propio documento.
+        logging.exception("⚠️ No se pudieron cargar documentos activos para dedup de %s", client_id)
+        active_paths = frozenset()
+
+    kept, signatures, report = dedup_chunks(
+        chunks,
+        document=document,
+        index=load_signature_index(persist_dir),
+        active_storage_paths=active_paths,
+    )
+    if report.kept_chunks < report.total_chunks:
+        logging.info(
+            "🧹 Dedup %s | %s: %s/%s chunks (exactos=%s, casi=%s)",
+            client_id,
+            document,
+            report.kept_chunks,
+            report.total_chunks,
+            report.exact_duplicates,
+            report.near_duplicates,
+        )
+    return kept, signatures, report
+
+
+def store_dedup_report(document_id: Optional[str], report: DedupReport, *, supabase_client: Any = None) -> None:
+    """Guarda el reporte en document_metadata.dedup_report (best-effort)."""
+    if not document_id:
+        return
+    client = supabase_client or supabase
+    try:
+        client.table("document_metadata").update({"dedup_report": report.as_dict()}).eq(
+            "id", str(document_id)
+        ).execute()
+    except Exception as exc:
+        msg = str(exc).lower()
+        if "dedup_report" in msg and ("does not exist" in msg or "could not find" in msg):
+            logging.warning("⚠️ document_metadata.dedup_report no existe; aplica la migración de dedup")
+            return
+        logging.exception("⚠️ No se pudo guardar el reporte de dedup para %s", document_id)
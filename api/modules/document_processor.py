@@ -1,26 +1,44 @@
 import gc
 import logging
+import multiprocessing
 import os
 import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import xml.etree.ElementTree as ET
 import zipfile
 
 import requests
 from langchain_community.document_loaders import (
-    PyPDFLoader,
     TextLoader,
     PyPDFium2Loader
 )
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from pypdf import PdfReader
-from api.modules.chroma_indexer import save_to_chroma
+from api.modules.chroma_indexer import EMBEDDING_MODEL, save_to_chroma, tenant_sidecar_dir
+from api.modules.chunk_dedup import append_signatures, dedup_for_ingest, store_dedup_report
+from api.modules.index_manifest import record_indexed_document
+from api.modules.vector_layout import VECTORSTORE_LAYOUT
 
 
 MAX_PDF_PAGES = int(os.getenv("EVOLVIAN_MAX_PDF_PAGES") or "400")
 MAX_DOCUMENT_CHARS = int(os.getenv("EVOLVIAN_MAX_DOCUMENT_CHARS") or "1200000")
 MAX_DOCUMENT_CHUNKS = int(os.getenv("EVOLVIAN_MAX_DOCUMENT_CHUNKS") or "2000")
 
+# Extracción de PDF por rangos de páginas en un process pool.
+PDF_EXTRACT_WORKERS = int(os.getenv("EVOLVIAN_PDF_EXTRACT_WORKERS") or str(min(4, os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("EVOLVIAN_PDF_PAGES_PER_TASK") or "20")
+# Por debajo de esto el costo de levantar procesos no compensa.
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("EVOLVIAN_PDF_PARALLEL_MIN_PAGES") or "40")
+
+# Un solo pool por proceso, creado al primer PDF grande. "spawn" evita hacer fork
+# de un uvicorn con hilos (locks heredados tomados → deadlock en el hijo).
+_pdf_pool: ProcessPoolExecutor | None = None
+_pdf_pool_lock = threading.Lock()
+
 
 class DocumentProcessingError(Exception):
     """Base class for document ingestion failures."""
@@ -45,45 +63,199 @@ def _guess_temp_suffix(file_url: str, content_type: str) -> str:
     return ".bin"
 
 
-def load_pdf_with_fallback(file_path: str):
+def _pdfium_page_text(file_path: str, page_index: int, state: dict) -> str:
+    """Fallback por página con pypdfium2 (otro parser, mejor con fuentes raras)."""
+    if "pdfium" not in state:
+        try:
+            import pypdfium2 as pdfium
+
+            state["pdfium"] = pdfium.PdfDocument(file_path)
+        except Exception as error:
+            logging.warning("⚠️ pypdfium2 no disponible para fallback por página: %s", error)
+            state["pdfium"] = None
+    document = state.get("pdfium")
+    if document is None:
+        return ""
+    textpage = document[page_index].get_textpage()
+    try:
+        return textpage.get_text_range() or ""
+    finally:
+        textpage.close()
+
+
+def _extract_pdf_page_range(file_path: str, start: int, end: int) -> list[tuple[int, str, str]]:
     """
-    Intenta cargar un PDF con diferentes loaders hasta encontrar texto válido.
-    Evita PDFs escaneados o vacíos.
+    Extrae [start, end) con pypdf; las páginas sin texto se reintentan con
+    pypdfium2. Corre dentro del process pool, por eso es de nivel módulo.
     """
+    reader = PdfReader(file_path)
+    state: dict = {}
+    pages = []
     try:
-        page_count = len(PdfReader(file_path).pages)
-        if MAX_PDF_PAGES > 0 and page_count > MAX_PDF_PAGES:
-            raise DocumentTooLargeError(
-                f"❌ El documento excede el límite seguro de páginas ({page_count} > {MAX_PDF_PAGES})."
+        for index in range(start, end):
+            text, extractor = "", "pypdf"
+            try:
+                text = reader.pages[index].extract_text() or ""
+            except Exception as error:
+                logging.warning("⚠️ pypdf falló en la página %s: %s", index + 1, error)
+
+            if not text.strip():
+                try:
+                    text, extractor = _pdfium_page_text(file_path, index, state), "pypdfium2"
+                except Exception as error:
+                    logging.warning("⚠️ pypdfium2 falló en la página %s: %s", index + 1, error)
+            pages.append((index, text, extractor))
+    finally:
+        if state.get("pdfium") is not None:
+            state["pdfium"].close()
+    return pages
+
+
+def _count_pdf_pages(file_path: str) -> int:
+    page_count = len(PdfReader(file_path).pages)
+    if MAX_PDF_PAGES > 0 and page_count > MAX_PDF_PAGES:
+        raise DocumentTooLargeError(
+            f"❌ El documento excede el límite seguro de páginas ({page_count} > {MAX_PDF_PAGES})."
+        )
+    return page_count
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=max(1, PDF_EXTRACT_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
             )
-    except DocumentTooLargeError:
-        raise
-    except Exception as error:
-        logging.warning("⚠️ No se pudo inspeccionar el PDF antes de cargarlo: %s", error)
+        return _pdf_pool
 
-    loaders = [
-        ("PyPDFLoader", PyPDFLoader(file_path)),
-        ("PyPDFium2Loader", PyPDFium2Loader(file_path)),
-    ]
 
-    for name, loader in loaders:
-        try:
-            docs = loader.load()
-            total_text = sum(len(doc.page_content.strip()) for doc in docs)
+def _discard_pdf_pool(pool: ProcessPoolExecutor) -> None:
+    """Descarta un pool roto (un worker murió) para que el siguiente upload cree otro."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is pool:
+            _pdf_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pdf_extract_pool() -> None:
+    """Cierra el pool de extracción; se llama en el shutdown de la app."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        pool, _pdf_pool = _pdf_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
 
-            logging.info(
-                f"🔍 Loader {name} -> {len(docs)} páginas, "
-                f"{total_text} caracteres extraídos"
+
+def _iter_page_batches(file_path: str, page_count: int):
+    ranges = [
+        (start, min(start + PDF_PAGES_PER_TASK, page_count))
+        for start in range(0, page_count, max(1, PDF_PAGES_PER_TASK))
+    ]
+    workers = min(PDF_EXTRACT_WORKERS, len(ranges))
+
+    if workers <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+        for start, end in ranges:
+            yield _extract_pdf_page_range(file_path, start, end)
+        return
+
+    # Ventana deslizante: como mucho 2 rangos por worker en vuelo, se consumen
+    # en orden → memoria acotada aunque el PDF tenga cientos de páginas.
+    executor = _get_pdf_pool()
+    pending = deque()
+    remaining = iter(ranges)
+    try:
+        for start, end in remaining:
+            pending.append(executor.submit(_extract_pdf_page_range, file_path, start, end))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            batch = pending.popleft().result()
+            next_range = next(remaining, None)
+            if next_range:
+                pending.append(executor.submit(_extract_pdf_page_range, file_path, *next_range))
+            yield batch
+    except BrokenProcessPool:
+        _discard_pdf_pool(executor)
+        raise
+    finally:
+        # El pool es compartido: solo se cancelan los rangos de este documento y
+        # se espera a los que ya corren, para no dejar trabajo huérfano.
+        for future in pending:
+            future.cancel()
+        for future in pending:
+            if not future.cancelled():
+                try:
+                    future.result()
+                except Exception:
+                    pass
+
+
+def iter_pdf_pages(file_path: str):
+    """
+    Páginas del PDF en orden, extraídas en paralelo y con fallback por página.
+    Aplica MAX_DOCUMENT_CHARS mientras avanza y aborta en cuanto se excede.
+    """
+    page_count = _count_pdf_pages(file_path)
+    total_chars = 0
+    fallback_pages = 0
+
+    for batch in _iter_page_batches(file_path, page_count):
+        for index, text, extractor in batch:
+            total_chars += len(text.strip())
+            if MAX_DOCUMENT_CHARS > 0 and total_chars > MAX_DOCUMENT_CHARS:
+                raise DocumentTooLargeError(
+                    f"❌ El documento excede el límite seguro de texto extraído ({total_chars} > {MAX_DOCUMENT_CHARS})."
+                )
+            fallback_pages += extractor != "pypdf"
+            yield Document(
+                page_content=text,
+                metadata={"source": file_path, "page": index, "total_pages": page_count},
             )
 
-            if total_text > 0:
-                logging.info(f"✅ Usando {name} para este PDF")
-                return docs
+    logging.info(
+        "🔍 PDF extraído -> %s páginas, %s caracteres (%s con fallback pypdfium2)",
+        page_count,
+        total_chars,
+        fallback_pages,
+    )
+    if total_chars == 0:
+        raise DocumentExtractionError("❌ No se pudo extraer texto del PDF con ningún loader")
+
 
-        except Exception as e:
-            logging.warning(f"⚠️ Error con {name}: {e}")
+def _load_pdf_whole_document(file_path: str):
+    """Último recurso si pypdf ni siquiera puede abrir el archivo."""
+    docs = PyPDFium2Loader(file_path).load()
+    if not sum(len(doc.page_content.strip()) for doc in docs):
+        raise DocumentExtractionError("❌ No se pudo extraer texto del PDF con ningún loader")
+    logging.info("✅ Usando PyPDFium2Loader para este PDF (%s páginas)", len(docs))
+    return docs
+
+
+def _iter_pdf_documents(file_path: str):
+    try:
+        pages = iter_pdf_pages(file_path)
+        first = next(pages, None)
+    except (DocumentTooLargeError, DocumentExtractionError):
+        raise
+    except Exception as error:
+        logging.warning("⚠️ pypdf no pudo abrir el PDF, usando PyPDFium2Loader: %s", error)
+        yield from _load_pdf_whole_document(file_path)
+        return
 
-    raise DocumentExtractionError("❌ No se pudo extraer texto del PDF con ningún loader")
+    if first is not None:
+        yield first
+    yield from pages
+
+
+def load_pdf_with_fallback(file_path: str):
+    """
+    Intenta cargar un PDF con diferentes loaders hasta encontrar texto válido.
+    Evita PDFs escaneados o vacíos.
+    """
+    return list(_iter_pdf_documents(file_path))
 
 
 def load_docx_with_fallback(file_path: str):
@@ -151,11 +323,75 @@ def _enforce_chunk_limit(chunks) -> None:
         )
 
 
+def _is_pdf(hint: str, content_type: str) -> bool:
+    return ".pdf" in hint or "pdf" in content_type
+
+
+def load_document(file_path: str, file_url: str = "", content_type: str = ""):
+    """
+    Carga un archivo local (PDF, DOCX o texto) con los mismos loaders de la ingesta.
+    El tipo se decide por la URL original / content-type; si no hay, por el path.
+    """
+    hint = (file_url or file_path or "").lower()
+    content_type = (content_type or "").lower()
+
+    if _is_pdf(hint, content_type):
+        docs = load_pdf_with_fallback(file_path)
+    elif ".docx" in hint or "wordprocessingml.document" in content_type:
+        docs = load_docx_with_fallback(file_path)
+    else:
+        loader = TextLoader(file_path, encoding="utf-8")
+        docs = loader.load()
+
+    logging.info(f"📄 Documento cargado: {len(docs)} páginas/secciones")
+    _enforce_document_limits(docs)
+    return docs
+
+
+def _new_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=500,
+        chunk_overlap=50
+    )
+
+
+def split_into_chunks(docs):
+    chunks = _new_splitter().split_documents(docs)
+    logging.info(f"🧠 Documento dividido en {len(chunks)} chunks")
+    _enforce_chunk_limit(chunks)
+    return chunks
+
+
+def iter_document_chunks(file_path: str, file_url: str = "", content_type: str = ""):
+    """
+    Chunks del documento a medida que se extraen. Los PDFs se dividen página a
+    página (mismo resultado que split_documents sobre la lista de páginas), sin
+    retener el texto de todas las páginas; los límites se aplican en streaming.
+    """
+    hint = (file_url or file_path or "").lower()
+    if not _is_pdf(hint, (content_type or "").lower()):
+        yield from split_into_chunks(load_document(file_path, file_url=file_url, content_type=content_type))
+        return
+
+    splitter = _new_splitter()
+    chunk_count = 0
+    for page in _iter_pdf_documents(file_path):
+        for chunk in splitter.split_documents([page]):
+            chunk_count += 1
+            if MAX_DOCUMENT_CHUNKS > 0 and chunk_count > MAX_DOCUMENT_CHUNKS:
+                raise DocumentTooLargeError(
+                    f"❌ El documento genera demasiados chunks para indexar de forma segura ({chunk_count} > {MAX_DOCUMENT_CHUNKS})."
+                )
+            yield chunk
+    logging.info(f"🧠 Documento dividido en {chunk_count} chunks")
+
+
 def process_file(
     file_url: str,
     client_id: str,
     storage_path: str | None = None,
     return_chunks: bool = True,
+    document_id: str | None = None,
 ):
     """
     Descarga un archivo desde Supabase, lo procesa, divide en chunks
@@ -163,7 +399,6 @@ def process_file(
     """
     response = None
     tmp_file_path = None
-    docs = None
     chunks = None
 
     try:
@@ -186,35 +421,9 @@ def process_file(
             tmp_file_path = tmp_file.name
 
         # --------------------------------------------------
-        # 📄 Carga del documento
+        # 📄 Carga + ✂️ chunking en streaming
         # --------------------------------------------------
-        if ".pdf" in file_url.lower() or "pdf" in content_type.lower():
-            docs = load_pdf_with_fallback(tmp_file_path)
-        elif ".docx" in file_url.lower() or "wordprocessingml.document" in content_type.lower():
-            docs = load_docx_with_fallback(tmp_file_path)
-        else:
-            loader = TextLoader(tmp_file_path, encoding="utf-8")
-            docs = loader.load()
-
-        logging.info(f"📄 Documento cargado: {len(docs)} páginas/secciones")
-        _enforce_document_limits(docs)
-
-        for i, doc in enumerate(docs[:5]):
-            logging.info(
-                f"Página {i + 1} -> {len(doc.page_content.strip())} caracteres"
-            )
-
-        # --------------------------------------------------
-        # ✂️ Chunking
-        # --------------------------------------------------
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=50
-        )
-
-        chunks = splitter.split_documents(docs)
-        logging.info(f"🧠 Documento dividido en {len(chunks)} chunks")
-        _enforce_chunk_limit(chunks)
+        chunks = list(iter_document_chunks(tmp_file_path, file_url=file_url, content_type=content_type))
 
         # --------------------------------------------------
         # 🔐 Blindaje multi-tenant + trazabilidad por archivo
@@ -222,15 +431,48 @@ def process_file(
         for chunk in chunks:
             chunk.metadata = chunk.metadata or {}
             chunk.metadata["client_id"] = client_id
+            if document_id:
+                # Marca de versión: document_metadata.id de la generación indexada.
+                chunk.metadata["document_id"] = str(document_id)
             if storage_path:
                 chunk.metadata["storage_path"] = storage_path
                 # Normalizamos "source" para facilitar depuración y filtros.
                 chunk.metadata["source"] = storage_path
 
+        # --------------------------------------------------
+        # 🧹 Dedup (headers, footers, boilerplate, versiones re-subidas)
+        # --------------------------------------------------
+        persist_dir = tenant_sidecar_dir(client_id)
+        chunks, signatures, dedup_report = dedup_for_ingest(
+            chunks,
+            client_id,
+            persist_dir=persist_dir,
+            document=str(document_id or storage_path or file_url),
+        )
+
         # --------------------------------------------------
         # 💾 Guardar en Chroma (indexer intacto)
         # --------------------------------------------------
         save_to_chroma(chunks, client_id)
+        append_signatures(signatures, persist_dir)
+        store_dedup_report(document_id, dedup_report)
+
+        # --------------------------------------------------
+        # 🧾 Manifest del índice (auditoría / listado sin recorrer disco)
+        # --------------------------------------------------
+        try:
+            record_indexed_document(
+                client_id,
+                sidecar_dir=persist_dir,
+                storage_path=storage_path or file_url,
+                document_id=document_id,
+                chunks=chunks,
+                embedding_model=EMBEDDING_MODEL,
+                layout=VECTORSTORE_LAYOUT,
+                dedup=dedup_report.as_dict(),
+            )
+        except Exception:
+            logging.exception("⚠️ No se pudo actualizar el manifest del índice para %s", client_id)
 
         if return_chunks:
             return chunks
@@ -246,7 +488,6 @@ def process_file(
                 response.close()
             except Exception:
                 logging.warning("⚠️ Could not close streamed response cleanly")
-        docs = None
         chunks = None
         gc.collect()
         if tmp_file_path and os.path.exists(tmp_file_path):
@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, Query, Request
 from fastapi.responses import RedirectResponse
 from api.modules.assistant_rag.supabase_client import supabase
 from api.authz import authorize_client_request
+from api.utils.dashboard_snapshot import invalidate_dashboard_snapshot
 
 router = APIRouter(prefix="/disconnect_gmail", tags=["Email Automation"])
 
@@ -45,6 +46,7 @@ async def disconnect_gmail(request: Request, client_id: str = Query(..., descrip
         )
 
         count_deleted = len(delete_resp.data or [])
+        invalidate_dashboard_snapshot(client_id, reason="gmail_disconnected")
         print(f"✅ {count_deleted} canal(es) Gmail eliminados completamente.")
 
         # ------------------------------------------------------
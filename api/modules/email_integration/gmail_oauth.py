@@ -23,6 +23,7 @@ from api.compliance.email_policy import (
 from api.compliance.email_marketing_standard import ensure_marketing_footer
 from api.modules.assistant_rag.supabase_client import supabase
 from api.authz import authorize_client_request
+from api.utils.dashboard_snapshot import invalidate_dashboard_snapshot
 
 router = APIRouter(prefix="/gmail_oauth", tags=["Gmail OAuth"])
 
@@ -318,6 +319,7 @@ async def oauth_callback(request: Request):
                 **payload_common,
             })
 
+        invalidate_dashboard_snapshot(client_id, reason="gmail_connected")
         print(f"✅ Canal Gmail sincronizado correctamente ({email})")
 
         total_time = time.time() - t0
@@ -1,10 +1,13 @@
 # api/modules/email/gmail_poll.py
 import os
 import time
-import json
-import requests
+import asyncio
+from dataclasses import dataclass
+from threading import Lock
 from typing import List, Dict, Any, Optional
 
+import httpx
+
 from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
 
@@ -15,7 +18,7 @@ from google.auth.transport import requests as google_requests
 
 from api.modules.assistant_rag.supabase_client import supabase
 from api.internal_auth import require_internal_request
-from api.utils.effective_plan import resolve_effective_plan_id
+from api.utils.effective_plan import resolve_effective_plan_ids
 
 router = APIRouter(prefix="/gmail_poll", tags=["Gmail Automation"])
 
@@ -32,7 +35,21 @@ SCOPES = ["https://mail.google.com/"]  # scope único y estable
 
 MAX_RETRIES = 3          # reintentos al enviar webhook
 TIMEOUT_SECONDS = 60     # timeout por petición webhook
-SLEEP_BETWEEN = 1        # pausa entre canales (suavizar carga)
+RETRY_BACKOFF_SECONDS = 2  # backoff base (exponencial) entre reintentos del webhook
+
+ELIGIBLE_PLANS = {"premium", "white_label"}
+
+# Scheduling adaptativo: el worker llama cada minuto y solo se consultan los
+# canales vencidos. Con correo activo el intervalo vuelve al mínimo; en reposo
+# se duplica hasta el máximo.
+POLL_CONCURRENCY = max(1, int(os.getenv("GMAIL_POLL_CONCURRENCY") or "8"))
+MIN_POLL_INTERVAL_SECONDS = max(1, int(os.getenv("GMAIL_POLL_MIN_INTERVAL_SECONDS") or "60"))
+MAX_POLL_INTERVAL_SECONDS = max(
+    MIN_POLL_INTERVAL_SECONDS,
+    int(os.getenv("GMAIL_POLL_MAX_INTERVAL_SECONDS") or "900"),
+)
+QUOTA_BACKOFF_SECONDS = max(1, int(os.getenv("GMAIL_POLL_QUOTA_BACKOFF_SECONDS") or "300"))
+QUOTA_ERROR_REASONS = {"ratelimitexceeded", "userratelimitexceeded", "quotaexceeded"}
 
 # ------------------------------------------------------------
 # 🔐 OAuth helpers
@@ -113,32 +130,174 @@ def _extract_latest_history_id(changes: List[Dict[str, Any]]) -> Optional[str]:
     ids = [int(c["id"]) for c in changes if c.get("id")]
     return str(max(ids)) if ids else None
 
+def extract_added_message_ids(changes: List[Dict[str, Any]]) -> List[str]:
+    """Ids (sin duplicados, en orden) de los mensajes añadidos al INBOX en el delta."""
+    seen: Dict[str, None] = {}
+    for change in changes:
+        for added in change.get("messagesAdded", []) or []:
+            message = added.get("message") or {}
+            msg_id = message.get("id")
+            if msg_id and "INBOX" in (message.get("labelIds") or ["INBOX"]):
+                seen.setdefault(str(msg_id), None)
+    return list(seen)
+
+# ------------------------------------------------------------
+# 🗓️ Scheduling por canal + cuota por cuenta
+# ------------------------------------------------------------
+@dataclass
+class _ChannelSchedule:
+    interval: float = MIN_POLL_INTERVAL_SECONDS
+    next_poll_at: float = 0.0
+
+
+_SCHEDULES: Dict[str, _ChannelSchedule] = {}
+_ACCOUNT_BACKOFF_UNTIL: Dict[str, float] = {}
+_SCHEDULE_LOCK = Lock()
+
+
+def _account_key(ch: dict) -> str:
+    return str(ch.get("value") or ch.get("id") or "").strip().lower()
+
+
+def _is_due(ch: dict, now: float) -> bool:
+    with _SCHEDULE_LOCK:
+        if _ACCOUNT_BACKOFF_UNTIL.get(_account_key(ch), 0.0) > now:
+            return False
+        schedule = _SCHEDULES.get(str(ch["id"]))
+        return schedule is None or schedule.next_poll_at <= now
+
+
+def _record_poll_result(channel_id: str, *, changed: bool, now: float) -> float:
+    """Reprograma el canal: mínimo si hubo cambios, doble del anterior si no."""
+    with _SCHEDULE_LOCK:
+        schedule = _SCHEDULES.setdefault(str(channel_id), _ChannelSchedule())
+        if changed:
+            schedule.interval = MIN_POLL_INTERVAL_SECONDS
+        else:
+            schedule.interval = min(schedule.interval * 2, MAX_POLL_INTERVAL_SECONDS)
+        schedule.next_poll_at = now + schedule.interval
+        return schedule.interval
+
+
+def _record_quota_exhausted(account: str, *, retry_after: Optional[float], now: float) -> float:
+    wait = retry_after if retry_after and retry_after > 0 else QUOTA_BACKOFF_SECONDS
+    with _SCHEDULE_LOCK:
+        _ACCOUNT_BACKOFF_UNTIL[account] = max(_ACCOUNT_BACKOFF_UNTIL.get(account, 0.0), now + wait)
+    return wait
+
+
+def _quota_retry_after(he: HttpError) -> Optional[float]:
+    """Devuelve el Retry-After (o 0) si el error es de cuota de Gmail; None si no lo es."""
+    status = getattr(he.resp, "status", None)
+    reasons = set()
+    try:
+        for detail in getattr(he, "error_details", None) or []:
+            if isinstance(detail, dict) and detail.get("reason"):
+                reasons.add(str(detail["reason"]).lower())
+    except Exception:
+        pass
+    if status != 429 and not (status == 403 and reasons & QUOTA_ERROR_REASONS):
+        return None
+    try:
+        return float(he.resp.get("retry-after") or 0)
+    except Exception:
+        return 0.0
+
+
 # ------------------------------------------------------------
 # 📬 Webhook dispatcher
 # ------------------------------------------------------------
-def _send_webhook(email: str, history_id: Optional[str]):
-    """Envía 1 webhook por canal con el último historyId (si hay cambios)."""
-    payload = {"email": email}
+async def _send_webhook(email: str, history_id: Optional[str], message_ids: Optional[List[str]] = None):
+    """Envía 1 webhook por canal con el último historyId y los mensajes nuevos del delta."""
+    payload: Dict[str, Any] = {"email": email}
     if history_id:
         payload["historyId"] = str(history_id)
+    if message_ids:
+        payload["messageIds"] = list(message_ids)
 
     headers = {"Content-Type": "application/json"}
     if WEBHOOK_SECRET:
         headers["X-Evolvian-Signature"] = WEBHOOK_SECRET
 
-    for attempt in range(1, MAX_RETRIES + 1):
+    async with httpx.AsyncClient(timeout=TIMEOUT_SECONDS) as client:
+        for attempt in range(1, MAX_RETRIES + 1):
+            try:
+                resp = await client.post(WEBHOOK_URL, json=payload, headers=headers)
+                if resp.status_code == 200:
+                    print(f"✅ Webhook → {email} (historyId={history_id})")
+                    return True
+                else:
+                    print(f"⚠️ Intento {attempt}/{MAX_RETRIES} → {resp.status_code}: {resp.text[:200]}")
+            except Exception as e:
+                print(f"⚠️ Error intento {attempt}/{MAX_RETRIES} para {email}: {e}")
+            if attempt < MAX_RETRIES:
+                await asyncio.sleep(RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1)))
+    return False
+
+# ------------------------------------------------------------
+# 🔁 Poll por canal
+# ------------------------------------------------------------
+def _poll_channel_sync(ch: dict) -> Optional[tuple]:
+    """
+    Lee cambios de Gmail para un canal (bloqueante; corre en un thread).
+    Devuelve (último historyId, ids de mensajes nuevos) si hubo cambios, None si no.
+    """
+    email = ch.get("value")
+    service = _build_service(ch)
+
+    try:
+        start_id = _get_or_bootstrap_history_id(service, ch)
+        changes = _list_history_changes(service, start_id)
+    except HttpError as he:
+        # Si el startHistoryId es viejo (410/404), re-bootstrap y vuelve a intentar una sola vez
+        if he.resp.status in (404, 410):
+            print(f"♻️ startHistoryId inválido para {email}, re-bootstrap…")
+            start_id = _get_or_bootstrap_history_id(service, {"id": ch["id"], "value": email})
+            changes = _list_history_changes(service, start_id)
+        else:
+            raise
+
+    if not changes:
+        print(f"🟢 {email}: sin cambios desde historyId={start_id}.")
+        return None
+
+    latest_history_id = _extract_latest_history_id(changes)
+    if latest_history_id:
+        _persist_last_history_id(ch["id"], latest_history_id)
+    return latest_history_id, extract_added_message_ids(changes)
+
+
+async def _poll_channel(ch: dict, semaphore: asyncio.Semaphore, account_lock: asyncio.Lock) -> str:
+    email = ch.get("value")
+    account = _account_key(ch)
+
+    # Una sola petición en vuelo por cuenta de Gmail (la cuota es por usuario).
+    async with account_lock:
+        if _ACCOUNT_BACKOFF_UNTIL.get(account, 0.0) > time.monotonic():
+            return "deferred"
         try:
-            resp = requests.post(WEBHOOK_URL, json=payload, headers=headers, timeout=TIMEOUT_SECONDS)
-            if resp.status_code == 200:
-                print(f"✅ Webhook → {email} (historyId={history_id})")
-                return True
-            else:
-                print(f"⚠️ Intento {attempt}/{MAX_RETRIES} → {resp.status_code}: {resp.text[:200]}")
+            async with semaphore:
+                delta = await asyncio.to_thread(_poll_channel_sync, ch)
+        except HttpError as he:
+            retry_after = _quota_retry_after(he)
+            if retry_after is None:
+                print(f"🔥 Error procesando {email}: {he}")
+                _record_poll_result(ch["id"], changed=False, now=time.monotonic())
+                return "error"
+            wait = _record_quota_exhausted(account, retry_after=retry_after, now=time.monotonic())
+            print(f"⏳ Cuota Gmail agotada para {email}; pausa de {int(wait)}s")
+            return "quota"
         except Exception as e:
-            print(f"⚠️ Error intento {attempt}/{MAX_RETRIES} para {email}: {e}")
-        if attempt < MAX_RETRIES:
-            time.sleep(2)
-    return False
+            print(f"🔥 Error procesando {email}: {e}")
+            _record_poll_result(ch["id"], changed=False, now=time.monotonic())
+            return "error"
+
+    latest_history_id, message_ids = delta or (None, [])
+    _record_poll_result(ch["id"], changed=bool(message_ids), now=time.monotonic())
+    if message_ids:
+        # 4) Dispara 1 webhook por canal con el delta completo (no solo el último mensaje)
+        await _send_webhook(email, latest_history_id, message_ids)
+    return "processed"
 
 # ------------------------------------------------------------
 # 🚀 Poll principal (para CRON)
@@ -147,6 +306,8 @@ def _send_webhook(email: str, history_id: Optional[str]):
 async def check_new_emails(request: Request):
     """
     Revisa cambios en Gmail por cliente usando historyId.
+    - Canales en paralelo (acotado) y nunca dos a la vez por cuenta.
+    - Solo canales vencidos según su intervalo adaptativo.
     - Un webhook por canal cuando hay nuevos cambios.
     - Resiliente a startHistoryId expirado: re-bootstrap.
     """
@@ -168,65 +329,40 @@ async def check_new_emails(request: Request):
             print("⚠️ No hay canales Gmail activos.")
             return {"status": "ok", "checked": [], "message": "Sin canales activos"}
 
-        # 2) Filtra por plan (Premium/White Label)
-        eligible_plans = {"premium", "white_label"}
-        plan_map = {}  # cache por client_id
-        processed, skipped = [], []
+        # 2) Filtra por plan (Premium/White Label) en una sola resolución en bloque
+        plan_map = await asyncio.to_thread(
+            resolve_effective_plan_ids,
+            [ch.get("client_id") for ch in channels],
+            supabase_client=supabase,
+        )
+        skipped, deferred, due = [], [], []
+        now = time.monotonic()
 
         for ch in channels:
             email = ch.get("value")
-            client_id = ch.get("client_id")
-
-            if client_id not in plan_map:
-                cs = supabase.table("client_settings").select("plan_id").eq("client_id", client_id).maybe_single().execute()
-                base_plan_id = (cs.data or {}).get("plan_id", "")
-                plan_map[client_id] = resolve_effective_plan_id(
-                    client_id,
-                    base_plan_id=base_plan_id,
-                    supabase_client=supabase,
-                )
-            plan = (plan_map[client_id] or "").strip().lower()
-
-            if plan not in eligible_plans:
+            plan = (plan_map.get(str(ch.get("client_id"))) or "").strip().lower()
+            if plan not in ELIGIBLE_PLANS:
                 print(f"🟡 {email}: plan '{plan}' no elegible.")
                 skipped.append(email)
-                continue
+            elif not _is_due(ch, now):
+                deferred.append(email)
+            else:
+                due.append(ch)
 
-            # 3) Servicio Gmail + history list
-            try:
-                service = _build_service(ch)
-
-                try:
-                    start_id = _get_or_bootstrap_history_id(service, ch)
-                    changes = _list_history_changes(service, start_id)
-                except HttpError as he:
-                    # Si el startHistoryId es viejo (410/404), re-bootstrap y vuelve a intentar una sola vez
-                    if he.resp.status in (404, 410):
-                        print(f"♻️ startHistoryId inválido para {email}, re-bootstrap…")
-                        start_id = _get_or_bootstrap_history_id(service, {"id": ch["id"], "value": email})
-                        changes = _list_history_changes(service, start_id)
-                    else:
-                        raise
-
-                if not changes:
-                    print(f"🟢 {email}: sin cambios desde historyId={start_id}.")
-                    processed.append(email)
-                    time.sleep(SLEEP_BETWEEN)
-                    continue
-
-                latest_history_id = _extract_latest_history_id(changes)
-                if latest_history_id:
-                    _persist_last_history_id(ch["id"], latest_history_id)
-
-                # 4) Dispara 1 webhook por canal con el último historyId
-                _send_webhook(email, latest_history_id)
-                processed.append(email)
-                time.sleep(SLEEP_BETWEEN)
+        # 3) Servicio Gmail + history list, en paralelo
+        semaphore = asyncio.Semaphore(POLL_CONCURRENCY)
+        account_locks: Dict[str, asyncio.Lock] = {}
+        outcomes = await asyncio.gather(
+            *(
+                _poll_channel(ch, semaphore, account_locks.setdefault(_account_key(ch), asyncio.Lock()))
+                for ch in due
+            )
+        )
 
-            except Exception as e:
-                print(f"🔥 Error procesando {email}: {e}")
+        processed = [ch.get("value") for ch, outcome in zip(due, outcomes) if outcome == "processed"]
+        deferred.extend(ch.get("value") for ch, outcome in zip(due, outcomes) if outcome in ("quota", "deferred"))
 
-        return JSONResponse({"status": "ok", "processed": processed, "skipped": skipped})
+        return JSONResponse({"status": "ok", "processed": processed, "skipped": skipped, "deferred": deferred})
 
     except Exception as e:
         print(f"💥 Error global gmail_poll/check: {e}")
@@ -9,6 +9,7 @@ from email.mime.text import MIMEText
 
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import JSONResponse
+from googleapiclient.errors import HttpError
 
 from api.compliance.email_policy import (
     begin_email_send_audit,
@@ -32,6 +33,15 @@ router = APIRouter(
 socket.setdefaulttimeout(10)
 WEBHOOK_SECRET = os.getenv("GMAIL_WEBHOOK_SECRET", "")  # opcional
 
+GMAIL_BATCH_SIZE = 50  # límite recomendado por Gmail para batch requests
+FALLBACK_MAX_MESSAGES = max(1, int(os.getenv("GMAIL_WEBHOOK_FALLBACK_MAX_MESSAGES") or "10"))
+MAX_REPLY_INPUT_CHARS = 4000
+METADATA_HEADERS = ["From", "To", "Subject", "Message-Id"]
+BLOCKED_SENDER_KEYWORDS = [
+    "no-reply", "noreply", "mailer-daemon", "newsletter", "bounce",
+    "alert@", "salesforce", "marketing", "crm", "ads@", "updates@"
+]
+
 def _parse_payload(body: dict):
     """
     Admite 2 formatos:
@@ -80,11 +90,12 @@ async def gmail_webhook(request: Request):
         email_address, history_id = _parse_payload(body)
         if not email_address:
             raise HTTPException(status_code=400, detail="email/emailAddress faltante en payload")
+        message_ids = [str(m) for m in (body.get("messageIds") or []) if m]
 
-        print(f"📩 Webhook recibido para {email_address} | historyId={history_id}")
+        print(f"📩 Webhook recibido para {email_address} | historyId={history_id} | messages={len(message_ids)}")
 
         # ✅ responder ya y trabajar en background
-        asyncio.create_task(process_gmail_message(email_address, history_id))
+        asyncio.create_task(process_gmail_message(email_address, history_id, message_ids))
         return JSONResponse(status_code=200, content={"status": "accepted"})
 
     except HTTPException:
@@ -94,17 +105,210 @@ async def gmail_webhook(request: Request):
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
+# -------------------------------------------------------------
+# 📦 Lectura en bloque de Gmail
+# -------------------------------------------------------------
+def _list_history_message_ids(service, start_history_id: str) -> tuple[list[str], str | None]:
+    """
+    Push de Pub/Sub (solo historyId): mensajes agregados desde el historyId
+    guardado del canal, paginando history.list. Devuelve (ids, historyId actual).
+    """
+    ids: list[str] = []
+    seen: set[str] = set()
+    latest = None
+    token = None
+    while True:
+        resp = service.users().history().list(
+            userId="me",
+            startHistoryId=str(start_history_id),
+            historyTypes=["messageAdded"],
+            pageToken=token,
+            maxResults=500,
+        ).execute()
+        latest = resp.get("historyId") or latest
+        for entry in resp.get("history", []) or []:
+            for added in entry.get("messagesAdded", []) or []:
+                msg_id = (added.get("message") or {}).get("id")
+                if msg_id and msg_id not in seen:
+                    seen.add(msg_id)
+                    ids.append(msg_id)
+        token = resp.get("nextPageToken")
+        if not token:
+            return ids, str(latest) if latest else None
+
+
+def _save_last_history_id(channel_id: str | None, history_id: str | None) -> None:
+    if not channel_id or not history_id:
+        return
+    try:
+        supabase.table("channels").update({"gmail_last_history_id": str(history_id)}).eq("id", channel_id).execute()
+    except Exception as e:
+        print(f"⚠️ Error guardando gmail_last_history_id: {e}")
+
+
+def _list_fallback_message_ids(service) -> list[str]:
+    """historyId guardado ausente o vencido (404/410): últimos UNREAD del INBOX."""
+    messages_resp = service.users().messages().list(
+        userId="me",
+        labelIds=["INBOX", "UNREAD"],
+        maxResults=FALLBACK_MAX_MESSAGES,
+    ).execute()
+    return [m["id"] for m in messages_resp.get("messages", []) or [] if m.get("id")]
+
+
+def _batch_get_messages(service, message_ids: list[str], fmt: str) -> dict[str, dict]:
+    """messages.get en batch requests de hasta GMAIL_BATCH_SIZE (un round-trip por lote)."""
+    results: dict[str, dict] = {}
+
+    def _collect(request_id, response, exception):
+        if exception is not None:
+            print(f"⚠️ Error leyendo mensaje Gmail {request_id}: {exception}")
+            return
+        if isinstance(response, dict):
+            results[request_id] = response
+
+    for start in range(0, len(message_ids), GMAIL_BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=_collect)
+        for msg_id in message_ids[start:start + GMAIL_BATCH_SIZE]:
+            kwargs = {"userId": "me", "id": msg_id, "format": fmt}
+            if fmt == "metadata":
+                kwargs["metadataHeaders"] = METADATA_HEADERS
+            batch.add(service.users().messages().get(**kwargs), request_id=msg_id)
+        batch.execute()
+    return results
+
+
+def _message_headers(msg_data: dict) -> dict:
+    return {h["name"].lower(): h["value"] for h in msg_data.get("payload", {}).get("headers", [])}
+
+
+def _extract_plain_text(payload: dict) -> str:
+    """Primer text/plain del mensaje (formato full), decodificado."""
+    if not isinstance(payload, dict):
+        return ""
+    if payload.get("mimeType") == "text/plain":
+        data = (payload.get("body") or {}).get("data")
+        if data:
+            try:
+                return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4)).decode("utf-8", errors="ignore")
+            except Exception:
+                return ""
+    for part in payload.get("parts", []) or []:
+        text = _extract_plain_text(part)
+        if text:
+            return text
+    return ""
+
+
+def _already_processed(message_ids: list[str]) -> set[str]:
+    """Dedupe en una sola consulta para todo el delta."""
+    if not message_ids:
+        return set()
+    try:
+        existing = (
+            supabase.table("gmail_processed")
+            .select("message_id")
+            .in_("message_id", message_ids)
+            .execute()
+        )
+        return {row.get("message_id") for row in existing.data or [] if row.get("message_id")}
+    except Exception as e:
+        print(f"⚠️ Error verificando duplicados gmail_processed: {e}")
+        return set()
+
+
+def _claim_message(client_id: str, candidate: dict, history_id: str | None) -> bool:
+    """
+    Registra el mensaje en gmail_processed ANTES de responder (insert que ignora
+    duplicados por message_id). Solo quien inserta la fila responde: pushes
+    solapados o reintentos no duplican la respuesta.
+    """
+    try:
+        res = (
+            supabase.table("gmail_processed")
+            .upsert(
+                {
+                    "client_id": client_id,
+                    "message_id": candidate["message_id"],  # UNIQUE en tu schema
+                    "history_id": history_id,
+                    "from_email": candidate["from_email"],
+                    "processed_at": datetime.utcnow().isoformat(),
+                },
+                on_conflict="message_id",
+                ignore_duplicates=True,
+            )
+            .execute()
+        )
+    except Exception as e:
+        print(f"⚠️ Error reclamando mensaje en gmail_processed ({candidate['message_id']}): {e}")
+        return False
+    return bool(res.data)
+
+
+def _read_delta_messages(service, message_ids: list[str], assigned_email: str | None) -> list[dict]:
+    """
+    Metadata en batch → filtros + dedupe → full en batch solo para los que
+    requieren respuesta. Devuelve candidatos en orden cronológico.
+    """
+    metadata = _batch_get_messages(service, message_ids, "metadata")
+
+    candidates = []
+    for msg_id, msg_data in metadata.items():
+        headers = _message_headers(msg_data)
+        from_email = parseaddr(headers.get("from", ""))[1]
+        to_email = parseaddr(headers.get("to", ""))[1]
+        labels = msg_data.get("labelIds", []) or []
+
+        if from_email and any(kw in from_email.lower() for kw in BLOCKED_SENDER_KEYWORDS):
+            print(f"🚫 Ignorado remitente automático: {from_email}")
+            continue
+        if to_email and assigned_email and to_email.lower() != assigned_email.lower():
+            print(f"🚫 Ignorado: destinatario incorrecto ({to_email})")
+            continue
+        if "INBOX" not in labels:
+            print(f"🚫 Ignorado: fuera de INBOX ({labels})")
+            continue
+
+        candidates.append({
+            "msg_id": msg_id,
+            "from_email": from_email,
+            "subject": headers.get("subject", "Sin asunto"),
+            # Fallback de message-id (evitar choque con UNIQUE global)
+            "message_id": headers.get("message-id", "") or f"fallback-{msg_id}",
+            "thread_id": msg_data.get("threadId"),
+            "snippet": msg_data.get("snippet", ""),
+            "labels": labels,
+            "internal_date": int(msg_data.get("internalDate") or 0),
+        })
+
+    processed = _already_processed([c["message_id"] for c in candidates])
+    for c in candidates:
+        if c["message_id"] in processed:
+            print(f"⚠️ Duplicado detectado ({c['message_id']}), se omite.")
+    candidates = [c for c in candidates if c["message_id"] not in processed]
+
+    full = _batch_get_messages(service, [c["msg_id"] for c in candidates], "full")
+    for c in candidates:
+        body_text = _extract_plain_text((full.get(c["msg_id"]) or {}).get("payload") or {}).strip()
+        c["text"] = body_text[:MAX_REPLY_INPUT_CHARS] or c["snippet"]
+
+    return sorted(candidates, key=lambda c: c["internal_date"])
+
+
 # -------------------------------------------------------------
 # 🔧 Procesamiento en segundo plano (Background Task real)
 # -------------------------------------------------------------
-async def process_gmail_message(email_address: str, history_id: str | None):
+async def process_gmail_message(email_address: str, history_id: str | None, message_ids: list[str] | None = None):
     try:
         print(f"⚙️ Iniciando procesamiento async para {email_address}")
 
         # 1️⃣ Buscar canal Gmail activo
         channel_resp = (
             supabase.table("channels")
-            .select("id, client_id, value, provider, type, gmail_access_token, gmail_refresh_token, gmail_expiry, active, scope, token_uri")
+            .select(
+                "id, client_id, value, provider, type, gmail_access_token, gmail_refresh_token, gmail_expiry, "
+                "gmail_last_history_id, active, scope, token_uri"
+            )
             .eq("type", "email")
             .eq("provider", "gmail")  # ✅ importante
             .eq("value", email_address)
@@ -124,181 +328,152 @@ async def process_gmail_message(email_address: str, history_id: str | None):
         # 2️⃣ Crear servicio Gmail (sin cache, con refresh interno)
         service = get_gmail_service(channel)
 
-        # 3️⃣ Obtener el último mensaje reciente (prioriza UNREAD; si no hay, toma 1 más reciente)
-        try:
-            messages_resp = service.users().messages().list(
-                userId="me",
-                labelIds=["INBOX", "UNREAD"],
-                maxResults=1
-            ).execute()
-            messages = messages_resp.get("messages", [])
-            if not messages:
-                messages_resp = service.users().messages().list(
-                    userId="me",
-                    labelIds=["INBOX"],
-                    maxResults=1
-                ).execute()
-                messages = messages_resp.get("messages", [])
-        except Exception as e:
-            print(f"⚠️ Error listando mensajes Gmail: {e}")
-            return
-
-        if not messages:
-            print("ℹ️ No hay mensajes nuevos o INBOX vacío.")
-            return
-
-        msg_id = messages[0]["id"]
-        msg_data = service.users().messages().get(userId="me", id=msg_id, format="full").execute()
-
-        headers = {h["name"].lower(): h["value"] for h in msg_data.get("payload", {}).get("headers", [])}
-        from_email = parseaddr(headers.get("from", ""))[1]
-        to_email = parseaddr(headers.get("to", ""))[1]
-        subject = headers.get("subject", "Sin asunto")
-        message_id = headers.get("message-id", "")  # header Message-Id
-        thread_id = msg_data.get("threadId")
-        snippet = msg_data.get("snippet", "")
-        labels = msg_data.get("labelIds", []) or []
-
-        # Fallback de message-id (evitar choque con UNIQUE global)
-        if not message_id:
-            message_id = f"fallback-{msg_id}"
-
-        print(f"✉️ Nuevo correo de {from_email} | Asunto: {subject}")
-
-        # 4️⃣ Detección de duplicados
+        # 3️⃣ Mensajes del delta: ids del payload, o history.list desde el historyId
+        # guardado; UNREAD recientes solo si ese historyId falta o ya no es válido.
+        next_history_id = None
         try:
-            existing = supabase.table("gmail_processed").select("id").eq("message_id", message_id).execute()
-            if existing.data:
-                print(f"⚠️ Duplicado detectado ({message_id}), se omite.")
-                return
+            if not message_ids:
+                next_history_id = history_id
+                start_history_id = channel.get("gmail_last_history_id")
+                use_fallback = not start_history_id
+                if start_history_id:
+                    try:
+                        message_ids, latest = await asyncio.to_thread(
+                            _list_history_message_ids, service, start_history_id
+                        )
+                        next_history_id = latest or history_id
+                    except HttpError as e:
+                        # Gmail responde 404/410 si el startHistoryId es muy antiguo
+                        if e.resp.status not in (404, 410):
+                            raise
+                        print(f"♻️ startHistoryId inválido para {assigned_email} ({start_history_id}); UNREAD recientes")
+                        use_fallback = True
+                if use_fallback:
+                    message_ids = await asyncio.to_thread(_list_fallback_message_ids, service)
+                if not message_ids:
+                    _save_last_history_id(channel.get("id"), next_history_id)
+                    print("ℹ️ No hay mensajes nuevos o INBOX vacío.")
+                    return
+            candidates = await asyncio.to_thread(_read_delta_messages, service, message_ids, assigned_email)
         except Exception as e:
-            print(f"⚠️ Error verificando duplicados gmail_processed: {e}")
-
-        # 5️⃣ Filtros básicos
-        blocked_keywords = [
-            "no-reply", "noreply", "mailer-daemon", "newsletter", "bounce",
-            "alert@", "salesforce", "marketing", "crm", "ads@", "updates@"
-        ]
-        if from_email and any(kw in from_email.lower() for kw in blocked_keywords):
-            print(f"🚫 Ignorado remitente automático: {from_email}")
-            return
-
-        if to_email and assigned_email and to_email.lower() != assigned_email.lower():
-            print(f"🚫 Ignorado: destinatario incorrecto ({to_email})")
+            print(f"⚠️ Error leyendo mensajes Gmail: {e}")
             return
 
-        if "INBOX" not in labels:
-            print(f"🚫 Ignorado: fuera de INBOX ({labels})")
-            return
+        print(f"📨 Delta Gmail: {len(message_ids)} ids → {len(candidates)} por responder")
 
-        # 6️⃣ Detectar hilo (thread)
+        read_ids = []
         try:
-            threads = (
-                service.users().threads().list(
-                    userId="me",
-                    q=f"from:{from_email} subject:\"{subject}\"",
-                    maxResults=1
-                ).execute().get("threads", [])
-            )
-            target_thread_id = threads[0]["id"] if threads else thread_id
-        except Exception as e:
-            print(f"⚠️ Error detectando hilo: {e}")
-            target_thread_id = thread_id
+            for candidate in candidates:
+                from_email = candidate["from_email"]
+                subject = candidate["subject"]
+                message_id = candidate["message_id"]
+                thread_id = candidate["thread_id"]
+
+                # 5️⃣ Reclamar antes de responder: si otro push ya lo tomó, se omite
+                if not await asyncio.to_thread(_claim_message, client_id, candidate, history_id):
+                    print(f"⚠️ Mensaje ya reclamado o sin registrar ({message_id}), se omite.")
+                    continue
+                if "UNREAD" in candidate["labels"]:
+                    read_ids.append(candidate["msg_id"])
+                print(f"✉️ Nuevo correo de {from_email} | Asunto: {subject}")
+
+                # 6️⃣ Detectar hilo (thread)
+                try:
+                    threads = (
+                        service.users().threads().list(
+                            userId="me",
+                            q=f"from:{from_email} subject:\"{subject}\"",
+                            maxResults=1
+                        ).execute().get("threads", [])
+                    )
+                    target_thread_id = threads[0]["id"] if threads else thread_id
+                except Exception as e:
+                    print(f"⚠️ Error detectando hilo: {e}")
+                    target_thread_id = thread_id
 
-        # 7️⃣ Ejecutar pipeline RAG Evolvian (con timeout)
-        try:
-            result = await asyncio.wait_for(
-                process_chat_email_payload(
-                    {
-                        "from_email": email_address,
-                        "subject": subject,
-                        "message": snippet,
-                        "provider": "gmail",
-                    }
-                ),
-                timeout=30,
-            )
-            no_reply = bool(result.get("no_reply"))
-            answer = str(result.get("answer") or "").strip()
-            if no_reply:
-                print("🤫 Respuesta automática suprimida por política de autorespuesta institucional.")
-        except asyncio.TimeoutError:
-            print("⏱️ chat_email excedió 30s, respuesta por defecto.")
-            no_reply = False
-            answer = "Gracias por tu mensaje. Pronto te responderemos."
-        except Exception as e:
-            print(f"⚠️ Error ejecutando chat_email: {e}")
-            no_reply = False
-            answer = "Gracias por tu mensaje. Pronto te responderemos."
-
-        # 8️⃣ Construir y enviar respuesta (MIMEText + headers de hilo)
-        if not no_reply and answer:
-            reply = MIMEText(answer, _subtype="plain", _charset="utf-8")
-            reply["To"] = from_email
-            reply["From"] = assigned_email or email_address  # correo del canal
-            reply["Subject"] = subject if subject.lower().startswith("re:") else f"Re: {subject}"
-            reply["In-Reply-To"] = message_id
-            reply["References"] = message_id
-
-            raw_b64 = base64.urlsafe_b64encode(reply.as_bytes()).decode("utf-8")
-            reply_body = {"raw": raw_b64, "threadId": target_thread_id}
-
-            allowed, policy = begin_email_send_audit(
-                client_id=client_id,
-                to_email=from_email,
-                purpose="transactional",
-                source="gmail_webhook_auto_reply",
-                source_id=message_id,
-            )
-            if allowed:
+                # 7️⃣ Ejecutar pipeline RAG Evolvian (con timeout)
                 try:
-                    send_result = service.users().messages().send(userId="me", body=reply_body).execute()
-                    complete_email_send_audit(
-                        client_id=client_id,
-                        policy_result=policy,
-                        success=True,
-                        provider_message_id=(send_result or {}).get("id")
-                        if isinstance(send_result, dict)
-                        else None,
+                    result = await asyncio.wait_for(
+                        process_chat_email_payload(
+                            {
+                                "from_email": email_address,
+                                "subject": subject,
+                                "message": candidate["text"],
+                                "provider": "gmail",
+                            }
+                        ),
+                        timeout=30,
                     )
-                    print(f"✅ Respuesta enviada a {from_email} (hilo {target_thread_id})")
+                    no_reply = bool(result.get("no_reply"))
+                    answer = str(result.get("answer") or "").strip()
+                    if no_reply:
+                        print("🤫 Respuesta automática suprimida por política de autorespuesta institucional.")
+                except asyncio.TimeoutError:
+                    print("⏱️ chat_email excedió 30s, respuesta por defecto.")
+                    no_reply = False
+                    answer = "Gracias por tu mensaje. Pronto te responderemos."
                 except Exception as e:
-                    complete_email_send_audit(
+                    print(f"⚠️ Error ejecutando chat_email: {e}")
+                    no_reply = False
+                    answer = "Gracias por tu mensaje. Pronto te responderemos."
+
+                # 8️⃣ Construir y enviar respuesta (MIMEText + headers de hilo)
+                if not no_reply and answer:
+                    reply = MIMEText(answer, _subtype="plain", _charset="utf-8")
+                    reply["To"] = from_email
+                    reply["From"] = assigned_email or email_address  # correo del canal
+                    reply["Subject"] = subject if subject.lower().startswith("re:") else f"Re: {subject}"
+                    reply["In-Reply-To"] = message_id
+                    reply["References"] = message_id
+
+                    raw_b64 = base64.urlsafe_b64encode(reply.as_bytes()).decode("utf-8")
+                    reply_body = {"raw": raw_b64, "threadId": target_thread_id}
+
+                    allowed, policy = begin_email_send_audit(
                         client_id=client_id,
-                        policy_result=policy,
-                        success=False,
-                        send_error="gmail_send_exception",
+                        to_email=from_email,
+                        purpose="transactional",
+                        source="gmail_webhook_auto_reply",
+                        source_id=message_id,
                     )
-                    print(f"⚠️ Error enviando respuesta Gmail: {e}")
-            else:
-                print(f"⛔ Respuesta bloqueada por política outbound. to={from_email} proof={policy.get('proof_id')}")
-        else:
-            print("ℹ️ No se envía respuesta Gmail para este mensaje.")
-
-        # 9️⃣ Marcar como leído (si correspondía)
-        try:
-            if "UNREAD" in labels:
-                service.users().messages().modify(
-                    userId="me",
-                    id=msg_id,
-                    body={"removeLabelIds": ["UNREAD"]}
-                ).execute()
-                print(f"📬 Marcado como leído: {msg_id}")
-        except Exception as e:
-            print(f"⚠️ Error marcando mensaje leído: {e}")
-
-        # 🔟 Registrar como procesado
-        try:
-            supabase.table("gmail_processed").insert({
-                "client_id": client_id,
-                "message_id": message_id,  # UNIQUE en tu schema
-                "history_id": history_id,
-                "from_email": from_email,
-                "processed_at": datetime.utcnow().isoformat()
-            }).execute()
-            print(f"✅ Mensaje registrado correctamente: {message_id}")
-        except Exception as e:
-            print(f"⚠️ Error insertando en gmail_processed: {e}")
+                    if allowed:
+                        try:
+                            send_result = service.users().messages().send(userId="me", body=reply_body).execute()
+                            complete_email_send_audit(
+                                client_id=client_id,
+                                policy_result=policy,
+                                success=True,
+                                provider_message_id=(send_result or {}).get("id")
+                                if isinstance(send_result, dict)
+                                else None,
+                            )
+                            print(f"✅ Respuesta enviada a {from_email} (hilo {target_thread_id})")
+                        except Exception as e:
+                            complete_email_send_audit(
+                                client_id=client_id,
+                                policy_result=policy,
+                                success=False,
+                                send_error="gmail_send_exception",
+                            )
+                            print(f"⚠️ Error enviando respuesta Gmail: {e}")
+                    else:
+                        print(f"⛔ Respuesta bloqueada por política outbound. to={from_email} proof={policy.get('proof_id')}")
+                else:
+                    print("ℹ️ No se envía respuesta Gmail para este mensaje.")
+        finally:
+            # 9️⃣ Marcar como leídos en una sola llamada (también si el lote se corta)
+            try:
+                if read_ids:
+                    service.users().messages().batchModify(
+                        userId="me",
+                        body={"ids": read_ids, "removeLabelIds": ["UNREAD"]}
+                    ).execute()
+                    print(f"📬 Marcados como leídos: {len(read_ids)}")
+            except Exception as e:
+                print(f"⚠️ Error marcando mensajes leídos: {e}")
+            # 🔟 Avanzar el historyId del canal: el próximo push lista desde aquí
+            _save_last_history_id(channel.get("id"), next_history_id)
 
     except Exception as e:
         print(f"🔥 Error en proceso Gmail: {e}")
+
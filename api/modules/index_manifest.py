@@ -0,0 +1,162 @@
+# api/modules/index_manifest.py
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Any, List, Optional
+
+from langchain.schema import Document
+
+
+MANIFEST_FILENAME = "index_manifest.json"
+MANIFEST_VERSION = 1
+CHUNK_PREVIEW_CHARS = 120
+
+_WRITE_LOCK = Lock()
+
+
+def manifest_path(sidecar_dir: str) -> str:
+    return os.path.join(sidecar_dir, MANIFEST_FILENAME)
+
+
+def _chunk_hash(text: str) -> str:
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()[:16]
+
+
+def content_hash(chunks: List[Document]) -> str:
+    """Hash del contenido indexado del documento (orden de chunks incluido)."""
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(_chunk_hash(chunk.page_content).encode("ascii"))
+    return digest.hexdigest()
+
+
+def load_manifest(sidecar_dir: str) -> Optional[dict]:
+    """Manifest del tenant, o None si no existe / está corrupto (tenant legacy)."""
+    try:
+        with open(manifest_path(sidecar_dir), encoding="utf-8") as handle:
+            manifest = json.load(handle)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logging.exception("⚠️ Manifest ilegible en %s", sidecar_dir)
+        return None
+    return manifest if isinstance(manifest, dict) else None
+
+
+def _write_atomic(path: str, payload: dict) -> None:
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".manifest-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            json.dump(payload, handle, ensure_ascii=False)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def record_indexed_document(
+    client_id: str,
+    *,
+    sidecar_dir: str,
+    storage_path: str,
+    document_id: Optional[str],
+    chunks: List[Document],
+    embedding_model: str,
+    layout: str = "",
+    dedup: Optional[dict] = None,
+) -> dict:
+    """
+    Registra (reemplaza) la entrada del documento en el manifest del tenant.
+    Escritura atómica: tmp + os.replace en el mismo directorio.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    entry = {
+        "document_id": str(document_id) if document_id else None,
+        "chunk_count": len(chunks),
+        "content_hash": content_hash(chunks),
+        "embedding_model": embedding_model,
+        "indexed_at": now,
+        "chunks": [
+            {
+                "index": index,
+                "page": (chunk.metadata or {}).get("page"),
+                "chars": len(chunk.page_content or ""),
+                "hash": _chunk_hash(chunk.page_content),
+                "preview": (chunk.page_content or "")[:CHUNK_PREVIEW_CHARS],
+            }
+            for index, chunk in enumerate(chunks)
+        ],
+    }
+    if dedup:
+        entry["dedup"] = {
+            key: dedup.get(key)
+            for key in ("total_chunks", "kept_chunks", "exact_duplicates", "near_duplicates")
+        }
+
+    with _WRITE_LOCK:
+        manifest = load_manifest(sidecar_dir) or {"version": MANIFEST_VERSION, "documents": {}}
+        manifest.update(
+            {
+                "client_id": client_id,
+                "embedding_model": embedding_model,
+                "layout": layout or manifest.get("layout") or "",
+                "updated_at": now,
+            }
+        )
+        manifest.setdefault("documents", {})[storage_path] = entry
+        manifest["total_chunks"] = sum(
+            int(doc.get("chunk_count") or 0) for doc in manifest["documents"].values()
+        )
+        _write_atomic(manifest_path(sidecar_dir), manifest)
+    return entry
+
+
+def compare_with_metadata(manifest: dict, active_rows: List[dict], *, embedding_model: str) -> dict:
+    """
+    Diferencias entre el manifest y las filas activas de document_metadata
+    (en memoria, sin tocar Chroma).
+    """
+    documents: dict[str, Any] = manifest.get("documents") or {}
+    active_by_path = {
+        str(row.get("storage_path") or "").strip(): str(row.get("id") or "")
+        for row in active_rows
+        if str(row.get("storage_path") or "").strip()
+    }
+
+    missing = sorted(path for path in active_by_path if path not in documents)
+    stale_versions = sorted(
+        path
+        for path, document_id in active_by_path.items()
+        if path in documents
+        and document_id
+        and documents[path].get("document_id")
+        and documents[path]["document_id"] != document_id
+    )
+    # Documentos desactivados cuyo vector sigue en el índice (filtrados en query).
+    inactive = sorted(path for path in documents if path not in active_by_path)
+    return {
+        "missing_documents": missing,
+        "stale_document_versions": stale_versions,
+        "inactive_documents_indexed": inactive,
+        "indexed_chunks": sum(
+            int((documents.get(path) or {}).get("chunk_count") or 0) for path in active_by_path
+        ),
+        "embedding_model_mismatch": any(
+            (documents[path].get("embedding_model") or manifest.get("embedding_model") or embedding_model)
+            != embedding_model
+            for path in active_by_path
+            if path in documents
+        ),
+    }
@@ -0,0 +1,187 @@
+# api/modules/lexical_index.py
+
+import json
+import logging
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from threading import Lock
+from typing import Iterable, List, Optional
+
+from langchain.schema import Document
+from api.utils.paths import get_base_data_path
+from api.modules.vector_layout import resolve_vector_location
+
+
+LEXICAL_INDEX_FILENAME = "lexical_index.jsonl"
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+
+# Tokens tipo SKU / precio / código: "ab-123", "1,500.00", "cp06700"
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.,\-/_][a-z0-9]+)*")
+STOPWORDS = {
+    "de", "la", "el", "los", "las", "un", "una", "que", "para", "por", "con",
+    "del", "al", "en", "y", "o", "se", "su", "sus", "es", "lo", "me", "mi",
+    "the", "a", "an", "and", "or", "is", "are", "of", "to", "in", "on", "for",
+    "with", "at", "by", "it", "do", "does", "what", "how", "my", "i",
+}
+
+_CACHE: dict = {}
+_CACHE_LOCK = Lock()
+
+
+def tokenize(text: str) -> List[str]:
+    normalized = unicodedata.normalize("NFKD", text or "")
+    without_marks = "".join(ch for ch in normalized if not unicodedata.combining(ch))
+    return _TOKEN_RE.findall(without_marks.lower())
+
+
+def content_terms(text: str) -> List[str]:
+    """Tokens sin stopwords (para cobertura de consultas por palabra clave)."""
+    return [tok for tok in tokenize(text) if tok not in STOPWORDS]
+
+
+def is_exact_token(token: str) -> bool:
+    """SKU, precio, código postal, clave de servicio… cualquier token con dígitos."""
+    return any(ch.isdigit() for ch in token)
+
+
+def lexical_index_path(client_id: str, persist_dir: Optional[str] = None) -> str:
+    persist_dir = persist_dir or resolve_vector_location(client_id, base_path=get_base_data_path()).sidecar_dir
+    return os.path.join(persist_dir, LEXICAL_INDEX_FILENAME)
+
+
+class LexicalIndex:
+    """Índice invertido BM25 en memoria sobre los chunks de un tenant."""
+
+    def __init__(self, entries: List[dict]):
+        self.documents: List[Document] = []
+        self.term_freqs: List[Counter] = []
+        self.postings: dict[str, List[int]] = {}
+        lengths = []
+
+        for entry in entries:
+            text = str(entry.get("text") or "")
+            tokens = tokenize(text)
+            if not tokens:
+                continue
+            doc_index = len(self.documents)
+            self.documents.append(Document(page_content=text, metadata=entry.get("metadata") or {}))
+            freqs = Counter(tokens)
+            self.term_freqs.append(freqs)
+            lengths.append(len(tokens))
+            for term in freqs:
+                self.postings.setdefault(term, []).append(doc_index)
+
+        self.lengths = lengths
+        self.avg_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+        total = len(self.documents)
+        self.idf = {
+            term: math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def search(
+        self,
+        query: str,
+        k: int = 20,
+        allowed_paths: Optional[Iterable[str]] = None,
+    ) -> List[tuple]:
+        """Top-k (Document, score) por BM25; solo documentos en allowed_paths si se indica."""
+        allowed = set(allowed_paths) if allowed_paths is not None else None
+        scores: dict[int, float] = {}
+
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_index in self.postings[term]:
+                tf = self.term_freqs[doc_index][term]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc_index] / (self.avg_length or 1.0))
+                scores[doc_index] = scores.get(doc_index, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        results = []
+        for doc_index, score in ranked:
+            doc = self.documents[doc_index]
+            if allowed is not None and str(doc.metadata.get("storage_path") or "").strip() not in allowed:
+                continue
+            results.append((doc, score))
+            if len(results) >= k:
+                break
+        return results
+
+
+def append_to_lexical_index(chunks: List[Document], client_id: str, persist_dir: Optional[str] = None) -> None:
+    """
+    Agrega chunks al índice léxico del tenant (JSONL junto al vectorstore).
+    Se borra y reconstruye junto con Chroma en cada reindex.
+    """
+    if not chunks or not client_id:
+        return
+
+    path = lexical_index_path(client_id, persist_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as handle:
+        for chunk in chunks:
+            text = (chunk.page_content or "").strip()
+            if not text:
+                continue
+            handle.write(json.dumps({"text": text, "metadata": chunk.metadata or {}}, ensure_ascii=False))
+            handle.write("\n")
+    logging.info("🔤 Índice léxico actualizado para %s (%s chunks)", client_id, len(chunks))
+
+
+def load_lexical_index(client_id: str, persist_dir: Optional[str] = None) -> Optional[LexicalIndex]:
+    """Carga (y cachea por mtime/tamaño) el índice BM25 del tenant; None si no existe."""
+    path = lexical_index_path(client_id, persist_dir)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _CACHE_LOCK:
+        cached = _CACHE.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+    entries = []
+    try:
+        with open(path, encoding="utf-8") as handle:
+            for line in handle:
+                line = line.strip()
+                if line:
+                    entries.append(json.loads(line))
+    except Exception:
+        logging.exception("⚠️ No se pudo leer el índice léxico de %s", client_id)
+        return None
+
+    index = LexicalIndex(entries)
+    with _CACHE_LOCK:
+        _CACHE[path] = (signature, index)
+    return index
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], k: int = RRF_K) -> List[Document]:
+    """Fusiona rankings (vector + léxico) por Reciprocal Rank Fusion."""
+    scores: dict[tuple, float] = {}
+    first_seen: dict[tuple, Document] = {}
+
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            key = (
+                str((doc.metadata or {}).get("storage_path") or ""),
+                (doc.page_content or "").strip(),
+            )
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+            first_seen.setdefault(key, doc)
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return [first_seen[key] for key, _score in ranked]
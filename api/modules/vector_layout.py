@@ -0,0 +1,142 @@
+# api/modules/vector_layout.py
+
+import hashlib
+import logging
+import os
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from api.utils.paths import get_base_data_path
+
+
+# "per_client": un directorio chroma_<client_id> por tenant (layout histórico).
+# "sharded": N shards compartidos, una colección por shard particionada por
+# metadata client_id; BM25 / firmas de dedup quedan en un directorio liviano
+# por tenant (sin SQLite ni segmentos HNSW).
+VECTORSTORE_LAYOUT = (os.getenv("EVOLVIAN_VECTORSTORE_LAYOUT") or "per_client").strip().lower()
+VECTORSTORE_SHARDS = max(1, int(os.getenv("EVOLVIAN_VECTORSTORE_SHARDS") or "16"))
+SHARDS_DIRNAME = "chroma_shards"
+TENANTS_DIRNAME = "tenants"
+SHARD_COLLECTION = "tenants"
+
+
+@dataclass(frozen=True)
+class VectorLocation:
+    client_id: str
+    layout: str
+    persist_dir: str
+    collection_name: str
+    # Archivos por tenant que viven junto al vectorstore (índice léxico, firmas).
+    sidecar_dir: str
+
+    @property
+    def sharded(self) -> bool:
+        return self.layout == "sharded"
+
+    def where(self, extra: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Filtro de Chroma; en shards siempre incluye el tenant."""
+        if not self.sharded:
+            return extra
+        tenant = {"client_id": self.client_id}
+        return {"$and": [tenant, extra]} if extra else tenant
+
+    def has_index(self) -> bool:
+        if not self.sharded:
+            return os.path.exists(self.persist_dir)
+        # El shard existe aunque el tenant no tenga chunks; el sidecar solo
+        # se crea al indexar.
+        try:
+            return any(Path(self.sidecar_dir).iterdir())
+        except FileNotFoundError:
+            return False
+        except Exception:
+            logging.exception("⚠️ Could not inspect vectorstore path %s", self.sidecar_dir)
+            return False
+
+
+def shard_for(client_id: str, shards: Optional[int] = None) -> int:
+    digest = hashlib.blake2b(str(client_id).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % (shards or VECTORSTORE_SHARDS)
+
+
+def shard_dir(shard: int, base_path: Optional[str] = None) -> str:
+    return os.path.join(base_path or get_base_data_path(), SHARDS_DIRNAME, f"shard_{shard:03d}")
+
+
+def per_client_location(client_id: str, base_path: Optional[str] = None) -> VectorLocation:
+    persist_dir = os.path.join(base_path or get_base_data_path(), f"chroma_{client_id}")
+    return VectorLocation(
+        client_id=client_id,
+        layout="per_client",
+        persist_dir=persist_dir,
+        collection_name=client_id,
+        sidecar_dir=persist_dir,
+    )
+
+
+def sharded_location(client_id: str, base_path: Optional[str] = None) -> VectorLocation:
+    base_path = base_path or get_base_data_path()
+    return VectorLocation(
+        client_id=client_id,
+        layout="sharded",
+        persist_dir=shard_dir(shard_for(client_id), base_path),
+        collection_name=SHARD_COLLECTION,
+        sidecar_dir=os.path.join(base_path, SHARDS_DIRNAME, TENANTS_DIRNAME, client_id),
+    )
+
+
+def resolve_vector_location(client_id: str, *, base_path: Optional[str] = None) -> VectorLocation:
+    if VECTORSTORE_LAYOUT == "sharded":
+        return sharded_location(client_id, base_path)
+    return per_client_location(client_id, base_path)
+
+
+def legacy_chroma_paths(client_id: str, base_path: Optional[str] = None) -> List[Path]:
+    """Directorios por tenant (vigente + legacy) que pueden existir en disco."""
+    return [
+        Path(base_path or get_base_data_path()) / f"chroma_{client_id}",
+        Path(f"./chroma_{client_id}"),
+        Path("chroma_db") / client_id,
+    ]
+
+
+def _delete_from_shard(location: VectorLocation) -> bool:
+    if not os.path.isdir(location.persist_dir):
+        return False
+    import chromadb
+
+    client = chromadb.PersistentClient(path=location.persist_dir)
+    try:
+        collection = client.get_collection(location.collection_name)
+    except Exception:
+        return False
+    collection.delete(where={"client_id": location.client_id})
+    return True
+
+
+def clear_tenant_vectors(client_id: str, *, base_path: Optional[str] = None) -> List[str]:
+    """
+    Borra todo lo indexado del tenant: directorios por cliente (vigente y
+    legacy), su partición en el shard y el sidecar. Devuelve lo que limpió.
+    """
+    cleared: List[str] = []
+    sharded = sharded_location(client_id, base_path)
+    candidates = legacy_chroma_paths(client_id, base_path) + [Path(sharded.sidecar_dir)]
+
+    for path in candidates:
+        try:
+            if path.exists():
+                shutil.rmtree(path)
+                cleared.append(str(path))
+        except Exception:
+            logging.exception("⚠️ Failed to remove vectorstore path %s for client %s", path, client_id)
+
+    try:
+        if _delete_from_shard(sharded):
+            cleared.append(f"{sharded.persist_dir}#client_id={client_id}")
+    except Exception:
+        logging.exception("⚠️ Failed to delete shard vectors for client %s", client_id)
+
+    return cleared
@@ -0,0 +1,275 @@
+"""
+Ingesta de callbacks de estado de Meta (sent / delivered / read / failed) para
+destinatarios de campañas.
+
+Los callbacks se acumulan por provider_message_id durante una ventana corta y
+solo se aplica la última transición de cada mensaje: una lectura de
+destinatarios por lote, un upsert masivo y un insert masivo de eventos.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any, Iterable, Optional
+
+from api.config.config import supabase
+
+
+logger = logging.getLogger(__name__)
+
+# Orden de transiciones: un callback tardío de menor rango no pisa uno mayor.
+META_STATUS_RANK = {
+    "sent": 1,
+    "delivered": 2,
+    "read": 3,
+    "failed": 4,
+    "undelivered": 4,
+}
+META_FAILED_STATUSES = {"failed", "undelivered"}
+
+STATUS_INGEST_MAX_PENDING = 500
+STATUS_INGEST_LOOKUP_CHUNK_SIZE = 120
+STATUS_INGEST_WRITE_CHUNK_SIZE = 500
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def status_window_seconds() -> float:
+    # 0 desactiva la ventana: cada payload se aplica al llegar (ya coalescido).
+    return max(0, _env_int("EVOLVIAN_META_STATUS_WINDOW_MS", 1500)) / 1000.0
+
+
+def _chunked(values: list, size: int):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def compact_meta_status_error(status_item: dict) -> Optional[str]:
+    errors = status_item.get("errors")
+    if not isinstance(errors, list) or not errors:
+        return None
+    first = errors[0] if isinstance(errors[0], dict) else {}
+    code = str(first.get("code") or "").strip()
+    title = str(first.get("title") or "").strip()
+    message = str(first.get("message") or "").strip()
+    parts = [part for part in [code, title, message] if part]
+    return " | ".join(parts) if parts else None
+
+
+def _callback_status(status_item: dict) -> str:
+    return str(status_item.get("status") or "").strip().lower() or "unknown"
+
+
+def _callback_order(status_item: dict) -> tuple[int, int]:
+    try:
+        timestamp = int(str(status_item.get("timestamp") or "0").strip() or 0)
+    except Exception:
+        timestamp = 0
+    return META_STATUS_RANK.get(_callback_status(status_item), 0), timestamp
+
+
+def coalesce_status_callbacks(
+    items: Iterable[Any],
+    pending: Optional[dict[str, dict]] = None,
+) -> dict[str, dict]:
+    """Última transición por provider_message_id (rango de estado, luego timestamp)."""
+    latest = pending if pending is not None else {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        provider_message_id = str(item.get("id") or "").strip()
+        if not provider_message_id:
+            continue
+        current = latest.get(provider_message_id)
+        if current is None or _callback_order(item) >= _callback_order(current):
+            latest[provider_message_id] = item
+    return latest
+
+
+def _load_recipients_by_message_id(db: Any, message_ids: list[str]) -> list[dict[str, Any]]:
+    rows: list[dict[str, Any]] = []
+    for chunk in _chunked(sorted(message_ids), STATUS_INGEST_LOOKUP_CHUNK_SIZE):
+        rows.extend(
+            (
+                db.table("marketing_campaign_recipients")
+                .select("id,client_id,campaign_id,recipient_key,provider_message_id")
+                .eq("provider", "meta")
+                .in_("provider_message_id", chunk)
+                .execute()
+            ).data
+            or []
+        )
+    return rows
+
+
+def _write_recipient_updates(db: Any, updates: list[dict[str, Any]]) -> None:
+    # PostgREST exige llaves homogéneas en bulk: fallos (con send_status) y el resto van por separado.
+    failed = [row for row in updates if "send_status" in row]
+    touched = [row for row in updates if "send_status" not in row]
+    for group in (failed, touched):
+        for chunk in _chunked(group, STATUS_INGEST_WRITE_CHUNK_SIZE):
+            try:
+                db.table("marketing_campaign_recipients").upsert(chunk, on_conflict="campaign_id,recipient_key").execute()
+                continue
+            except Exception:
+                logger.exception("❌ Bulk recipient upsert failed for Meta status callbacks | rows=%s", len(chunk))
+            # Respaldo fila por fila para no perder el lote completo.
+            for row in chunk:
+                try:
+                    payload = {key: row[key] for key in ("send_status", "send_error", "updated_at") if key in row}
+                    db.table("marketing_campaign_recipients").update(payload).eq("id", row["id"]).execute()
+                except Exception:
+                    logger.exception(
+                        "❌ Failed updating marketing recipient from Meta status callback | recipient_id=%s",
+                        row.get("id"),
+                    )
+
+
+def _write_status_events(db: Any, events: list[dict[str, Any]]) -> None:
+    for chunk in _chunked(events, STATUS_INGEST_WRITE_CHUNK_SIZE):
+        try:
+            db.table("marketing_campaign_events").insert(chunk).execute()
+        except Exception:
+            logger.exception("❌ Failed writing marketing events from Meta status callbacks | rows=%s", len(chunk))
+
+
+def apply_status_callbacks(items: Iterable[Any], *, supabase_client: Any = None) -> int:
+    """
+    Aplica los callbacks (ya coalescidos o no) a marketing_campaign_recipients y
+    registra un evento meta_<status> por destinatario. Devuelve filas tocadas.
+    """
+    db = supabase_client or supabase
+    latest = coalesce_status_callbacks(items)
+    if not latest:
+        return 0
+
+    try:
+        rows = _load_recipients_by_message_id(db, list(latest))
+    except Exception:
+        logger.exception(
+            "❌ Failed loading marketing recipients for Meta status callbacks | messages=%s",
+            len(latest),
+        )
+        return 0
+
+    updated_at = datetime.now(timezone.utc).isoformat()
+    updates: list[dict[str, Any]] = []
+    events: list[dict[str, Any]] = []
+    for row in rows:
+        recipient_id = str((row or {}).get("id") or "").strip()
+        provider_message_id = str((row or {}).get("provider_message_id") or "").strip()
+        status_item = latest.get(provider_message_id)
+        if not recipient_id or not status_item:
+            continue
+
+        callback_status = _callback_status(status_item)
+        error_text = compact_meta_status_error(status_item)
+        update = {
+            "id": recipient_id,
+            "client_id": row.get("client_id"),
+            "campaign_id": row.get("campaign_id"),
+            "recipient_key": row.get("recipient_key"),
+            "updated_at": updated_at,
+        }
+        # Solo un fallo cambia send_status; sent/delivered/read no pisan lo que haya escrito el envío.
+        if callback_status in META_FAILED_STATUSES:
+            update["send_status"] = "failed"
+            update["send_error"] = error_text or f"meta_status:{callback_status}"
+        updates.append(update)
+        events.append(
+            {
+                "client_id": row.get("client_id"),
+                "campaign_id": row.get("campaign_id"),
+                "recipient_key": row.get("recipient_key"),
+                "event_type": f"meta_{callback_status}",
+                "metadata": {
+                    "provider_message_id": provider_message_id,
+                    "callback_status": callback_status,
+                    "error": error_text,
+                },
+                "created_at": updated_at,
+            }
+        )
+
+    if updates:
+        _write_recipient_updates(db, updates)
+    if events:
+        _write_status_events(db, events)
+    return len(updates)
+
+
+class MetaStatusBuffer:
+    """
+    Buffer por proceso: acumula callbacks y programa un flush tras la ventana.
+    Se vacía de inmediato si se llena (STATUS_INGEST_MAX_PENDING mensajes) o si
+    llega un fallo: Meta no reenvía tras el 200, así que un failed/undelivered
+    no se deja esperando en memoria. Al apagar la app se llama a flush().
+    """
+
+    def __init__(self, *, supabase_client: Any = None, max_pending: int = STATUS_INGEST_MAX_PENDING):
+        self.supabase_client = supabase_client
+        self.max_pending = max_pending
+        self._pending: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def add(self, items: Iterable[Any]) -> int:
+        with self._lock:
+            coalesce_status_callbacks(items, self._pending)
+            return len(self._pending)
+
+    def drain(self) -> list[dict]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return list(pending.values())
+
+    async def submit(self, items: Iterable[Any]) -> None:
+        items = list(items or [])
+        pending_count = self.add(items)
+        if not pending_count:
+            return
+        has_failure = any(
+            isinstance(item, dict) and _callback_status(item) in META_FAILED_STATUSES for item in items
+        )
+        window = status_window_seconds()
+        if window <= 0 or has_failure or pending_count >= self.max_pending:
+            await self.flush()
+            return
+        loop = asyncio.get_running_loop()
+        task = self._flush_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._flush_task = loop.create_task(self._flush_after(window))
+
+    async def _flush_after(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        await self.flush()
+
+    async def flush(self) -> int:
+        items = self.drain()
+        if not items:
+            return 0
+        try:
+            return await asyncio.to_thread(apply_status_callbacks, items, supabase_client=self.supabase_client)
+        except Exception:
+            logger.exception("❌ Meta status callback flush failed | messages=%s", len(items))
+            return 0
+
+
+_status_buffer = MetaStatusBuffer()
+
+
+async def submit_meta_status_callbacks(items: Iterable[Any]) -> None:
+    await _status_buffer.submit(items)
+
+
+async def flush_meta_status_callbacks() -> int:
+    return await _status_buffer.flush()
@@ -0,0 +1,337 @@
+"""
+Registro de media para headers de plantillas de WhatsApp.
+
+Cada imagen se identifica por (WABA, sha256 del contenido): el handle que Meta
+devuelve al subirla se reutiliza mientras no expire, aunque la misma imagen se
+use en muchas plantillas o llegue por URLs distintas. Las descargas se hacen por
+chunks a un archivo temporal (sin cargar todo en memoria) y las subidas
+concurrentes del mismo asset se agrupan en una sola.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import mimetypes
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import IO, Any, Callable, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from api.config.config import supabase
+
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_MEDIA_TABLE = "whatsapp_template_media"
+TEMPLATE_MEDIA_MAX_BYTES = 5 * 1024 * 1024
+TEMPLATE_MEDIA_CHUNK_BYTES = 64 * 1024
+# Hasta este tamaño el archivo temporal vive en memoria; arriba pasa a disco.
+TEMPLATE_MEDIA_SPOOL_BYTES = 512 * 1024
+TEMPLATE_MEDIA_HTTP_TIMEOUT_SECONDS = 18
+# Margen para no entregar un handle que expire mientras Meta revisa la plantilla.
+TEMPLATE_MEDIA_EXPIRY_MARGIN_SECONDS = 3600
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def handle_ttl_seconds() -> int:
+    return max(TEMPLATE_MEDIA_EXPIRY_MARGIN_SECONDS + 60, _env_int("META_TEMPLATE_MEDIA_HANDLE_TTL_SECONDS", 24 * 3600))
+
+
+@dataclass
+class HeaderMedia:
+    file: IO[bytes]
+    sha256: str
+    length: int
+    mime_type: str
+    file_name: str
+    source_etag: Optional[str] = None
+
+    def close(self) -> None:
+        try:
+            self.file.close()
+        except Exception:
+            pass
+
+
+def _normalize_mime_type(content_type: str, file_name: str) -> str:
+    content_type = str(content_type or "").split(";")[0].strip().lower()
+    if not content_type:
+        guessed, _ = mimetypes.guess_type(file_name)
+        content_type = str(guessed or "").strip().lower()
+    if content_type not in {"image/jpeg", "image/jpg", "image/png"}:
+        # Normalize jpg alias and reject unsupported mime upfront.
+        if content_type == "image/pjpeg":
+            content_type = "image/jpeg"
+        elif content_type in {"image/webp", "image/gif"}:
+            raise ValueError(f"unsupported_image_type:{content_type}")
+        elif not content_type:
+            content_type = "image/jpeg"
+    if content_type == "image/jpg":
+        content_type = "image/jpeg"
+    return content_type
+
+
+def download_header_media(image_url: str, *, if_none_match: Optional[str] = None) -> Optional[HeaderMedia]:
+    """
+    Descarga la imagen por chunks a un archivo temporal calculando su sha256.
+    Devuelve None si el servidor responde 304 a If-None-Match (sin cambios).
+    """
+    headers = {"User-Agent": "Evolvian-TemplateSync/1.0"}
+    if if_none_match:
+        headers["If-None-Match"] = if_none_match
+    response = requests.get(
+        image_url,
+        timeout=TEMPLATE_MEDIA_HTTP_TIMEOUT_SECONDS,
+        stream=True,
+        headers=headers,
+    )
+    try:
+        if if_none_match and response.status_code == 304:
+            return None
+        response.raise_for_status()
+
+        parsed = urlparse(image_url)
+        file_name = os.path.basename(parsed.path or "") or "template_image.jpg"
+        mime_type = _normalize_mime_type(response.headers.get("content-type"), file_name)
+
+        spool = tempfile.SpooledTemporaryFile(max_size=TEMPLATE_MEDIA_SPOOL_BYTES)
+        digest = hashlib.sha256()
+        total = 0
+        try:
+            for chunk in response.iter_content(chunk_size=TEMPLATE_MEDIA_CHUNK_BYTES):
+                if not chunk:
+                    continue
+                total += len(chunk)
+                if total > TEMPLATE_MEDIA_MAX_BYTES:
+                    raise ValueError("image_too_large_for_template_header")
+                digest.update(chunk)
+                spool.write(chunk)
+            if not total:
+                raise ValueError("empty_image_payload")
+        except Exception:
+            spool.close()
+            raise
+        spool.seek(0)
+
+        if "." not in file_name:
+            ext = ".png" if mime_type == "image/png" else ".jpg"
+            file_name = f"{file_name}{ext}"
+
+        return HeaderMedia(
+            file=spool,
+            sha256=digest.hexdigest(),
+            length=total,
+            mime_type=mime_type,
+            file_name=file_name,
+            source_etag=str(response.headers.get("etag") or "").strip() or None,
+        )
+    finally:
+        response.close()
+
+
+# -------------------------------------------------
+# Registro (memoria del proceso + tabla)
+# -------------------------------------------------
+_handles: dict[tuple[str, str], dict[str, Any]] = {}
+_url_index: dict[tuple[str, str], dict[str, Any]] = {}
+_registry_lock = threading.Lock()
+
+_inflight: dict[tuple, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+def clear_media_registry() -> None:
+    with _registry_lock:
+        _handles.clear()
+        _url_index.clear()
+
+
+def _is_missing_media_table(exc: Exception) -> bool:
+    msg = str(exc).lower()
+    return TEMPLATE_MEDIA_TABLE in msg and (
+        "does not exist" in msg or "relation" in msg or "schema cache" in msg or "not found" in msg
+    )
+
+
+def _parse_expiry(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except Exception:
+        return 0.0
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _is_live(entry: Optional[dict[str, Any]]) -> bool:
+    if not entry or not entry.get("handle"):
+        return False
+    return _parse_expiry(entry.get("expires_at")) - TEMPLATE_MEDIA_EXPIRY_MARGIN_SECONDS > time.time()
+
+
+def _single_flight(key: tuple, fn: Callable[[], Any]) -> Any:
+    """Solo un hilo ejecuta fn por key; los demás esperan y reciben el mismo resultado."""
+    with _inflight_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _inflight[key] = future
+    if not owner:
+        return future.result()
+    try:
+        result = fn()
+        future.set_result(result)
+        return result
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def _load_media_row(db: Any, waba_id: str, *, field: str, value: str) -> Optional[dict[str, Any]]:
+    try:
+        rows = (
+            db.table(TEMPLATE_MEDIA_TABLE)
+            .select("waba_id,content_sha256,handle,expires_at,source_url,source_etag")
+            .eq("waba_id", waba_id)
+            .eq(field, value)
+            .order("expires_at", desc=True)
+            .limit(1)
+            .execute()
+        ).data or []
+    except Exception as exc:
+        if not _is_missing_media_table(exc):
+            logger.warning("⚠️ Failed reading template media registry | field=%s | error=%s", field, exc)
+        return None
+    return rows[0] if rows else None
+
+
+def _lookup_by_sha(db: Any, waba_id: str, sha256: str) -> Optional[dict[str, Any]]:
+    with _registry_lock:
+        entry = _handles.get((waba_id, sha256))
+    if _is_live(entry):
+        return entry
+    row = _load_media_row(db, waba_id, field="content_sha256", value=sha256)
+    if _is_live(row):
+        with _registry_lock:
+            _handles[(waba_id, sha256)] = row
+        return row
+    return None
+
+
+def _lookup_by_url(db: Any, waba_id: str, image_url: str) -> Optional[dict[str, Any]]:
+    with _registry_lock:
+        entry = _url_index.get((waba_id, image_url))
+    if entry:
+        return entry
+    row = _load_media_row(db, waba_id, field="source_url", value=image_url)
+    if row and row.get("content_sha256"):
+        entry = {"content_sha256": row["content_sha256"], "source_etag": row.get("source_etag")}
+        with _registry_lock:
+            _url_index[(waba_id, image_url)] = entry
+        return entry
+    return None
+
+
+def _remember_url(waba_id: str, image_url: str, media: HeaderMedia) -> None:
+    with _registry_lock:
+        _url_index[(waba_id, image_url)] = {"content_sha256": media.sha256, "source_etag": media.source_etag}
+
+
+def _remember_handle(db: Any, waba_id: str, image_url: str, media: HeaderMedia, handle: str) -> None:
+    expires_at = datetime.fromtimestamp(time.time() + handle_ttl_seconds(), tz=timezone.utc).isoformat()
+    row = {
+        "waba_id": waba_id,
+        "content_sha256": media.sha256,
+        "handle": handle,
+        "mime_type": media.mime_type,
+        "file_length": media.length,
+        "source_url": image_url,
+        "source_etag": media.source_etag,
+        "uploaded_at": datetime.now(timezone.utc).isoformat(),
+        "expires_at": expires_at,
+    }
+    with _registry_lock:
+        _handles[(waba_id, media.sha256)] = row
+    try:
+        db.table(TEMPLATE_MEDIA_TABLE).upsert(row, on_conflict="waba_id,content_sha256").execute()
+    except Exception as exc:
+        if not _is_missing_media_table(exc):
+            logger.warning(
+                "⚠️ Failed persisting template media handle | waba_fp=fp_%s | error=%s",
+                hashlib.sha256(waba_id.encode("utf-8")).hexdigest()[:12],
+                exc,
+            )
+
+
+def resolve_header_media_handle(
+    *,
+    waba_id: str,
+    image_url: str,
+    upload: Callable[[HeaderMedia], Optional[str]],
+    supabase_client: Any = None,
+) -> Optional[str]:
+    """
+    Handle de Meta para la imagen de header. Reusa un handle vigente del mismo
+    contenido en la WABA; si la URL ya se vio y el servidor confirma (ETag) que
+    no cambió, ni siquiera se descarga. `upload` sube el archivo y devuelve el handle.
+    """
+    db = supabase_client or supabase
+    normalized_waba = str(waba_id or "").strip()
+    normalized_url = str(image_url or "").strip()
+    if not normalized_waba or not normalized_url:
+        return None
+
+    def _resolve_url() -> Optional[str]:
+        known = _lookup_by_url(db, normalized_waba, normalized_url)
+        known_sha = str((known or {}).get("content_sha256") or "")
+        known_entry = _lookup_by_sha(db, normalized_waba, known_sha) if known_sha else None
+
+        try:
+            media = download_header_media(
+                normalized_url,
+                if_none_match=(known or {}).get("source_etag") if known_entry else None,
+            )
+        except Exception:
+            logger.warning("⚠️ Failed downloading template header image | url=%s", normalized_url)
+            return None
+        if media is None:
+            return str(known_entry["handle"])
+
+        try:
+            def _resolve_content() -> Optional[str]:
+                entry = _lookup_by_sha(db, normalized_waba, media.sha256)
+                if entry:
+                    return str(entry["handle"])
+                media.file.seek(0)
+                uploaded = upload(media)
+                if uploaded:
+                    _remember_handle(db, normalized_waba, normalized_url, media, uploaded)
+                return uploaded
+
+            handle = _single_flight(("sha", normalized_waba, media.sha256), _resolve_content)
+            _remember_url(normalized_waba, normalized_url, media)
+            return handle
+        finally:
+            media.close()
+
+    return _single_flight(("url", normalized_waba, normalized_url), _resolve_url)
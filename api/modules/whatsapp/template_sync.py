@@ -1,11 +1,15 @@
+import copy
 import json
 import hashlib
 import logging
-import mimetypes
 import os
 import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
 from urllib.parse import urlparse
 
 import requests
@@ -13,13 +17,27 @@ import requests
 from api.config.config import supabase
 from api.appointments.template_language_resolution import normalize_language_preferences
 from api.security.whatsapp_token_crypto import decrypt_whatsapp_token
+from api.modules.whatsapp.template_media import HeaderMedia, resolve_header_media_handle
 
 logger = logging.getLogger(__name__)
 
 GRAPH_VERSION = os.getenv("META_GRAPH_VERSION", "v22.0")
 GRAPH_BASE_URL = f"https://graph.facebook.com/{GRAPH_VERSION}"
 HTTP_TIMEOUT_SECONDS = 18
-WHATSAPP_TEMPLATE_IMAGE_MAX_BYTES = 5 * 1024 * 1024
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+# Caché de metadata de Graph (businesses, WABAs, phone numbers, templates).
+GRAPH_CACHE_MAX_ENTRIES = 1024
+GRAPH_DISCOVERY_TTL_SECONDS = max(0, _env_int("META_GRAPH_DISCOVERY_TTL_SECONDS", 300))
+GRAPH_METADATA_TTL_SECONDS = max(0, _env_int("META_GRAPH_METADATA_TTL_SECONDS", 60))
+GRAPH_FANOUT_CONCURRENCY = max(1, _env_int("META_GRAPH_FANOUT_CONCURRENCY", 4))
 
 
 def _safe_id_fingerprint(value: Any) -> str:
@@ -322,12 +340,15 @@ def _meta_request(
     token: str,
     params: Optional[dict] = None,
     json_payload: Optional[dict] = None,
+    extra_headers: Optional[dict] = None,
 ) -> requests.Response:
     url = f"{GRAPH_BASE_URL}/{path.lstrip('/')}"
     headers = {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json",
     }
+    if extra_headers:
+        headers.update(extra_headers)
     return requests.request(
         method=method.upper(),
         url=url,
@@ -351,6 +372,162 @@ def _extract_after_cursor(payload: Any) -> Optional[str]:
     return str(after) if after else None
 
 
+class _CachedGraphResponse:
+    """Respuesta 200 servida desde caché; expone lo que usan los callers de _meta_request."""
+
+    status_code = 200
+
+    def __init__(self, payload: Any):
+        self._payload = payload
+        self.text = json.dumps(payload)
+        self.headers: dict = {}
+
+    def json(self) -> Any:
+        return copy.deepcopy(self._payload)
+
+
+_graph_cache: "OrderedDict[tuple, dict]" = OrderedDict()
+_graph_cache_lock = threading.Lock()
+
+
+def _token_fingerprint(token: str) -> str:
+    return hashlib.sha256(str(token or "").encode("utf-8")).hexdigest()[:16]
+
+
+def _graph_cache_key(path: str, *, token: str, params: Optional[dict]) -> tuple:
+    normalized_params = tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+    return _token_fingerprint(token), path.strip("/"), normalized_params
+
+
+def clear_graph_cache(*, token: Optional[str] = None, object_id: Optional[str] = None) -> None:
+    """Invalida entradas por token y/o por objeto (prefijo del path). Sin argumentos vacía todo."""
+    token_fp = _token_fingerprint(token) if token else None
+    object_prefix = str(object_id or "").strip().strip("/")
+    with _graph_cache_lock:
+        if token_fp is None and not object_prefix:
+            _graph_cache.clear()
+            return
+        for key in list(_graph_cache):
+            if token_fp is not None and key[0] != token_fp:
+                continue
+            if object_prefix and key[1] != object_prefix and not key[1].startswith(f"{object_prefix}/"):
+                continue
+            del _graph_cache[key]
+
+
+def _meta_get_cached(
+    path: str,
+    *,
+    token: str,
+    params: Optional[dict] = None,
+    max_age_seconds: int,
+):
+    """
+    GET a Graph con caché por (huella del token, path, params). Dentro del TTL
+    no hay request; vencido, se revalida con If-None-Match y un 304 reusa el
+    payload guardado. Solo se guardan respuestas exitosas.
+    """
+    key = _graph_cache_key(path, token=token, params=params)
+    now = time.monotonic()
+    with _graph_cache_lock:
+        entry = _graph_cache.get(key)
+        if entry is not None:
+            _graph_cache.move_to_end(key)
+    if entry is not None and now - entry["fetched_at"] < max_age_seconds:
+        return _CachedGraphResponse(entry["payload"])
+
+    etag = entry.get("etag") if entry is not None else None
+    response = _meta_request(
+        "GET",
+        path,
+        token=token,
+        params=params,
+        extra_headers={"If-None-Match": etag} if etag else None,
+    )
+    if response.status_code == 304 and entry is not None:
+        with _graph_cache_lock:
+            entry["fetched_at"] = now
+        return _CachedGraphResponse(entry["payload"])
+    if response.status_code >= 400:
+        return response
+
+    try:
+        payload = response.json()
+    except Exception:
+        return response
+    headers = getattr(response, "headers", None) or {}
+    with _graph_cache_lock:
+        _graph_cache[key] = {
+            "payload": copy.deepcopy(payload),
+            "etag": headers.get("ETag") or headers.get("etag"),
+            "fetched_at": now,
+        }
+        _graph_cache.move_to_end(key)
+        while len(_graph_cache) > GRAPH_CACHE_MAX_ENTRIES:
+            _graph_cache.popitem(last=False)
+    return response
+
+
+def _iter_graph_pages(
+    path: str,
+    *,
+    token: str,
+    params: dict,
+    max_age_seconds: int,
+) -> Iterator[tuple[Any, Any]]:
+    """
+    Recorre un edge de Graph siguiendo paging.cursors.after, una página a la vez.
+    Produce (response, payload); tras una respuesta de error (payload None) se detiene.
+    """
+    after_cursor: Optional[str] = None
+    while True:
+        page_params = dict(params)
+        if after_cursor:
+            page_params["after"] = after_cursor
+        response = _meta_get_cached(path, token=token, params=page_params, max_age_seconds=max_age_seconds)
+        if response.status_code >= 400:
+            yield response, None
+            return
+        payload = response.json()
+        yield response, payload
+        after_cursor = _extract_after_cursor(payload)
+        if not after_cursor:
+            return
+
+
+_T = TypeVar("_T")
+_R = TypeVar("_R")
+
+
+def _graph_fanout(fn: Callable[[_T], _R], items: list[_T]) -> list[_R]:
+    """map() en paralelo con tope META_GRAPH_FANOUT_CONCURRENCY; conserva el orden de items."""
+    if len(items) <= 1 or GRAPH_FANOUT_CONCURRENCY <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(
+        max_workers=min(GRAPH_FANOUT_CONCURRENCY, len(items)),
+        thread_name_prefix="meta-graph",
+    ) as pool:
+        return list(pool.map(fn, items))
+
+
+def _graph_first_match(predicate: Callable[[_T], bool], items: list[_T]) -> Optional[_T]:
+    """Primer item (en orden) que cumple predicate, evaluando en paralelo y cancelando el resto."""
+    if len(items) <= 1 or GRAPH_FANOUT_CONCURRENCY <= 1:
+        return next((item for item in items if predicate(item)), None)
+    pool = ThreadPoolExecutor(
+        max_workers=min(GRAPH_FANOUT_CONCURRENCY, len(items)),
+        thread_name_prefix="meta-graph",
+    )
+    try:
+        futures = [pool.submit(predicate, item) for item in items]
+        for item, future in zip(items, futures):
+            if future.result():
+                return item
+        return None
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
 def _response_has_unknown_field_error(response: requests.Response) -> bool:
     try:
         payload = response.json()
@@ -383,11 +560,11 @@ def _list_business_ids_for_token(wa_token: str) -> list[str]:
     business_ids: set[str] = set()
 
     # Newer Graph setups: /me?fields=businesses{id}
-    response = _meta_request(
-        "GET",
+    response = _meta_get_cached(
         "me",
         token=wa_token,
         params={"fields": "businesses{id}"},
+        max_age_seconds=GRAPH_DISCOVERY_TTL_SECONDS,
     )
     if response.status_code < 400:
         payload = response.json()
@@ -401,88 +578,58 @@ def _list_business_ids_for_token(wa_token: str) -> list[str]:
         logger.warning("⚠️ Failed listing businesses from /me | %s", _format_meta_error(response))
 
     # Legacy/alternative edge: /me/businesses
-    after_cursor: Optional[str] = None
-    while True:
-        params: dict[str, Any] = {"fields": "id", "limit": 200}
-        if after_cursor:
-            params["after"] = after_cursor
-
-        response = _meta_request(
-            "GET",
-            "me/businesses",
-            token=wa_token,
-            params=params,
-        )
-        if response.status_code >= 400:
+    for _response, payload in _iter_graph_pages(
+        "me/businesses",
+        token=wa_token,
+        params={"fields": "id", "limit": 200},
+        max_age_seconds=GRAPH_DISCOVERY_TTL_SECONDS,
+    ):
+        if payload is None:
             # This edge commonly requires business_management; keep graceful.
             break
-
-        payload = response.json()
         data = payload.get("data") if isinstance(payload, dict) else []
         for row in data or []:
             business_id = str((row or {}).get("id") or "").strip()
             if business_id:
                 business_ids.add(business_id)
 
-        after_cursor = _extract_after_cursor(payload)
-        if not after_cursor:
-            break
-
-    return list(business_ids)
+    return sorted(business_ids)
 
 
 def _list_owned_wabas_for_business(*, business_id: str, wa_token: str) -> list[str]:
     found: list[str] = []
-    after_cursor: Optional[str] = None
-
-    while True:
-        params: dict[str, Any] = {"fields": "id", "limit": 200}
-        if after_cursor:
-            params["after"] = after_cursor
 
-        response = _meta_request(
-            "GET",
-            f"{business_id}/owned_whatsapp_business_accounts",
-            token=wa_token,
-            params=params,
-        )
-        if response.status_code >= 400:
+    for response, payload in _iter_graph_pages(
+        f"{business_id}/owned_whatsapp_business_accounts",
+        token=wa_token,
+        params={"fields": "id", "limit": 200},
+        max_age_seconds=GRAPH_DISCOVERY_TTL_SECONDS,
+    ):
+        if payload is None:
             logger.warning(
                 "⚠️ Failed listing owned WABAs | business_id=%s | %s",
                 business_id,
                 _format_meta_error(response),
             )
             break
-
-        payload = response.json()
         data = payload.get("data") if isinstance(payload, dict) else []
         for row in data or []:
             waba_id = str((row or {}).get("id") or "").strip()
             if waba_id:
                 found.append(waba_id)
 
-        after_cursor = _extract_after_cursor(payload)
-        if not after_cursor:
-            break
-
     return found
 
 
 def _waba_has_phone_number(*, waba_id: str, wa_phone_id: str, wa_token: str) -> bool:
-    after_cursor: Optional[str] = None
-
-    while True:
-        params: dict[str, Any] = {"fields": "id", "limit": 200}
-        if after_cursor:
-            params["after"] = after_cursor
-
-        response = _meta_request(
-            "GET",
-            f"{waba_id}/phone_numbers",
-            token=wa_token,
-            params=params,
-        )
-        if response.status_code >= 400:
+    # Las páginas se piden de forma perezosa: se deja de paginar al encontrar el número.
+    for response, payload in _iter_graph_pages(
+        f"{waba_id}/phone_numbers",
+        token=wa_token,
+        params={"fields": "id", "limit": 200},
+        max_age_seconds=GRAPH_DISCOVERY_TTL_SECONDS,
+    ):
+        if payload is None:
             # Some Graph setups return code=100 "nonexisting field (phone_numbers)"
             # for objects that don't expose this edge. Treat it as an unsupported
             # candidate during fallback discovery instead of warning noise.
@@ -500,78 +647,79 @@ def _waba_has_phone_number(*, waba_id: str, wa_phone_id: str, wa_token: str) ->
             )
             return False
 
-        payload = response.json()
         data = payload.get("data") if isinstance(payload, dict) else []
         for row in data or []:
             phone_id = str((row or {}).get("id") or "").strip()
             if phone_id and phone_id == wa_phone_id:
                 return True
 
-        after_cursor = _extract_after_cursor(payload)
-        if not after_cursor:
-            break
-
     return False
 
 
 def _list_phone_numbers_for_waba(*, waba_id: str, wa_token: str) -> list[dict]:
-    found: list[dict] = []
-    after_cursor: Optional[str] = None
     fields_candidates = (
         "id,display_phone_number,verified_name,quality_rating,code_verification_status",
         "id,display_phone_number",
         "id",
     )
 
-    selected_fields = fields_candidates[0]
-    tried_fields = 0
-
-    while True:
-        params: dict[str, Any] = {"fields": selected_fields, "limit": 200}
-        if after_cursor:
-            params["after"] = after_cursor
-
-        response = _meta_request(
-            "GET",
+    for index, selected_fields in enumerate(fields_candidates):
+        found: list[dict] = []
+        retry_with_fewer_fields = False
+        for response, payload in _iter_graph_pages(
             f"{waba_id}/phone_numbers",
             token=wa_token,
-            params=params,
-        )
-        if response.status_code >= 400:
-            if _response_has_unknown_field_error(response) and tried_fields + 1 < len(fields_candidates):
-                tried_fields += 1
-                selected_fields = fields_candidates[tried_fields]
-                continue
-            logger.warning(
-                "⚠️ Failed listing phone numbers for discovery | waba_fp=%s | %s",
-                _safe_id_fingerprint(waba_id),
-                _format_meta_error(response),
-            )
-            break
+            params={"fields": selected_fields, "limit": 200},
+            max_age_seconds=GRAPH_DISCOVERY_TTL_SECONDS,
+        ):
+            if payload is None:
+                if _response_has_unknown_field_error(response) and index + 1 < len(fields_candidates):
+                    retry_with_fewer_fields = True
+                    break
+                logger.warning(
+                    "⚠️ Failed listing phone numbers for discovery | waba_fp=%s | %s",
+                    _safe_id_fingerprint(waba_id),
+                    _format_meta_error(response),
+                )
+                break
 
-        payload = response.json()
-        rows = payload.get("data") if isinstance(payload, dict) else []
-        for row in rows or []:
-            if not isinstance(row, dict):
-                continue
-            phone_id = str(row.get("id") or "").strip()
-            if not phone_id:
-                continue
-            found.append(
-                {
-                    "phone_id": phone_id,
-                    "display_phone_number": str(row.get("display_phone_number") or "").strip() or None,
-                    "verified_name": str(row.get("verified_name") or "").strip() or None,
-                    "quality_rating": str(row.get("quality_rating") or "").strip() or None,
-                    "code_verification_status": str(row.get("code_verification_status") or "").strip() or None,
-                }
-            )
+            rows = payload.get("data") if isinstance(payload, dict) else []
+            for row in rows or []:
+                if not isinstance(row, dict):
+                    continue
+                phone_id = str(row.get("id") or "").strip()
+                if not phone_id:
+                    continue
+                found.append(
+                    {
+                        "phone_id": phone_id,
+                        "display_phone_number": str(row.get("display_phone_number") or "").strip() or None,
+                        "verified_name": str(row.get("verified_name") or "").strip() or None,
+                        "quality_rating": str(row.get("quality_rating") or "").strip() or None,
+                        "code_verification_status": str(row.get("code_verification_status") or "").strip() or None,
+                    }
+                )
+        if not retry_with_fewer_fields:
+            return found
 
-        after_cursor = _extract_after_cursor(payload)
-        if not after_cursor:
-            break
+    return []
 
-    return found
+
+def _owned_wabas_by_business(*, business_ids: list[str], wa_token: str) -> list[tuple[str, str]]:
+    """(business_id, waba_id) en orden de negocio, sin repetir WABAs; un request por negocio en paralelo."""
+    waba_lists = _graph_fanout(
+        lambda business_id: _list_owned_wabas_for_business(business_id=business_id, wa_token=wa_token),
+        business_ids,
+    )
+    pairs: list[tuple[str, str]] = []
+    seen_waba_ids: set[str] = set()
+    for business_id, waba_ids in zip(business_ids, waba_lists):
+        for waba_id in waba_ids:
+            if waba_id in seen_waba_ids:
+                continue
+            seen_waba_ids.add(waba_id)
+            pairs.append((business_id, waba_id))
+    return pairs
 
 
 def discover_waba_phone_candidates(*, wa_token: str) -> list[dict]:
@@ -583,32 +731,28 @@ def discover_waba_phone_candidates(*, wa_token: str) -> list[dict]:
     seen_phone_ids: set[str] = set()
 
     business_ids = _list_business_ids_for_token(token)
-    for business_id in business_ids:
-        waba_ids = _list_owned_wabas_for_business(
-            business_id=business_id,
-            wa_token=token,
-        )
-        for waba_id in waba_ids:
-            phones = _list_phone_numbers_for_waba(
-                waba_id=waba_id,
-                wa_token=token,
+    waba_pairs = _owned_wabas_by_business(business_ids=business_ids, wa_token=token)
+    phone_lists = _graph_fanout(
+        lambda pair: _list_phone_numbers_for_waba(waba_id=pair[1], wa_token=token),
+        waba_pairs,
+    )
+    for (business_id, waba_id), phones in zip(waba_pairs, phone_lists):
+        for phone in phones:
+            phone_id = str(phone.get("phone_id") or "").strip()
+            if not phone_id or phone_id in seen_phone_ids:
+                continue
+            seen_phone_ids.add(phone_id)
+            results.append(
+                {
+                    "business_id": business_id,
+                    "waba_id": waba_id,
+                    "phone_id": phone_id,
+                    "display_phone_number": phone.get("display_phone_number"),
+                    "verified_name": phone.get("verified_name"),
+                    "quality_rating": phone.get("quality_rating"),
+                    "code_verification_status": phone.get("code_verification_status"),
+                }
             )
-            for phone in phones:
-                phone_id = str(phone.get("phone_id") or "").strip()
-                if not phone_id or phone_id in seen_phone_ids:
-                    continue
-                seen_phone_ids.add(phone_id)
-                results.append(
-                    {
-                        "business_id": business_id,
-                        "waba_id": waba_id,
-                        "phone_id": phone_id,
-                        "display_phone_number": phone.get("display_phone_number"),
-                        "verified_name": phone.get("verified_name"),
-                        "quality_rating": phone.get("quality_rating"),
-                        "code_verification_status": phone.get("code_verification_status"),
-                    }
-                )
 
     return results
 
@@ -618,20 +762,15 @@ def _resolve_waba_id_via_business_graph(*, wa_phone_id: str, wa_token: str) -> O
     if not business_ids:
         return None
 
-    for business_id in business_ids:
-        waba_ids = _list_owned_wabas_for_business(
-            business_id=business_id,
+    waba_ids = [waba_id for _business_id, waba_id in _owned_wabas_by_business(business_ids=business_ids, wa_token=wa_token)]
+    return _graph_first_match(
+        lambda waba_id: _waba_has_phone_number(
+            waba_id=waba_id,
+            wa_phone_id=wa_phone_id,
             wa_token=wa_token,
-        )
-        for waba_id in waba_ids:
-            if _waba_has_phone_number(
-                waba_id=waba_id,
-                wa_phone_id=wa_phone_id,
-                wa_token=wa_token,
-            ):
-                return waba_id
-
-    return None
+        ),
+        waba_ids,
+    )
 
 
 def resolve_waba_id_from_phone(*, wa_phone_id: str, wa_token: str) -> Optional[str]:
@@ -642,11 +781,11 @@ def resolve_waba_id_from_phone(*, wa_phone_id: str, wa_token: str) -> Optional[s
 
         # Try direct phone-node fields first. Some Graph versions expose only one.
         for field_name in ("waba_id", "whatsapp_business_account"):
-            response = _meta_request(
-                "GET",
+            response = _meta_get_cached(
                 normalized_phone_id,
                 token=wa_token,
                 params={"fields": field_name},
+                max_age_seconds=GRAPH_DISCOVERY_TTL_SECONDS,
             )
             if response.status_code >= 400:
                 if _response_has_unknown_field_error(response):
@@ -692,11 +831,11 @@ def validate_waba_access(*, waba_id: str, wa_token: str) -> bool:
     if not normalized_waba_id:
         return False
     try:
-        response = _meta_request(
-            "GET",
+        response = _meta_get_cached(
             normalized_waba_id,
             token=wa_token,
             params={"fields": "id"},
+            max_age_seconds=GRAPH_METADATA_TTL_SECONDS,
         )
         if response.status_code >= 400:
             logger.warning(
@@ -886,7 +1025,12 @@ def _normalize_phone_status_value(value: Any) -> Optional[str]:
     return text.upper() if text else None
 
 
-def fetch_phone_number_metadata(*, wa_phone_id: str, wa_token: str) -> dict:
+def fetch_phone_number_metadata(
+    *,
+    wa_phone_id: str,
+    wa_token: str,
+    max_age_seconds: int = GRAPH_METADATA_TTL_SECONDS,
+) -> dict:
     normalized_phone_id = str(wa_phone_id or "").strip()
     normalized_token = str(wa_token or "").strip()
     if not normalized_phone_id or not normalized_token:
@@ -896,11 +1040,11 @@ def fetch_phone_number_metadata(*, wa_phone_id: str, wa_token: str) -> dict:
         }
 
     for fields in _PHONE_FIELDS_CANDIDATES:
-        response = _meta_request(
-            "GET",
+        response = _meta_get_cached(
             normalized_phone_id,
             token=normalized_token,
             params={"fields": fields},
+            max_age_seconds=max_age_seconds,
         )
         if response.status_code < 400:
             try:
@@ -1136,54 +1280,6 @@ def resolve_effective_template_header_image_url(
     )
 
 
-def _download_template_header_image(image_url: str) -> tuple[bytes, str, str]:
-    response = requests.get(
-        image_url,
-        timeout=HTTP_TIMEOUT_SECONDS,
-        stream=True,
-        headers={"User-Agent": "Evolvian-TemplateSync/1.0"},
-    )
-    response.raise_for_status()
-
-    parsed = urlparse(image_url)
-    file_name = os.path.basename(parsed.path or "") or "template_image.jpg"
-    content_type = str(response.headers.get("content-type") or "").split(";")[0].strip().lower()
-    if not content_type:
-        guessed, _ = mimetypes.guess_type(file_name)
-        content_type = str(guessed or "").strip().lower()
-    if content_type not in {"image/jpeg", "image/jpg", "image/png"}:
-        # Normalize jpg alias and reject unsupported mime upfront.
-        if content_type == "image/pjpeg":
-            content_type = "image/jpeg"
-        elif content_type in {"image/webp", "image/gif"}:
-            raise ValueError(f"unsupported_image_type:{content_type}")
-        elif not content_type:
-            content_type = "image/jpeg"
-
-    chunks: list[bytes] = []
-    total = 0
-    for chunk in response.iter_content(chunk_size=64 * 1024):
-        if not chunk:
-            continue
-        total += len(chunk)
-        if total > WHATSAPP_TEMPLATE_IMAGE_MAX_BYTES:
-            raise ValueError("image_too_large_for_template_header")
-        chunks.append(chunk)
-
-    binary = b"".join(chunks)
-    if not binary:
-        raise ValueError("empty_image_payload")
-
-    if content_type == "image/jpg":
-        content_type = "image/jpeg"
-
-    if "." not in file_name:
-        ext = ".png" if content_type == "image/png" else ".jpg"
-        file_name = f"{file_name}{ext}"
-
-    return binary, content_type, file_name
-
-
 def _create_resumable_upload_session_id(
     *,
     owner_id: str,
@@ -1212,11 +1308,12 @@ def _create_resumable_upload_session_id(
     return session_id or None
 
 
-def _upload_binary_to_resumable_session(
+def _upload_file_to_resumable_session(
     *,
     session_id: str,
     wa_token: str,
-    binary: bytes,
+    media_file: Any,
+    file_length: int,
 ) -> Optional[str]:
     url = f"{GRAPH_BASE_URL}/{str(session_id or '').lstrip('/')}"
     auth_headers = [
@@ -1225,14 +1322,17 @@ def _upload_binary_to_resumable_session(
     ]
     for auth in auth_headers:
         try:
+            # requests envía el archivo por bloques; no se arma el binario completo en memoria.
+            media_file.seek(0)
             response = requests.post(
                 url,
                 headers={
                     **auth,
                     "file_offset": "0",
                     "Content-Type": "application/octet-stream",
+                    "Content-Length": str(file_length),
                 },
-                data=binary,
+                data=media_file,
                 timeout=HTTP_TIMEOUT_SECONDS,
             )
         except Exception:
@@ -1249,18 +1349,7 @@ def _upload_binary_to_resumable_session(
     return None
 
 
-def _generate_template_header_handle(
-    *,
-    image_url: str,
-    wa_token: str,
-    waba_id: str,
-) -> Optional[str]:
-    try:
-        binary, mime_type, file_name = _download_template_header_image(image_url)
-    except Exception:
-        logger.warning("⚠️ Failed downloading template header image | url=%s", image_url)
-        return None
-
+def _upload_template_header_media(*, media: HeaderMedia, wa_token: str, waba_id: str) -> Optional[str]:
     owner_candidates = [
         str(waba_id or "").strip(),
         str(os.getenv("WHATSAPP_BUSINESS_ID") or "").strip(),
@@ -1273,22 +1362,37 @@ def _generate_template_header_handle(
         session_id = _create_resumable_upload_session_id(
             owner_id=owner_id,
             wa_token=wa_token,
-            file_name=file_name,
-            file_length=len(binary),
-            file_type=mime_type,
+            file_name=media.file_name,
+            file_length=media.length,
+            file_type=media.mime_type,
         )
         if not session_id:
             continue
-        handle = _upload_binary_to_resumable_session(
+        handle = _upload_file_to_resumable_session(
             session_id=session_id,
             wa_token=wa_token,
-            binary=binary,
+            media_file=media.file,
+            file_length=media.length,
         )
         if handle:
             return handle
     return None
 
 
+def _generate_template_header_handle(
+    *,
+    image_url: str,
+    wa_token: str,
+    waba_id: str,
+) -> Optional[str]:
+    # Registro por (WABA, sha256): la misma imagen se sube una vez y el handle se reutiliza.
+    return resolve_header_media_handle(
+        waba_id=waba_id,
+        image_url=image_url,
+        upload=lambda media: _upload_template_header_media(media=media, wa_token=wa_token, waba_id=waba_id),
+    )
+
+
 def _is_meta_invalid_parameter_error(error_text: Any) -> bool:
     probe = str(error_text or "").lower()
     if not probe:
@@ -1683,29 +1787,24 @@ def _load_canonical_templates(*, client_id: str | None = None) -> list[dict]:
     return []
 
 
-def _list_meta_templates(*, waba_id: str, wa_token: str) -> dict[str, dict]:
+def _list_meta_templates(
+    *,
+    waba_id: str,
+    wa_token: str,
+    max_age_seconds: int = GRAPH_METADATA_TTL_SECONDS,
+) -> dict[str, dict]:
     found: dict[str, dict] = {}
-    after_cursor: Optional[str] = None
 
-    while True:
-        params = {
-            "fields": "id,name,status,language,category",
-            "limit": 200,
-        }
-        if after_cursor:
-            params["after"] = after_cursor
-
-        response = _meta_request(
-            "GET",
-            f"{waba_id}/message_templates",
-            token=wa_token,
-            params=params,
-        )
-        if response.status_code >= 400:
+    for response, payload in _iter_graph_pages(
+        f"{waba_id}/message_templates",
+        token=wa_token,
+        params={"fields": "id,name,status,language,category", "limit": 200},
+        max_age_seconds=max_age_seconds,
+    ):
+        if payload is None:
             logger.error("❌ Failed listing Meta templates | %s", _format_meta_error(response))
             break
 
-        payload = response.json()
         data = payload.get("data") if isinstance(payload, dict) else None
         if isinstance(data, list):
             for item in data:
@@ -1713,12 +1812,6 @@ def _list_meta_templates(*, waba_id: str, wa_token: str) -> dict[str, dict]:
                 if name:
                     found[name] = item
 
-        paging = payload.get("paging", {}) if isinstance(payload, dict) else {}
-        cursors = paging.get("cursors", {}) if isinstance(paging, dict) else {}
-        after_cursor = cursors.get("after")
-        if not after_cursor:
-            break
-
     return found
 
 
@@ -1744,6 +1837,8 @@ def _create_meta_template(
         token=wa_token,
         json_payload=payload,
     )
+    # La lista remota cambió (o se intentó cambiar): siguiente lectura va a Graph.
+    clear_graph_cache(token=wa_token, object_id=f"{waba_id}/message_templates")
 
     if response.status_code < 400:
         parsed = response.json() if response.text else {}
@@ -2513,7 +2608,8 @@ def refresh_client_template_statuses(*, client_id: str) -> dict:
         outcome["success"] = True
         return outcome
 
-    remote_map = _list_meta_templates(waba_id=waba_id, wa_token=wa_token)
+    # Refresco de estados: siempre revalida (ETag) en vez de confiar en el TTL.
+    remote_map = _list_meta_templates(waba_id=waba_id, wa_token=wa_token, max_age_seconds=0)
     now_iso = _utcnow_iso()
 
     for row in local_rows:
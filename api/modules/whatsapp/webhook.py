@@ -13,6 +13,11 @@ from api.modules.assistant_rag.rag_pipeline import handle_message
 from api.modules.whatsapp.whatsapp_sender import send_whatsapp_message
 from api.config.config import supabase
 from api.marketing_contacts_state import upsert_marketing_contact_state
+from api.utils.contact_identity import phone_match_candidates
+from api.modules.whatsapp.status_ingest import (
+    compact_meta_status_error as _compact_meta_status_error,
+    submit_meta_status_callbacks,
+)
 from api.appointments.cancellation_notifications import (
     send_appointment_cancellation_notification,
     send_appointment_cancellation_email_notification,
@@ -486,90 +491,6 @@ def _log_marketing_reply_event(
         )
 
 
-def _compact_meta_status_error(status_item: dict) -> Optional[str]:
-    errors = status_item.get("errors")
-    if not isinstance(errors, list) or not errors:
-        return None
-    first = errors[0] if isinstance(errors[0], dict) else {}
-    code = str(first.get("code") or "").strip()
-    title = str(first.get("title") or "").strip()
-    message = str(first.get("message") or "").strip()
-    parts = [part for part in [code, title, message] if part]
-    return " | ".join(parts) if parts else None
-
-
-def _sync_marketing_status_from_meta_callback(status_item: dict) -> None:
-    provider_message_id = str(status_item.get("id") or "").strip()
-    if not provider_message_id:
-        return
-
-    callback_status = str(status_item.get("status") or "").strip().lower() or "unknown"
-    error_text = _compact_meta_status_error(status_item)
-    updated_at = datetime.now(timezone.utc).isoformat()
-    mapped_send_status = "failed" if callback_status in {"failed", "undelivered"} else None
-
-    try:
-        rows = (
-            supabase.table("marketing_campaign_recipients")
-            .select("id,client_id,campaign_id,recipient_key")
-            .eq("provider", "meta")
-            .eq("provider_message_id", provider_message_id)
-            .limit(50)
-            .execute()
-        ).data or []
-    except Exception:
-        logger.exception(
-            "❌ Failed loading marketing recipients for Meta status callback | message_id=%s",
-            provider_message_id,
-        )
-        return
-
-    for row in rows:
-        recipient_id = str((row or {}).get("id") or "").strip()
-        if not recipient_id:
-            continue
-        try:
-            update_payload = {
-                "updated_at": updated_at,
-            }
-            if mapped_send_status:
-                update_payload["send_status"] = mapped_send_status
-                update_payload["send_error"] = error_text or f"meta_status:{callback_status}"
-
-            (
-                supabase.table("marketing_campaign_recipients")
-                .update(update_payload)
-                .eq("id", recipient_id)
-                .execute()
-            )
-        except Exception:
-            logger.exception(
-                "❌ Failed updating marketing recipient from Meta status callback | recipient_id=%s",
-                recipient_id,
-            )
-
-        try:
-            supabase.table("marketing_campaign_events").insert(
-                {
-                    "client_id": row.get("client_id"),
-                    "campaign_id": row.get("campaign_id"),
-                    "recipient_key": row.get("recipient_key"),
-                    "event_type": f"meta_{callback_status}",
-                    "metadata": {
-                        "provider_message_id": provider_message_id,
-                        "callback_status": callback_status,
-                        "error": error_text,
-                    },
-                    "created_at": updated_at,
-                }
-            ).execute()
-        except Exception:
-            logger.exception(
-                "❌ Failed writing marketing event from Meta status callback | message_id=%s",
-                provider_message_id,
-            )
-
-
 def _extract_user_text(message_type: str, message: dict) -> str | None:
     if message_type == "text":
         return message.get("text", {}).get("body")
@@ -594,28 +515,8 @@ def _extract_user_text(message_type: str, message: dict) -> str | None:
 
 
 def _phone_candidates(from_number: str) -> list[str]:
-    digits = re.sub(r"\D", "", from_number or "")
-    if not digits:
-        return []
-
-    candidates = {
-        digits,
-        f"+{digits}",
-    }
-
-    # Compatibilidad MX (algunos proveedores reportan 521..., otros 52...)
-    if digits.startswith("521") and len(digits) > 3:
-        mx_alt = f"52{digits[3:]}"
-        candidates.add(mx_alt)
-        candidates.add(f"+{mx_alt}")
-
-    if digits.startswith("52") and len(digits) > 2:
-        mx_alt = f"521{digits[2:]}"
-        candidates.add(mx_alt)
-        candidates.add(f"+{mx_alt}")
-
-    # Orden estable para facilitar debugging
-    return sorted(candidates, key=lambda x: (len(x), x))
+    # Orden estable (largo, valor) para facilitar debugging
+    return phone_match_candidates(from_number)
 
 
 def _parse_iso_datetime(value: Any) -> Optional[datetime]:
@@ -900,10 +801,12 @@ async def process_whatsapp_payload(payload: dict):
         )
 
         # -------------------------------------------------------------
-        # 🛑 Ignorar callbacks de estado (sent, delivered, read)
+        # 📬 Callbacks de estado (sent, delivered, read, failed)
+        # Se acumulan por mensaje y se aplican en lote (status_ingest)
         # -------------------------------------------------------------
         if "statuses" in value:
             statuses = value.get("statuses") or []
+            status_items = []
             for status_item in statuses:
                 if not isinstance(status_item, dict):
                     continue
@@ -918,7 +821,8 @@ async def process_whatsapp_payload(payload: dict):
                     _safe_hash(recipient_id),
                     error_text or "none",
                 )
-                _sync_marketing_status_from_meta_callback(status_item)
+                status_items.append(status_item)
+            await submit_meta_status_callbacks(status_items)
             return
 
         messages = value.get("messages")
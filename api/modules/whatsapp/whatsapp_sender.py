@@ -11,6 +11,7 @@ from api.compliance.outbound_policy import (
 from api.modules.whatsapp.template_sync import resolve_effective_template_header_image_url
 from api.modules.assistant_rag.supabase_client import supabase
 from api.security.whatsapp_token_crypto import decrypt_whatsapp_token
+from api.utils.tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -117,8 +118,10 @@ async def send_whatsapp_message(
     }
 
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            res = await client.post(meta_url, json=payload, headers=headers)
+        with span("outbound.whatsapp", message_type="text") as send_span:
+            async with httpx.AsyncClient(timeout=10) as client:
+                res = await client.post(meta_url, json=payload, headers=headers)
+            send_span.set(status_code=res.status_code)
 
         if res.status_code >= 400:
             logger.error("❌ WhatsApp TEXT failed | status=%s", res.status_code)
@@ -355,8 +358,10 @@ async def send_meta_template(
     }
 
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            res = await client.post(meta_url, json=payload, headers=headers)
+        with span("outbound.whatsapp", message_type="template", template=template_name) as send_span:
+            async with httpx.AsyncClient(timeout=15) as client:
+                res = await client.post(meta_url, json=payload, headers=headers)
+            send_span.set(status_code=res.status_code)
 
         status_code = res.status_code
 
@@ -13,11 +13,11 @@ from fastapi.responses import HTMLResponse, RedirectResponse
 from api.config.config import supabase
 from api.marketing_contacts_state import upsert_marketing_contact_state
 from api.security.request_limiter import enforce_rate_limit, get_request_ip
+from api.utils.contact_identity import normalize_phone_e164, resolve_client_country_code
 
 
 router = APIRouter(prefix="/api/public/marketing", tags=["Public Marketing"])
 logger = logging.getLogger(__name__)
-_MEXICO_COUNTRY_ALIASES = {"mx", "mex", "mexico", "méxico"}
 
 
 def _normalize_email(value: Optional[str]) -> Optional[str]:
@@ -27,49 +27,12 @@ def _normalize_email(value: Optional[str]) -> Optional[str]:
 
 @lru_cache(maxsize=512)
 def _get_client_country_code(client_id: str) -> str:
-    normalized_client_id = str(client_id or "").strip()
-    if not normalized_client_id:
-        return ""
-    try:
-        rows = (
-            supabase
-            .table("client_profile")
-            .select("country")
-            .eq("client_id", normalized_client_id)
-            .limit(1)
-            .execute()
-        ).data or []
-        if rows:
-            raw_country = str((rows[0] or {}).get("country") or "").strip().lower()
-            if raw_country in _MEXICO_COUNTRY_ALIASES:
-                return "MX"
-            if len(raw_country) == 2 and raw_country.isalpha():
-                return raw_country.upper()
-    except Exception:
-        logger.warning("Could not resolve client country for phone normalization | client_id=%s", normalized_client_id)
-    return ""
+    return resolve_client_country_code(client_id, supabase_client=supabase)
 
 
 def _normalize_phone(value: Optional[str], *, client_id: Optional[str] = None) -> Optional[str]:
-    raw = str(value or "").strip()
-    if not raw:
-        return None
-    cleaned = re.sub(r"[^\d+]", "", raw)
-    if cleaned.startswith("00"):
-        cleaned = "+" + cleaned[2:]
-    digits = re.sub(r"\D", "", cleaned)
-    if not digits:
-        return None
     client_country = _get_client_country_code(str(client_id or "").strip()) if client_id else ""
-    if len(digits) == 10 and client_country == "MX":
-        digits = f"52{digits}"
-    if digits.startswith("521") and len(digits) == 13:
-        digits = "52" + digits[3:]
-    if len(digits) == 10:
-        return None
-    if len(digits) < 10 or len(digits) > 15:
-        return None
-    return f"+{digits}"
+    return normalize_phone_e164(value, country_code=client_country)
 
 
 def _normalize_recipient_key(value: Optional[str]) -> Optional[str]:
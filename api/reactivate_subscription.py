@@ -3,6 +3,7 @@ from fastapi.responses import JSONResponse
 from api.modules.assistant_rag.supabase_client import supabase
 from api.authz import authorize_client_request
 from api.utils.effective_plan import get_client_override_plan_id
+from api.utils.dashboard_snapshot import invalidate_dashboard_snapshot
 import stripe
 import os
 
@@ -62,6 +63,7 @@ async def reactivate_subscription(request: Request):
                 "cancellation_requested_at": None,
                 "scheduled_plan_id": None
             }).eq("client_id", client_id).execute()
+            invalidate_dashboard_snapshot(client_id, reason="subscription_reactivated")
             return JSONResponse(content={"message": "Test subscription reactivated locally."})
 
         # 🔹 Reactivar en Stripe real
@@ -86,6 +88,7 @@ async def reactivate_subscription(request: Request):
             print(f"❌ Supabase update error: {update_res.error}")
             raise HTTPException(status_code=500, detail="Failed to update Supabase")
 
+        invalidate_dashboard_snapshot(client_id, reason="subscription_reactivated")
         print(f"✅ Subscription reactivated for client {client_id}")
         return JSONResponse(content={"message": "Subscription successfully reactivated."})
 
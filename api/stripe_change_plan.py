@@ -8,6 +8,7 @@ from api.authz import authorize_client_request
 from api.utils.stripe_plan_utils import modify_subscription_plan, cancel_subscription_at_period_end
 from api.utils.effective_plan import get_client_override_plan_id
 from api.utils.calendar_plan_cleanup import disconnect_calendar_features_for_plan
+from api.utils.dashboard_snapshot import invalidate_dashboard_snapshot
 import stripe
 
 load_dotenv()
@@ -103,6 +104,7 @@ async def change_plan(request: Request):
                 "subscription_end": period_end.isoformat()
             }).eq("client_id", client_id).execute()
 
+            invalidate_dashboard_snapshot(client_id, reason="plan_downgrade_scheduled")
             print(f"✅ Downgrade a FREE programado hasta {period_end}")
             return JSONResponse({
                 "status": "scheduled_cancel",
@@ -144,6 +146,7 @@ async def change_plan(request: Request):
                 "subscription_end": period_end.isoformat()
             }).eq("client_id", client_id).execute()
 
+            invalidate_dashboard_snapshot(client_id, reason="plan_downgrade_scheduled")
             print(f"✅ Downgrade Premium → Starter programado hasta {period_end}")
             return JSONResponse({
                 "status": "scheduled_downgrade",
@@ -173,6 +176,7 @@ async def change_plan(request: Request):
             supabase_client=supabase,
         )
 
+        invalidate_dashboard_snapshot(client_id, reason="plan_upgraded")
         print(f"✅ Cambio de plan aplicado inmediatamente: {new_plan_id}")
         return JSONResponse({
             "status": "ok",
@@ -9,6 +9,7 @@ from api.modules.assistant_rag.supabase_client import (
     supabase
 )
 from api.utils.calendar_plan_cleanup import disconnect_calendar_features_for_plan
+from api.utils.dashboard_snapshot import invalidate_dashboard_snapshot
 from api.utils.stripe_plan_utils import get_plan_from_price_id, create_subscription_for_customer
 
 load_dotenv()
@@ -108,6 +109,7 @@ async def stripe_webhook(request: Request):
                     "scheduled_plan_id": None,
                     "pending_deleted_subscription_id": None
                 }).eq("client_id", client_id).execute()
+                invalidate_dashboard_snapshot(client_id, reason="checkout_completed")
                 print(f"🔄 Flags limpiados para cliente {client_id}")
             else:
                 print("⚠️ checkout.session.completed con datos faltantes")
@@ -124,6 +126,7 @@ async def stripe_webhook(request: Request):
                     "upgrade_in_progress": False,
                     "pending_deleted_subscription_id": None
                 }).eq("client_id", client_id).execute()
+                invalidate_dashboard_snapshot(client_id, reason="checkout_expired")
 
         # -------------------------------------------------------------
         # 3️⃣ invoice.paid / invoice.payment_succeeded → Confirmar ciclo
@@ -163,6 +166,7 @@ async def stripe_webhook(request: Request):
                 base_plan_id=plan_id,
                 supabase_client=supabase,
             )
+            invalidate_dashboard_snapshot(client_id, reason="invoice_paid")
 
         # -------------------------------------------------------------
         # 4️⃣ customer.subscription.updated → Cancel-at-period-end
@@ -188,11 +192,13 @@ async def stripe_webhook(request: Request):
                     "cancellation_requested_at": datetime.utcnow().isoformat(),
                     "subscription_end": cancel_date
                 }).eq("client_id", client_id).execute()
+                invalidate_dashboard_snapshot(client_id, reason="cancellation_scheduled")
             else:
                 print(f"♻️ Suscripción {subscription_id} actualizada sin cancelación programada.")
                 supabase.table("client_settings").update({
                     "cancellation_requested_at": None
                 }).eq("client_id", client_id).execute()
+                invalidate_dashboard_snapshot(client_id, reason="cancellation_cleared")
 
         # -------------------------------------------------------------
         # 5️⃣ customer.subscription.deleted → Manejo de bajas
@@ -243,6 +249,7 @@ async def stripe_webhook(request: Request):
                         "pending_deleted_subscription_id": None,
                         "upgrade_in_progress": False
                     }).eq("client_id", client_id).execute()
+                    invalidate_dashboard_snapshot(client_id, reason="upgrade_flags_cleared")
                 print(f"🚫 Downgrade cancelado (otra sub activa) para cliente {client_id}")
                 return Response(status_code=200)
 
@@ -284,6 +291,7 @@ async def stripe_webhook(request: Request):
                         base_plan_id=scheduled_plan_id,
                         supabase_client=supabase,
                     )
+                    invalidate_dashboard_snapshot(client_id, reason="scheduled_downgrade")
                     print(
                         f"✅ Downgrade programado materializado: cliente {client_id} → "
                         f"{scheduled_plan_id} (sub {new_subscription_id})"
@@ -320,6 +328,7 @@ async def stripe_webhook(request: Request):
                         base_plan_id="free",
                         supabase_client=supabase,
                     )
+                    invalidate_dashboard_snapshot(client_id, reason="scheduled_downgrade_fallback_free")
                     return Response(status_code=200)
 
             # Sin sub activa → downgrade automático
@@ -339,6 +348,7 @@ async def stripe_webhook(request: Request):
                 base_plan_id="free",
                 supabase_client=supabase,
             )
+            invalidate_dashboard_snapshot(client_id, reason="downgraded_to_free")
 
         else:
             print(f"ℹ️ Evento no manejado: {event['type']}")
@@ -20,6 +20,9 @@ from api.modules.document_processor import (
 from api.internal.reindex_single_client import reindex_client
 from api.utils.effective_plan import normalize_plan_id, resolve_effective_plan_id
 from api.utils.usage_limiter import check_and_increment_usage
+from api.utils.client_counters import get_client_counters, increment_client_counters
+from api.utils.dashboard_snapshot import invalidate_dashboard_snapshot
+from api.utils.active_documents import invalidate_active_document_set
 
 router = APIRouter()
 BUCKET_NAME = "evolvian-documents"
@@ -56,7 +59,7 @@ def _mark_document_inactive(client_id: str, storage_path: str) -> None:
     if not client_id or not storage_path:
         return
 
-    (
+    res = (
         supabase.table("document_metadata")
         .update({"is_active": False})
         .eq("client_id", client_id)
@@ -64,9 +67,12 @@ def _mark_document_inactive(client_id: str, storage_path: str) -> None:
         .eq("is_active", True)
         .execute()
     )
+    deactivated = len(getattr(res, "data", None) or [])
+    increment_client_counters(client_id, active_documents=-deactivated, supabase_client=supabase)
+    invalidate_active_document_set(client_id, reason="document_marked_inactive")
 
 
-def _deactivate_document_ids(document_ids: list[str]) -> None:
+def _deactivate_document_ids(client_id: str, document_ids: list[str]) -> None:
     for document_id in document_ids:
         (
             supabase.table("document_metadata")
@@ -74,9 +80,11 @@ def _deactivate_document_ids(document_ids: list[str]) -> None:
             .eq("id", document_id)
             .execute()
         )
+    increment_client_counters(client_id, active_documents=-len(document_ids), supabase_client=supabase)
+    invalidate_active_document_set(client_id, reason="document_version_replaced")
 
 
-def _activate_document(document_id: str | None, storage_path: str) -> None:
+def _activate_document(client_id: str, document_id: str | None, storage_path: str) -> None:
     query = supabase.table("document_metadata").update(
         {"is_active": True, "indexed_at": "now()"}
     )
@@ -86,7 +94,10 @@ def _activate_document(document_id: str | None, storage_path: str) -> None:
     else:
         query = query.eq("storage_path", storage_path).eq("is_active", False)
 
-    query.execute()
+    res = query.execute()
+    activated = len(getattr(res, "data", None) or [])
+    increment_client_counters(client_id, active_documents=activated, supabase_client=supabase)
+    invalidate_active_document_set(client_id, reason="document_activated")
 
 
 # --------------------------------------------------
@@ -141,18 +152,9 @@ async def upload_document(
         is_unlimited = bool(plan_limits.get("is_unlimited"))
 
         # --------------------------------------------------
-        # 2️⃣ Contar documentos activos (metadata)
+        # 2️⃣ Contar documentos activos (contador mantenido, O(1))
         # --------------------------------------------------
-        meta_res = (
-            supabase
-            .table("document_metadata")
-            .select("id", count="exact")
-            .eq("client_id", client_id)
-            .eq("is_active", True)
-            .execute()
-        )
-
-        current_docs = meta_res.count or 0
+        current_docs = get_client_counters(client_id, supabase_client=supabase)["active_documents"]
 
         if not is_unlimited and max_documents and current_docs >= max_documents:
             raise HTTPException(status_code=403, detail="document_limit_reached")
@@ -232,16 +234,17 @@ async def upload_document(
             file_url=signed_url,
             client_id=client_id,
             storage_path=storage_path,
+            document_id=new_document_id,
         )
 
         # --------------------------------------------------
         # 7️⃣ Marcar como indexado
         # --------------------------------------------------
-        _activate_document(new_document_id, storage_path)
+        _activate_document(client_id, new_document_id, storage_path)
 
         # Si hubo reemplazo de versión en el mismo path, reconstruimos índice.
         if had_prior_active_path:
-            _deactivate_document_ids([
+            _deactivate_document_ids(client_id, [
                 str(row.get("id"))
                 for row in existing_same_path
                 if row.get("id")
@@ -260,6 +263,7 @@ async def upload_document(
             usage_type="documents_uploaded",
             delta=1
         )
+        invalidate_dashboard_snapshot(client_id, reason="document_uploaded")
 
         return {
             "success": True,
@@ -0,0 +1,72 @@
+import logging
+import os
+import time
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any
+
+from api.config.config import supabase
+
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_DOCS_CACHE_TTL_SECONDS = int(os.getenv("EVOLVIAN_ACTIVE_DOCS_CACHE_TTL_SECONDS") or "60")
+
+
+@dataclass(frozen=True)
+class ActiveDocumentSet:
+    storage_paths: frozenset
+    document_ids: frozenset
+
+    def __bool__(self) -> bool:
+        return bool(self.storage_paths)
+
+
+_CACHE: dict[str, tuple[float, ActiveDocumentSet]] = {}
+_LOCK = Lock()
+
+
+def _load_active_document_set(client_id: str, client: Any) -> ActiveDocumentSet:
+    res = (
+        client.table("document_metadata")
+        .select("id, storage_path")
+        .eq("client_id", client_id)
+        .eq("is_active", True)
+        .execute()
+    )
+    rows = getattr(res, "data", None) or []
+    return ActiveDocumentSet(
+        storage_paths=frozenset(
+            str(row.get("storage_path") or "").strip()
+            for row in rows
+            if str(row.get("storage_path") or "").strip()
+        ),
+        document_ids=frozenset(str(row.get("id")) for row in rows if row.get("id")),
+    )
+
+
+def get_active_document_set(client_id: str, *, supabase_client: Any = None) -> ActiveDocumentSet:
+    """
+    Documentos activos del tenant (rutas + ids de versión), cacheados en proceso.
+    Las escrituras de activación invalidan la entrada; el TTL acota la
+    desactualización entre procesos.
+    """
+    now = time.monotonic()
+    with _LOCK:
+        cached = _CACHE.get(client_id)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    active = _load_active_document_set(client_id, supabase_client or supabase)
+    if ACTIVE_DOCS_CACHE_TTL_SECONDS > 0:
+        with _LOCK:
+            _CACHE[client_id] = (now + ACTIVE_DOCS_CACHE_TTL_SECONDS, active)
+    return active
+
+
+def invalidate_active_document_set(client_id: str | None, *, reason: str = "") -> None:
+    if not client_id:
+        return
+    with _LOCK:
+        _CACHE.pop(str(client_id), None)
+    logger.debug("Active document set invalidated | client_id=%s | reason=%s", client_id, reason)
@@ -0,0 +1,180 @@
+import logging
+from datetime import datetime, timezone
+from typing import Any
+
+from api.config.config import supabase
+
+
+logger = logging.getLogger(__name__)
+
+COUNTERS_TABLE = "client_counters"
+COUNTER_FIELDS = ("user_messages", "widget_user_messages", "active_documents")
+
+
+def _utcnow_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _is_missing_counters_table(exc: Exception) -> bool:
+    msg = str(exc).lower()
+    return COUNTERS_TABLE in msg and (
+        "does not exist" in msg or "relation" in msg or "schema cache" in msg or "not found" in msg
+    )
+
+
+def increment_client_counters(
+    client_id: str | None,
+    *,
+    user_messages: int = 0,
+    widget_user_messages: int = 0,
+    active_documents: int = 0,
+    supabase_client: Any = None,
+) -> None:
+    """
+    Suma deltas a los contadores del tenant en un solo RPC atómico.
+    Best-effort: la reconciliación periódica corrige cualquier drift.
+    """
+    if not client_id or not (user_messages or widget_user_messages or active_documents):
+        return
+
+    client = supabase_client or supabase
+    try:
+        client.rpc(
+            "increment_client_counters",
+            {
+                "p_client_id": str(client_id),
+                "p_user_messages": int(user_messages),
+                "p_widget_user_messages": int(widget_user_messages),
+                "p_active_documents": int(active_documents),
+            },
+        ).execute()
+    except Exception as exc:
+        logger.warning("⚠️ Counter increment failed | client_id=%s | err=%s", client_id, exc)
+
+
+def record_history_counters(
+    client_id: str | None,
+    *,
+    role: str,
+    channel: str | None,
+    supabase_client: Any = None,
+) -> None:
+    if role != "user":
+        return
+    increment_client_counters(
+        client_id,
+        user_messages=1,
+        widget_user_messages=1 if channel == "widget" else 0,
+        supabase_client=supabase_client,
+    )
+
+
+def load_client_counters(client_id: str, *, supabase_client: Any = None) -> dict | None:
+    if not client_id:
+        return None
+
+    client = supabase_client or supabase
+    try:
+        res = (
+            client.table(COUNTERS_TABLE)
+            .select("client_id, user_messages, widget_user_messages, active_documents, reconciled_at")
+            .eq("client_id", client_id)
+            .limit(1)
+            .execute()
+        )
+    except Exception as exc:
+        if not _is_missing_counters_table(exc):
+            logger.warning("Could not read client counters for client %s: %s", client_id, exc)
+        return None
+
+    rows = getattr(res, "data", None) or []
+    row = rows[0] if isinstance(rows, list) and rows else None
+    if not isinstance(row, dict):
+        return None
+    return {field: max(0, int(row.get(field) or 0)) for field in COUNTER_FIELDS}
+
+
+def count_client_totals_exact(client_id: str, *, supabase_client: Any = None) -> dict:
+    """Conteo exacto (O(historial)); solo para reconciliación y primer uso."""
+    client = supabase_client or supabase
+
+    def _count(table: str, **filters) -> int:
+        query = client.table(table).select("id", count="exact").eq("client_id", client_id)
+        for field, value in filters.items():
+            query = query.eq(field, value)
+        res = query.limit(1).execute()
+        return getattr(res, "count", 0) or 0
+
+    return {
+        "user_messages": _count("history", role="user"),
+        "widget_user_messages": _count("history", role="user", channel="widget"),
+        "active_documents": _count("document_metadata", is_active=True),
+    }
+
+
+def reconcile_client_counters(client_id: str, *, supabase_client: Any = None) -> dict:
+    """
+    Recalcula los contadores con conteos exactos y los persiste.
+    Devuelve los totales y el drift detectado respecto a la fila previa.
+    """
+    client = supabase_client or supabase
+    previous = load_client_counters(client_id, supabase_client=client)
+    totals = count_client_totals_exact(client_id, supabase_client=client)
+
+    drift = {
+        field: totals[field] - previous[field]
+        for field in COUNTER_FIELDS
+        if previous is not None and totals[field] != previous[field]
+    }
+
+    now_iso = _utcnow_iso()
+    try:
+        client.table(COUNTERS_TABLE).upsert(
+            {
+                "client_id": client_id,
+                **totals,
+                "updated_at": now_iso,
+                "reconciled_at": now_iso,
+            },
+            on_conflict="client_id",
+        ).execute()
+    except Exception as exc:
+        if not _is_missing_counters_table(exc):
+            logger.warning("Could not persist reconciled counters for client %s: %s", client_id, exc)
+
+    if drift:
+        logger.info("🔧 Client counters drift corrected | client_id=%s | drift=%s", client_id, drift)
+
+    return {
+        "client_id": client_id,
+        "seeded": previous is None,
+        "totals": totals,
+        "drift": drift,
+    }
+
+
+def get_client_counters(client_id: str, *, supabase_client: Any = None) -> dict:
+    """
+    Lectura O(1) de los contadores del tenant. Si todavía no existe la fila
+    (tenant nuevo o tabla sin backfill), se siembra con un conteo exacto.
+    """
+    counters = load_client_counters(client_id, supabase_client=supabase_client)
+    if counters is not None:
+        return counters
+    return reconcile_client_counters(client_id, supabase_client=supabase_client)["totals"]
+
+
+def list_clients_due_for_reconciliation(limit: int, *, supabase_client: Any = None) -> list[str]:
+    client = supabase_client or supabase
+    res = (
+        client.table(COUNTERS_TABLE)
+        .select("client_id, reconciled_at")
+        .order("reconciled_at", desc=False, nullsfirst=True)
+        .limit(limit)
+        .execute()
+    )
+    return [
+        str(row.get("client_id"))
+        for row in (getattr(res, "data", None) or [])
+        if row.get("client_id")
+    ]
@@ -0,0 +1,239 @@
+"""
+Identidad de contacto por teléfono: normalización E.164, alias de búsqueda y
+un índice alias -> fila para cruces de audiencia y matching de inbound.
+
+Las reglas son las que ya usaban marketing, webhook y send_reply; aquí quedan
+en un solo lugar, memoizadas, con variantes por lote para columnas completas.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from functools import lru_cache
+from typing import Any, Generic, Iterable, Optional, TypeVar
+
+
+logger = logging.getLogger(__name__)
+
+_NON_DIGITS = re.compile(r"\D")
+_NON_PHONE_CHARS = re.compile(r"[^\d+]")
+
+MEXICO_COUNTRY_ALIASES = frozenset({"mx", "mex", "mexico", "méxico"})
+
+# País del tenant -> (prefijo internacional, dígitos del número local).
+# Solo se infiere el prefijo de números locales para países listados aquí.
+COUNTRY_DIALING_PREFIXES: dict[str, tuple[str, int]] = {
+    "MX": ("52", 10),
+}
+
+_NORMALIZE_CACHE_SIZE = 8192
+
+T = TypeVar("T")
+
+
+def country_code_from_profile(raw_country: Any) -> str:
+    value = str(raw_country or "").strip().lower()
+    if value in MEXICO_COUNTRY_ALIASES:
+        return "MX"
+    if len(value) == 2 and value.isalpha():
+        return value.upper()
+    return ""
+
+
+def resolve_client_country_code(client_id: str, *, supabase_client: Any) -> str:
+    """País ISO-2 del tenant según client_profile.country ('' si no se conoce)."""
+    normalized_client_id = str(client_id or "").strip()
+    if not normalized_client_id:
+        return ""
+    try:
+        rows = (
+            supabase_client
+            .table("client_profile")
+            .select("country")
+            .eq("client_id", normalized_client_id)
+            .limit(1)
+            .execute()
+        ).data or []
+        if rows:
+            return country_code_from_profile((rows[0] or {}).get("country"))
+    except Exception:
+        logger.warning("Could not resolve client country for phone normalization | client_id=%s", normalized_client_id)
+    return ""
+
+
+def phone_digits(value: Any) -> str:
+    return _NON_DIGITS.sub("", str(value or ""))
+
+
+@lru_cache(maxsize=_NORMALIZE_CACHE_SIZE)
+def _normalize_phone_cached(raw: str, country_code: str, strict_mx: bool) -> Optional[str]:
+    cleaned = _NON_PHONE_CHARS.sub("", raw)
+    if cleaned.startswith("00"):
+        cleaned = "+" + cleaned[2:]
+    digits = _NON_DIGITS.sub("", cleaned)
+    if not digits:
+        return None
+
+    dialing = COUNTRY_DIALING_PREFIXES.get(country_code)
+    if dialing and len(digits) == dialing[1]:
+        digits = f"{dialing[0]}{digits}"
+
+    # Normalize legacy MX format 521XXXXXXXXXX -> 52XXXXXXXXXX
+    if digits.startswith("521") and len(digits) == 13:
+        digits = "52" + digits[3:]
+    if len(digits) == 10:
+        return None
+
+    # Basic E.164 sanity checks.
+    if len(digits) < 10 or len(digits) > 15:
+        return None
+    # Mexico numbers in E.164 should be country code 52 + 10 digits.
+    if strict_mx and digits.startswith("52") and len(digits) != 12:
+        return None
+
+    return f"+{digits}"
+
+
+def normalize_phone_e164(value: Any, *, country_code: str = "", strict_mx: bool = False) -> Optional[str]:
+    """
+    E.164 para contactos de marketing. Los números locales de 10 dígitos solo
+    se promueven cuando el país del tenant está en COUNTRY_DIALING_PREFIXES.
+    """
+    if value is None:
+        return None
+    raw = str(value).strip()
+    if not raw:
+        return None
+    return _normalize_phone_cached(raw, str(country_code or "").strip().upper(), bool(strict_mx))
+
+
+def normalize_phone_column(
+    values: Iterable[Any],
+    *,
+    country_code: str = "",
+    strict_mx: bool = False,
+) -> list[Optional[str]]:
+    """normalize_phone_e164 sobre una columna completa; cada valor distinto se procesa una vez."""
+    country = str(country_code or "").strip().upper()
+    strict = bool(strict_mx)
+    seen: dict[str, Optional[str]] = {}
+    out: list[Optional[str]] = []
+    for value in values:
+        raw = "" if value is None else str(value).strip()
+        if raw not in seen:
+            seen[raw] = _normalize_phone_cached(raw, country, strict) if raw else None
+        out.append(seen[raw])
+    return out
+
+
+_STRICT_E164_RE = re.compile(r"^\+[1-9]\d{7,14}$")
+
+
+def strict_e164(value: Any) -> Optional[str]:
+    """Acepta solo números que ya vienen en E.164 (quitando separadores); no infiere país."""
+    if value is None:
+        return None
+    raw = str(value).strip()
+    if not raw:
+        return None
+    raw = raw.replace(" ", "").replace("-", "").replace("(", "").replace(")", "")
+    if raw.startswith("00"):
+        raw = f"+{raw[2:]}"
+    if not _STRICT_E164_RE.fullmatch(raw):
+        return None
+    return raw
+
+
+def digits_to_e164(value: Any) -> Optional[str]:
+    """'+' + dígitos cuando hay entre 10 y 15 (formato de display de Meta)."""
+    digits = phone_digits(value)
+    if len(digits) < 10 or len(digits) > 15:
+        return None
+    return f"+{digits}"
+
+
+@lru_cache(maxsize=_NORMALIZE_CACHE_SIZE)
+def _mx_variants(digits: str) -> tuple[str, ...]:
+    # Compatibilidad MX (algunos proveedores reportan 521..., otros 52...)
+    candidates = {digits}
+    if digits.startswith("521") and len(digits) > 3:
+        candidates.add(f"52{digits[3:]}")
+    if digits.startswith("52") and len(digits) > 2:
+        candidates.add(f"521{digits[2:]}")
+    return tuple(sorted(candidates, key=lambda x: (len(x), x)))
+
+
+def phone_match_candidates(value: Any, *, with_plus: bool = True) -> list[str]:
+    """
+    Variantes de un número entrante para buscar en columnas guardadas con y
+    sin '+', con y sin el 1 móvil de MX. Orden estable (largo, valor).
+    """
+    digits = phone_digits(value)
+    if not digits:
+        return []
+    variants = _mx_variants(digits)
+    if not with_plus:
+        return list(variants)
+    candidates = set(variants) | {f"+{variant}" for variant in variants}
+    return sorted(candidates, key=lambda x: (len(x), x))
+
+
+@lru_cache(maxsize=_NORMALIZE_CACHE_SIZE)
+def _marketing_aliases_cached(raw: str, country_code: str, strict_mx: bool) -> tuple[str, ...]:
+    normalized = _normalize_phone_cached(raw, country_code, strict_mx) if raw else None
+    digits = _NON_DIGITS.sub("", normalized or raw)
+    if not digits:
+        return ()
+
+    aliases: set[str] = {digits, f"+{digits}"}
+    if normalized:
+        aliases.add(normalized)
+
+    if digits.startswith("52") and len(digits) == 12:
+        local_digits = digits[2:]
+        aliases.update((local_digits, f"+{local_digits}", f"521{local_digits}", f"+521{local_digits}"))
+    elif digits.startswith("521") and len(digits) == 13:
+        mx_digits = f"52{digits[3:]}"
+        local_digits = mx_digits[2:]
+        aliases.update((mx_digits, f"+{mx_digits}", local_digits, f"+{local_digits}"))
+
+    return tuple(sorted(aliases))
+
+
+def marketing_phone_aliases(value: Any, *, country_code: str = "", strict_mx: bool = False) -> list[str]:
+    """Todas las formas en que un mismo teléfono puede estar guardado (E.164, local, 521...)."""
+    raw = str(value or "").strip()
+    return list(_marketing_aliases_cached(raw, str(country_code or "").strip().upper(), bool(strict_mx)))
+
+
+class PhoneAliasIndex(Generic[T]):
+    """
+    Índice hash alias -> valor. Cada teléfono indexado se expande una vez a
+    sus alias, así que un cruce de N filas contra M contactos cuesta O(N + M).
+    """
+
+    def __init__(self, *, country_code: str = "", strict_mx: bool = False):
+        self.country_code = str(country_code or "").strip().upper()
+        self.strict_mx = bool(strict_mx)
+        self._by_alias: dict[str, T] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_alias)
+
+    def __bool__(self) -> bool:
+        return bool(self._by_alias)
+
+    def add(self, phone: Any, value: T) -> None:
+        for alias in _marketing_aliases_cached(str(phone or "").strip(), self.country_code, self.strict_mx):
+            self._by_alias[alias] = value
+
+    def lookup(self, phone: Any) -> Optional[T]:
+        for alias in _marketing_aliases_cached(str(phone or "").strip(), self.country_code, self.strict_mx):
+            value = self._by_alias.get(alias)
+            if value is not None:
+                return value
+        return None
+
+    def aliases(self) -> list[str]:
+        return list(self._by_alias)
@@ -0,0 +1,152 @@
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from api.config.config import supabase
+
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_TABLE = "client_dashboard_snapshots"
+SNAPSHOT_TTL_SECONDS = int(os.getenv("EVOLVIAN_DASHBOARD_SNAPSHOT_TTL_SECONDS") or "60")
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _parse_ts(value: Any) -> datetime | None:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except Exception:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _is_missing_snapshot_table(exc: Exception) -> bool:
+    msg = str(exc).lower()
+    return SNAPSHOT_TABLE in msg and (
+        "does not exist" in msg or "relation" in msg or "schema cache" in msg or "not found" in msg
+    )
+
+
+def load_dashboard_snapshot(client_id: str, *, supabase_client: Any = None) -> dict | None:
+    """
+    Devuelve el payload materializado del dashboard si sigue vigente.
+    Cualquier error se trata como cache miss (el dashboard se recalcula).
+    """
+    if not client_id or SNAPSHOT_TTL_SECONDS <= 0:
+        return None
+
+    client = supabase_client or supabase
+    try:
+        res = (
+            client.table(SNAPSHOT_TABLE)
+            .select("payload, perf_ms, computed_at, expires_at")
+            .eq("client_id", client_id)
+            .limit(1)
+            .execute()
+        )
+    except Exception as exc:
+        if not _is_missing_snapshot_table(exc):
+            logger.warning("Could not read dashboard snapshot for client %s: %s", client_id, exc)
+        return None
+
+    rows = getattr(res, "data", None) or []
+    row = rows[0] if isinstance(rows, list) and rows else None
+    # Payload vacío = marca de invalidación.
+    if not isinstance(row, dict) or not isinstance(row.get("payload"), dict) or not row["payload"]:
+        return None
+
+    expires_at = _parse_ts(row.get("expires_at"))
+    if not expires_at or expires_at <= _utcnow():
+        return None
+
+    return row
+
+
+def _is_duplicate_snapshot(exc: Exception) -> bool:
+    msg = str(exc).lower()
+    return "23505" in msg or "duplicate key" in msg
+
+
+def store_dashboard_snapshot(
+    client_id: str,
+    payload: dict,
+    *,
+    perf_ms: dict | None = None,
+    computed_at: datetime | None = None,
+    supabase_client: Any = None,
+) -> None:
+    """
+    Guarda el payload calculado a partir de `computed_at` (inicio del cálculo).
+    Solo reemplaza una fila más antigua: si una invalidación (o un cálculo más
+    nuevo) llegó después, el guardado se descarta en vez de revivir datos viejos.
+    """
+    if not client_id or SNAPSHOT_TTL_SECONDS <= 0:
+        return
+
+    client = supabase_client or supabase
+    computed_at = computed_at or _utcnow()
+    row = {
+        "client_id": client_id,
+        "payload": payload,
+        "perf_ms": perf_ms or {},
+        "computed_at": computed_at.isoformat(),
+        "expires_at": (computed_at + timedelta(seconds=SNAPSHOT_TTL_SECONDS)).isoformat(),
+    }
+    try:
+        res = (
+            client.table(SNAPSHOT_TABLE)
+            .update(row)
+            .eq("client_id", client_id)
+            .lt("computed_at", row["computed_at"])
+            .execute()
+        )
+        if getattr(res, "data", None):
+            return
+        # Sin fila previa: insert. Si ya existe una más nueva, el PK lo rechaza.
+        client.table(SNAPSHOT_TABLE).insert(row).execute()
+    except Exception as exc:
+        if _is_duplicate_snapshot(exc):
+            logger.debug("Dashboard snapshot superseded | client_id=%s", client_id)
+        elif not _is_missing_snapshot_table(exc):
+            logger.warning("Could not store dashboard snapshot for client %s: %s", client_id, exc)
+
+
+def invalidate_dashboard_snapshot(client_id: str | None, *, reason: str = "", supabase_client: Any = None) -> None:
+    """
+    Marca el snapshot del tenant como vencido tras una escritura que cambia el
+    dashboard (plan, canales, documentos, calendario, plantillas, citas).
+    Deja una marca con computed_at=ahora para que un cálculo iniciado antes no
+    lo vuelva a guardar.
+    Best-effort: nunca debe romper el flujo de escritura que la invoca.
+    """
+    if not client_id:
+        return
+
+    client = supabase_client or supabase
+    now = _utcnow().isoformat()
+    tombstone = {
+        "client_id": str(client_id),
+        "payload": {},
+        "perf_ms": {},
+        "computed_at": now,
+        "expires_at": now,
+    }
+    try:
+        client.table(SNAPSHOT_TABLE).upsert(tombstone, on_conflict="client_id").execute()
+        logger.debug("Dashboard snapshot invalidated | client_id=%s | reason=%s", client_id, reason)
+    except Exception as exc:
+        if not _is_missing_snapshot_table(exc):
+            logger.warning(
+                "Could not invalidate dashboard snapshot | client_id=%s | reason=%s | err=%s",
+                client_id,
+                reason,
+                exc,
+            )
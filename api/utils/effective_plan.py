@@ -75,3 +75,38 @@ def resolve_effective_plan_id(
     except Exception as exc:
         logger.warning("Could not resolve base plan_id for client %s: %s", client_id, exc)
         return "free"
+
+
+def resolve_effective_plan_ids(client_ids, *, supabase_client: Any = None) -> dict[str, str]:
+    """
+    Versión en bloque de resolve_effective_plan_id: dos lecturas `in_`
+    (overrides + client_settings) para todo el conjunto de tenants.
+    """
+    ids = sorted({str(client_id) for client_id in (client_ids or []) if client_id})
+    if not ids:
+        return {}
+
+    client = supabase_client or supabase
+    overrides: dict[str, str] = {}
+    base_plans: dict[str, str] = {}
+
+    try:
+        res = client.table("clients").select("id, override_plan").in_("id", ids).execute()
+        for row in res.data or []:
+            raw_override = str(row.get("override_plan") or "").strip().lower()
+            if raw_override in ALLOWED_OVERRIDE_PLANS:
+                overrides[str(row.get("id"))] = normalize_plan_id(raw_override)
+    except Exception as exc:
+        logger.warning("Could not batch-resolve override_plan for %s clients: %s", len(ids), exc)
+
+    try:
+        res = client.table("client_settings").select("client_id, plan_id").in_("client_id", ids).execute()
+        for row in res.data or []:
+            base_plans[str(row.get("client_id"))] = normalize_plan_id(row.get("plan_id"))
+    except Exception as exc:
+        logger.warning("Could not batch-resolve base plan_id for %s clients: %s", len(ids), exc)
+
+    return {
+        client_id: overrides.get(client_id) or base_plans.get(client_id) or "free"
+        for client_id in ids
+    }
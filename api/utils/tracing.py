@@ -0,0 +1,311 @@
+"""
+Tracing liviano por etapa (widget → router → RAG / calendario → envío).
+
+- Spans anidados propagados con contextvars (sirve en async, to_thread y hilos
+  que copian contexto).
+- Tags de tenant y canal heredados por todos los spans de la traza.
+- Muestreo por traza (EVOLVIAN_TRACE_SAMPLE_RATE); solo las trazas muestreadas
+  se exportan, en formato OTLP/JSON, a un JSONL local y/o a un collector OTLP/HTTP.
+- Todas las duraciones (muestreadas o no) alimentan una ventana en memoria
+  para p50/p95/p99 por etapa (endpoint interno).
+"""
+
+from __future__ import annotations
+
+import functools
+import inspect
+import json
+import logging
+import math
+import os
+import random
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional
+
+
+logger = logging.getLogger(__name__)
+
+TRACE_SAMPLE_RATE = float(os.getenv("EVOLVIAN_TRACE_SAMPLE_RATE") or "0.1")
+TRACE_JSONL_PATH = (os.getenv("EVOLVIAN_TRACE_JSONL_PATH") or "").strip()
+TRACE_OTLP_ENDPOINT = (os.getenv("EVOLVIAN_TRACE_OTLP_ENDPOINT") or "").strip()
+TRACE_STATS_WINDOW = int(os.getenv("EVOLVIAN_TRACE_STATS_WINDOW") or "2048")
+TRACE_SERVICE_NAME = "evolvian-api"
+TRACE_TAG_KEYS = ("client_id", "channel")
+
+_CURRENT_TRACE: ContextVar[Optional["_Trace"]] = ContextVar("evolvian_trace", default=None)
+_CURRENT_SPAN: ContextVar[Optional["Span"]] = ContextVar("evolvian_span", default=None)
+
+_STATS: dict[str, deque] = {}
+_STATS_LOCK = threading.Lock()
+_EXPORT_LOCK = threading.Lock()
+_EXPORT_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-export")
+
+
+@dataclass
+class _Trace:
+    trace_id: str
+    sampled: bool
+    tags: dict = field(default_factory=dict)
+    spans: list = field(default_factory=list)
+
+
+@dataclass
+class Span:
+    name: str
+    span_id: str
+    parent_span_id: str
+    trace: _Trace
+    start_ns: int
+    attributes: dict = field(default_factory=dict)
+    end_ns: int = 0
+    error: Optional[str] = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+
+def _record_duration(name: str, duration_ms: float) -> None:
+    with _STATS_LOCK:
+        window = _STATS.get(name)
+        if window is None:
+            window = _STATS[name] = deque(maxlen=max(1, TRACE_STATS_WINDOW))
+        window.append(duration_ms)
+
+
+def _new_trace(attributes: dict) -> _Trace:
+    return _Trace(
+        trace_id=secrets.token_hex(16),
+        sampled=random.random() < TRACE_SAMPLE_RATE,
+        tags={k: str(attributes[k]) for k in TRACE_TAG_KEYS if attributes.get(k)},
+    )
+
+
+def _attribute_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(span: Span) -> dict:
+    attributes = {**span.trace.tags, **span.attributes}
+    return {
+        "traceId": span.trace.trace_id,
+        "spanId": span.span_id,
+        "parentSpanId": span.parent_span_id,
+        "name": span.name,
+        "kind": 1,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [{"key": k, "value": _attribute_value(v)} for k, v in attributes.items()],
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+
+
+def _otlp_payload(spans: list[Span]) -> dict:
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [{"key": "service.name", "value": {"stringValue": TRACE_SERVICE_NAME}}]
+                },
+                "scopeSpans": [
+                    {"scope": {"name": "api.utils.tracing"}, "spans": [_otlp_span(s) for s in spans]}
+                ],
+            }
+        ]
+    }
+
+
+def _export(payload: dict) -> None:
+    if TRACE_JSONL_PATH:
+        try:
+            line = json.dumps(payload, ensure_ascii=False)
+            with _EXPORT_LOCK, open(TRACE_JSONL_PATH, "a", encoding="utf-8") as handle:
+                handle.write(line + "\n")
+        except Exception as exc:
+            logger.warning("⚠️ Trace JSONL export failed: %s", exc)
+
+    if TRACE_OTLP_ENDPOINT:
+        try:
+            import httpx
+
+            httpx.post(TRACE_OTLP_ENDPOINT, json=payload, timeout=5)
+        except Exception as exc:
+            logger.warning("⚠️ Trace OTLP export failed: %s", exc)
+
+
+def _finish(span: Span, duration_seconds: float, owns_trace: bool) -> None:
+    _record_duration(span.name, duration_seconds * 1000.0)
+    trace = span.trace
+    if not trace.sampled:
+        return
+    trace.spans.append(span)
+    if owns_trace and (TRACE_JSONL_PATH or TRACE_OTLP_ENDPOINT):
+        _EXPORT_EXECUTOR.submit(_export, _otlp_payload(list(trace.spans)))
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Abre un span hijo del span actual (o una traza nueva si no hay).
+    `client_id` / `channel` se promueven a tags de toda la traza.
+    """
+    trace = _CURRENT_TRACE.get()
+    owns_trace = trace is None
+    if owns_trace:
+        trace = _new_trace(attributes)
+    else:
+        for key in TRACE_TAG_KEYS:
+            if attributes.get(key) and key not in trace.tags:
+                trace.tags[key] = str(attributes[key])
+
+    parent = _CURRENT_SPAN.get()
+    current = Span(
+        name=name,
+        span_id=secrets.token_hex(8),
+        parent_span_id=parent.span_id if parent else "",
+        trace=trace,
+        start_ns=time.time_ns(),
+        attributes={k: v for k, v in attributes.items() if v is not None and k not in TRACE_TAG_KEYS},
+    )
+    trace_token = _CURRENT_TRACE.set(trace)
+    span_token = _CURRENT_SPAN.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as exc:
+        current.error = type(exc).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        current.end_ns = current.start_ns + int(duration * 1e9)
+        _CURRENT_SPAN.reset(span_token)
+        _CURRENT_TRACE.reset(trace_token)
+        _finish(current, duration, owns_trace)
+
+
+def record_span(name: str, duration_seconds: float, *, error: Optional[str] = None, **attributes: Any) -> None:
+    """Registra un span ya terminado (p. ej. medido por hooks de httpx) bajo el span actual."""
+    trace = _CURRENT_TRACE.get()
+    owns_trace = trace is None
+    if owns_trace:
+        trace = _new_trace(attributes)
+    parent = _CURRENT_SPAN.get()
+    end_ns = time.time_ns()
+    finished = Span(
+        name=name,
+        span_id=secrets.token_hex(8),
+        parent_span_id=parent.span_id if parent else "",
+        trace=trace,
+        start_ns=end_ns - int(duration_seconds * 1e9),
+        end_ns=end_ns,
+        attributes={k: v for k, v in attributes.items() if v is not None},
+        error=error,
+    )
+    _finish(finished, duration_seconds, owns_trace)
+
+
+def _tag_arguments(signature: inspect.Signature, args: tuple, kwargs: dict) -> dict:
+    try:
+        bound = signature.bind_partial(*args, **kwargs)
+    except TypeError:
+        return {}
+    return {key: bound.arguments.get(key) for key in TRACE_TAG_KEYS if bound.arguments.get(key)}
+
+
+def traced(name: str) -> Callable:
+    """Decorador (sync o async): span `name` con client_id/channel tomados de los argumentos."""
+
+    def _decorator(fn: Callable) -> Callable:
+        signature = inspect.signature(fn)
+
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def _async_wrapper(*args, **kwargs):
+                with span(name, **_tag_arguments(signature, args, kwargs)):
+                    return await fn(*args, **kwargs)
+
+            return _async_wrapper
+
+        @functools.wraps(fn)
+        def _wrapper(*args, **kwargs):
+            with span(name, **_tag_arguments(signature, args, kwargs)):
+                return fn(*args, **kwargs)
+
+        return _wrapper
+
+    return _decorator
+
+
+# ------------------------------------------------------------------
+# Hooks httpx → un span por query PostgREST / llamada de storage
+# ------------------------------------------------------------------
+_HTTPX_STARTED_KEY = "evolvian_trace_started"
+
+
+def _supabase_resource(path: str) -> str:
+    parts = [p for p in (path or "").split("/") if p]
+    if len(parts) >= 3 and parts[0] in ("rest", "storage"):
+        return parts[2] if parts[2] != "rpc" or len(parts) < 4 else f"rpc/{parts[3]}"
+    return "/".join(parts[:3])
+
+
+def httpx_request_hook(request) -> None:
+    request.extensions[_HTTPX_STARTED_KEY] = time.perf_counter()
+
+
+def httpx_response_hook(response) -> None:
+    request = response.request
+    started = request.extensions.get(_HTTPX_STARTED_KEY)
+    if started is None:
+        return
+    record_span(
+        "supabase.query",
+        time.perf_counter() - started,
+        error=f"http_{response.status_code}" if response.status_code >= 400 else None,
+        method=request.method,
+        resource=_supabase_resource(request.url.path),
+        status_code=response.status_code,
+    )
+
+
+# ------------------------------------------------------------------
+# Percentiles
+# ------------------------------------------------------------------
+def _percentile(ordered: list[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    rank = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def stage_percentiles() -> dict:
+    """p50/p95/p99 (ms) por nombre de span sobre la ventana en memoria."""
+    with _STATS_LOCK:
+        snapshot = {name: sorted(values) for name, values in _STATS.items()}
+    return {
+        name: {
+            "count": len(values),
+            "p50_ms": round(_percentile(values, 50), 2),
+            "p95_ms": round(_percentile(values, 95), 2),
+            "p99_ms": round(_percentile(values, 99), 2),
+        }
+        for name, values in sorted(snapshot.items())
+    }
+
+
+def reset_stage_stats() -> None:
+    with _STATS_LOCK:
+        _STATS.clear()
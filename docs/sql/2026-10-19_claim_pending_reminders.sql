@@ -0,0 +1,34 @@
+-- Batched, contention-free claim for the reminder executor.
+-- POST /api/internal/reminders/execute calls claim_pending_reminders() in a loop:
+-- each call flips up to p_limit due reminders to 'processing' and returns them.
+-- `for update skip locked` guarantees overlapping cron runs never claim the same row.
+
+begin;
+
+create index if not exists idx_appointment_reminders_pending_due
+  on public.appointment_reminders (scheduled_at asc)
+  where status = 'pending';
+
+create or replace function public.claim_pending_reminders(
+  p_now timestamptz default now(),
+  p_limit integer default 100
+)
+returns setof public.appointment_reminders
+language sql
+as $$
+  update public.appointment_reminders r
+     set status = 'processing',
+         updated_at = p_now
+   where r.id in (
+     select id
+       from public.appointment_reminders
+      where status = 'pending'
+        and scheduled_at <= p_now
+      order by scheduled_at asc
+      limit greatest(p_limit, 1)
+      for update skip locked
+   )
+  returning r.*;
+$$;
+
+commit;
@@ -0,0 +1,79 @@
+-- Maintained per-tenant counters so the dashboard and upload-limit checks do not
+-- run count(*) over history / document_metadata on every request.
+-- Written by the app on save_history / log_history (user messages) and on document
+-- activation / deactivation, via increment_client_counters().
+-- POST /api/internal/counters/reconcile recomputes exact counts and fixes drift.
+
+begin;
+
+create table if not exists public.client_counters (
+  client_id uuid primary key references public.clients(id) on delete cascade,
+  user_messages bigint not null default 0,
+  widget_user_messages bigint not null default 0,
+  active_documents integer not null default 0,
+  updated_at timestamptz not null default now(),
+  reconciled_at timestamptz null
+);
+
+create index if not exists idx_client_counters_reconciled_at
+  on public.client_counters (reconciled_at asc nulls first);
+
+alter table if exists public.client_counters enable row level security;
+
+create or replace function public.increment_client_counters(
+  p_client_id uuid,
+  p_user_messages bigint default 0,
+  p_widget_user_messages bigint default 0,
+  p_active_documents integer default 0
+)
+returns void
+language sql
+as $$
+  insert into public.client_counters as c (
+    client_id,
+    user_messages,
+    widget_user_messages,
+    active_documents,
+    updated_at
+  )
+  values (
+    p_client_id,
+    greatest(p_user_messages, 0),
+    greatest(p_widget_user_messages, 0),
+    greatest(p_active_documents, 0),
+    now()
+  )
+  on conflict (client_id) do update set
+    user_messages = greatest(c.user_messages + p_user_messages, 0),
+    widget_user_messages = greatest(c.widget_user_messages + p_widget_user_messages, 0),
+    active_documents = greatest(c.active_documents + p_active_documents, 0),
+    updated_at = now();
+$$;
+
+-- Backfill from exact counts once; afterwards the app keeps them current.
+insert into public.client_counters (client_id, user_messages, widget_user_messages, active_documents, reconciled_at)
+select
+  c.id,
+  coalesce(h.user_messages, 0),
+  coalesce(h.widget_user_messages, 0),
+  coalesce(d.active_documents, 0),
+  now()
+from public.clients c
+left join (
+  select
+    client_id,
+    count(*) as user_messages,
+    count(*) filter (where channel = 'widget') as widget_user_messages
+  from public.history
+  where role = 'user'
+  group by client_id
+) h on h.client_id = c.id
+left join (
+  select client_id, count(*) as active_documents
+  from public.document_metadata
+  where is_active = true
+  group by client_id
+) d on d.client_id = c.id
+on conflict (client_id) do nothing;
+
+commit;
@@ -0,0 +1,24 @@
+-- Materialized per-tenant dashboard payload for /dashboard_summary.
+-- A repeat dashboard load is a single primary-key read while the row is fresh.
+-- On writes that change the dashboard (plan, channels, documents, calendar,
+-- templates, appointments) the app replaces the row with an empty, already expired
+-- tombstone stamped with computed_at = now(), so a computation that started earlier
+-- cannot store over it. Rows otherwise expire after
+-- EVOLVIAN_DASHBOARD_SNAPSHOT_TTL_SECONDS (default 60s).
+
+begin;
+
+create table if not exists public.client_dashboard_snapshots (
+  client_id uuid primary key references public.clients(id) on delete cascade,
+  payload jsonb not null,
+  perf_ms jsonb not null default '{}'::jsonb,
+  computed_at timestamptz not null default now(),
+  expires_at timestamptz not null
+);
+
+create index if not exists idx_client_dashboard_snapshots_expires_at
+  on public.client_dashboard_snapshots (expires_at);
+
+alter table if exists public.client_dashboard_snapshots enable row level security;
+
+commit;
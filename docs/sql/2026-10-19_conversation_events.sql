@@ -0,0 +1,52 @@
+-- Compact per-session event log (ring buffer) next to conversation_state.
+-- Written by the app on save_history (one typed event per message) and by the
+-- calendar handler (fields_collected snapshots), via append_conversation_events().
+-- Routing heuristics and calendar state recovery read this single row instead
+-- of re-querying and re-parsing history on every message.
+
+begin;
+
+create table if not exists public.conversation_events (
+  client_id uuid not null references public.clients(id) on delete cascade,
+  session_id text not null,
+  events jsonb not null default '[]'::jsonb,
+  updated_at timestamptz not null default now(),
+  primary key (client_id, session_id)
+);
+
+create index if not exists idx_conversation_events_updated_at
+  on public.conversation_events (updated_at);
+
+alter table if exists public.conversation_events enable row level security;
+
+-- Atomic append + trim to the newest p_capacity events.
+create or replace function public.append_conversation_events(
+  p_client_id uuid,
+  p_session_id text,
+  p_events jsonb,
+  p_capacity integer default 32
+)
+returns void
+language sql
+as $$
+  insert into public.conversation_events as e (client_id, session_id, events, updated_at)
+  values (
+    p_client_id,
+    p_session_id,
+    (
+      select coalesce(jsonb_agg(item order by ord), '[]'::jsonb)
+      from jsonb_array_elements(p_events) with ordinality as t(item, ord)
+      where ord > jsonb_array_length(p_events) - greatest(p_capacity, 1)
+    ),
+    now()
+  )
+  on conflict (client_id, session_id) do update set
+    events = (
+      select coalesce(jsonb_agg(item order by ord), '[]'::jsonb)
+      from jsonb_array_elements(e.events || p_events) with ordinality as t(item, ord)
+      where ord > jsonb_array_length(e.events || p_events) - greatest(p_capacity, 1)
+    ),
+    updated_at = now();
+$$;
+
+commit;
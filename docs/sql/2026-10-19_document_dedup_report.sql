@@ -0,0 +1,11 @@
+-- Per-document report of the ingest-time chunk dedup pass
+-- (api/modules/chunk_dedup.py): total / kept chunks, exact and near duplicates,
+-- and which documents the dropped chunks already lived in.
+-- Written best-effort by process_file after the chunks are stored in Chroma.
+
+begin;
+
+alter table if exists public.document_metadata
+  add column if not exists dedup_report jsonb null;
+
+commit;
@@ -0,0 +1,74 @@
+-- Materialized per-tenant marketing audience for /marketing/audience and campaign sends.
+-- One row per recipient_key with the merged contact (appointment_clients, appointments,
+-- widget_consents, conversation_handoff_requests) plus opt-out / marketing_contacts /
+-- delivery signals. The app keeps it current incrementally: each read re-reads only the
+-- source rows changed since marketing_audience_index_state.synced_at and upserts the
+-- affected keys; a full rebuild runs when the state row is missing or older than
+-- EVOLVIAN_MARKETING_AUDIENCE_REBUILD_SECONDS (default 6h).
+-- Policy reasons (consent freshness) are computed on read from `contact`.
+
+begin;
+
+create extension if not exists pg_trgm;
+
+create table if not exists public.marketing_audience_index (
+  client_id uuid not null references public.clients(id) on delete cascade,
+  recipient_key text not null,
+  email text null,
+  phone text null,
+  segment text null,
+  listed boolean not null default false,
+  segment_rank smallint not null default 99,
+  activity_epoch double precision not null default 0,
+  sort_name text not null default '',
+  search_text text not null default '',
+  contact jsonb not null default '{}'::jsonb,
+  updated_at timestamptz not null default now(),
+  primary key (client_id, recipient_key),
+  constraint marketing_audience_index_segment_chk
+    check (segment is null or segment in ('clients', 'leads'))
+);
+
+-- Paginated reads in audience order (segment, last activity desc, name).
+-- recipient_key closes the ordering so OFFSET paging is stable when other keys tie.
+drop index if exists public.idx_marketing_audience_index_listed_order;
+create index idx_marketing_audience_index_listed_order
+  on public.marketing_audience_index (client_id, segment_rank, activity_epoch desc, sort_name, recipient_key)
+  where listed;
+
+create index if not exists idx_marketing_audience_index_client_email
+  on public.marketing_audience_index (client_id, email)
+  where email is not null;
+
+create index if not exists idx_marketing_audience_index_client_phone
+  on public.marketing_audience_index (client_id, phone)
+  where phone is not null;
+
+-- `q` search: ilike '%q%' over name/email/phone/recipient_key.
+create index if not exists idx_marketing_audience_index_search_trgm
+  on public.marketing_audience_index using gin (search_text gin_trgm_ops);
+
+create table if not exists public.marketing_audience_index_state (
+  client_id uuid primary key references public.clients(id) on delete cascade,
+  synced_at timestamptz not null,
+  rebuilt_at timestamptz not null,
+  row_count integer null
+);
+
+alter table if exists public.marketing_audience_index enable row level security;
+alter table if exists public.marketing_audience_index_state enable row level security;
+
+-- Delta reads by change timestamp on the source tables.
+create index if not exists idx_appointment_clients_client_updated_at
+  on public.appointment_clients (client_id, updated_at);
+
+create index if not exists idx_conversation_handoff_requests_client_updated_at
+  on public.conversation_handoff_requests (client_id, updated_at);
+
+create index if not exists idx_marketing_contacts_client_updated_at
+  on public.marketing_contacts (client_id, updated_at);
+
+create index if not exists idx_marketing_campaign_recipients_client_updated_at
+  on public.marketing_campaign_recipients (client_id, updated_at);
+
+commit;
@@ -0,0 +1,235 @@
+-- Per-campaign rollup counters for /marketing/campaigns and campaign detail.
+-- Maintained by triggers on marketing_campaign_recipients (counts by send_status,
+-- including transitions such as sent -> failed from Meta status callbacks) and on
+-- marketing_campaign_events (raw counts by event_type plus distinct-recipient
+-- response / interested / not_interested / opt_out counters). Every writer (send
+-- loop, WhatsApp webhook, public click redirect) is covered without app changes.
+-- The app falls back to counting recipients/events when this table is missing.
+
+begin;
+
+create table if not exists public.marketing_campaign_stats (
+  campaign_id uuid primary key references public.marketing_campaigns(id) on delete cascade,
+  client_id uuid not null references public.clients(id) on delete cascade,
+  status_counts jsonb not null default '{}'::jsonb,
+  event_counts jsonb not null default '{}'::jsonb,
+  responses_count integer not null default 0,
+  interested_count integer not null default 0,
+  not_interested_count integer not null default 0,
+  opt_out_count integer not null default 0,
+  updated_at timestamptz not null default now()
+);
+
+create index if not exists idx_marketing_campaign_stats_client
+  on public.marketing_campaign_stats (client_id);
+
+-- One row per (campaign, recipient, kind) already counted in the distinct counters.
+create table if not exists public.marketing_campaign_response_marks (
+  campaign_id uuid not null references public.marketing_campaigns(id) on delete cascade,
+  recipient_key text not null,
+  kind text not null check (kind in ('response', 'interested', 'not_interested', 'opt_out')),
+  primary key (campaign_id, recipient_key, kind)
+);
+
+alter table if exists public.marketing_campaign_stats enable row level security;
+alter table if exists public.marketing_campaign_response_marks enable row level security;
+
+-- Detail view pages recipients by campaign in updated_at order.
+create index if not exists idx_marketing_campaign_recipients_campaign_updated
+  on public.marketing_campaign_recipients (campaign_id, updated_at desc);
+
+create index if not exists idx_marketing_campaign_events_campaign_recipient
+  on public.marketing_campaign_events (campaign_id, recipient_key, created_at desc);
+
+create or replace function public.marketing_jsonb_incr(counts jsonb, k text, delta integer)
+returns jsonb
+language sql
+immutable
+as $$
+  select jsonb_set(
+    coalesce(counts, '{}'::jsonb),
+    array[k],
+    to_jsonb(greatest(coalesce((counts ->> k)::integer, 0) + delta, 0))
+  );
+$$;
+
+create or replace function public.marketing_campaign_stats_on_recipient()
+returns trigger
+language plpgsql
+as $$
+begin
+  if tg_op = 'UPDATE'
+     and new.campaign_id = old.campaign_id
+     and new.send_status is not distinct from old.send_status then
+    return null;
+  end if;
+
+  if tg_op in ('UPDATE', 'DELETE') then
+    update public.marketing_campaign_stats
+       set status_counts = public.marketing_jsonb_incr(status_counts, old.send_status, -1),
+           updated_at = now()
+     where campaign_id = old.campaign_id;
+  end if;
+
+  if tg_op in ('INSERT', 'UPDATE') then
+    insert into public.marketing_campaign_stats as s (campaign_id, client_id, status_counts)
+    values (new.campaign_id, new.client_id, jsonb_build_object(new.send_status, 1))
+    on conflict (campaign_id) do update set
+      status_counts = public.marketing_jsonb_incr(s.status_counts, new.send_status, 1),
+      updated_at = now();
+  end if;
+
+  return null;
+end;
+$$;
+
+create or replace function public.marketing_campaign_stats_on_event()
+returns trigger
+language plpgsql
+as $$
+declare
+  v_type text := lower(coalesce(new.event_type, ''));
+  v_key text := nullif(btrim(coalesce(new.recipient_key, '')), '');
+  v_kinds text[] := '{}';
+  v_kind text;
+  v_rows integer;
+  v_responses integer := 0;
+  v_interested integer := 0;
+  v_not_interested integer := 0;
+  v_opt_out integer := 0;
+begin
+  if v_type = '' then
+    return null;
+  end if;
+
+  if v_key is not null then
+    if v_type in ('interest', 'interest_yes', 'interest_no') then
+      v_kinds := v_kinds || 'response'::text;
+    end if;
+    if v_type in ('interest', 'interest_yes') then
+      v_kinds := v_kinds || 'interested'::text;
+    elsif v_type = 'interest_no' then
+      v_kinds := v_kinds || 'not_interested'::text;
+    elsif v_type = 'opt_out' then
+      v_kinds := v_kinds || 'opt_out'::text;
+    end if;
+
+    foreach v_kind in array v_kinds loop
+      insert into public.marketing_campaign_response_marks (campaign_id, recipient_key, kind)
+      values (new.campaign_id, v_key, v_kind)
+      on conflict do nothing;
+      get diagnostics v_rows = row_count;
+      if v_rows > 0 then
+        case v_kind
+          when 'response' then v_responses := 1;
+          when 'interested' then v_interested := 1;
+          when 'not_interested' then v_not_interested := 1;
+          when 'opt_out' then v_opt_out := 1;
+        end case;
+      end if;
+    end loop;
+  end if;
+
+  insert into public.marketing_campaign_stats as s (
+    campaign_id, client_id, event_counts,
+    responses_count, interested_count, not_interested_count, opt_out_count
+  )
+  values (
+    new.campaign_id, new.client_id, jsonb_build_object(v_type, 1),
+    v_responses, v_interested, v_not_interested, v_opt_out
+  )
+  on conflict (campaign_id) do update set
+    event_counts = public.marketing_jsonb_incr(s.event_counts, v_type, 1),
+    responses_count = s.responses_count + v_responses,
+    interested_count = s.interested_count + v_interested,
+    not_interested_count = s.not_interested_count + v_not_interested,
+    opt_out_count = s.opt_out_count + v_opt_out,
+    updated_at = now();
+
+  return null;
+end;
+$$;
+
+-- Backfill under lock so no write lands between the snapshot and the triggers.
+lock table public.marketing_campaign_recipients, public.marketing_campaign_events
+  in share row exclusive mode;
+
+drop trigger if exists trg_marketing_campaign_stats_recipient on public.marketing_campaign_recipients;
+create trigger trg_marketing_campaign_stats_recipient
+  after insert or update of send_status, campaign_id or delete
+  on public.marketing_campaign_recipients
+  for each row execute function public.marketing_campaign_stats_on_recipient();
+
+drop trigger if exists trg_marketing_campaign_stats_event on public.marketing_campaign_events;
+create trigger trg_marketing_campaign_stats_event
+  after insert
+  on public.marketing_campaign_events
+  for each row execute function public.marketing_campaign_stats_on_event();
+
+truncate public.marketing_campaign_response_marks;
+delete from public.marketing_campaign_stats;
+
+insert into public.marketing_campaign_response_marks (campaign_id, recipient_key, kind)
+select distinct e.campaign_id, btrim(e.recipient_key), k.kind
+from public.marketing_campaign_events e
+cross join lateral (
+  select 'response' as kind where lower(e.event_type) in ('interest', 'interest_yes', 'interest_no')
+  union all
+  select 'interested' where lower(e.event_type) in ('interest', 'interest_yes')
+  union all
+  select 'not_interested' where lower(e.event_type) = 'interest_no'
+  union all
+  select 'opt_out' where lower(e.event_type) = 'opt_out'
+) k
+where nullif(btrim(coalesce(e.recipient_key, '')), '') is not null
+on conflict do nothing;
+
+with status_rollup as (
+  select campaign_id, jsonb_object_agg(send_status, n) as status_counts
+  from (
+    select campaign_id, send_status, count(*)::integer as n
+    from public.marketing_campaign_recipients
+    group by campaign_id, send_status
+  ) t
+  group by campaign_id
+),
+event_rollup as (
+  select campaign_id, jsonb_object_agg(event_type, n) as event_counts
+  from (
+    select campaign_id, lower(event_type) as event_type, count(*)::integer as n
+    from public.marketing_campaign_events
+    where coalesce(event_type, '') <> ''
+    group by campaign_id, lower(event_type)
+  ) t
+  group by campaign_id
+),
+mark_rollup as (
+  select
+    campaign_id,
+    count(*) filter (where kind = 'response')::integer as responses_count,
+    count(*) filter (where kind = 'interested')::integer as interested_count,
+    count(*) filter (where kind = 'not_interested')::integer as not_interested_count,
+    count(*) filter (where kind = 'opt_out')::integer as opt_out_count
+  from public.marketing_campaign_response_marks
+  group by campaign_id
+)
+insert into public.marketing_campaign_stats (
+  campaign_id, client_id, status_counts, event_counts,
+  responses_count, interested_count, not_interested_count, opt_out_count
+)
+select
+  c.id,
+  c.client_id,
+  coalesce(s.status_counts, '{}'::jsonb),
+  coalesce(e.event_counts, '{}'::jsonb),
+  coalesce(m.responses_count, 0),
+  coalesce(m.interested_count, 0),
+  coalesce(m.not_interested_count, 0),
+  coalesce(m.opt_out_count, 0)
+from public.marketing_campaigns c
+left join status_rollup s on s.campaign_id = c.id
+left join event_rollup e on e.campaign_id = c.id
+left join mark_rollup m on m.campaign_id = c.id
+where s.campaign_id is not null or e.campaign_id is not null or m.campaign_id is not null;
+
+commit;
@@ -0,0 +1,31 @@
+-- Content-addressed registry of WhatsApp template header media.
+-- One row per (WABA, sha256 of the image bytes) with the Meta upload handle and
+-- its expiry. template_sync reuses a live handle instead of re-uploading the same
+-- image for every template; source_url/source_etag let it skip the download when
+-- the image server answers 304 to If-None-Match.
+-- Handle lifetime is META_TEMPLATE_MEDIA_HANDLE_TTL_SECONDS (default 24h).
+
+begin;
+
+create table if not exists public.whatsapp_template_media (
+  waba_id text not null,
+  content_sha256 text not null,
+  handle text not null,
+  mime_type text null,
+  file_length integer null,
+  source_url text null,
+  source_etag text null,
+  uploaded_at timestamptz not null default now(),
+  expires_at timestamptz not null,
+  primary key (waba_id, content_sha256)
+);
+
+create index if not exists idx_whatsapp_template_media_source_url
+  on public.whatsapp_template_media (waba_id, source_url, expires_at desc);
+
+create index if not exists idx_whatsapp_template_media_expires_at
+  on public.whatsapp_template_media (expires_at);
+
+alter table if exists public.whatsapp_template_media enable row level security;
+
+commit;
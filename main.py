@@ -75,6 +75,8 @@ from api.internal.privacy_requests import router as internal_privacy_router
 from api.internal.retention_jobs import router as internal_retention_router
 from api.internal.incident_readiness import router as internal_incident_router
 from api.internal.indexing_jobs import router as internal_indexing_router
+from api.internal.counter_jobs import router as internal_counters_router
+from api.internal.tracing_stats import router as internal_tracing_router
 from api.routes import reset  # Cron
 from api.routes import embed
 from api.channels import router as channels_router
@@ -113,6 +115,8 @@ from api.appointments.cancel_appointment import router as cancel_appointment_rou
 #Whatsapp
 
 from api.modules.whatsapp.webhook import router as whatsapp_webhook_router
+from api.modules.whatsapp.status_ingest import flush_meta_status_callbacks
+from api.modules.document_processor import shutdown_pdf_extract_pool
 from api.appointments.meta_reminder import router as meta_reminder_router
 from api.templates.meta_approved_templates import router as meta_templates_router
 
@@ -259,6 +263,24 @@ print("🚀 Imports completed successfully")
 app = FastAPI(title="Evolvian Assistant API", version="1.0")
 
 
+@app.on_event("shutdown")
+async def flush_pending_meta_status_callbacks():
+    # Meta no reenvía callbacks ya respondidos con 200: aplicar lo que quedó en la ventana.
+    try:
+        flushed = await flush_meta_status_callbacks()
+        print(f"✅ Meta status callbacks flushed on shutdown: {flushed}")
+    except Exception as e:
+        print(f"⚠️ Meta status callback flush on shutdown failed: {e}")
+
+
+@app.on_event("shutdown")
+def shutdown_pdf_extract_workers():
+    try:
+        shutdown_pdf_extract_pool()
+    except Exception as e:
+        print(f"⚠️ PDF extract pool shutdown failed: {e}")
+
+
 def _sanitize_error_detail(detail):
     """Redact sensitive tokens from error payloads before they reach clients."""
     try:
@@ -365,7 +387,7 @@ routers = [
     embed_router, public_plans_router, public_contact_router, public_privacy_router,
     public_demo_router, public_marketing_router,
     internal_privacy_router, internal_retention_router, internal_incident_router,
-    internal_indexing_router,
+    internal_indexing_router, internal_counters_router, internal_tracing_router,
     stripe_router, checkout_router,
     stripe_cancel_router, stripe_change_plan_router,
     reactivate_subscription_router, channels_router, register_consent_router, check_consent_router,
@@ -1,22 +1,25 @@
 #!/bin/bash
 echo "🚀 Iniciando Gmail Poll Worker para Evolvian AI..."
+# El endpoint decide qué canales tocan (intervalo adaptativo por canal);
+# el worker solo marca el tick.
+POLL_TICK_SECONDS="${GMAIL_POLL_TICK_SECONDS:-60}"
 while true; do
   TIMESTAMP=$(date '+%Y-%m-%d %H:%M:%S')
   echo "🕐 [$TIMESTAMP] Ejecutando revisión de Gmail..."
-  RESPONSE=$(curl -s -X POST https://evolvian-assistant.onrender.com/gmail_poll/check -H "Content-Type: application/json")
+  RESPONSE=$(curl -s -X POST https://evolvian-assistant.onrender.com/gmail_poll/check -H "Content-Type: application/json" -H "x-evolvian-internal-token: ${EVOLVIAN_INTERNAL_TASK_TOKEN}")
   if echo "$RESPONSE" | grep -q '"status":"ok"'; then
     echo "✅ [$TIMESTAMP] Poll exitoso → $RESPONSE"
   else
     echo "⚠️ [$TIMESTAMP] Error en poll → $RESPONSE"
     echo "⏳ [$TIMESTAMP] Reintentando en 60 segundos..."
     sleep 60
-    RETRY_RESPONSE=$(curl -s -X POST https://evolvian-assistant.onrender.com/gmail_poll/check -H "Content-Type: application/json")
+    RETRY_RESPONSE=$(curl -s -X POST https://evolvian-assistant.onrender.com/gmail_poll/check -H "Content-Type: application/json" -H "x-evolvian-internal-token: ${EVOLVIAN_INTERNAL_TASK_TOKEN}")
     if echo "$RETRY_RESPONSE" | grep -q '"status":"ok"'; then
       echo "✅ [$TIMESTAMP] Segundo intento exitoso."
     else
       echo "❌ [$TIMESTAMP] Segundo intento fallido → $RETRY_RESPONSE"
     fi
   fi
-  echo "💤 [$TIMESTAMP] Esperando 5 minutos para la siguiente ejecución..."
-  sleep 300
+  echo "💤 [$TIMESTAMP] Esperando ${POLL_TICK_SECONDS}s para el siguiente tick..."
+  sleep "$POLL_TICK_SECONDS"
 done
@@ -0,0 +1,166 @@
+"""
+Migra los vectorstores por tenant (`chroma_<client_id>`) al layout compartido
+por shards (EVOLVIAN_VECTORSTORE_LAYOUT=sharded).
+
+- Copia ids, embeddings, textos y metadata tal cual: no se re-embebe nada.
+- Cada chunk queda con metadata `client_id` (el filtro de tenant en el shard).
+- Índice léxico, firmas de dedup y manifest se copian al sidecar del tenant.
+- Idempotente: antes de copiar se borra la partición previa del tenant en el shard.
+
+Usage:
+  PYTHONPATH=. python scripts/migrate_chroma_to_shards.py [--client-id ID ...] [--dry-run] [--delete-source]
+
+Tras migrar todos los tenants, activar EVOLVIAN_VECTORSTORE_LAYOUT=sharded
+(y el mismo EVOLVIAN_VECTORSTORE_SHARDS) en todos los procesos.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import chromadb  # noqa: E402
+
+from api.modules.chunk_dedup import SIGNATURES_FILENAME  # noqa: E402
+from api.modules.index_manifest import MANIFEST_FILENAME  # noqa: E402
+from api.modules.lexical_index import LEXICAL_INDEX_FILENAME  # noqa: E402
+from api.modules.vector_layout import per_client_location, sharded_location  # noqa: E402
+from api.utils.paths import get_base_data_path  # noqa: E402
+
+
+SIDECAR_FILENAMES = (LEXICAL_INDEX_FILENAME, SIGNATURES_FILENAME, MANIFEST_FILENAME)
+PAGE_SIZE = 500
+
+
+def discover_client_ids(base_path: str) -> List[str]:
+    return sorted(
+        entry.name[len("chroma_"):]
+        for entry in Path(base_path).glob("chroma_*")
+        if entry.is_dir() and entry.name != "chroma_shards"
+    )
+
+
+def _iter_source_pages(collection) -> Iterable[dict]:
+    offset = 0
+    while True:
+        page = collection.get(
+            include=["embeddings", "documents", "metadatas"],
+            limit=PAGE_SIZE,
+            offset=offset,
+        )
+        ids = page.get("ids") or []
+        if not ids:
+            return
+        yield page
+        offset += len(ids)
+
+
+def migrate_client(
+    client_id: str,
+    *,
+    base_path: Optional[str] = None,
+    dry_run: bool = False,
+    delete_source: bool = False,
+) -> dict:
+    base_path = base_path or get_base_data_path()
+    source = per_client_location(client_id, base_path)
+    target = sharded_location(client_id, base_path)
+    summary = {
+        "client_id": client_id,
+        "source": source.persist_dir,
+        "shard": target.persist_dir,
+        "chunks": 0,
+        "sidecar_files": [],
+        "status": "migrated",
+    }
+
+    if not os.path.isdir(source.persist_dir):
+        summary["status"] = "missing_source"
+        return summary
+
+    try:
+        source_collection = chromadb.PersistentClient(path=source.persist_dir).get_collection(
+            source.collection_name
+        )
+    except Exception:
+        summary["status"] = "empty_source"
+        source_collection = None
+
+    summary["chunks"] = source_collection.count() if source_collection is not None else 0
+    sidecar_files = [
+        name for name in SIDECAR_FILENAMES if os.path.isfile(os.path.join(source.sidecar_dir, name))
+    ]
+    summary["sidecar_files"] = sidecar_files
+    if dry_run:
+        summary["status"] = "dry_run"
+        return summary
+
+    if source_collection is not None:
+        os.makedirs(target.persist_dir, exist_ok=True)
+        shard = chromadb.PersistentClient(path=target.persist_dir).get_or_create_collection(
+            target.collection_name,
+            embedding_function=None,
+        )
+        shard.delete(where={"client_id": client_id})
+
+        for page in _iter_source_pages(source_collection):
+            metadatas = [{**(metadata or {}), "client_id": client_id} for metadata in page["metadatas"]]
+            shard.add(
+                ids=page["ids"],
+                embeddings=page["embeddings"],
+                documents=page["documents"],
+                metadatas=metadatas,
+            )
+
+        copied = len(shard.get(where={"client_id": client_id}, include=[])["ids"])
+        if copied != summary["chunks"]:
+            summary["status"] = "count_mismatch"
+            summary["copied"] = copied
+            return summary
+
+    if os.path.isdir(target.sidecar_dir):
+        shutil.rmtree(target.sidecar_dir)
+    os.makedirs(target.sidecar_dir, exist_ok=True)
+    for name in sidecar_files:
+        shutil.copy2(os.path.join(source.sidecar_dir, name), os.path.join(target.sidecar_dir, name))
+
+    if delete_source:
+        shutil.rmtree(source.persist_dir)
+        summary["source_deleted"] = True
+
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--client-id", action="append", dest="client_ids", help="Migrar solo estos tenants")
+    parser.add_argument("--base-path", default=None, help="Directorio de datos (default: get_base_data_path())")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--delete-source", action="store_true", help="Borrar chroma_<client_id> tras verificar")
+    args = parser.parse_args(argv)
+
+    base_path = args.base_path or get_base_data_path()
+    client_ids = args.client_ids or discover_client_ids(base_path)
+    results = [
+        migrate_client(
+            client_id,
+            base_path=base_path,
+            dry_run=args.dry_run,
+            delete_source=args.delete_source,
+        )
+        for client_id in client_ids
+    ]
+    failed = [row for row in results if row["status"] == "count_mismatch"]
+    print(json.dumps({"clients": len(results), "failed": len(failed), "results": results}, indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
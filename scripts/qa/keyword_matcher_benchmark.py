@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the intent-routing keyword checks.
+
+Compares, over a fixed set of representative messages:
+- legacy: one `any(...)` / `re.search` per keyword and per hint family, the way
+  the router evaluated them before (sets rebuilt on every call)
+- matcher: a single `ROUTING_KEYWORDS.scan()` pass over the normalized text
+
+Also checks that both paths find the same families for every message
+(exit code 1 on mismatch).
+
+Usage:
+  python scripts/qa/keyword_matcher_benchmark.py
+  python scripts/qa/keyword_matcher_benchmark.py --rounds 2000 --json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from api.modules.assistant_rag import intent_router as router  # noqa: E402
+from api.modules.assistant_rag.keyword_matcher import normalize_text  # noqa: E402
+
+
+MESSAGES = (
+    "Hola, quiero agendar una cita para mañana a las 10",
+    "¿Cuánto cuesta el plan premium?",
+    "Cómo instalo el widget en Instagram?",
+    "Gracias por comunicarte con Clínica Dental Sonrisa. En breve nos comunicaremos contigo.",
+    "Este es un mensaje automático, por favor no responda",
+    "quiero hablar con un agente humano por favor",
+    "Me interesa, ¿qué sigue?",
+    "Aldo Nicolas Benitez",
+    "What days are available next week? I want to book an appointment",
+    "necesito información sobre sus servicios y horarios de atención",
+    "ok",
+    "The quick brown fox jumps over the lazy dog while nobody schedules anything at all " * 3,
+)
+
+_WORD_FAMILIES = {"calendar_followup", "campaign_interest"}
+
+
+_LEGACY_FAMILIES = {
+    family: [normalize_text(keyword) for keyword in keywords]
+    for family, keywords in {
+        "non_scheduling_product": router.NON_SCHEDULING_PRODUCT_KEYWORDS,
+        "pricing": router.PRICING_HINTS,
+        "product_help": router.PRODUCT_HELP_HINTS,
+        "scheduling": router.SCHEDULING_HINTS,
+        "generic_info": router.GENERIC_INFO_HINTS,
+        "exit_calendar": router.EXIT_CALENDAR_KEYWORDS,
+        "auto_reply_strong": router.AUTO_REPLY_STRONG_MARKERS,
+        "auto_reply_institutional": router.AUTO_REPLY_INSTITUTIONAL_MARKERS,
+        "whatsapp_handoff": router.WHATSAPP_HANDOFF_PHRASES,
+        "calendar_followup": router.CALENDAR_FOLLOWUP_KEYWORDS,
+        "campaign_interest": router.CAMPAIGN_INTEREST_MARKERS,
+    }.items()
+}
+
+
+def _legacy_families(message: str) -> set[str]:
+    """Semántica original: un substring / regex por keyword y por familia."""
+    normalized = normalize_text(message)
+    found = set()
+    for family, keywords in _LEGACY_FAMILIES.items():
+        for token in keywords:
+            if family in _WORD_FAMILIES:
+                matched = re.search(rf"(?<!\w){re.escape(token)}(?!\w)", normalized)
+            else:
+                matched = token in normalized
+            if matched:
+                found.add(family)
+                break
+    # contains_schedule_keywords normalizaba cada keyword en cada llamada.
+    for keyword in router.AGENDA_KEYWORDS:
+        token = normalize_text(keyword)
+        if (" " in token and token in normalized) or (
+            " " not in token and re.search(rf"(?<!\w){re.escape(token)}(?!\w)", normalized)
+        ):
+            found.add("agenda")
+            break
+    return found
+
+
+def _matcher_families(message: str) -> set[str]:
+    return router.ROUTING_KEYWORDS.scan(normalize_text(message)).families
+
+
+def _time_per_message_us(fn, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for message in MESSAGES:
+            fn(message)
+    elapsed = time.perf_counter() - started
+    return elapsed / (rounds * len(MESSAGES)) * 1_000_000
+
+
+def run_benchmark(rounds: int) -> dict:
+    mismatches = [
+        {"message": message[:60], "legacy": sorted(legacy), "matcher": sorted(current)}
+        for message in MESSAGES
+        for legacy, current in [(_legacy_families(message), _matcher_families(message))]
+        if legacy != current
+    ]
+    legacy_us = _time_per_message_us(_legacy_families, rounds)
+    matcher_us = _time_per_message_us(_matcher_families, rounds)
+    return {
+        "messages": len(MESSAGES),
+        "rounds": rounds,
+        "families": len(router.ROUTING_KEYWORDS.families),
+        "legacy_us_per_message": round(legacy_us, 2),
+        "matcher_us_per_message": round(matcher_us, 2),
+        "speedup": round(legacy_us / matcher_us, 2) if matcher_us else None,
+        "mismatches": mismatches,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=500)
+    parser.add_argument("--json", action="store_true", help="Imprime el reporte en JSON")
+    args = parser.parse_args()
+
+    report = run_benchmark(max(1, args.rounds))
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print(f"Messages: {report['messages']} x {report['rounds']} rounds, {report['families']} families")
+        print(f"legacy : {report['legacy_us_per_message']:>9.2f} us/message")
+        print(f"matcher: {report['matcher_us_per_message']:>9.2f} us/message ({report['speedup']}x)")
+        for mismatch in report["mismatches"]:
+            print(f"MISMATCH {mismatch}")
+    return 1 if report["mismatches"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
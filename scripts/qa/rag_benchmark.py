@@ -0,0 +1,635 @@
+#!/usr/bin/env python3
+"""
+Offline latency / quality benchmark for the RAG pipeline (`ask_question`).
+
+Runs the real pipeline end to end with local stand-ins, no network:
+- Hashing embeddings (deterministic bag of words) instead of OpenAI embeddings
+- Scripted chat model (translate / rewrite / extractive answer) instead of ChatOpenAI
+- In-memory Supabase for client_settings, document_metadata and history
+- Fixture corpus written to a temp dir as PDF, DOCX and TXT and ingested with
+  the same loaders, splitter and Chroma indexer as production
+
+Reports per-stage latency (language, translate, rewrite, retrieve, filter,
+pack, generate, save), tracemalloc peak / net blocks per query and
+retrieval recall@k against the expected source of each case.
+
+Usage:
+  python scripts/qa/rag_benchmark.py --iterations 5
+  python scripts/qa/rag_benchmark.py --iterations 20 --llm-latency-ms 300 --json
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+import zipfile
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+from unittest import mock
+from xml.sax.saxutils import escape
+
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from langchain_core.embeddings import Embeddings  # noqa: E402
+
+from api.modules import chroma_indexer, document_processor  # noqa: E402
+from api.modules.assistant_rag import prompt_utils, rag_pipeline  # noqa: E402
+from api.modules.assistant_rag import supabase_client as rag_supabase_client  # noqa: E402
+from api.modules.lexical_index import content_terms, tokenize  # noqa: E402
+from api.utils import active_documents  # noqa: E402
+
+
+STAGES = ("language", "translate", "rewrite", "retrieve", "filter", "pack", "generate", "save")
+RECALL_KS = (1, 5, rag_pipeline.RETRIEVAL_K)
+EMBEDDING_DIM = 256
+
+
+# ---------------------------------------------------------------------------
+# Fixture corpus
+# ---------------------------------------------------------------------------
+
+CORPUS = {
+    "servicios.pdf": [
+        "Clinica Veterinaria Huellitas. Servicios y precios vigentes.",
+        "La consulta general cuesta 450 pesos e incluye revision completa de la mascota.",
+        "La vacuna antirrabica cuesta 300 pesos y se aplica sin cita previa.",
+        "La esterilizacion de perros y gatos requiere ayuno de 12 horas y cuesta 1800 pesos.",
+        "El bano y corte de pelo para razas pequenas cuesta 350 pesos.",
+        "El bano y corte de pelo para razas grandes cuesta 550 pesos e incluye corte de unas.",
+        "La desparasitacion interna cuesta 180 pesos por dosis segun el peso de la mascota.",
+        "Los estudios de sangre completos cuestan 900 pesos y requieren ayuno de 8 horas.",
+        "La limpieza dental con anestesia cuesta 2200 pesos e incluye valoracion previa.",
+        "Las radiografias cuestan 650 pesos por placa y se entregan el mismo dia.",
+        "El ultrasonido abdominal cuesta 850 pesos con interpretacion del especialista.",
+        "La hospitalizacion cuesta 950 pesos por dia e incluye monitoreo y alimentacion.",
+        "La aplicacion de microchip de identificacion cuesta 400 pesos con registro nacional.",
+    ],
+    "politicas.docx": [
+        "Politicas de la clinica.",
+        "Las cancelaciones deben hacerse con al menos 24 horas de anticipacion.",
+        "Aceptamos pagos con tarjeta de credito, tarjeta de debito y transferencia bancaria.",
+        "Los resultados de laboratorio se envian por correo electronico en un plazo de 48 horas.",
+        "El estacionamiento es gratuito para clientes durante la consulta.",
+        "Las mascotas deben llegar con correa o transportadora por seguridad de todos.",
+        "Si llegas mas de 15 minutos tarde tu cita podra reprogramarse.",
+        "Las facturas se solicitan el mismo mes del servicio enviando tus datos fiscales.",
+        "Los planes de salud anuales se pagan por adelantado y no son reembolsables.",
+        "Las recetas de medicamentos controlados solo se entregan despues de una consulta presencial.",
+        "Los reembolsos por servicios no realizados se procesan en un plazo de 10 dias habiles.",
+    ],
+    "horarios.txt": [
+        "Horarios de atencion.",
+        "Abrimos de lunes a viernes de 9 a 18 horas.",
+        "Los sabados atendemos de 10 a 14 horas y los domingos permanecemos cerrados.",
+        "Urgencias veterinarias las 24 horas al telefono 55 1234 5678.",
+        "Estamos en Avenida Insurgentes Sur 1450, colonia del Valle, codigo postal 03100.",
+        "Los dias festivos oficiales la clinica abre de 10 a 13 horas solo para urgencias.",
+        "Las citas de esterilizacion se agendan de martes a jueves a partir de las 8 horas.",
+        "La farmacia veterinaria atiende en el mismo horario que la clinica.",
+        "En temporada vacacional ampliamos el horario de hospedaje hasta las 20 horas.",
+    ],
+    "faq.txt": [
+        "Preguntas frecuentes.",
+        "Si, atendemos perros, gatos, conejos, aves y pequenos roedores.",
+        "No atendemos reptiles ni animales exoticos de gran tamano.",
+        "Puedes agendar tu cita por WhatsApp, por telefono o en recepcion.",
+        "Ofrecemos hospedaje para mascotas con paseos diarios y reporte por foto.",
+        "Las vacunas de cachorro se aplican en tres dosis con tres semanas de diferencia.",
+        "Recomendamos revision dental una vez al ano para perros y gatos adultos.",
+        "Contamos con sala de espera separada para gatos para reducir su estres.",
+    ],
+}
+
+
+@dataclass
+class BenchmarkCase:
+    id: str
+    question: str
+    expected_paths: tuple[str, ...]
+    history: tuple[tuple[str, str], ...] = ()
+
+
+CASES = (
+    BenchmarkCase("price_general", "Cuanto cuesta la consulta general?", ("servicios.pdf",)),
+    BenchmarkCase("price_exact_token", "precio vacuna antirrabica 300", ("servicios.pdf",)),
+    BenchmarkCase("payments", "Aceptan pagos con tarjeta?", ("politicas.docx",)),
+    BenchmarkCase("cancellation", "Con cuanta anticipacion puedo cancelar?", ("politicas.docx",)),
+    BenchmarkCase("hours", "Abren los sabados y domingos?", ("horarios.txt",)),
+    BenchmarkCase("species", "Atienden conejos y aves?", ("faq.txt",)),
+    BenchmarkCase("xray_price", "Cuanto cuestan las radiografias?", ("servicios.pdf",)),
+    BenchmarkCase("address_en", "Where is the clinic located?", ("horarios.txt",)),
+    BenchmarkCase(
+        "multiturn_rewrite",
+        "Y cuanto cuesta?",
+        ("servicios.pdf",),
+        history=(
+            ("user", "Hola, necesito informacion: hacen esterilizacion de gatos?"),
+            ("assistant", "Si, realizamos esterilizaciones de perros y gatos."),
+        ),
+    ),
+)
+
+# "Traducciones" del modelo guionizado (pregunta EN → idioma del corpus).
+SCRIPTED_TRANSLATIONS = {
+    "Where is the clinic located?": "Donde esta ubicada la clinica? Avenida direccion colonia",
+}
+
+
+def _pdf_bytes(lines: list[str]) -> bytes:
+    """PDF mínimo de una página (Helvetica, una línea por párrafo)."""
+    def _pdf_text(value: str) -> str:
+        return value.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    stream_lines = ["BT", "/F1 11 Tf", "14 TL", "50 780 Td"]
+    for line in lines:
+        stream_lines.append(f"({_pdf_text(line)}) Tj T*")
+    stream_lines.append("ET")
+    stream = "\n".join(stream_lines).encode("latin-1")
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_at)
+    return bytes(out)
+
+
+def _docx_bytes(lines: list[str]) -> bytes:
+    paragraphs = "".join(f"<w:p><w:r><w:t>{escape(line)}</w:t></w:r></w:p>" for line in lines)
+    document_xml = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f"<w:body>{paragraphs}</w:body></w:document>"
+    )
+    buffer = tempfile.SpooledTemporaryFile()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("word/document.xml", document_xml)
+    buffer.seek(0)
+    return buffer.read()
+
+
+def write_fixture_corpus(target_dir: Path) -> list[Path]:
+    target_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for name, lines in CORPUS.items():
+        path = target_dir / name
+        if name.endswith(".pdf"):
+            path.write_bytes(_pdf_bytes(lines))
+        elif name.endswith(".docx"):
+            path.write_bytes(_docx_bytes(lines))
+        else:
+            path.write_text("\n".join(lines), encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+# ---------------------------------------------------------------------------
+# Local stand-ins
+# ---------------------------------------------------------------------------
+
+class HashingEmbeddings(Embeddings):
+    """Embeddings deterministas: hashing de tokens y bigramas, normalizado L2."""
+
+    def __init__(self, *_args, dim: int = EMBEDDING_DIM, **_kwargs):
+        self.dim = dim
+
+    def _embed(self, text: str) -> list[float]:
+        tokens = tokenize(text)
+        vector = [0.0] * self.dim
+        for feature in tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]:
+            digest = hashlib.md5(feature.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            vector[index] += 1.0 if digest[4] % 2 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+class ScriptedChatModel:
+    """
+    Sustituto de ChatOpenAI: traduce con un mapa fijo, reescribe devolviendo la
+    pregunta y responde de forma extractiva con la oración más parecida del contexto.
+    """
+
+    latency_seconds = 0.0
+    on_generate = None
+
+    def __init__(self, *_args, **_kwargs):
+        pass
+
+    def invoke(self, messages):
+        system = str(getattr(messages[0], "content", "") or "")
+        human = str(getattr(messages[-1], "content", "") or "")
+
+        if "translation engine" in system:
+            text = human.split("\n\n", 1)[-1].strip()
+            return SimpleNamespace(content=SCRIPTED_TRANSLATIONS.get(text, text))
+
+        if "rewrite questions" in system:
+            # Pregunta autocontenida = turno previo del usuario + pregunta actual.
+            match = re.search(r"Question:\s*(.+)$", human, re.S)
+            question = match.group(1).strip() if match else ""
+            previous = [
+                line[len("User:"):].strip()
+                for line in human.splitlines()
+                if line.startswith("User:") and line[len("User:"):].strip() != question
+            ]
+            return SimpleNamespace(content=" ".join(previous[-1:] + [question]))
+
+        started = time.perf_counter()
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        answer = self._extractive_answer(system, human)
+        if ScriptedChatModel.on_generate:
+            ScriptedChatModel.on_generate(time.perf_counter() - started)
+        return SimpleNamespace(content=answer)
+
+    @staticmethod
+    def _extractive_answer(system: str, human: str) -> str:
+        fallback = re.search(r'reply exactly: "(.+?)"', system, re.S)
+        information = re.search(r"<information>(.*?)</information>", human, re.S)
+        question = re.search(r"<question>(.*?)</question>", human, re.S)
+        conversation = re.search(r"<conversation>(.*?)</conversation>", human, re.S)
+
+        question_text = (question.group(1) if question else "").strip()
+        query_terms = set(content_terms(SCRIPTED_TRANSLATIONS.get(question_text, question_text)))
+        query_terms |= set(content_terms(conversation.group(1) if conversation else "")) if len(query_terms) < 3 else set()
+
+        best, best_overlap = "", 0
+        sentences = re.split(r"(?<=[.!?])\s+|\n+", information.group(1) if information else "")
+        for sentence in sentences:
+            overlap = len(query_terms & set(content_terms(sentence)))
+            if overlap > best_overlap:
+                best, best_overlap = sentence.strip(), overlap
+        return best or (fallback.group(1) if fallback else "")
+
+
+class _FakeQuery:
+    def __init__(self, db: "InMemorySupabase", table_name: str):
+        self._db = db
+        self._table = table_name
+        self._filters: list = []
+        self._single = False
+        self._limit = None
+        self._insert = None
+
+    def select(self, *_args, **_kwargs):
+        return self
+
+    def eq(self, column, value):
+        self._filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        allowed = set(values)
+        self._filters.append(lambda row: row.get(column) in allowed)
+        return self
+
+    def order(self, *_args, **_kwargs):
+        return self
+
+    def limit(self, value):
+        self._limit = value
+        return self
+
+    def single(self):
+        self._single = True
+        return self
+
+    maybe_single = single
+
+    def insert(self, payload):
+        self._insert = payload
+        return self
+
+    def execute(self):
+        self._db.calls.append(self._table)
+        rows = self._db.tables.setdefault(self._table, [])
+        if self._insert is not None:
+            inserted = self._insert if isinstance(self._insert, list) else [self._insert]
+            rows.extend(dict(row) for row in inserted)
+            return SimpleNamespace(data=inserted)
+        matched = [row for row in rows if all(check(row) for check in self._filters)]
+        if self._limit is not None:
+            matched = matched[: self._limit]
+        if self._single:
+            return SimpleNamespace(data=matched[0] if matched else None)
+        return SimpleNamespace(data=matched)
+
+
+class InMemorySupabase:
+    def __init__(self, tables: dict[str, list[dict]] | None = None):
+        self.tables = tables or {}
+        self.calls: list[str] = []
+
+    def table(self, name: str) -> _FakeQuery:
+        return _FakeQuery(self, name)
+
+    def rpc(self, name: str, _params: dict):
+        self.calls.append(f"rpc:{name}")
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=None))
+
+
+# ---------------------------------------------------------------------------
+# Instrumentación por etapa
+# ---------------------------------------------------------------------------
+
+@dataclass
+class QueryTrace:
+    stages: dict[str, float] = field(default_factory=dict)
+    retrieved_paths: list[str] = field(default_factory=list)
+    retrieve_started: float | None = None
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+
+class StageRecorder:
+    def __init__(self):
+        self.current = QueryTrace()
+
+    def timed(self, stage: str, fn):
+        def _wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.current.add(stage, time.perf_counter() - started)
+
+        return _wrapper
+
+    def retrieve_start(self, fn):
+        # "retrieve" = desde la resolución de documentos activos hasta el filtro
+        # (BM25, Chroma/embeddings y RRF), sin tocar la función del pipeline.
+        def _wrapper(*args, **kwargs):
+            self.current.retrieve_started = time.perf_counter()
+            return fn(*args, **kwargs)
+
+        return _wrapper
+
+    def filter_stage(self, fn):
+        def _wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            if self.current.retrieve_started is not None:
+                self.current.add("retrieve", started - self.current.retrieve_started)
+            docs = fn(*args, **kwargs)
+            self.current.add("filter", time.perf_counter() - started)
+            self.current.retrieved_paths = [
+                str((getattr(doc, "metadata", None) or {}).get("storage_path") or "") for doc in docs
+            ]
+            return docs
+
+        return _wrapper
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, math.ceil(pct / 100.0 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def _summarize_ms(values: list[float]) -> dict:
+    millis = [v * 1000.0 for v in values]
+    return {
+        "count": len(millis),
+        "p50_ms": round(_percentile(millis, 50), 3),
+        "p95_ms": round(_percentile(millis, 95), 3),
+        "max_ms": round(max(millis), 3) if millis else 0.0,
+    }
+
+
+def _recall_at_k(retrieved_paths: list[str], expected_paths: set[str], k: int) -> float:
+    if not expected_paths:
+        return 1.0
+    return len(expected_paths & set(retrieved_paths[:k])) / len(expected_paths)
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def _ingest_corpus(work_dir: Path, client_id: str, db: InMemorySupabase) -> int:
+    total_chunks = 0
+    for path in write_fixture_corpus(work_dir / "corpus"):
+        storage_path = f"{client_id}/{path.name}"
+        document_id = str(uuid.uuid4())
+        docs = document_processor.load_document(str(path))
+        chunks = document_processor.split_into_chunks(docs)
+        for chunk in chunks:
+            chunk.metadata = chunk.metadata or {}
+            chunk.metadata.update(
+                {
+                    "client_id": client_id,
+                    "document_id": document_id,
+                    "storage_path": storage_path,
+                    "source": storage_path,
+                }
+            )
+        chroma_indexer.save_to_chroma(chunks, client_id)
+        db.tables.setdefault("document_metadata", []).append(
+            {"id": document_id, "client_id": client_id, "storage_path": storage_path, "is_active": True}
+        )
+        total_chunks += len(chunks)
+    return total_chunks
+
+
+def _messages_for(case: BenchmarkCase) -> list[dict]:
+    messages = [{"role": role, "content": content} for role, content in case.history]
+    messages.append({"role": "user", "content": case.question})
+    return messages
+
+
+def run_benchmark(
+    iterations: int = 3,
+    llm_latency_ms: float = 0.0,
+    trace_allocations: bool = True,
+    work_dir: str | None = None,
+) -> dict:
+    """Ejecuta `ask_question` sobre CASES `iterations` veces y devuelve el reporte."""
+    client_id = f"bench-{uuid.uuid4().hex[:8]}"
+    recorder = StageRecorder()
+    db = InMemorySupabase(
+        {"client_settings": [{"client_id": client_id, "language": "es", "temperature": 0, "custom_prompt": None}]}
+    )
+
+    with ExitStack() as stack:
+        base_dir = Path(work_dir or stack.enter_context(tempfile.TemporaryDirectory(prefix="rag-bench-")))
+        ScriptedChatModel.latency_seconds = max(0.0, llm_latency_ms) / 1000.0
+        ScriptedChatModel.on_generate = lambda seconds: recorder.current.add("generate", seconds)
+        stack.callback(setattr, ScriptedChatModel, "on_generate", None)
+
+        patches = [
+            (chroma_indexer, "get_base_data_path", lambda: str(base_dir)),
+            (chroma_indexer, "OpenAIEmbeddings", HashingEmbeddings),
+            (rag_pipeline, "get_base_data_path", lambda: str(base_dir)),
+            (rag_pipeline, "OpenAIEmbeddings", HashingEmbeddings),
+            (rag_pipeline, "ChatOpenAI", ScriptedChatModel),
+            (prompt_utils, "supabase", db),
+            (rag_supabase_client, "supabase", db),
+            (active_documents, "supabase", db),
+            (rag_pipeline, "_resolve_user_language", recorder.timed("language", rag_pipeline._resolve_user_language)),
+            (rag_pipeline, "_translate_text", recorder.timed("translate", rag_pipeline._translate_text)),
+            (rag_pipeline, "_rewrite_for_retrieval", recorder.timed("rewrite", rag_pipeline._rewrite_for_retrieval)),
+            (rag_pipeline, "_get_active_storage_paths", recorder.retrieve_start(rag_pipeline._get_active_storage_paths)),
+            (
+                rag_pipeline,
+                "_filter_retrieved_docs_for_client",
+                recorder.filter_stage(rag_pipeline._filter_retrieved_docs_for_client),
+            ),
+            (rag_pipeline, "pack_context", recorder.timed("pack", rag_pipeline.pack_context)),
+            (rag_pipeline, "save_history", recorder.timed("save", rag_pipeline.save_history)),
+        ]
+        for target, name, value in patches:
+            stack.enter_context(mock.patch.object(target, name, value))
+        stack.callback(active_documents.invalidate_active_document_set, client_id, reason="benchmark_done")
+
+        ingest_started = time.perf_counter()
+        chunk_count = _ingest_corpus(base_dir, client_id, db)
+        ingest_seconds = time.perf_counter() - ingest_started
+
+        stage_samples: dict[str, list[float]] = {stage: [] for stage in STAGES}
+        totals: list[float] = []
+        recall_samples: dict[int, list[float]] = {k: [] for k in RECALL_KS}
+        peak_kib: list[float] = []
+        net_blocks: list[int] = []
+        answers: dict[str, Any] = {}
+
+        def _ask(case: BenchmarkCase) -> dict:
+            return rag_pipeline.ask_question(
+                messages=_messages_for(case),
+                client_id=client_id,
+                session_id=f"{client_id}-{case.id}",
+                return_metadata=True,
+            )
+
+        # Warm-up: abre Chroma / carga BM25 una vez fuera de las mediciones.
+        for case in CASES:
+            _ask(case)
+
+        for _ in range(max(1, iterations)):
+            for case in CASES:
+                recorder.current = QueryTrace()
+                started = time.perf_counter()
+                result = _ask(case)
+                totals.append(time.perf_counter() - started)
+
+                for stage in STAGES:
+                    stage_samples[stage].append(recorder.current.stages.get(stage, 0.0))
+                expected = {f"{client_id}/{name}" for name in case.expected_paths}
+                for k in RECALL_KS:
+                    recall_samples[k].append(_recall_at_k(recorder.current.retrieved_paths, expected, k))
+                answers[case.id] = {
+                    "answer": result.get("answer"),
+                    "confidence_score": result.get("confidence_score"),
+                    "handoff_recommended": result.get("handoff_recommended"),
+                }
+
+        if trace_allocations:
+            for case in CASES:
+                recorder.current = QueryTrace()
+                tracemalloc.start()
+                before = tracemalloc.take_snapshot()
+                _ask(case)
+                after = tracemalloc.take_snapshot()
+                _current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                peak_kib.append(peak / 1024.0)
+                net_blocks.append(sum(stat.count_diff for stat in after.compare_to(before, "filename")))
+
+    report = {
+        "client_id": client_id,
+        "iterations": max(1, iterations),
+        "queries": len(totals),
+        "corpus": {"documents": len(CORPUS), "chunks": chunk_count, "ingest_ms": round(ingest_seconds * 1000.0, 3)},
+        "llm_latency_ms": llm_latency_ms,
+        "total": _summarize_ms(totals),
+        "stages": {stage: _summarize_ms(samples) for stage, samples in stage_samples.items()},
+        "recall_at_k": {
+            str(k): round(sum(samples) / len(samples), 4) if samples else 0.0
+            for k, samples in recall_samples.items()
+        },
+        "answers": answers,
+    }
+    if trace_allocations:
+        report["allocations"] = {
+            "peak_kib_p50": round(_percentile(peak_kib, 50), 1),
+            "peak_kib_max": round(max(peak_kib), 1) if peak_kib else 0.0,
+            "net_blocks_p50": _percentile(net_blocks, 50),
+            "net_blocks_max": max(net_blocks) if net_blocks else 0,
+        }
+    return report
+
+
+def _print_report(report: dict) -> None:
+    corpus = report["corpus"]
+    print(f"Corpus: {corpus['documents']} docs, {corpus['chunks']} chunks (ingest {corpus['ingest_ms']} ms)")
+    print(f"Queries: {report['queries']} ({report['iterations']} iterations), llm latency {report['llm_latency_ms']} ms")
+    print(f"\n{'stage':<10} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}")
+    for stage, stats in list(report["stages"].items()) + [("total", report["total"])]:
+        print(f"{stage:<10} {stats['p50_ms']:>10.3f} {stats['p95_ms']:>10.3f} {stats['max_ms']:>10.3f}")
+    print("\nRecall@k: " + ", ".join(f"@{k}={v}" for k, v in report["recall_at_k"].items()))
+    if "allocations" in report:
+        alloc = report["allocations"]
+        print(
+            f"Allocations: peak p50 {alloc['peak_kib_p50']} KiB (max {alloc['peak_kib_max']}), "
+            f"net blocks p50 {alloc['net_blocks_p50']} (max {alloc['net_blocks_max']})"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Latencia simulada del modelo de chat")
+    parser.add_argument("--no-alloc", action="store_true", help="No medir asignaciones con tracemalloc")
+    parser.add_argument("--json", action="store_true", help="Imprime el reporte completo en JSON")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        iterations=args.iterations,
+        llm_latency_ms=args.llm_latency_ms,
+        trace_allocations=not args.no_alloc,
+    )
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        _print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
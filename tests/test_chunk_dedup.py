@@ -0,0 +1,107 @@
+from langchain.schema import Document
+
+
+FOOTER = (
+    "Clinica Dental Sonrisa S.A. de C.V. Todos los derechos reservados. "
+    "Aviso de privacidad disponible en nuestra recepcion y sitio web oficial."
+)
+TERMS = (
+    "Las citas canceladas con menos de 24 horas de anticipacion generan un cargo del 50 por ciento. "
+    "Los pagos se aceptan en efectivo, tarjeta de debito o credito y transferencia bancaria. "
+    "Los tratamientos de ortodoncia requieren valoracion previa y firma de consentimiento informado. "
+    "Pagina 3 de 12."
+)
+
+
+def _chunk(text, storage_path="c1/doc.pdf", document_id="doc-1"):
+    return Document(page_content=text, metadata={"storage_path": storage_path, "document_id": document_id})
+
+
+def test_exact_and_near_duplicates_are_dropped_within_document():
+    from api.modules import chunk_dedup
+
+    chunks = [
+        _chunk("La limpieza dental cuesta 800 pesos e incluye revision completa con el especialista."),
+        _chunk(FOOTER),
+        _chunk("El blanqueamiento tiene un costo de 2500 pesos por sesion en cualquier sucursal."),
+        _chunk(FOOTER.upper()),
+        _chunk(FOOTER.replace("oficial", "oficial.")),
+        _chunk(TERMS),
+        _chunk(TERMS.replace("Pagina 3 de 12", "Pagina 7 de 12")),
+    ]
+
+    kept, signatures, report = chunk_dedup.dedup_chunks(
+        chunks, document="doc-1", index=chunk_dedup.ChunkSignatureIndex()
+    )
+
+    assert [chunk.page_content for chunk in kept] == [chunks[i].page_content for i in (0, 1, 2, 5)]
+    assert len(signatures) == 4
+    assert report.exact_duplicates == 2
+    assert report.near_duplicates == 1
+    assert report.as_dict()["duplicate_sources"] == {"c1/doc.pdf": 3}
+
+
+def test_cross_document_matches_only_count_for_other_active_documents(tmp_path):
+    from api.modules import chunk_dedup
+
+    persist_dir = str(tmp_path)
+    _, signatures, _ = chunk_dedup.dedup_chunks(
+        [_chunk(FOOTER, "c1/a.pdf", "a-1")], document="a-1", index=chunk_dedup.ChunkSignatureIndex()
+    )
+    chunk_dedup.append_signatures(signatures, persist_dir)
+
+    def _run(storage_path, document_id, active):
+        return chunk_dedup.dedup_chunks(
+            [_chunk(FOOTER, storage_path, document_id)],
+            document=document_id,
+            index=chunk_dedup.load_signature_index(persist_dir),
+            active_storage_paths=active,
+        )
+
+    # Otro documento activo: el footer ya está indexado.
+    kept, _, report = _run("c1/b.pdf", "b-1", {"c1/a.pdf"})
+    assert kept == [] and report.duplicate_sources == {"c1/a.pdf": 1}
+
+    # El documento original ya no está activo: se vuelve a indexar.
+    kept, _, _ = _run("c1/b.pdf", "b-1", set())
+    assert len(kept) == 1
+
+    # Nueva versión de la misma ruta: la previa se reemplaza, no cuenta.
+    kept, _, _ = _run("c1/a.pdf", "a-2", {"c1/a.pdf"})
+    assert len(kept) == 1
+
+
+def test_short_chunks_only_match_exactly():
+    from api.modules import chunk_dedup
+
+    index = chunk_dedup.ChunkSignatureIndex()
+    kept, _, report = chunk_dedup.dedup_chunks(
+        [_chunk("Horario: 9 a 18"), _chunk("Horario: 9 a 19"), _chunk("horario 9 a 18")],
+        document="doc-1",
+        index=index,
+    )
+
+    assert [chunk.page_content for chunk in kept] == ["Horario: 9 a 18", "Horario: 9 a 19"]
+    assert report.exact_duplicates == 1 and report.near_duplicates == 0
+
+
+def test_dedup_for_ingest_respects_kill_switch_and_active_lookup_failures(tmp_path, monkeypatch):
+    from api.modules import chunk_dedup
+
+    chunks = [_chunk(FOOTER), _chunk(FOOTER)]
+
+    monkeypatch.setattr(chunk_dedup, "DEDUP_ENABLED", False)
+    kept, signatures, report = chunk_dedup.dedup_for_ingest(
+        chunks, "c1", persist_dir=str(tmp_path), document="doc-1"
+    )
+    assert kept == chunks and signatures == [] and report.kept_chunks == 2
+
+    def _boom(client_id):
+        raise RuntimeError("supabase down")
+
+    monkeypatch.setattr(chunk_dedup, "DEDUP_ENABLED", True)
+    monkeypatch.setattr(chunk_dedup, "get_active_document_set", _boom)
+    kept, signatures, report = chunk_dedup.dedup_for_ingest(
+        chunks, "c1", persist_dir=str(tmp_path), document="doc-1"
+    )
+    assert len(kept) == 1 and report.exact_duplicates == 1
@@ -0,0 +1,127 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+class _FakeQuery:
+    def __init__(self, db, table_name):
+        self._db = db
+        self._table = table_name
+        self._filters = []
+        self._count = None
+        self._upsert = None
+
+    def select(self, _fields, count=None):
+        self._count = count
+        return self
+
+    def eq(self, field, value):
+        self._filters.append((field, value))
+        return self
+
+    def order(self, *_args, **_kwargs):
+        return self
+
+    def limit(self, _value):
+        return self
+
+    def upsert(self, payload, on_conflict=None):
+        self._upsert = payload
+        return self
+
+    def execute(self):
+        rows = self._db.rows.setdefault(self._table, [])
+        if self._upsert is not None:
+            rows[:] = [row for row in rows if row.get("client_id") != self._upsert["client_id"]]
+            rows.append(dict(self._upsert))
+            return SimpleNamespace(data=[self._upsert])
+        matched = [
+            row for row in rows
+            if all(row.get(field) == value for field, value in self._filters)
+        ]
+        self._db.reads.append(self._table)
+        return SimpleNamespace(data=matched, count=len(matched) if self._count else None)
+
+
+class _FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.reads = []
+        self.rpc_calls = []
+
+    def table(self, table_name):
+        return _FakeQuery(self, table_name)
+
+    def rpc(self, name, params):
+        self.rpc_calls.append((name, params))
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=None))
+
+
+def _history_rows():
+    return [
+        {"client_id": "c1", "role": "user", "channel": "widget"},
+        {"client_id": "c1", "role": "user", "channel": "whatsapp"},
+        {"client_id": "c1", "role": "assistant", "channel": "widget"},
+        {"client_id": "c2", "role": "user", "channel": "widget"},
+    ]
+
+
+def test_record_history_counters_only_counts_user_messages():
+    from api.utils.client_counters import record_history_counters
+
+    fake = _FakeSupabase({})
+    record_history_counters("c1", role="assistant", channel="widget", supabase_client=fake)
+    record_history_counters("c1", role="user", channel="whatsapp", supabase_client=fake)
+    record_history_counters("c1", role="user", channel="widget", supabase_client=fake)
+
+    assert [params for _name, params in fake.rpc_calls] == [
+        {"p_client_id": "c1", "p_user_messages": 1, "p_widget_user_messages": 0, "p_active_documents": 0},
+        {"p_client_id": "c1", "p_user_messages": 1, "p_widget_user_messages": 1, "p_active_documents": 0},
+    ]
+
+
+def test_get_client_counters_seeds_missing_row_then_reads_o1():
+    from api.utils.client_counters import get_client_counters
+
+    fake = _FakeSupabase(
+        {
+            "history": _history_rows(),
+            "document_metadata": [
+                {"client_id": "c1", "is_active": True},
+                {"client_id": "c1", "is_active": False},
+            ],
+        }
+    )
+
+    seeded = get_client_counters("c1", supabase_client=fake)
+    assert seeded == {"user_messages": 2, "widget_user_messages": 1, "active_documents": 1}
+
+    fake.reads.clear()
+    assert get_client_counters("c1", supabase_client=fake) == seeded
+    assert fake.reads == ["client_counters"]
+
+
+def test_reconcile_client_counters_reports_drift():
+    from api.utils.client_counters import reconcile_client_counters
+
+    fake = _FakeSupabase(
+        {
+            "history": _history_rows(),
+            "document_metadata": [],
+            "client_counters": [
+                {"client_id": "c1", "user_messages": 5, "widget_user_messages": 1, "active_documents": 0},
+            ],
+        }
+    )
+
+    result = reconcile_client_counters("c1", supabase_client=fake)
+
+    assert result["seeded"] is False
+    assert result["drift"] == {"user_messages": -3}
+    assert fake.rows["client_counters"][0]["user_messages"] == 2
+    assert fake.rows["client_counters"][0]["reconciled_at"]
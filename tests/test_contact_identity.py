@@ -0,0 +1,68 @@
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from api.utils.contact_identity import (
+    PhoneAliasIndex,
+    digits_to_e164,
+    marketing_phone_aliases,
+    normalize_phone_column,
+    normalize_phone_e164,
+    phone_match_candidates,
+    strict_e164,
+)
+
+
+def test_normalization_rules_per_country_and_strictness():
+    assert normalize_phone_e164("55 2527 7660", country_code="MX") == "+525525277660"
+    assert normalize_phone_e164("55 2527 7660", country_code="GB") is None
+    assert normalize_phone_e164("0052 1 55 2527 7660") == "+525525277660"
+    assert normalize_phone_e164("+52 55 2527 766") == "+52552527766"
+    assert normalize_phone_e164("+52 55 2527 766", strict_mx=True) is None
+    assert normalize_phone_e164("   ") is None
+
+    column = ["5525277660", None, "5525277660", "+44 20 7946 0958", ""]
+    assert normalize_phone_column(column, country_code="mx") == [
+        "+525525277660",
+        None,
+        "+525525277660",
+        "+442079460958",
+        None,
+    ]
+
+    assert strict_e164("00 52 (55) 2527-7660") == "+525525277660"
+    assert strict_e164("5525277660") is None
+    assert digits_to_e164("+52 55 1234 5678") == "+525512345678"
+    assert digits_to_e164("12345") is None
+
+
+def test_inbound_candidates_cover_mx_mobile_variants():
+    assert phone_match_candidates("whatsapp:+525512345678") == [
+        "525512345678",
+        "+525512345678",
+        "5215512345678",
+        "+5215512345678",
+    ]
+    # Igual que antes: un 521... también genera la variante 5211... (inofensiva en el lookup).
+    assert phone_match_candidates("5215512345678", with_plus=False) == [
+        "525512345678",
+        "5215512345678",
+        "52115512345678",
+    ]
+    assert phone_match_candidates("") == []
+
+
+def test_alias_index_matches_any_stored_format():
+    index = PhoneAliasIndex(country_code="MX", strict_mx=True)
+    index.add("+525525277660", {"id": "mx"})
+    index.add("+442079460958", {"id": "uk"})
+
+    assert index.lookup("5525277660") == {"id": "mx"}
+    assert index.lookup("+521 55 2527 7660") == {"id": "mx"}
+    assert index.lookup("442079460958") == {"id": "uk"}
+    assert index.lookup("+15550000000") is None
+    assert set(marketing_phone_aliases("+525525277660")) <= set(index.aliases())
@@ -0,0 +1,275 @@
+import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+from starlette.requests import Request
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+class _FakeQuery:
+    def __init__(self, db, table_name):
+        self._db = db
+        self._table = table_name
+        self._filters = []
+        self._older_than = None
+        self._count = None
+        self._single = False
+        self._op = "select"
+        self._payload = None
+
+    def select(self, _fields, count=None):
+        self._count = count
+        return self
+
+    def eq(self, field, value):
+        self._filters.append((field, value))
+        return self
+
+    def lt(self, field, value):
+        self._older_than = (field, value)
+        return self
+
+    @property
+    def not_(self):
+        return self
+
+    def is_(self, *_args):
+        return self
+
+    def neq(self, *_args):
+        return self
+
+    def order(self, *_args, **_kwargs):
+        return self
+
+    def limit(self, _value):
+        return self
+
+    def single(self):
+        self._single = True
+        return self
+
+    def maybe_single(self):
+        self._single = True
+        return self
+
+    def upsert(self, payload, on_conflict=None):
+        self._op = "upsert"
+        self._payload = payload
+        return self
+
+    def update(self, payload):
+        self._op = "update"
+        self._payload = payload
+        return self
+
+    def insert(self, payload):
+        self._op = "insert"
+        self._payload = payload
+        return self
+
+    def delete(self):
+        self._op = "delete"
+        return self
+
+    def execute(self):
+        with self._db.lock:
+            self._db.calls.append((self._table, self._op))
+            rows = self._db.rows.setdefault(self._table, [])
+            matched = [
+                row for row in rows
+                if all(row.get(field) == value for field, value in self._filters)
+                and (not self._older_than or str(row.get(self._older_than[0]) or "") < self._older_than[1])
+            ]
+            if self._op == "upsert":
+                rows[:] = [row for row in rows if row.get("client_id") != self._payload.get("client_id")]
+                rows.append(dict(self._payload))
+                return SimpleNamespace(data=[self._payload])
+            if self._op == "update":
+                for row in matched:
+                    row.update(self._payload)
+                return SimpleNamespace(data=matched)
+            if self._op == "insert":
+                if any(row.get("client_id") == self._payload.get("client_id") for row in rows):
+                    raise Exception('duplicate key value violates unique constraint (23505)')
+                rows.append(dict(self._payload))
+                return SimpleNamespace(data=[self._payload])
+            if self._op == "delete":
+                rows[:] = [row for row in rows if row not in matched]
+                return SimpleNamespace(data=matched)
+        if self._single:
+            return SimpleNamespace(data=matched[0] if matched else None)
+        return SimpleNamespace(data=matched, count=len(matched) if self._count else None)
+
+
+class _FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def table(self, table_name):
+        return _FakeQuery(self, table_name)
+
+
+def _request(query_string: str = "") -> Request:
+    return Request({"type": "http", "headers": [], "query_string": query_string.encode()})
+
+
+def _seed_rows():
+    return {
+        "client_settings": [
+            {
+                "client_id": "client-1",
+                "assistant_name": "Evo",
+                "language": "es",
+                "plan_id": "starter",
+                "plans": {
+                    "id": "starter",
+                    "name": "Starter",
+                    "max_messages": 100,
+                    "is_unlimited": False,
+                    "supports_whatsapp": False,
+                    "supports_email": False,
+                    "plan_features": [{"feature": "chat", "is_active": True}],
+                },
+            }
+        ],
+        "clients": [{"id": "client-1", "override_plan": None}],
+        "history": [
+            {"client_id": "client-1", "role": "user", "channel": "widget", "content": "hola"},
+            {"client_id": "client-1", "role": "user", "channel": "widget", "content": "precio?"},
+        ],
+        "client_usage": [{"client_id": "client-1", "documents_uploaded": 2}],
+        "channels": [{"client_id": "client-1", "type": "chat"}],
+        "plans": [
+            {"id": "starter", "name": "Starter"},
+            {"id": "premium", "name": "Premium", "supports_whatsapp": True},
+        ],
+    }
+
+
+def _patch(monkeypatch, fake):
+    from api import dashboard_summary as module
+    from api.utils import dashboard_snapshot
+
+    monkeypatch.setattr(module, "supabase", fake)
+    monkeypatch.setattr(dashboard_snapshot, "supabase", fake)
+    monkeypatch.setattr(module, "authorize_client_request", lambda *_args: None)
+    # Un solo worker hace determinista la espera del guardado del snapshot.
+    monkeypatch.setattr(module, "_DASHBOARD_EXECUTOR", ThreadPoolExecutor(max_workers=1))
+    return module
+
+
+def _drain(module):
+    module._DASHBOARD_EXECUTOR.submit(lambda: None).result()
+
+
+def test_dashboard_summary_miss_fans_out_and_stores_snapshot(monkeypatch):
+    fake = _FakeSupabase(_seed_rows())
+    module = _patch(monkeypatch, fake)
+    monkeypatch.setattr(module, "get_client_override_plan_id", lambda *_args, **_kwargs: None)
+
+    response = module.dashboard_summary(_request(), client_id="client-1")
+    _drain(module)
+
+    body = json.loads(response.body)
+    assert body["usage"]["messages_used"] == 2
+    assert body["onboarding_signals"]["widget_messages_count"] == 2
+    assert body["onboarding_signals"]["external_channel_upgrade_plan"] == {"id": "premium", "name": "Premium"}
+    assert response.headers["X-Dashboard-Snapshot"] == "miss"
+    assert "settings_query;dur=" in response.headers["Server-Timing"]
+    assert "total;dur=" in response.headers["Server-Timing"]
+
+    stored = fake.rows["client_dashboard_snapshots"]
+    assert len(stored) == 1
+    assert stored[0]["payload"] == body
+    assert "client_counters_query" in stored[0]["perf_ms"]
+
+
+def test_dashboard_summary_hit_is_single_read(monkeypatch):
+    fake = _FakeSupabase(_seed_rows())
+    module = _patch(monkeypatch, fake)
+    cached_payload = {"plan": {"id": "starter"}, "usage": {"messages_used": 7}}
+    fake.rows["client_dashboard_snapshots"] = [
+        {
+            "client_id": "client-1",
+            "payload": cached_payload,
+            "perf_ms": {},
+            "computed_at": datetime.now(timezone.utc).isoformat(),
+            "expires_at": (datetime.now(timezone.utc) + timedelta(seconds=30)).isoformat(),
+        }
+    ]
+
+    response = module.dashboard_summary(_request(), client_id="client-1")
+
+    assert json.loads(response.body) == cached_payload
+    assert response.headers["X-Dashboard-Snapshot"] == "hit"
+    assert fake.calls == [("client_dashboard_snapshots", "select")]
+
+
+def test_dashboard_summary_ignores_expired_snapshot_and_refresh_flag(monkeypatch):
+    fake = _FakeSupabase(_seed_rows())
+    module = _patch(monkeypatch, fake)
+    monkeypatch.setattr(module, "get_client_override_plan_id", lambda *_args, **_kwargs: None)
+    fake.rows["client_dashboard_snapshots"] = [
+        {
+            "client_id": "client-1",
+            "payload": {"stale": True},
+            "expires_at": (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat(),
+        }
+    ]
+
+    expired = module.dashboard_summary(_request(), client_id="client-1")
+    assert expired.headers["X-Dashboard-Snapshot"] == "miss"
+
+    _drain(module)
+    fake.calls.clear()
+    refreshed = module.dashboard_summary(_request("refresh=1"), client_id="client-1")
+    assert refreshed.headers["X-Dashboard-Snapshot"] == "miss"
+    assert ("client_dashboard_snapshots", "select") not in fake.calls
+
+
+def test_invalidate_dashboard_snapshot_expires_tenant_row(monkeypatch):
+    from api.utils import dashboard_snapshot
+
+    fake = _FakeSupabase(
+        {
+            "client_dashboard_snapshots": [
+                {"client_id": "client-1", "payload": {"plan": {}}},
+                {"client_id": "client-2", "payload": {"plan": {}}},
+            ]
+        }
+    )
+    monkeypatch.setattr(dashboard_snapshot, "supabase", fake)
+
+    dashboard_snapshot.invalidate_dashboard_snapshot("client-1", reason="channel_linked")
+
+    rows = {row["client_id"]: row for row in fake.rows["client_dashboard_snapshots"]}
+    assert rows["client-1"]["payload"] == {}
+    assert rows["client-2"]["payload"] == {"plan": {}}
+    assert dashboard_snapshot.load_dashboard_snapshot("client-1") is None
+
+
+def test_store_skips_snapshot_computed_before_invalidation(monkeypatch):
+    from api.utils import dashboard_snapshot
+
+    fake = _FakeSupabase({})
+    monkeypatch.setattr(dashboard_snapshot, "supabase", fake)
+    started = datetime.now(timezone.utc) - timedelta(seconds=5)
+
+    dashboard_snapshot.invalidate_dashboard_snapshot("client-1", reason="appointment_created")
+    dashboard_snapshot.store_dashboard_snapshot("client-1", {"stale": True}, computed_at=started)
+
+    assert [row["payload"] for row in fake.rows["client_dashboard_snapshots"]] == [{}]
+
+    dashboard_snapshot.store_dashboard_snapshot("client-1", {"fresh": True})
+    assert dashboard_snapshot.load_dashboard_snapshot("client-1")["payload"] == {"fresh": True}
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+from starlette.requests import Request
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+class _FakeQuery:
+    def __init__(self, db, table_name):
+        self._db = db
+        self._table = table_name
+        self._filters = []
+        self._in = None
+
+    def select(self, _fields):
+        return self
+
+    def eq(self, field, value):
+        self._filters.append((field, value))
+        return self
+
+    def in_(self, field, values):
+        self._in = (field, set(values))
+        return self
+
+    def execute(self):
+        self._db.reads.append(self._table)
+        rows = self._db.rows.get(self._table, [])
+        return SimpleNamespace(
+            data=[
+                row for row in rows
+                if all(row.get(field) == value for field, value in self._filters)
+                and (self._in is None or row.get(self._in[0]) in self._in[1])
+            ]
+        )
+
+
+class _FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.reads = []
+
+    def table(self, table_name):
+        return _FakeQuery(self, table_name)
+
+
+def _request() -> Request:
+    return Request({"type": "http", "headers": [], "query_string": b""})
+
+
+def _channel(channel_id, client_id, email):
+    return {"id": channel_id, "client_id": client_id, "value": email,
+            "type": "email", "provider": "gmail", "active": True}
+
+
+def _patch(monkeypatch, fake, poll_results):
+    from api.modules.email_integration import gmail_poll as module
+
+    polled = []
+    webhooks = []
+
+    def _fake_poll(ch):
+        polled.append(ch["value"])
+        result = poll_results[ch["value"]]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def _fake_webhook(email, history_id, message_ids=None):
+        webhooks.append((email, history_id, message_ids))
+        return True
+
+    monkeypatch.setattr(module, "supabase", fake)
+    monkeypatch.setattr(module, "require_internal_request", lambda _request: None)
+    monkeypatch.setattr(module, "_poll_channel_sync", _fake_poll)
+    monkeypatch.setattr(module, "_send_webhook", _fake_webhook)
+    monkeypatch.setattr(module, "_SCHEDULES", {})
+    monkeypatch.setattr(module, "_ACCOUNT_BACKOFF_UNTIL", {})
+    return module, polled, webhooks
+
+
+def _check(module):
+    response = asyncio.run(module.check_new_emails(_request()))
+    return json.loads(response.body)
+
+
+def test_gmail_poll_resolves_plans_in_batch_and_schedules_adaptively(monkeypatch):
+    fake = _FakeSupabase(
+        {
+            "channels": [
+                _channel("ch1", "c1", "busy@example.com"),
+                _channel("ch2", "c2", "idle@example.com"),
+                _channel("ch3", "c3", "free@example.com"),
+            ],
+            "clients": [{"id": "c2", "override_plan": "white_label"}],
+            "client_settings": [
+                {"client_id": "c1", "plan_id": "premium"},
+                {"client_id": "c2", "plan_id": "starter"},
+                {"client_id": "c3", "plan_id": "free"},
+            ],
+        }
+    )
+    module, polled, webhooks = _patch(
+        monkeypatch,
+        fake,
+        {"busy@example.com": ("900", ["m1", "m2"]), "idle@example.com": None},
+    )
+
+    body = _check(module)
+
+    assert sorted(body["processed"]) == ["busy@example.com", "idle@example.com"]
+    assert body["skipped"] == ["free@example.com"]
+    assert webhooks == [("busy@example.com", "900", ["m1", "m2"])]
+    assert fake.reads == ["channels", "clients", "client_settings"]
+
+    assert module._SCHEDULES["ch1"].interval == module.MIN_POLL_INTERVAL_SECONDS
+    assert module._SCHEDULES["ch2"].interval == module.MIN_POLL_INTERVAL_SECONDS * 2
+
+    # Nada vence todavía: el siguiente tick no toca Gmail.
+    polled.clear()
+    body = _check(module)
+    assert polled == []
+    assert sorted(body["deferred"]) == ["busy@example.com", "idle@example.com"]
+
+
+def test_gmail_poll_backs_off_account_on_quota_error(monkeypatch):
+    from googleapiclient.errors import HttpError
+
+    quota_error = HttpError(
+        SimpleNamespace(status=429, reason="Too Many Requests", get=lambda key, default=None: "120"),
+        b'{"error": {"message": "rate limited"}}',
+    )
+    fake = _FakeSupabase(
+        {
+            "channels": [_channel("ch1", "c1", "busy@example.com")],
+            "client_settings": [{"client_id": "c1", "plan_id": "premium"}],
+        }
+    )
+    module, polled, webhooks = _patch(monkeypatch, fake, {"busy@example.com": quota_error})
+
+    body = _check(module)
+
+    assert body["deferred"] == ["busy@example.com"]
+    assert webhooks == []
+    backoff = module._ACCOUNT_BACKOFF_UNTIL["busy@example.com"]
+    assert backoff > module.time.monotonic() + 100
+    assert not module._is_due(fake.rows["channels"][0], module.time.monotonic())
+
+
+def test_extract_added_message_ids_keeps_inbox_order_without_duplicates():
+    from api.modules.email_integration.gmail_poll import extract_added_message_ids
+
+    changes = [
+        {"id": "10", "messagesAdded": [{"message": {"id": "m1", "labelIds": ["INBOX", "UNREAD"]}}]},
+        {"id": "11", "messagesAdded": [{"message": {"id": "m2", "labelIds": ["SENT"]}}]},
+        {"id": "12", "labelsAdded": [{"message": {"id": "m1"}, "labelIds": ["STARRED"]}]},
+        {"id": "13", "messagesAdded": [
+            {"message": {"id": "m3", "labelIds": ["INBOX"]}},
+            {"message": {"id": "m1", "labelIds": ["INBOX"]}},
+        ]},
+    ]
+
+    assert extract_added_message_ids(changes) == ["m1", "m3"]
@@ -0,0 +1,298 @@
+import base64
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+class _FakeRequest:
+    def __init__(self, result):
+        self._result = result
+
+    def execute(self):
+        return self._result
+
+
+class _FakeBatch:
+    def __init__(self, service, callback):
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, request_id=None):
+        self._requests.append((request_id, request))
+
+    def execute(self):
+        self._service.batches.append(len(self._requests))
+        for request_id, request in self._requests:
+            self._callback(request_id, request.execute(), None)
+
+
+class _FakeGmail:
+    def __init__(self, messages):
+        self._messages = messages
+        self.batches = []
+        self.formats = []
+
+    def new_batch_http_request(self, callback):
+        return _FakeBatch(self, callback)
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def get(self, userId, id, format, metadataHeaders=None):
+        self.formats.append((id, format))
+        return _FakeRequest(self._messages[id])
+
+
+class _FakeSupabase:
+    def __init__(self, processed):
+        self.processed = processed
+        self.queries = 0
+
+    def table(self, _name):
+        return self
+
+    def select(self, _fields):
+        return self
+
+    def in_(self, _field, values):
+        self._values = set(values)
+        return self
+
+    def execute(self):
+        self.queries += 1
+        return SimpleNamespace(data=[{"message_id": m} for m in self.processed if m in self._values])
+
+
+def _message(msg_id, sender, *, labels=("INBOX", "UNREAD"), internal_date=0, body=None):
+    payload = {
+        "headers": [
+            {"name": "From", "value": sender},
+            {"name": "To", "value": "soporte@example.com"},
+            {"name": "Subject", "value": f"Pregunta {msg_id}"},
+            {"name": "Message-Id", "value": f"<{msg_id}@mail>"},
+        ],
+    }
+    if body:
+        payload["parts"] = [{
+            "mimeType": "text/plain",
+            "body": {"data": base64.urlsafe_b64encode(body.encode()).decode().rstrip("=")},
+        }]
+    return {"id": msg_id, "threadId": f"t-{msg_id}", "snippet": f"snippet {msg_id}",
+            "labelIds": list(labels), "internalDate": str(internal_date), "payload": payload}
+
+
+def test_read_delta_messages_batches_dedupes_once_and_fetches_full_only_for_replies(monkeypatch):
+    from api.modules.email_integration import gmail_webhook as module
+
+    messages = {
+        "m1": _message("m1", "ana@cliente.com", internal_date=30, body="Hola, ¿tienen horario el sábado?"),
+        "m2": _message("m2", "noreply@servicio.com", internal_date=10),
+        "m3": _message("m3", "luis@cliente.com", internal_date=20),
+        "m4": _message("m4", "eva@cliente.com", internal_date=40),
+    }
+    fake_db = _FakeSupabase(processed={"<m4@mail>"})
+    service = _FakeGmail(messages)
+    monkeypatch.setattr(module, "supabase", fake_db)
+    monkeypatch.setattr(module, "GMAIL_BATCH_SIZE", 3)
+
+    candidates = module._read_delta_messages(service, ["m1", "m2", "m3", "m4"], "soporte@example.com")
+
+    assert [c["msg_id"] for c in candidates] == ["m3", "m1"]
+    assert candidates[1]["text"] == "Hola, ¿tienen horario el sábado?"
+    assert candidates[0]["text"] == "snippet m3"
+    assert fake_db.queries == 1
+    assert service.batches == [3, 1, 2]
+    assert sorted(i for i, fmt in service.formats if fmt == "full") == ["m1", "m3"]
+
+
+class _FakeClaimDb:
+    def __init__(self):
+        self.processed = {}
+        self._table = None
+        self._payload = None
+
+    def table(self, name):
+        self._table = name
+        self._payload = None
+        return self
+
+    def select(self, _fields):
+        return self
+
+    def eq(self, *_args):
+        return self
+
+    def limit(self, _n):
+        return self
+
+    def upsert(self, payload, on_conflict=None, ignore_duplicates=False):
+        assert on_conflict == "message_id" and ignore_duplicates
+        self._payload = payload
+        return self
+
+    def execute(self):
+        if self._table == "channels":
+            return SimpleNamespace(data=[{"client_id": "c1", "value": "soporte@example.com"}])
+        if self._payload["message_id"] in self.processed:
+            return SimpleNamespace(data=[])
+        self.processed[self._payload["message_id"]] = self._payload
+        return SimpleNamespace(data=[self._payload])
+
+
+class _FakeSendService:
+    def __init__(self):
+        self.sent = []
+        self.read_batches = []
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def threads(self):
+        return self
+
+    def list(self, **_kwargs):
+        return _FakeRequest({"threads": []})
+
+    def send(self, userId, body):
+        self.sent.append(body)
+        return _FakeRequest({"id": f"sent-{len(self.sent)}"})
+
+    def batchModify(self, userId, body):
+        self.read_batches.append(body["ids"])
+        return _FakeRequest({})
+
+
+def test_process_gmail_message_claims_each_message_before_replying(monkeypatch):
+    import asyncio
+
+    from api.modules.email_integration import gmail_webhook as module
+
+    db = _FakeClaimDb()
+    service = _FakeSendService()
+    candidate = {
+        "msg_id": "m1", "from_email": "ana@cliente.com", "subject": "Pregunta", "message_id": "<m1@mail>",
+        "thread_id": "t-m1", "labels": ["INBOX", "UNREAD"], "text": "Hola",
+    }
+
+    async def _fake_chat(_payload):
+        return {"answer": "Claro que sí"}
+
+    monkeypatch.setattr(module, "supabase", db)
+    monkeypatch.setattr(module, "get_gmail_service", lambda _channel: service)
+    monkeypatch.setattr(module, "_read_delta_messages", lambda *_args: [dict(candidate)])
+    monkeypatch.setattr(module, "process_chat_email_payload", _fake_chat)
+    monkeypatch.setattr(module, "begin_email_send_audit", lambda **_kwargs: (True, {}))
+    monkeypatch.setattr(module, "complete_email_send_audit", lambda **_kwargs: None)
+
+    # Dos pushes solapados del mismo mensaje: solo el que reclama responde.
+    async def _run():
+        await asyncio.gather(
+            module.process_gmail_message("soporte@example.com", "h1", ["m1"]),
+            module.process_gmail_message("soporte@example.com", "h2", ["m1"]),
+        )
+
+    asyncio.run(_run())
+
+    assert len(service.sent) == 1
+    assert list(db.processed) == ["<m1@mail>"]
+    assert service.read_batches == [["m1"]]
+
+
+class _FakeHistoryDb(_FakeClaimDb):
+    def __init__(self, last_history_id):
+        super().__init__()
+        self.last_history_id = last_history_id
+        self.channel_updates = []
+
+    def update(self, payload):
+        self._payload = payload
+        return self
+
+    def execute(self):
+        if self._table == "channels" and self._payload is not None:
+            self.channel_updates.append(self._payload)
+            return SimpleNamespace(data=[self._payload])
+        if self._table == "channels":
+            return SimpleNamespace(data=[{
+                "id": "ch1", "client_id": "c1", "value": "soporte@example.com",
+                "gmail_last_history_id": self.last_history_id,
+            }])
+        return super().execute()
+
+
+class _FakeHistoryService(_FakeSendService):
+    def __init__(self, pages=None, error=None):
+        super().__init__()
+        self._pages = list(pages or [])
+        self._error = error
+        self.history_calls = []
+        self.unread_calls = 0
+
+    def history(self):
+        return self
+
+    def list(self, **kwargs):
+        if "startHistoryId" in kwargs:
+            self.history_calls.append(kwargs)
+            if self._error is not None:
+                raise self._error
+            return _FakeRequest(self._pages.pop(0))
+        if kwargs.get("labelIds"):
+            self.unread_calls += 1
+            return _FakeRequest({"messages": [{"id": "u1"}]})
+        return super().list(**kwargs)
+
+
+def _run_push(monkeypatch, db, service):
+    import asyncio
+
+    from api.modules.email_integration import gmail_webhook as module
+
+    read = []
+    monkeypatch.setattr(module, "supabase", db)
+    monkeypatch.setattr(module, "get_gmail_service", lambda _channel: service)
+    monkeypatch.setattr(module, "_read_delta_messages", lambda _service, ids, _email: read.append(list(ids)) or [])
+    asyncio.run(module.process_gmail_message("soporte@example.com", "900", None))
+    return read
+
+
+def test_pubsub_push_expands_history_from_stored_history_id(monkeypatch):
+    db = _FakeHistoryDb("100")
+    service = _FakeHistoryService(pages=[
+        {"history": [{"messagesAdded": [{"message": {"id": "m1"}}, {"message": {"id": "m2"}}]}],
+         "nextPageToken": "p2", "historyId": "950"},
+        {"history": [{"messagesAdded": [{"message": {"id": "m2"}}, {"message": {"id": "m3"}}]}], "historyId": "950"},
+    ])
+
+    read = _run_push(monkeypatch, db, service)
+
+    assert read == [["m1", "m2", "m3"]]
+    assert [call["startHistoryId"] for call in service.history_calls] == ["100", "100"]
+    assert service.history_calls[1]["pageToken"] == "p2"
+    assert service.unread_calls == 0
+    assert db.channel_updates == [{"gmail_last_history_id": "950"}]
+
+
+def test_pubsub_push_lists_unread_only_when_stored_history_id_is_invalid(monkeypatch):
+    from googleapiclient.errors import HttpError
+
+    db = _FakeHistoryDb("1")
+    service = _FakeHistoryService(error=HttpError(SimpleNamespace(status=404, reason="Not Found"), b""))
+
+    read = _run_push(monkeypatch, db, service)
+
+    assert read == [["u1"]]
+    assert service.unread_calls == 1
+    assert db.channel_updates == [{"gmail_last_history_id": "900"}]
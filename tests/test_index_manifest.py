@@ -0,0 +1,110 @@
+import json
+from types import SimpleNamespace
+
+from langchain.schema import Document
+
+
+class _FakeTable:
+    def __init__(self, rows):
+        self._rows = rows
+        self._filters = []
+
+    def select(self, _query):
+        return self
+
+    def eq(self, field, value):
+        self._filters.append((field, value))
+        return self
+
+    def execute(self):
+        return SimpleNamespace(
+            data=[dict(row) for row in self._rows if all(row.get(f) == v for f, v in self._filters)]
+        )
+
+
+class _FakeSupabase:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def table(self, _name):
+        return _FakeTable(self._rows)
+
+
+def _chunks(*texts):
+    return [Document(page_content=text, metadata={"page": index}) for index, text in enumerate(texts)]
+
+
+def _record(sidecar_dir, storage_path, document_id, chunks, model="text-embedding-3-small"):
+    from api.modules import index_manifest
+
+    return index_manifest.record_indexed_document(
+        "client-1",
+        sidecar_dir=str(sidecar_dir),
+        storage_path=storage_path,
+        document_id=document_id,
+        chunks=chunks,
+        embedding_model=model,
+        layout="per_client",
+    )
+
+
+def test_record_replaces_document_entry_atomically(tmp_path):
+    from api.modules import index_manifest
+
+    _record(tmp_path, "client-1/a.pdf", "doc-a1", _chunks("uno", "dos"))
+    _record(tmp_path, "client-1/b.pdf", "doc-b1", _chunks("tres"))
+    entry = _record(tmp_path, "client-1/a.pdf", "doc-a2", _chunks("uno", "dos", "cuatro"))
+
+    manifest = index_manifest.load_manifest(str(tmp_path))
+    assert manifest["total_chunks"] == 4
+    assert manifest["documents"]["client-1/a.pdf"]["document_id"] == "doc-a2"
+    assert entry["content_hash"] == index_manifest.content_hash(_chunks("uno", "dos", "cuatro"))
+    assert [chunk["preview"] for chunk in entry["chunks"]] == ["uno", "dos", "cuatro"]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["index_manifest.json"]
+
+
+def test_audit_compares_manifest_with_active_metadata(tmp_path, monkeypatch):
+    from api.internal import audit_document_index_health as audit
+
+    rows = [
+        {"id": "doc-a2", "client_id": "client-1", "storage_path": "client-1/a.pdf", "indexed_at": "x", "is_active": True},
+        {"id": "doc-c1", "client_id": "client-1", "storage_path": "client-1/c.pdf", "indexed_at": "x", "is_active": True},
+        {"id": "doc-z1", "client_id": "client-2", "storage_path": "client-2/z.pdf", "indexed_at": "x", "is_active": True},
+    ]
+    monkeypatch.setattr(audit, "supabase", _FakeSupabase(rows))
+    monkeypatch.setattr(audit, "get_base_data_path", lambda: str(tmp_path))
+
+    _record(tmp_path / "chroma_client-1", "client-1/a.pdf", "doc-a1", _chunks("uno"), model="text-embedding-ada-002")
+    _record(tmp_path / "chroma_client-1", "client-1/old.pdf", "doc-o1", _chunks("viejo"))
+    _record(tmp_path / "chroma_client-2", "client-2/z.pdf", "doc-z1", _chunks("zeta"))
+
+    result = audit.audit_document_index_health()
+
+    assert result["clients_at_risk"] == 1
+    client = result["at_risk_clients"][0]
+    assert client["client_id"] == "client-1"
+    assert client["index_manifest"] is True
+    assert client["risk_reasons"] == [
+        "documents_missing_from_index",
+        "stale_document_versions",
+        "embedding_model_mismatch",
+    ]
+    assert client["missing_documents"] == ["client-1/c.pdf"]
+    assert client["stale_document_versions"] == ["client-1/a.pdf"]
+    assert client["inactive_documents_indexed"] == ["client-1/old.pdf"]
+
+
+def test_list_chunks_returns_manifest_documents(tmp_path, monkeypatch):
+    from api import list_chunks_api
+
+    monkeypatch.setattr(list_chunks_api, "CHROMA_ROOT", tmp_path.resolve())
+    monkeypatch.setattr(list_chunks_api, "authorize_client_request", lambda *_args: None)
+    _record(tmp_path / "chroma_client-1", "client-1/a.pdf", "doc-a1", _chunks("hola mundo", "adios"))
+
+    body = list_chunks_api.list_chunks(request=None, client_id="client-1")
+
+    assert body["total_documents"] == 1 and body["total_chunks"] == 2
+    document = body["documents"][0]
+    assert document["storage_path"] == "client-1/a.pdf"
+    assert [chunk["page"] for chunk in document["chunks"]] == [0, 1]
+    json.dumps(body)
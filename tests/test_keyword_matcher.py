@@ -0,0 +1,56 @@
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from api.modules.assistant_rag import intent_router
+from api.modules.assistant_rag.keyword_matcher import SUBSTRING, TOKEN, WORD, KeywordMatcher, normalize_text
+
+
+def test_single_pass_reports_every_family_with_its_own_semantics():
+    matcher = KeywordMatcher(
+        {
+            "substring": (["agend", "cita"], SUBSTRING),
+            "word": (["si", "hoy"], WORD),
+            "token": (["cita", "dias disponibles"], TOKEN),
+        }
+    )
+
+    hits = matcher.scan(normalize_text("¿Podemos agendar citas? Sí, hoy; o los xdias disponibles"))
+
+    assert hits.families == {"substring", "word", "token"}
+    assert hits.keywords("substring") == ["agend", "cita"]
+    assert hits.keywords("word") == ["si", "hoy"]
+    # "citas" no cuenta como token "cita"; las frases siguen siendo substring.
+    assert hits.keywords("token") == ["dias disponibles"]
+    assert matcher.scan("hoyo simple").families == set()
+
+
+def test_router_helpers_keep_previous_matching_rules():
+    assert intent_router.contains_schedule_keywords("Quiero reservar una sesión") is True
+    assert intent_router.contains_schedule_keywords("tengo dias disponibles") is True
+    assert intent_router.contains_schedule_keywords("las citas de ayer") is False
+    assert intent_router._looks_like_calendar_followup("el sábado por favor") is True
+    assert intent_router._looks_like_calendar_followup("sigo sin saber?") is False
+    assert intent_router._is_whatsapp_handoff_request("Quiero hablar con un AGENTE HUMANO") is True
+    assert intent_router._is_campaign_interest_followup("Me interesa, ¿qué sigue?") is True
+    assert intent_router._is_campaign_interest_followup("asesoria contable") is False
+
+
+def test_auto_reply_signals_follow_declaration_order():
+    detected = intent_router._detect_institutional_auto_reply(
+        "Gracias por comunicarte con Clínica Sonrisa. Este es un mensaje automático; "
+        "en breve nos comunicaremos contigo.",
+        "whatsapp",
+    )
+
+    assert detected["signals"] == [
+        "mensaje automatico",
+        "este es un mensaje automatico",
+        "gracias por comunicarte",
+        "gracias por comunicarte con",
+    ]
+    assert intent_router._detect_institutional_auto_reply("Gracias por comunicarte", "whatsapp") is None
@@ -0,0 +1,238 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.getcwd())
+
+from api import marketing_audience_index as index_module
+from api import marketing_campaigns as module
+
+
+def _ts(minutes_ago=0):
+    return (datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)).isoformat()
+
+
+class _FakeQuery:
+    def __init__(self, db, table_name):
+        self.db = db
+        self.table_name = table_name
+        self.filters = []
+        self.orders = []
+        self.window = None
+        self.count = None
+        self.action = "select"
+        self.payload = None
+
+    def select(self, _fields, count=None):
+        self.count = count
+        return self
+
+    def eq(self, key, value):
+        self.filters.append(lambda row: row.get(key) == value)
+        return self
+
+    def in_(self, key, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(key) in values)
+        return self
+
+    def gte(self, key, value):
+        self.filters.append(lambda row: str(row.get(key) or "") >= value)
+        return self
+
+    def ilike(self, key, pattern):
+        needle = pattern.strip("%").replace("\\_", "_").replace("\\%", "%").replace("\\\\", "\\")
+        self.filters.append(lambda row: needle in str(row.get(key) or "").lower())
+        return self
+
+    def order(self, key, desc=False):
+        self.orders.append((key, desc))
+        return self
+
+    def range(self, start, end):
+        self.window = (start, end + 1)
+        return self
+
+    def limit(self, n):
+        self.window = (0, n)
+        return self
+
+    def upsert(self, payload, on_conflict=None):
+        self.action, self.payload, self.conflict = "upsert", payload, on_conflict
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    def execute(self):
+        if self.table_name in self.db.missing:
+            raise Exception(f'relation "public.{self.table_name}" does not exist')
+        table = self.db.state.setdefault(self.table_name, [])
+        if self.action == "upsert":
+            payloads = self.payload if isinstance(self.payload, list) else [self.payload]
+            keys = self.conflict.split(",")
+            self.db.writes.append((self.table_name, len(payloads)))
+            for payload in payloads:
+                table[:] = [row for row in table if any(row.get(k) != payload.get(k) for k in keys)]
+                table.append(dict(payload))
+            return SimpleNamespace(data=payloads)
+        rows = [row for row in table if all(match(row) for match in self.filters)]
+        if self.action == "delete":
+            table[:] = [row for row in table if row not in rows]
+            return SimpleNamespace(data=rows)
+        for key, desc in reversed(self.orders):
+            rows.sort(key=lambda row: (row.get(key) is None, row.get(key) or 0), reverse=desc)
+        total = len(rows)
+        if self.window:
+            rows = rows[self.window[0]:self.window[1]]
+        return SimpleNamespace(data=rows, count=total if self.count else None)
+
+
+class _FakeSupabase:
+    def __init__(self, state, missing=()):
+        self.state = state
+        self.missing = set(missing)
+        self.writes = []
+
+    def table(self, name):
+        return _FakeQuery(self, name)
+
+
+def _state():
+    return {
+        "appointment_clients": [
+            {"client_id": "c1", "user_name": "Ana Pérez", "user_email": "ana@example.com", "user_phone": None,
+             "updated_at": _ts(60), "created_at": _ts(60)},
+            {"client_id": "c1", "user_name": "Bruno", "user_email": "bruno@example.com", "user_phone": None,
+             "updated_at": _ts(30), "created_at": _ts(30)},
+        ],
+        "appointments": [],
+        "widget_consents": [
+            {"client_id": "c1", "email": "lead@example.com", "phone": None, "accepted_terms": True,
+             "accepted_email_marketing": True, "consent_at": _ts(10)},
+        ],
+        "conversation_handoff_requests": [],
+        "public_privacy_requests": [],
+        "client_settings": [{"client_id": "c1", "consent_renewal_days": 90}],
+        "client_profile": [],
+        "marketing_campaign_recipients": [],
+        "marketing_campaigns": [],
+        "marketing_contacts": [],
+    }
+
+
+def _setup(monkeypatch, db):
+    monkeypatch.setattr(module, "supabase", db)
+    monkeypatch.setattr(index_module, "supabase", db)
+    monkeypatch.setattr(module, "backfill_default_marketing_consents_for_contacts", lambda **_kwargs: None)
+    module._get_client_country_code.cache_clear()
+
+
+def test_index_pages_match_legacy_and_sync_only_changed_rows(monkeypatch):
+    db = _FakeSupabase(_state())
+    _setup(monkeypatch, db)
+
+    legacy = module._load_audience(client_id="c1", q=None, segment=None)
+    items, counts, total = module._load_audience_page(client_id="c1", q=None, segment=None, limit=2)
+
+    assert [row["recipient_key"] for row in items] == [row["recipient_key"] for row in legacy[:2]]
+    assert items == legacy[:2]
+    assert counts == {"clients": 2, "leads": 1} and total == 3
+
+    # Nuevo lead + opt-out del lead existente: el sync solo reescribe esas dos claves.
+    db.state["widget_consents"].append(
+        {"client_id": "c1", "email": "nuevo@example.com", "phone": None, "accepted_terms": True,
+         "accepted_email_marketing": True, "consent_at": _ts(0)}
+    )
+    db.state["public_privacy_requests"].append(
+        {"email": "lead@example.com", "request_type": "marketing_opt_out", "status": "pending",
+         "created_at": _ts(0), "details": ""}
+    )
+    db.writes.clear()
+
+    items, counts, _ = module._load_audience_page(client_id="c1", q="example", segment="leads", limit=10)
+
+    assert [row["recipient_key"] for row in items] == ["email:nuevo@example.com"]
+    assert counts == {"clients": 0, "leads": 1}
+    assert ("marketing_audience_index", 2) in db.writes
+    assert module._load_audience_page(client_id="c1", q="ANA P", segment=None)[0][0]["recipient_name"] == "Ana Pérez"
+
+
+def test_send_audience_reads_only_selected_keys_and_falls_back_without_table(monkeypatch):
+    db = _FakeSupabase(_state())
+    _setup(monkeypatch, db)
+
+    selected = module._load_send_audience("c1", ["email:bruno@example.com", "email:missing@example.com"])
+    assert list(selected) == ["email:bruno@example.com"]
+    assert selected["email:bruno@example.com"]["segment"] == "clients"
+
+    missing = _FakeSupabase(_state(), missing={"marketing_audience_index_state"})
+    _setup(monkeypatch, missing)
+    items, counts, total = module._load_audience_page(client_id="c1", q=None, segment=None, limit=1, offset=1)
+    assert total == 3 and counts == {"clients": 2, "leads": 1}
+    assert len(items) == 1
+    assert "marketing_audience_index" not in missing.state
+
+
+def test_merge_pool_rows_prefers_fresh_source_identity():
+    row = {"recipient_key": "email:ana@example.com", "recipient_name": "Ana Pérez", "email": "ana@example.com", "phone": ""}
+    existing = {"recipient_key": "email:ana@example.com", "recipient_name": "Ana", "email": "ana@example.com", "phone": "+525500000001"}
+
+    module._merge_pool_rows(row, existing)
+
+    assert row["recipient_name"] == "Ana Pérez"
+    assert row["phone"] == "+525500000001"
+
+
+def test_index_paging_breaks_ties_on_recipient_key(monkeypatch):
+    tied = {"segment_rank": 0, "activity_epoch": 100, "sort_name": "ana", "listed": True, "client_id": "c1"}
+    db = _FakeSupabase({
+        "marketing_audience_index": [
+            {**tied, "recipient_key": key, "contact": {}} for key in ("email:c@x.com", "email:a@x.com", "email:b@x.com")
+        ]
+    })
+    monkeypatch.setattr(index_module, "AUDIENCE_INDEX_READ_CHUNK_SIZE", 1)
+
+    keys = [row["recipient_key"] for row in index_module.iter_index_rows("c1", supabase_client=db)]
+
+    assert keys == ["email:a@x.com", "email:b@x.com", "email:c@x.com"]
+
+
+def test_signal_delta_pages_and_rebuilds_instead_of_advancing_on_failure(monkeypatch):
+    db = _FakeSupabase(_state())
+    _setup(monkeypatch, db)
+    monkeypatch.setattr(module, "AUDIENCE_INDEX_READ_CHUNK_SIZE", 1)
+    db.state["marketing_campaign_recipients"] = [
+        {"id": str(i), "client_id": "c1", "recipient_key": f"email:r{i}@example.com", "updated_at": _ts(0)}
+        for i in range(3)
+    ]
+
+    _, _, recipient_keys = module._audience_signal_changes("c1", since=_ts(5))
+    assert recipient_keys == {f"email:r{i}@example.com" for i in range(3)}
+
+    assert module._sync_audience_index("c1")
+    state = dict(db.state["marketing_audience_index_state"][0])
+
+    # Fallo transitorio en una consulta de señales: reconstrucción completa, no delta.
+    db.state["widget_consents"].append(
+        {"client_id": "c1", "email": "viejo@example.com", "phone": None, "accepted_terms": True,
+         "accepted_email_marketing": True, "consent_at": _ts(600)}
+    )
+    original_execute = _FakeQuery.execute
+    failures = [1]
+
+    def flaky_execute(self):
+        if self.table_name == "marketing_contacts" and failures:
+            failures.pop()
+            raise Exception("canceling statement due to statement timeout")
+        return original_execute(self)
+
+    monkeypatch.setattr(_FakeQuery, "execute", flaky_execute)
+    assert module._sync_audience_index("c1")
+
+    rebuilt = db.state["marketing_audience_index_state"][0]
+    assert rebuilt["rebuilt_at"] != state["rebuilt_at"]
+    keys = {row["recipient_key"] for row in db.state["marketing_audience_index"]}
+    assert "email:viejo@example.com" in keys
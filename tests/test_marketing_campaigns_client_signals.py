@@ -12,8 +12,11 @@ class _FakeQuery:
         self.table_name = table_name
         self.state = state
         self.filters = []
+        self.count = None
+        self.window = None
 
-    def select(self, _fields):
+    def select(self, _fields, count=None):
+        self.count = count
         return self
 
     def eq(self, key, value):
@@ -30,7 +33,14 @@ class _FakeQuery:
     def limit(self, _n):
         return self
 
+    def range(self, start, end):
+        self.window = (start, end)
+        return self
+
     def execute(self):
+        if self.table_name in self.state.get("_missing_tables", ()):
+            raise Exception(f'relation "public.{self.table_name}" does not exist')
+        self.state.setdefault("_reads", []).append(self.table_name)
         rows = list(self.state.get(self.table_name, []))
         for op, key, value in self.filters:
             if op == "eq":
@@ -39,7 +49,10 @@ class _FakeQuery:
                 rows = [row for row in rows if row.get(key) in value]
             else:
                 raise AssertionError(op)
-        return SimpleNamespace(data=rows)
+        total = len(rows)
+        if self.window:
+            rows = rows[self.window[0] : self.window[1] + 1]
+        return SimpleNamespace(data=rows, count=total if self.count else None)
 
 
 class _FakeSupabase:
@@ -184,6 +197,7 @@ def test_load_contacts_audience_applies_marketing_contact_state(monkeypatch):
 
 def test_list_campaigns_includes_summary_metrics(monkeypatch):
     state = {
+        "_missing_tables": ("marketing_campaign_stats",),
         "marketing_campaigns": [
             {
                 "id": "campaign_1",
@@ -314,6 +328,8 @@ def test_get_campaign_detail_includes_recipient_response_status(monkeypatch):
         request=SimpleNamespace(),
         campaign_id="campaign_1",
         client_id="client_1",
+        limit=None,
+        offset=0,
     )
 
     assert result["recipients"][0]["send_status"] == "sent"
@@ -321,6 +337,100 @@ def test_get_campaign_detail_includes_recipient_response_status(monkeypatch):
     assert result["recipients"][0]["response_at"] == "2026-03-18T10:05:00+00:00"
 
 
+def test_list_campaigns_reads_rollups_without_scanning_recipients(monkeypatch):
+    state = {
+        "marketing_campaigns": [
+            {"id": "campaign_1", "client_id": "client_1", "name": "Promo", "channel": "whatsapp", "status": "sent",
+             "body": "Hola", "is_active": True, "created_at": "2026-03-18T09:00:00+00:00"},
+            {"id": "campaign_2", "client_id": "client_1", "name": "Nueva", "channel": "email", "status": "draft",
+             "body": "Hola", "is_active": True, "created_at": "2026-03-19T09:00:00+00:00"},
+        ],
+        "marketing_campaign_stats": [
+            {
+                "client_id": "client_1",
+                "campaign_id": "campaign_1",
+                "status_counts": {"sent": 40, "failed": 3, "pending": 2},
+                "event_counts": {"sent": 43, "meta_delivered": 38, "interest_yes": 6},
+                "responses_count": 7,
+                "interested_count": 5,
+                "not_interested_count": 2,
+                "opt_out_count": 1,
+            }
+        ],
+    }
+
+    monkeypatch.setattr(module, "supabase", _FakeSupabase(state))
+    monkeypatch.setattr(module, "authorize_client_request", lambda *_args, **_kwargs: "user_1")
+    monkeypatch.setattr(module, "_ensure_premium_access", lambda *_args, **_kwargs: None)
+
+    result = module.list_campaigns(
+        request=SimpleNamespace(),
+        client_id="client_1",
+        q=None,
+        channel=None,
+        status=None,
+        include_archived=False,
+    )
+
+    by_id = {item["id"]: item for item in result["items"]}
+    assert by_id["campaign_1"]["sent_count"] == 40
+    assert by_id["campaign_1"]["failed_count"] == 3
+    assert by_id["campaign_1"]["skipped_count"] == 0
+    assert by_id["campaign_1"]["responses_count"] == 7
+    assert by_id["campaign_1"]["opt_out_count"] == 1
+    assert by_id["campaign_2"]["sent_count"] == 0
+    assert "marketing_campaign_recipients" not in state["_reads"]
+    assert "marketing_campaign_events" not in state["_reads"]
+
+
+def test_get_campaign_detail_pages_recipients(monkeypatch):
+    recipients = [
+        {
+            "client_id": "client_1",
+            "campaign_id": "campaign_1",
+            "recipient_key": f"email:r{index}@example.com",
+            "send_status": "sent",
+            "updated_at": f"2026-03-18T10:{index:02d}:00+00:00",
+        }
+        for index in range(5)
+    ]
+    state = {
+        "marketing_campaigns": [
+            {"id": "campaign_1", "client_id": "client_1", "name": "Promo", "channel": "email", "status": "sent",
+             "body": "Hola", "is_active": True, "created_at": "2026-03-18T09:00:00+00:00"},
+        ],
+        "marketing_campaign_recipients": recipients,
+        "marketing_campaign_events": [
+            {"client_id": "client_1", "campaign_id": "campaign_1", "recipient_key": "email:r3@example.com",
+             "event_type": "opt_out", "created_at": "2026-03-18T11:00:00+00:00"},
+        ],
+        "marketing_campaign_stats": [
+            {"client_id": "client_1", "campaign_id": "campaign_1", "status_counts": {"sent": 5},
+             "event_counts": {"opt_out": 1}, "opt_out_count": 1},
+        ],
+    }
+
+    monkeypatch.setattr(module, "supabase", _FakeSupabase(state))
+    monkeypatch.setattr(module, "authorize_client_request", lambda *_args, **_kwargs: "user_1")
+    monkeypatch.setattr(module, "_ensure_premium_access", lambda *_args, **_kwargs: None)
+
+    result = module.get_campaign_detail(
+        request=SimpleNamespace(),
+        campaign_id="campaign_1",
+        client_id="client_1",
+        limit=2,
+        offset=2,
+    )
+
+    assert [row["recipient_key"] for row in result["recipients"]] == ["email:r2@example.com", "email:r3@example.com"]
+    assert result["recipients"][1]["response_status"] == "opt_out"
+    assert result["total"] == 5
+    assert result["limit"] == 2 and result["offset"] == 2
+    assert result["summary"]["sent_count"] == 5
+    assert result["summary"]["opt_out_count"] == 1
+    assert result["event_counts"] == {"opt_out": 1}
+
+
 def test_auto_sync_whatsapp_campaign_templates_returns_summary(monkeypatch):
     monkeypatch.setattr(
         module,
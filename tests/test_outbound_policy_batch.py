@@ -0,0 +1,172 @@
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from api.compliance import outbound_policy
+
+
+def _ago(days):
+    return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+
+
+class _Query:
+    def __init__(self, db, table_name):
+        self.db = db
+        self.table_name = table_name
+        self._filters = []
+        self._payload = None
+        self._window = None
+
+    def select(self, _fields):
+        return self
+
+    def eq(self, key, value):
+        self._filters.append((key, lambda row, value=value: row.get(key) == value))
+        return self
+
+    def in_(self, key, values):
+        values = set(values)
+        self._filters.append((key, lambda row, values=values: row.get(key) in values))
+        return self
+
+    def order(self, *_args, **_kwargs):
+        return self
+
+    def limit(self, _n):
+        return self
+
+    def range(self, start, end):
+        self._window = (start, end + 1)
+        return self
+
+    def insert(self, payload):
+        self._payload = payload
+        return self
+
+    def execute(self):
+        self.db.calls.append((self.table_name, "insert" if self._payload is not None else "select"))
+        if self._payload is not None:
+            self.db.inserts.append(self._payload)
+            return SimpleNamespace(data=self._payload)
+        rows = [row for row in self.db.tables.get(self.table_name, []) if all(match(row) for _, match in self._filters)]
+        if self._window:
+            rows = rows[self._window[0]:self._window[1]]
+        if self.db.max_rows is not None:
+            rows = rows[: self.db.max_rows]
+        return SimpleNamespace(data=rows)
+
+
+class _FakeSupabase:
+    def __init__(self, tables):
+        self.tables = tables
+        self.calls = []
+        self.inserts = []
+        self.max_rows = None
+
+    def table(self, name):
+        return _Query(self, name)
+
+
+def _fake_db():
+    return _FakeSupabase(
+        {
+            "client_settings": [{"client_id": "c1", "consent_renewal_days": 30}],
+            "widget_consents": [
+                {"id": "old", "client_id": "c1", "email": "ana@example.com", "consent_at": _ago(60),
+                 "accepted_terms": True, "accepted_email_marketing": True},
+                {"id": "fresh", "client_id": "c1", "email": "ana@example.com", "consent_at": _ago(2),
+                 "accepted_terms": True, "accepted_email_marketing": True},
+                {"id": "bob", "client_id": "c1", "email": "bob@example.com", "consent_at": _ago(2),
+                 "accepted_terms": True, "accepted_email_marketing": True},
+                {"id": "other-tenant", "client_id": "c2", "email": "eve@example.com", "consent_at": _ago(1),
+                 "accepted_terms": True, "accepted_email_marketing": True},
+            ],
+            "public_privacy_requests": [
+                {"id": "dsar-1", "email": "bob@example.com", "request_type": "marketing_opt_out",
+                 "status": "pending", "created_at": _ago(1), "details": "client_id=deadbeef-0002"},
+                {"id": "dsar-2", "email": "bob@example.com", "request_type": "marketing_opt_out",
+                 "status": "pending", "created_at": _ago(3), "details": ""},
+            ],
+        }
+    )
+
+
+def test_bulk_evaluation_loads_each_input_once_and_matches_rules(monkeypatch):
+    db = _fake_db()
+    monkeypatch.setattr(outbound_policy, "supabase", db)
+
+    results = outbound_policy.evaluate_outbound_policy_bulk(
+        client_id="c1",
+        channel="email",
+        purpose="marketing",
+        recipients=[
+            {"email": " Ana@Example.com "},
+            {"email": "bob@example.com"},
+            {"email": "eve@example.com"},
+        ],
+        source="test",
+    )
+
+    assert [r["allowed"] for r in results] == [True, False, False]
+    assert results[0]["consent_id"] == "fresh"
+    assert results[0]["rules"]["consent_renewal_days"] == 30
+    # El opt-out con scope de otro tenant se ignora; aplica el global.
+    assert results[1]["marketing_opt_out_request_id"] == "dsar-2"
+    assert results[2]["reason"] == "missing_or_expired_marketing_consent"
+    assert sorted(db.calls) == [
+        ("client_settings", "select"),
+        ("public_privacy_requests", "select"),
+        ("widget_consents", "select"),
+    ]
+
+
+def test_prefetch_pages_past_max_rows_truncation(monkeypatch):
+    db = _fake_db()
+    # PostgREST corta cada respuesta a max-rows; la fila "fresh" y el opt-out global quedan en la 2a página.
+    db.max_rows = 1
+    monkeypatch.setattr(outbound_policy, "supabase", db)
+    monkeypatch.setattr(outbound_policy, "POLICY_PREFETCH_PAGE_SIZE", 1)
+
+    results = outbound_policy.evaluate_outbound_policy_bulk(
+        client_id="c1",
+        channel="email",
+        purpose="marketing",
+        recipients=[{"email": "ana@example.com"}, {"email": "bob@example.com"}],
+        source="test",
+    )
+
+    assert results[0]["allowed"] is True and results[0]["consent_id"] == "fresh"
+    assert results[1]["allowed"] is False and results[1]["marketing_opt_out_request_id"] == "dsar-2"
+    assert db.calls.count(("widget_consents", "select")) > 1
+    assert db.calls.count(("public_privacy_requests", "select")) > 1
+
+
+def test_uncovered_recipients_fall_back_and_audit_is_written_in_bulk(monkeypatch):
+    db = _fake_db()
+    monkeypatch.setattr(outbound_policy, "supabase", db)
+
+    with outbound_policy.outbound_policy_batch([("c1", "ana@example.com", None)]):
+        covered = outbound_policy.evaluate_outbound_policy(
+            client_id="c1", channel="email", purpose="marketing", recipient_email="ana@example.com",
+        )
+        uncovered = outbound_policy.evaluate_outbound_policy(
+            client_id="c1", channel="email", purpose="marketing", recipient_email="bob@example.com",
+        )
+        for result in (covered, uncovered):
+            outbound_policy.log_outbound_policy_event(
+                client_id="c1", policy_result=result, stage="pre_send", send_status="pending",
+            )
+        assert db.inserts == []
+
+    assert covered["allowed"] is True and uncovered["allowed"] is False
+    # bob no estaba registrado: se consultó con los loaders por destinatario.
+    assert db.calls.count(("widget_consents", "select")) == 2
+    assert db.calls.count(("history", "insert")) == 1
+    assert [row["session_id"] for row in db.inserts[0]] == [covered["proof_id"], uncovered["proof_id"]]
+    assert all(row["role"] == "assistant" for row in db.inserts[0])
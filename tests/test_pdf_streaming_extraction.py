@@ -0,0 +1,128 @@
+import pytest
+
+
+def _pdf_bytes(page_texts):
+    """PDF mínimo con una línea de texto Helvetica por página."""
+    objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>", 3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    kids = []
+    for index, text in enumerate(page_texts):
+        page_id, content_id = 4 + index * 2, 5 + index * 2
+        stream = f"BT /F1 12 Tf 50 700 Td ({text}) Tj ET".encode("latin-1") if text else b""
+        objects[page_id] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        objects[content_id] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        kids.append(b"%d 0 R" % page_id)
+    objects[2] = b"<< /Type /Pages /Kids [" + b" ".join(kids) + b"] /Count %d >>" % len(page_texts)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(out)
+        out += b"%d 0 obj\n" % number + objects[number] + b"\nendobj\n"
+    xref_at = len(out)
+    size = max(objects) + 1
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % size
+    for number in range(1, size):
+        out += b"%010d 00000 n \n" % offsets[number]
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref_at)
+    return bytes(out)
+
+
+def _write_pdf(tmp_path, page_texts):
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(_pdf_bytes(page_texts))
+    return str(path)
+
+
+def test_parallel_extraction_keeps_page_order_and_matches_sequential(tmp_path, monkeypatch):
+    from api.modules import document_processor
+
+    path = _write_pdf(tmp_path, [f"Pagina numero {i} con precio {i * 10} pesos" for i in range(12)])
+
+    monkeypatch.setattr(document_processor, "PDF_PARALLEL_MIN_PAGES", 1)
+    monkeypatch.setattr(document_processor, "PDF_PAGES_PER_TASK", 3)
+    monkeypatch.setattr(document_processor, "PDF_EXTRACT_WORKERS", 2)
+    parallel = list(document_processor.iter_pdf_pages(path))
+
+    monkeypatch.setattr(document_processor, "PDF_EXTRACT_WORKERS", 1)
+    sequential = list(document_processor.iter_pdf_pages(path))
+
+    assert [doc.metadata["page"] for doc in parallel] == list(range(12))
+    assert [doc.page_content for doc in parallel] == [doc.page_content for doc in sequential]
+    assert "Pagina numero 7 con precio 70 pesos" in parallel[7].page_content
+    assert parallel[0].metadata["total_pages"] == 12
+
+
+def test_char_limit_aborts_before_extracting_remaining_pages(tmp_path, monkeypatch):
+    from api.modules import document_processor
+
+    path = _write_pdf(tmp_path, ["x" * 40 for _ in range(10)])
+    extracted_ranges = []
+    original = document_processor._extract_pdf_page_range
+
+    def _tracking(file_path, start, end):
+        extracted_ranges.append((start, end))
+        return original(file_path, start, end)
+
+    monkeypatch.setattr(document_processor, "_extract_pdf_page_range", _tracking)
+    monkeypatch.setattr(document_processor, "PDF_EXTRACT_WORKERS", 1)
+    monkeypatch.setattr(document_processor, "PDF_PAGES_PER_TASK", 2)
+    monkeypatch.setattr(document_processor, "MAX_DOCUMENT_CHARS", 100)
+
+    with pytest.raises(document_processor.DocumentTooLargeError):
+        list(document_processor.iter_document_chunks(path))
+
+    assert extracted_ranges == [(0, 2), (2, 4)]
+
+
+def test_empty_pages_fall_back_per_page_and_chunks_stream_per_page(tmp_path, monkeypatch):
+    from api.modules import document_processor
+
+    path = _write_pdf(tmp_path, ["Horario de lunes a viernes", "", "Aceptamos tarjeta"])
+    fallback_calls = []
+
+    def _fake_pdfium(file_path, page_index, state):
+        fallback_calls.append(page_index)
+        return "Texto recuperado por pdfium"
+
+    monkeypatch.setattr(document_processor, "_pdfium_page_text", _fake_pdfium)
+    monkeypatch.setattr(document_processor, "PDF_EXTRACT_WORKERS", 1)
+
+    chunks = list(document_processor.iter_document_chunks(path, file_url="https://x/doc.pdf"))
+
+    assert fallback_calls == [1]
+    assert [chunk.metadata["page"] for chunk in chunks] == [0, 1, 2]
+    assert chunks[1].page_content == "Texto recuperado por pdfium"
+
+
+def test_pdf_without_any_text_raises_extraction_error(tmp_path, monkeypatch):
+    from api.modules import document_processor
+
+    path = _write_pdf(tmp_path, ["", ""])
+    monkeypatch.setattr(document_processor, "_pdfium_page_text", lambda *_args: "")
+    monkeypatch.setattr(document_processor, "PDF_EXTRACT_WORKERS", 1)
+
+    with pytest.raises(document_processor.DocumentExtractionError):
+        document_processor.load_pdf_with_fallback(path)
+
+
+def test_parallel_extraction_reuses_one_spawn_pool_until_shutdown(tmp_path, monkeypatch):
+    from api.modules import document_processor
+
+    path = _write_pdf(tmp_path, [f"Pagina {i}" for i in range(6)])
+    monkeypatch.setattr(document_processor, "PDF_PARALLEL_MIN_PAGES", 1)
+    monkeypatch.setattr(document_processor, "PDF_PAGES_PER_TASK", 2)
+    monkeypatch.setattr(document_processor, "PDF_EXTRACT_WORKERS", 2)
+
+    try:
+        list(document_processor.iter_pdf_pages(path))
+        pool = document_processor._pdf_pool
+        list(document_processor.iter_pdf_pages(path))
+
+        assert pool is not None and document_processor._pdf_pool is pool
+        assert pool._mp_context.get_start_method() == "spawn"
+    finally:
+        document_processor.shutdown_pdf_extract_pool()
+    assert document_processor._pdf_pool is None
@@ -0,0 +1,47 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def _load_benchmark():
+    spec = importlib.util.spec_from_file_location(
+        "rag_benchmark", ROOT / "scripts" / "qa" / "rag_benchmark.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_fixture_corpus_loads_through_ingest_loaders(tmp_path):
+    from api.modules import document_processor
+
+    bench = _load_benchmark()
+    paths = bench.write_fixture_corpus(tmp_path)
+
+    assert sorted(path.suffix for path in paths) == [".docx", ".pdf", ".txt", ".txt"]
+    for path in paths:
+        text = " ".join(doc.page_content for doc in document_processor.load_document(str(path)))
+        assert bench.CORPUS[path.name][1].split()[0] in text
+
+
+def test_run_benchmark_reports_stages_recall_and_restores_pipeline(tmp_path):
+    from api.modules.assistant_rag import rag_pipeline
+
+    bench = _load_benchmark()
+    original_chat_model = rag_pipeline.ChatOpenAI
+
+    report = bench.run_benchmark(iterations=1, trace_allocations=False, work_dir=str(tmp_path))
+
+    assert report["queries"] == len(bench.CASES)
+    assert set(report["stages"]) == set(bench.STAGES)
+    assert report["stages"]["retrieve"]["p50_ms"] > 0
+    assert report["stages"]["generate"]["count"] == len(bench.CASES)
+    assert report["recall_at_k"]["5"] == 1.0
+    assert "cuesta 1800 pesos" in report["answers"]["multiturn_rewrite"]["answer"]
+    assert rag_pipeline.ChatOpenAI is original_chat_model
@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+
+def _doc(text, path="client-1/faq.pdf"):
+    return SimpleNamespace(page_content=text, metadata={"storage_path": path, "source": path})
+
+
+def test_pack_context_strips_splitter_overlap_and_near_duplicates():
+    from api.modules.assistant_rag.context_packer import pack_context
+
+    first = "Abrimos de lunes a viernes de 9 a 18 horas. Los sábados atendemos de 10 a 14 horas."
+    overlapping = "Los sábados atendemos de 10 a 14 horas. Los domingos permanecemos cerrados."
+    near_duplicate = "Abrimos de lunes a viernes de 9 a 18 horas. Los sábados atendemos de 10 a 14 horas!"
+    other = "El estacionamiento es gratuito para clientes."
+
+    packed = pack_context(
+        [_doc(first), _doc(overlapping), _doc(near_duplicate), _doc(other, "client-1/extra.pdf")],
+        "gpt-4o",
+        budget_tokens=500,
+    )
+
+    assert packed.text.count("Los sábados atendemos") == 1
+    assert "Los domingos permanecemos cerrados." in packed.text
+    assert packed.dropped_duplicates == 1
+    assert packed.trimmed_overlap_chars > 0
+    assert [d.page_content for d in packed.docs] == [first, overlapping, other]
+
+
+def test_pack_context_respects_token_budget_and_relevance_order():
+    from api.modules.assistant_rag.context_packer import count_tokens, pack_context
+
+    docs = [_doc(f"Servicio número {i}: " + "detalle del servicio ofrecido " * 30, f"client-1/doc{i}.pdf") for i in range(10)]
+
+    packed = pack_context(docs, "gpt-4o-mini", budget_tokens=300)
+
+    assert packed.tokens <= 300
+    assert count_tokens(packed.text, "gpt-4o-mini") <= 300 + len(packed.docs)
+    assert packed.text.startswith("Servicio número 0:")
+    assert packed.docs[0] is docs[0]
+
+
+def test_context_token_budget_follows_model_and_env_override(monkeypatch):
+    from api.modules.assistant_rag.context_packer import (
+        DEFAULT_CONTEXT_TOKEN_BUDGET,
+        MODEL_CONTEXT_TOKEN_BUDGETS,
+        context_token_budget,
+    )
+
+    assert context_token_budget("gpt-4o-mini-2024-07-18") == MODEL_CONTEXT_TOKEN_BUDGETS["gpt-4o-mini"]
+    assert context_token_budget("gpt-4o") == MODEL_CONTEXT_TOKEN_BUDGETS["gpt-4o"]
+    assert context_token_budget("some-local-model") == DEFAULT_CONTEXT_TOKEN_BUDGET
+
+    monkeypatch.setenv("EVOLVIAN_RAG_CONTEXT_TOKENS", "1234")
+    assert context_token_budget("gpt-4o") == 1234
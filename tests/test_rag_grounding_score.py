@@ -0,0 +1,39 @@
+CONTEXT = (
+    "Abrimos de lunes a viernes de 9 a 18 horas. "
+    "La consulta general cuesta 450 pesos e incluye revisión completa de la mascota. "
+    "El estacionamiento es gratuito para clientes."
+)
+
+
+def test_grounded_answer_scores_high_and_paraphrase_stays_above_fallback():
+    from api.modules.assistant_rag.rag_pipeline import GROUNDING_FALLBACK_SCORE, _grounding_score
+
+    copied = _grounding_score("La consulta general cuesta 450 pesos e incluye revisión completa.", CONTEXT)
+    paraphrased = _grounding_score("El precio de la consulta es de 450 pesos.", CONTEXT)
+
+    assert copied > 0.8
+    assert GROUNDING_FALLBACK_SCORE < paraphrased < copied
+
+
+def test_stopwords_alone_do_not_ground_an_answer():
+    from api.modules.assistant_rag.rag_pipeline import GROUNDING_FALLBACK_SCORE, _grounding_score
+
+    # Con el check anterior "de" / "la" bastaban para aceptar la respuesta.
+    invented = "Sí, tenemos servicio de hotel canino con alberca para la mascota los domingos."
+
+    assert _grounding_score(invented, CONTEXT) < GROUNDING_FALLBACK_SCORE
+    assert _grounding_score("de la y el", CONTEXT) == 0.0
+
+
+def test_grounding_blends_in_memory_embeddings_and_maps_to_confidence():
+    from api.modules.assistant_rag.rag_pipeline import _grounding_confidence, _grounding_score
+
+    answer = "Abrimos de lunes a viernes."
+    base = _grounding_score(answer, CONTEXT)
+    aligned = _grounding_score(answer, CONTEXT, answer_embedding=[1.0, 0.0], context_embedding=[1.0, 0.0])
+    orthogonal = _grounding_score(answer, CONTEXT, answer_embedding=[1.0, 0.0], context_embedding=[0.0, 1.0])
+
+    assert orthogonal < base <= aligned
+    assert _grounding_confidence(0.0) < 0.35
+    assert _grounding_confidence(1.0) == 0.95
+    assert _grounding_confidence(0.3) >= 0.35
@@ -0,0 +1,95 @@
+import importlib
+from types import SimpleNamespace
+
+from langchain.schema import Document
+
+
+def _chunk(text, path="client-1/faq.pdf"):
+    return Document(page_content=text, metadata={"client_id": "client-1", "storage_path": path, "source": path})
+
+
+def _corpus():
+    return [
+        _chunk("El servicio de baño para perros pequeños cuesta 250 pesos."),
+        _chunk("La clave del servicio de corte de uñas es SRV-1042 y dura 15 minutos."),
+        _chunk("Estamos en Avenida Reforma 118, colonia Juárez."),
+        _chunk("Servicio SRV-2001 descontinuado.", path="client-1/old.pdf"),
+    ]
+
+
+def test_bm25_ranks_exact_token_matches_and_respects_active_paths(monkeypatch, tmp_path):
+    from api.modules import lexical_index
+
+    monkeypatch.setenv("EVOLVIAN_DATA_PATH", str(tmp_path))
+    lexical_index.append_to_lexical_index(_corpus(), "client-1")
+
+    index = lexical_index.load_lexical_index("client-1")
+    assert len(index) == 4
+    assert lexical_index.load_lexical_index("client-1") is index
+
+    hits = index.search("¿Qué es SRV-1042?", k=5, allowed_paths={"client-1/faq.pdf"})
+    assert "SRV-1042" in hits[0][0].page_content
+    assert all(doc.metadata["storage_path"] == "client-1/faq.pdf" for doc, _score in hits)
+
+    assert index.search("SRV-2001", allowed_paths={"client-1/faq.pdf"}) == []
+
+
+def test_reciprocal_rank_fusion_merges_duplicates_across_rankings():
+    from api.modules.lexical_index import reciprocal_rank_fusion
+
+    a, b, c = _corpus()[:3]
+    fused = reciprocal_rank_fusion([[a, b], [_chunk(b.page_content), c]])
+
+    assert [doc.page_content for doc in fused] == [b.page_content, a.page_content, c.page_content]
+
+
+def test_ask_question_keyword_query_skips_embeddings(monkeypatch, tmp_path):
+    from api.modules import lexical_index
+    from api.utils.active_documents import ActiveDocumentSet
+
+    module = importlib.import_module("api.modules.assistant_rag.rag_pipeline")
+    monkeypatch.setenv("EVOLVIAN_DATA_PATH", str(tmp_path))
+    lexical_index.append_to_lexical_index(_corpus(), "client-1")
+
+    def _no_embeddings(*_args, **_kwargs):
+        raise AssertionError("embedding API should not be called on the lexical fast path")
+
+    captured = {}
+
+    class _FakeLLM:
+        def __init__(self, **_kwargs):
+            pass
+
+        def invoke(self, messages):
+            captured["prompt"] = messages[-1].content
+            return SimpleNamespace(content="La clave SRV-1042 corresponde al corte de uñas.")
+
+    monkeypatch.setattr(module, "get_prompt_for_client", lambda _client_id: "")
+    monkeypatch.setattr(module, "get_temperature_for_client", lambda _client_id: 0.2)
+    monkeypatch.setattr(module, "get_language_for_client", lambda _client_id: "es")
+    monkeypatch.setattr(module, "_resolve_user_language", lambda _client_id, _text: "es")
+    monkeypatch.setattr(module, "get_base_data_path", lambda: str(tmp_path))
+    monkeypatch.setattr(module, "_rewrite_for_retrieval", lambda _memory, question: question)
+    monkeypatch.setattr(module, "save_history", lambda *args, **kwargs: None)
+    monkeypatch.setattr(module, "OpenAIEmbeddings", _no_embeddings)
+    monkeypatch.setattr(module, "ChatOpenAI", _FakeLLM)
+    monkeypatch.setattr(
+        module,
+        "get_active_document_set",
+        lambda _client_id: ActiveDocumentSet(
+            storage_paths=frozenset({"client-1/faq.pdf"}),
+            document_ids=frozenset({"doc-1"}),
+        ),
+    )
+
+    result = module.ask_question(
+        messages="srv-1042",
+        client_id="client-1",
+        session_id="session-1",
+        return_metadata=True,
+        persist_history=False,
+    )
+
+    assert result["confidence_reason"] == "rag_answer_with_retrieval"
+    assert "SRV-1042" in captured["prompt"]
+    assert "SRV-2001" not in captured["prompt"]
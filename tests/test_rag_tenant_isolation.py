@@ -108,3 +108,98 @@ def test_ask_question_falls_back_when_retrieval_only_returns_foreign_docs(monkey
     assert result["handoff_reason"] == "no_retrieval_match"
     assert result["confidence_reason"] == "retriever_returned_no_docs"
     assert result["answer"] == module.FALLBACK_BY_LANG["es"]
+
+
+def test_ask_question_pushes_active_document_filter_into_vector_query(monkeypatch, tmp_path):
+    module = _load_module()
+    captured = {}
+
+    class _FakeRetriever:
+        def invoke(self, _question):
+            return []
+
+    class _FakeChroma:
+        def __init__(self, **_kwargs):
+            pass
+
+        def as_retriever(self, **kwargs):
+            captured.update(kwargs)
+            return _FakeRetriever()
+
+    (tmp_path / "chroma_client-1").mkdir()
+
+    monkeypatch.setattr(module, "get_prompt_for_client", lambda _client_id: "")
+    monkeypatch.setattr(module, "get_temperature_for_client", lambda _client_id: 0.2)
+    monkeypatch.setattr(module, "get_language_for_client", lambda _client_id: "es")
+    monkeypatch.setattr(module, "_resolve_user_language", lambda _client_id, _text: "es")
+    monkeypatch.setattr(module, "get_base_data_path", lambda: str(tmp_path))
+    monkeypatch.setattr(module, "_rewrite_for_retrieval", lambda _memory, question: question)
+    monkeypatch.setattr(module, "save_history", lambda *args, **kwargs: None)
+    monkeypatch.setattr(module, "OpenAIEmbeddings", lambda *args, **kwargs: object())
+    monkeypatch.setattr(module, "Chroma", _FakeChroma)
+    from api.utils.active_documents import ActiveDocumentSet
+
+    monkeypatch.setattr(
+        module,
+        "get_active_document_set",
+        lambda _client_id: ActiveDocumentSet(
+            storage_paths=frozenset({"client-1/faq.pdf", "client-1/precios.pdf"}),
+            document_ids=frozenset({"doc-1", "doc-2"}),
+        ),
+    )
+
+    module.ask_question(
+        messages="Que informacion tienes?",
+        client_id="client-1",
+        session_id="session-1",
+        return_metadata=True,
+        persist_history=False,
+    )
+
+    assert captured["search_kwargs"]["filter"] == {
+        "storage_path": {"$in": ["client-1/faq.pdf", "client-1/precios.pdf"]}
+    }
+
+
+def test_active_document_set_is_cached_until_invalidated(monkeypatch):
+    from api.utils import active_documents
+
+    reads = []
+
+    class _FakeQuery:
+        def select(self, _fields):
+            return self
+
+        def eq(self, *_args):
+            return self
+
+        def execute(self):
+            reads.append(1)
+            return SimpleNamespace(data=[{"id": "doc-1", "storage_path": "client-1/faq.pdf"}])
+
+    fake = SimpleNamespace(table=lambda _name: _FakeQuery())
+    monkeypatch.setattr(active_documents, "_CACHE", {})
+
+    first = active_documents.get_active_document_set("client-1", supabase_client=fake)
+    second = active_documents.get_active_document_set("client-1", supabase_client=fake)
+    assert first is second
+    assert first.document_ids == frozenset({"doc-1"})
+    assert len(reads) == 1
+
+    active_documents.invalidate_active_document_set("client-1", reason="document_activated")
+    active_documents.get_active_document_set("client-1", supabase_client=fake)
+    assert len(reads) == 2
+
+
+def test_per_client_vectorstore_queries_with_the_indexing_embedding_model(monkeypatch, tmp_path):
+    module = _load_module()
+    from api.modules.chroma_indexer import EMBEDDING_MODEL
+    from api.modules.vector_layout import per_client_location
+
+    opened = {}
+    monkeypatch.setattr(module, "OpenAIEmbeddings", lambda **kwargs: kwargs)
+    monkeypatch.setattr(module, "Chroma", lambda **kwargs: opened.update(kwargs) or kwargs)
+
+    module._open_vectorstore(per_client_location("client-1", base_path=str(tmp_path)))
+
+    assert opened["embedding_function"] == {"model": EMBEDDING_MODEL}
@@ -70,6 +70,7 @@ def test_reindex_client_returns_partial_failure_and_marks_successful_docs(monkey
         client_id: str,
         storage_path: str | None = None,
         return_chunks: bool = True,
+        document_id: str | None = None,
     ):
         if storage_path == "client-1/b.pdf":
             raise RuntimeError("broken document")
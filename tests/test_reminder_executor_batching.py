@@ -0,0 +1,249 @@
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+from starlette.requests import Request
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+class _FakeQuery:
+    def __init__(self, db, table_name):
+        self._db = db
+        self._table = table_name
+        self._filters = []
+        self._in = None
+        self._op = "select"
+        self._payload = None
+
+    def select(self, _fields, count=None):
+        return self
+
+    def eq(self, field, value):
+        self._filters.append((field, value))
+        return self
+
+    def in_(self, field, values):
+        self._in = (field, set(values))
+        return self
+
+    def lte(self, *_args):
+        return self
+
+    def order(self, *_args, **_kwargs):
+        return self
+
+    def limit(self, _value):
+        return self
+
+    def update(self, payload):
+        self._op = "update"
+        self._payload = payload
+        return self
+
+    def execute(self):
+        self._db.calls.append((self._table, self._op))
+        rows = self._db.rows.setdefault(self._table, [])
+        matched = [
+            row for row in rows
+            if all(row.get(field) == value for field, value in self._filters)
+            and (self._in is None or row.get(self._in[0]) in self._in[1])
+        ]
+        if self._op == "update":
+            for row in matched:
+                row.update(self._payload)
+            self._db.updates.append((self._payload.get("status"), sorted(row["id"] for row in matched)))
+        return SimpleNamespace(data=[dict(row) for row in matched])
+
+
+class _FakeSupabase:
+    def __init__(self, rows, *, rpc_missing=False):
+        self.rows = rows
+        self.calls = []
+        self.updates = []
+        self.rpc_missing = rpc_missing
+
+    def table(self, table_name):
+        return _FakeQuery(self, table_name)
+
+    def rpc(self, name, params):
+        def _execute():
+            if self.rpc_missing:
+                raise Exception(f"Could not find the function public.{name} in the schema cache")
+            claimed = [
+                row for row in self.rows["appointment_reminders"]
+                if row["status"] == "pending"
+            ][: params["p_limit"]]
+            for row in claimed:
+                row["status"] = "processing"
+            return SimpleNamespace(data=[dict(row) for row in claimed])
+
+        self.calls.append((name, "rpc"))
+        return SimpleNamespace(execute=_execute)
+
+
+def _request() -> Request:
+    return Request({"type": "http", "headers": [], "query_string": b""})
+
+
+def _seed_rows():
+    now = datetime.now(timezone.utc)
+    future = (now + timedelta(hours=3)).isoformat()
+    return {
+        "appointment_reminders": [
+            {"id": "r1", "appointment_id": "a1", "client_id": "c1", "channel": "email",
+             "template_id": "t1", "status": "pending", "scheduled_at": now.isoformat()},
+            {"id": "r2", "appointment_id": "a2", "client_id": "c2", "channel": "whatsapp",
+             "template_id": "t2", "status": "pending", "scheduled_at": now.isoformat()},
+            {"id": "r3", "appointment_id": "a1", "client_id": "c1", "channel": "email",
+             "template_id": "t1", "status": "pending",
+             "scheduled_at": (now - timedelta(hours=2)).isoformat()},
+        ],
+        "appointments": [
+            {"id": "a1", "client_id": "c1", "user_email": "ana@example.com",
+             "user_name": "Ana", "scheduled_time": future},
+            {"id": "a2", "client_id": "c2", "user_phone": "+5215512345678",
+             "user_name": "Luis", "appointment_type": "Consulta", "scheduled_time": future},
+        ],
+        "message_templates": [
+            {"id": "t1", "client_id": "c1", "is_active": True, "body": "Hola {{user_name}} - {{company_name}}"},
+            {"id": "t2", "client_id": "c2", "is_active": True, "template_name": "reminder_v1",
+             "meta_template_id": "m1"},
+        ],
+        "meta_approved_templates": [
+            {"id": "m1", "is_active": True, "parameter_count": 3, "language": "es_MX"},
+        ],
+        "client_settings": [
+            {"client_id": "c1", "language": "es", "timezone": "America/Mexico_City"},
+            {"client_id": "c2", "language": "en", "timezone": "UTC"},
+        ],
+        "client_profile": [{"client_id": "c1", "company_name": "Clínica Sol"}],
+        "clients": [{"id": "c1", "name": "Sol"}, {"id": "c2", "name": ""}],
+    }
+
+
+def _patch(monkeypatch, fake):
+    from api.appointments import routes_execute_reminders as module
+
+    emails = []
+    whatsapps = []
+
+    async def _fake_whatsapp(**kwargs):
+        whatsapps.append(kwargs)
+        return {"success": True}
+
+    def _fake_email(**kwargs):
+        emails.append(kwargs)
+        return True
+
+    monkeypatch.setattr(module, "supabase", fake)
+    monkeypatch.setattr(module, "require_internal_request", lambda _request: None)
+    monkeypatch.setattr(module, "send_whatsapp_template_for_client", _fake_whatsapp)
+    monkeypatch.setattr(module, "send_confirmation_email", _fake_email)
+    monkeypatch.setattr(module, "generate_cancel_token", lambda **_kwargs: None)
+    monkeypatch.setattr(
+        module,
+        "resolve_locale_for_rendering",
+        lambda **_kwargs: ("es", "es_MX"),
+    )
+    return module, emails, whatsapps
+
+
+def test_execute_reminders_claims_once_prefetches_and_writes_statuses_in_bulk(monkeypatch):
+    fake = _FakeSupabase(_seed_rows())
+    module, emails, whatsapps = _patch(monkeypatch, fake)
+
+    result = asyncio.run(module.execute_pending_reminders(_request()))
+
+    assert result == {"processed": 3, "sent": 2, "failed": 0, "skipped": 1}
+    assert [email["html_body"] for email in emails] == ["Hola Ana - Clínica Sol"]
+    assert whatsapps[0]["parameters"][:2] == ["Luis", "your company"]
+
+    # Una lectura por tabla para todo el lote, sin N+1 por recordatorio.
+    reads = [table for table, op in fake.calls if op == "select"]
+    assert sorted(reads) == sorted(
+        [
+            "appointments",
+            "message_templates",
+            "meta_approved_templates",
+            "client_settings",
+            "client_profile",
+            "clients",
+        ]
+    )
+    assert sorted(fake.updates) == [("cancelled", ["r3"]), ("sent", ["r1", "r2"])]
+
+
+def test_execute_reminders_falls_back_to_conditional_claim_without_rpc(monkeypatch):
+    fake = _FakeSupabase(_seed_rows(), rpc_missing=True)
+    module, _emails, _whatsapps = _patch(monkeypatch, fake)
+
+    result = asyncio.run(module.execute_pending_reminders(_request()))
+
+    assert result["processed"] == 3
+    assert fake.updates[0] == ("processing", ["r1", "r2", "r3"])
+    assert all(row["status"] != "processing" for row in fake.rows["appointment_reminders"])
+
+
+def test_execute_reminders_drains_backlog_in_batches(monkeypatch):
+    fake = _FakeSupabase(_seed_rows())
+    module, _emails, _whatsapps = _patch(monkeypatch, fake)
+    monkeypatch.setattr(module, "REMINDER_CLAIM_BATCH_SIZE", 2)
+
+    result = asyncio.run(module.execute_pending_reminders(_request()))
+
+    assert result["processed"] == 3
+    assert [name for name, op in fake.calls if op == "rpc"] == ["claim_pending_reminders"] * 2
+
+
+def test_execute_reminders_records_finished_outcomes_before_batch_ends(monkeypatch):
+    fake = _FakeSupabase(_seed_rows())
+    module, emails, _whatsapps = _patch(monkeypatch, fake)
+    monkeypatch.setattr(module, "REMINDER_STATUS_FLUSH_SIZE", 1)
+
+    async def _hanging_whatsapp(**_kwargs):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(module, "send_whatsapp_template_for_client", _hanging_whatsapp)
+
+    async def _run():
+        try:
+            await asyncio.wait_for(module.execute_pending_reminders(_request()), timeout=0.5)
+        except asyncio.TimeoutError:
+            pass
+
+    asyncio.run(_run())
+
+    # El proceso "muere" con r2 en vuelo: r1 y r3 ya quedaron registrados.
+    statuses = {row["id"]: row["status"] for row in fake.rows["appointment_reminders"]}
+    assert statuses == {"r1": "sent", "r2": "processing", "r3": "cancelled"}
+    assert len(emails) == 1
+
+
+def test_execute_reminders_sends_run_inside_policy_batch(monkeypatch):
+    from api.compliance import outbound_policy
+
+    fake = _FakeSupabase(_seed_rows())
+    module, _emails, _whatsapps = _patch(monkeypatch, fake)
+    seen = {}
+
+    async def _fake_whatsapp(**kwargs):
+        seen["whatsapp"] = outbound_policy._ACTIVE_BATCH.get()
+        return {"success": True}
+
+    def _fake_email(**kwargs):
+        seen["email"] = outbound_policy._ACTIVE_BATCH.get()
+        return True
+
+    monkeypatch.setattr(module, "send_whatsapp_template_for_client", _fake_whatsapp)
+    monkeypatch.setattr(module, "send_confirmation_email", _fake_email)
+
+    asyncio.run(module.execute_pending_reminders(_request()))
+
+    assert set(seen) == {"whatsapp", "email"}
+    assert seen["whatsapp"] is not None and seen["email"] is not None
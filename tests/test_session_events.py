@@ -0,0 +1,184 @@
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from api.modules.assistant_rag import calendar_intent_handler
+from api.modules.assistant_rag import intent_router
+from api.modules.assistant_rag import session_events
+
+
+class _Query:
+    def __init__(self, db, table_name):
+        self.db = db
+        self.table_name = table_name
+        self._filters = {}
+        self._payload = None
+
+    def select(self, _fields):
+        return self
+
+    def eq(self, key, value):
+        self._filters[key] = value
+        return self
+
+    def limit(self, _n):
+        return self
+
+    def order(self, *_args, **_kwargs):
+        return self
+
+    def upsert(self, payload, on_conflict=None):  # noqa: ARG002
+        self._payload = payload
+        return self
+
+    def execute(self):
+        if self.table_name == "history":
+            self.db.history_reads += 1
+            rows = [
+                row for row in self.db.history
+                if all(row.get(key) == value for key, value in self._filters.items())
+            ]
+            return SimpleNamespace(data=list(reversed(rows)))
+        if self.table_name != "conversation_events":
+            raise AssertionError(f"Unexpected table: {self.table_name}")
+        if self._payload is not None:
+            self.db.rows[(self._payload["client_id"], self._payload["session_id"])] = list(self._payload["events"])
+            return SimpleNamespace(data=[self._payload])
+        events = self.db.rows.get((self._filters.get("client_id"), self._filters.get("session_id")))
+        return SimpleNamespace(data=[{"events": list(events)}] if events is not None else [])
+
+
+class _FakeSupabase:
+    def __init__(self, rows=None, *, with_rpc=True, history=None):
+        self.rows = dict(rows or {})
+        self.history = list(history or [])
+        self.history_reads = 0
+        self.rpc_calls = []
+        self.with_rpc = with_rpc
+
+    def table(self, name):
+        return _Query(self, name)
+
+    def rpc(self, name, params):
+        if not self.with_rpc:
+            raise Exception(f"Could not find the function public.{name} in the schema cache")
+        self.rpc_calls.append((name, params))
+        key = (params["p_client_id"], params["p_session_id"])
+        self.rows[key] = (self.rows.get(key, []) + list(params["p_events"]))[-params["p_capacity"]:]
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=None))
+
+
+def _event(event_type, *, minutes_ago=1, role="assistant", ch="whatsapp", **extra):
+    at = (datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)).isoformat()
+    return {"type": event_type, "role": role, "ch": ch, "at": at, **extra}
+
+
+def test_unit_appends_typed_events_once_per_session():
+    db = _FakeSupabase()
+
+    with session_events.session_event_unit():
+        for role, content, metadata in (
+            ("user", "Quiero agendar una cita", None),
+            ("assistant", "Estos son los horarios disponibles: 1) lunes 10:00", None),
+            ("assistant", "✅ Tu cita ha sido registrada.", None),
+            ("assistant", "Puedo ayudarte con este negocio.", {"whatsapp_policy": {"event": "out_of_scope_redirect"}}),
+        ):
+            session_events.record_history_event(
+                "c1", "s1", role=role, content=content, channel="whatsapp",
+                source_type="appointment", metadata=metadata, supabase_client=db,
+            )
+        session_events.record_session_event("c1", "s1", session_events.fields_event({"user_name": "Aldo"}), supabase_client=db)
+        session_events.record_session_event(
+            "c1", "s1", session_events.fields_event({"user_name": "Aldo", "user_email": "a@b.co"}), supabase_client=db
+        )
+        assert db.rpc_calls == []
+
+    assert len(db.rpc_calls) == 1
+    events = db.rows[("c1", "s1")]
+    assert [event["type"] for event in events] == [
+        "message", "slots_offered", "booking_done", "scope_redirect", "fields_collected",
+    ]
+    assert events[0]["src"] == "appointment" and events[0]["lang"] == "es"
+    assert events[-1]["fields"] == {"user_name": "Aldo", "user_email": "a@b.co"}
+
+
+def test_append_without_rpc_keeps_ring_capacity(monkeypatch):
+    monkeypatch.setattr(session_events, "SESSION_EVENT_CAPACITY", 3)
+    db = _FakeSupabase(with_rpc=False)
+
+    for index in range(5):
+        assert session_events.append_session_events("c1", "s1", [{"type": "message", "n": index}], supabase_client=db)
+
+    assert [event["n"] for event in db.rows[("c1", "s1")]] == [2, 3, 4]
+    assert session_events.load_session_events("c1", "missing", supabase_client=db) is None
+
+
+def test_router_heuristics_read_the_log_instead_of_history(monkeypatch):
+    db = _FakeSupabase(
+        {
+            ("c1", "in-progress"): [_event("message", role="user"), _event("calendar_progress")],
+            ("c1", "booked"): [_event("calendar_progress", minutes_ago=5), _event("booking_done")],
+            ("c1", "redirected"): [_event("scope_redirect"), _event("message", role="user")],
+        }
+    )
+    monkeypatch.setattr(intent_router, "supabase", db)
+
+    assert intent_router._has_recent_appointment_history("c1", "in-progress", "whatsapp") is True
+    assert intent_router._has_recent_appointment_history("c1", "booked", "whatsapp") is False
+    assert intent_router._has_recent_appointment_history("c1", "in-progress", "chat") is False
+    assert intent_router._last_assistant_was_scope_redirect("c1", "redirected") is True
+    assert intent_router._last_assistant_was_scope_redirect("c1", "in-progress") is False
+
+
+def test_router_falls_back_to_history_when_log_has_no_assistant_reply(monkeypatch):
+    # Sesión previa al log: el log solo tiene el mensaje nuevo del usuario.
+    recent = (datetime.now(timezone.utc) - timedelta(minutes=3)).isoformat()
+    db = _FakeSupabase(
+        {("c1", "legacy"): [_event("message", role="user")]},
+        history=[
+            {"client_id": "c1", "session_id": "legacy", "role": "assistant", "channel": "whatsapp",
+             "content": "Estos son los horarios disponibles: 1) lunes 10:00", "created_at": recent,
+             "metadata": {"whatsapp_policy": {"event": "out_of_scope_redirect"}}},
+        ],
+    )
+    monkeypatch.setattr(intent_router, "supabase", db)
+
+    assert intent_router._has_recent_appointment_history("c1", "legacy", "whatsapp") is True
+    assert intent_router._last_assistant_was_scope_redirect("c1", "legacy") is True
+    assert db.history_reads == 2
+
+
+def test_calendar_recovery_uses_fields_snapshots(monkeypatch):
+    db = _FakeSupabase(
+        {
+            ("c1", "s1"): [
+                _event("message", role="user", src="appointment", lang="en", minutes_ago=10),
+                {"type": "fields_collected", "fields": {"scheduled_time": "2026-10-20T10:00:00-06:00"},
+                 "at": _event("x", minutes_ago=9)["at"]},
+                _event("phone_confirmation_requested", src="appointment", minutes_ago=8),
+                {"type": "fields_collected", "at": _event("x", minutes_ago=7)["at"], "fields": {
+                    "scheduled_time": "2026-10-20T10:00:00-06:00",
+                    "user_name": "Aldo Benitez",
+                    "user_email": "aldo@example.com",
+                    "user_phone": "+525512345678",
+                }},
+                _event("message", role="user", src="appointment", minutes_ago=500),
+            ]
+        }
+    )
+    monkeypatch.setattr(calendar_intent_handler, "supabase", db)
+
+    recovered = calendar_intent_handler._recover_calendar_state_from_history(
+        client_id="c1", session_id="s1", channel="whatsapp", settings={}, fallback_lang="es",
+    )
+
+    assert recovered["status"] == "pending_confirmation"
+    assert recovered["lang"] == "en"
+    assert recovered["awaiting_whatsapp_phone_confirmation"] is True
+    assert recovered["collected"]["user_name"] == "Aldo Benitez"
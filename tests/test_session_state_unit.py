@@ -0,0 +1,120 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from api.modules.assistant_rag import calendar_intent_handler
+from api.modules.assistant_rag import intent_router
+from api.modules.assistant_rag import session_state
+
+
+class _Query:
+    def __init__(self, db, table_name):
+        self.db = db
+        self.table_name = table_name
+        self._action = None
+        self._payload = None
+        self._filters = {}
+
+    def select(self, _fields):
+        self._action = "select"
+        return self
+
+    def eq(self, key, value):
+        self._filters[key] = value
+        return self
+
+    def limit(self, _n):
+        return self
+
+    def upsert(self, payload, on_conflict=None):  # noqa: ARG002
+        self._action = "upsert"
+        self._payload = payload
+        return self
+
+    def execute(self):
+        assert self.table_name == "conversation_state"
+        self.db.calls.append(self._action)
+        if self._action == "upsert":
+            if self.db.fail_writes:
+                raise Exception("connection reset")
+            self.db.rows[(self._payload["client_id"], self._payload["session_id"])] = dict(self._payload["state"])
+            return SimpleNamespace(data=[self._payload])
+        row = self.db.rows.get((self._filters.get("client_id"), self._filters.get("session_id")))
+        return SimpleNamespace(data=[{"state": dict(row)}] if row is not None else [])
+
+
+class _FakeSupabase:
+    def __init__(self, rows=None):
+        self.rows = dict(rows or {})
+        self.calls = []
+        self.fail_writes = False
+
+    def table(self, name):
+        return _Query(self, name)
+
+
+def _patch(monkeypatch, db):
+    monkeypatch.setattr(intent_router, "supabase", db)
+    monkeypatch.setattr(calendar_intent_handler, "supabase", db)
+
+
+def test_unit_of_work_reads_once_and_flushes_one_upsert(monkeypatch):
+    db = _FakeSupabase({("c1", "s1"): {"intent": None}})
+    _patch(monkeypatch, db)
+
+    with session_state.session_state_unit():
+        # Secuencia de route_message (set_intent → get_state → upsert_state)
+        intent_router.set_intent("c1", "s1", "calendar")
+        state = intent_router.get_state("c1", "s1")
+        state.update({"status": "collecting", "has_calendar_feature": True})
+        intent_router.upsert_state("c1", "s1", state)
+        # … y del handler de calendario.
+        calendar_state = calendar_intent_handler._load_conversation_state("c1", "s1")
+        calendar_state["collected"] = {"user_name": "Aldo"}
+        assert calendar_intent_handler._persist_conversation_state("c1", "s1", calendar_state) is True
+        assert db.calls == ["select"]
+
+    assert db.calls == ["select", "upsert"]
+    assert db.rows[("c1", "s1")] == {
+        "intent": "calendar",
+        "collected": {"user_name": "Aldo"},
+        "status": "collecting",
+        "has_calendar_feature": True,
+    }
+
+
+def test_write_through_cache_serves_reads_until_ttl(monkeypatch):
+    db = _FakeSupabase()
+    _patch(monkeypatch, db)
+    clock = [1000.0]
+    monkeypatch.setattr(session_state.time, "monotonic", lambda: clock[0])
+
+    intent_router.upsert_state("c1", "s1", {"intent": "calendar"})
+    state = intent_router.get_state("c1", "s1")
+    state["intent"] = "mutated-locally"
+    assert intent_router.get_state("c1", "s1") == {"intent": "calendar"}
+    assert db.calls == ["upsert"]
+
+    clock[0] += session_state.SESSION_STATE_CACHE_TTL_SECONDS + 1
+    db.rows[("c1", "s1")] = {"intent": None}
+    assert intent_router.get_state("c1", "s1") == {"intent": None}
+    assert db.calls == ["upsert", "select"]
+
+
+def test_failed_flush_invalidates_cache(monkeypatch):
+    db = _FakeSupabase({("c1", "s1"): {"intent": "calendar"}})
+    _patch(monkeypatch, db)
+
+    assert intent_router.get_state("c1", "s1") == {"intent": "calendar"}
+    db.fail_writes = True
+    with session_state.session_state_unit():
+        intent_router.upsert_state("c1", "s1", {"intent": None})
+
+    # La escritura falló: el siguiente read vuelve a Supabase.
+    assert intent_router.get_state("c1", "s1") == {"intent": "calendar"}
+    assert db.calls == ["select", "upsert", "select"]
@@ -153,6 +153,12 @@ def test_subscription_deleted_materializes_scheduled_paid_downgrade(monkeypatch)
             }
         ),
     )
+    invalidations = []
+    monkeypatch.setattr(
+        stripe_webhook_module,
+        "invalidate_dashboard_snapshot",
+        lambda client_id, reason="": invalidations.append((client_id, reason)),
+    )
     monkeypatch.setattr(stripe_webhook_module, "supabase", fake_supabase)
 
     response = asyncio.run(stripe_webhook_module.stripe_webhook(_FakeRequest()))
@@ -164,6 +170,7 @@ def test_subscription_deleted_materializes_scheduled_paid_downgrade(monkeypatch)
     assert settings["scheduled_plan_id"] is None
     assert settings["cancellation_requested_at"] is None
     assert cleanup_calls == [{"client_id": client_id, "base_plan_id": "starter"}]
+    assert invalidations == [(client_id, "scheduled_downgrade")]
 
 
 def test_subscription_deleted_logs_recovery_and_falls_back_to_free_when_paid_downgrade_creation_fails(monkeypatch):
@@ -241,6 +248,12 @@ def test_subscription_deleted_logs_recovery_and_falls_back_to_free_when_paid_dow
             }
         ),
     )
+    invalidations = []
+    monkeypatch.setattr(
+        stripe_webhook_module,
+        "invalidate_dashboard_snapshot",
+        lambda client_id, reason="": invalidations.append((client_id, reason)),
+    )
     monkeypatch.setattr(stripe_webhook_module, "supabase", fake_supabase)
 
     response = asyncio.run(stripe_webhook_module.stripe_webhook(_FakeRequest()))
@@ -254,7 +267,49 @@ def test_subscription_deleted_logs_recovery_and_falls_back_to_free_when_paid_dow
     assert settings["scheduled_plan_id"] == "starter"
     assert settings["cancellation_requested_at"] is None
     assert cleanup_calls == [{"client_id": client_id, "base_plan_id": "free"}]
+    assert invalidations == [(client_id, "scheduled_downgrade_fallback_free")]
     assert len(history) == 1
     assert history[0]["content"] == "scheduled_downgrade_recovery_needed"
     assert history[0]["source_type"] == "billing_alert"
     assert history[0]["metadata"]["target_plan_id"] == "starter"
+
+
+def test_subscription_updated_invalidates_dashboard_snapshot_after_cancellation_write(monkeypatch):
+    client_id = "client-1"
+    fake_supabase = _FakeSupabase(
+        {"client_settings": [{"client_id": client_id, "plan_id": "premium", "subscription_id": "sub_1"}]}
+    )
+    event = {
+        "type": "customer.subscription.updated",
+        "data": {"object": {"id": "sub_1", "cancel_at_period_end": True, "cancel_at": 1_700_086_400}},
+    }
+
+    monkeypatch.setattr(
+        stripe_webhook_module.stripe.Webhook,
+        "construct_event",
+        lambda payload, sig_header, secret: event,
+    )
+
+    async def _fake_get_client_id_by_subscription_id(_subscription_id):
+        return client_id
+
+    monkeypatch.setattr(
+        stripe_webhook_module,
+        "get_client_id_by_subscription_id",
+        _fake_get_client_id_by_subscription_id,
+    )
+    invalidations = []
+    monkeypatch.setattr(
+        stripe_webhook_module,
+        "invalidate_dashboard_snapshot",
+        lambda client_id, reason="": invalidations.append(
+            (client_id, reason, fake_supabase.db["client_settings"][0].get("subscription_end"))
+        ),
+    )
+    monkeypatch.setattr(stripe_webhook_module, "supabase", fake_supabase)
+
+    response = asyncio.run(stripe_webhook_module.stripe_webhook(_FakeRequest()))
+
+    assert response.status_code == 200
+    # La invalidación ocurre después de escribir la cancelación.
+    assert invalidations == [(client_id, "cancellation_scheduled", "2023-11-15T22:13:20+00:00")]
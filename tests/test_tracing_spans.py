@@ -0,0 +1,123 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def tracing(monkeypatch, tmp_path):
+    from api.utils import tracing as module
+
+    monkeypatch.setattr(module, "TRACE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(module, "TRACE_JSONL_PATH", str(tmp_path / "spans.jsonl"))
+    monkeypatch.setattr(module, "TRACE_OTLP_ENDPOINT", "")
+    module.reset_stage_stats()
+    yield module
+    module.reset_stage_stats()
+
+
+def _exported_traces(module):
+    module._EXPORT_EXECUTOR.submit(lambda: None).result()
+    path = Path(module.TRACE_JSONL_PATH)
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def _spans(payload):
+    return payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+
+
+def _attrs(span):
+    return {item["key"]: next(iter(item["value"].values())) for item in span["attributes"]}
+
+
+def test_nested_spans_share_trace_and_inherit_tenant_channel_tags(tracing):
+    @tracing.traced("message.process")
+    async def process(client_id, session_id, message, channel="chat"):
+        # to_thread copia el contexto: el span hijo queda dentro de la traza.
+        return await asyncio.to_thread(_rag)
+
+    def _rag():
+        with tracing.span("retrieval.vector", k=20):
+            tracing.record_span("supabase.query", 0.004, resource="history", status_code=200)
+        return "ok"
+
+    assert asyncio.run(process("client-1", "s-1", "hola", channel="widget")) == "ok"
+
+    traces = _exported_traces(tracing)
+    assert len(traces) == 1
+    spans = {span["name"]: span for span in _spans(traces[0])}
+    assert set(spans) == {"message.process", "retrieval.vector", "supabase.query"}
+    assert len({span["traceId"] for span in spans.values()}) == 1
+    assert spans["retrieval.vector"]["parentSpanId"] == spans["message.process"]["spanId"]
+    assert spans["supabase.query"]["parentSpanId"] == spans["retrieval.vector"]["spanId"]
+    assert _attrs(spans["supabase.query"]) == {
+        "client_id": "client-1",
+        "channel": "widget",
+        "resource": "history",
+        "status_code": "200",
+    }
+
+
+def test_unsampled_traces_feed_percentiles_but_are_not_exported(tracing, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 0.0)
+
+    for _ in range(20):
+        with tracing.span("llm.generate", client_id="client-1"):
+            pass
+    with pytest.raises(ValueError):
+        with tracing.span("llm.generate"):
+            raise ValueError("boom")
+
+    assert _exported_traces(tracing) == []
+    stats = tracing.stage_percentiles()["llm.generate"]
+    assert stats["count"] == 21
+    assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+
+
+def test_httpx_hooks_record_supabase_resource_and_errors(tracing):
+    request = SimpleNamespace(
+        method="POST",
+        url=SimpleNamespace(path="/rest/v1/rpc/claim_pending_reminders"),
+        extensions={},
+    )
+    tracing.httpx_request_hook(request)
+    tracing.httpx_response_hook(SimpleNamespace(request=request, status_code=503))
+
+    span = _spans(_exported_traces(tracing)[0])[0]
+    assert span["name"] == "supabase.query"
+    assert _attrs(span)["resource"] == "rpc/claim_pending_reminders"
+    assert span["status"] == {"code": 2, "message": "http_503"}
+    assert tracing._supabase_resource("/rest/v1/history") == "history"
+
+
+def test_internal_tracing_endpoint_requires_token_and_returns_percentiles(tracing, monkeypatch):
+    from api.internal import tracing_stats
+
+    monkeypatch.setenv("EVOLVIAN_INTERNAL_TASK_TOKEN", "secret")
+    tracing.record_span("retrieval.vector", 0.010)
+    tracing.record_span("retrieval.vector", 0.030)
+
+    def _request(token):
+        headers = [(b"x-evolvian-internal-token", token.encode())] if token else []
+        return Request({"type": "http", "headers": headers, "query_string": b""})
+
+    with pytest.raises(HTTPException) as excinfo:
+        tracing_stats.tracing_stage_percentiles(_request(None))
+    assert excinfo.value.status_code == 401
+
+    body = tracing_stats.tracing_stage_percentiles(_request("secret"), reset=True)
+    assert body["stages"]["retrieval.vector"]["count"] == 2
+    assert body["stages"]["retrieval.vector"]["p99_ms"] == pytest.approx(30.0, abs=0.5)
+    assert tracing.stage_percentiles() == {}
@@ -0,0 +1,92 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def _load_migration():
+    spec = importlib.util.spec_from_file_location(
+        "migrate_chroma_to_shards", ROOT / "scripts" / "migrate_chroma_to_shards.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _seed_per_client_store(base_path, client_id, count):
+    import chromadb
+
+    persist_dir = base_path / f"chroma_{client_id}"
+    collection = chromadb.PersistentClient(path=str(persist_dir)).get_or_create_collection(
+        client_id, embedding_function=None
+    )
+    collection.add(
+        ids=[f"{client_id}-{i}" for i in range(count)],
+        embeddings=[[float(i), 1.0, 0.0] for i in range(count)],
+        documents=[f"chunk {i} de {client_id}" for i in range(count)],
+        metadatas=[{"storage_path": f"{client_id}/doc.pdf"} for _ in range(count)],
+    )
+    (persist_dir / "lexical_index.jsonl").write_text('{"text": "hola"}\n', encoding="utf-8")
+    (persist_dir / "index_manifest.json").write_text('{"version": 1, "documents": {}}', encoding="utf-8")
+    return persist_dir
+
+
+def test_sharded_location_scopes_filters_and_index_presence_to_tenant(tmp_path, monkeypatch):
+    from api.modules import vector_layout
+
+    monkeypatch.setattr(vector_layout, "VECTORSTORE_LAYOUT", "sharded")
+    monkeypatch.setattr(vector_layout, "VECTORSTORE_SHARDS", 4)
+
+    location = vector_layout.resolve_vector_location("client-1", base_path=str(tmp_path))
+    assert location.persist_dir == str(tmp_path / "chroma_shards" / f"shard_{vector_layout.shard_for('client-1'):03d}")
+    assert location.where({"storage_path": {"$in": ["client-1/a.pdf"]}}) == {
+        "$and": [{"client_id": "client-1"}, {"storage_path": {"$in": ["client-1/a.pdf"]}}]
+    }
+    assert location.has_index() is False
+
+    Path(location.sidecar_dir).mkdir(parents=True)
+    (Path(location.sidecar_dir) / "lexical_index.jsonl").write_text("{}\n", encoding="utf-8")
+    assert location.has_index() is True
+
+    monkeypatch.setattr(vector_layout, "VECTORSTORE_LAYOUT", "per_client")
+    legacy = vector_layout.resolve_vector_location("client-1", base_path=str(tmp_path))
+    assert legacy.persist_dir == legacy.sidecar_dir == str(tmp_path / "chroma_client-1")
+    assert legacy.where({"x": 1}) == {"x": 1}
+
+
+def test_migration_copies_vectors_without_reembedding_and_clear_removes_partition(tmp_path, monkeypatch):
+    import chromadb
+    from api.modules import vector_layout
+
+    migration = _load_migration()
+    monkeypatch.setattr(vector_layout, "VECTORSTORE_SHARDS", 1)
+    source_a = _seed_per_client_store(tmp_path, "client-a", 3)
+    _seed_per_client_store(tmp_path, "client-b", 2)
+
+    assert migration.discover_client_ids(str(tmp_path)) == ["client-a", "client-b"]
+    dry = migration.migrate_client("client-a", base_path=str(tmp_path), dry_run=True)
+    assert dry["status"] == "dry_run" and dry["chunks"] == 3
+
+    assert migration.main(["--base-path", str(tmp_path)]) == 0
+    # Re-ejecutar no duplica (la partición del tenant se reemplaza).
+    assert migration.main(["--base-path", str(tmp_path), "--delete-source"]) == 0
+    assert not source_a.exists()
+
+    location = vector_layout.sharded_location("client-a", str(tmp_path))
+    shard = chromadb.PersistentClient(path=location.persist_dir).get_collection(location.collection_name)
+    rows = shard.get(where={"client_id": "client-a"}, include=["embeddings", "metadatas"])
+    assert sorted(rows["ids"]) == ["client-a-0", "client-a-1", "client-a-2"]
+    assert rows["metadatas"][0]["storage_path"] == "client-a/doc.pdf"
+    assert list(rows["embeddings"][0])[1:] == [1.0, 0.0]
+    assert (Path(location.sidecar_dir) / "lexical_index.jsonl").exists()
+    assert (Path(location.sidecar_dir) / "index_manifest.json").exists()
+
+    cleared = vector_layout.clear_tenant_vectors("client-a", base_path=str(tmp_path))
+    assert location.sidecar_dir in cleared
+    assert shard.get(where={"client_id": "client-a"}, include=[])["ids"] == []
+    assert len(shard.get(where={"client_id": "client-b"}, include=[])["ids"]) == 2
@@ -7,10 +7,11 @@ from api.modules.whatsapp import template_sync as module
 
 
 class _FakeResponse:
-    def __init__(self, status_code: int, payload: dict | None = None, text: str = ""):
+    def __init__(self, status_code: int, payload: dict | None = None, text: str = "", headers: dict | None = None):
         self.status_code = status_code
         self._payload = payload if payload is not None else {}
         self.text = text
+        self.headers = headers or {}
 
     def json(self):
         return self._payload
@@ -118,6 +119,7 @@ def test_fetch_phone_number_metadata_fallback_on_unknown_field(monkeypatch):
     def _fake_meta_request(*_args, **_kwargs):
         return responses.pop(0)
 
+    module.clear_graph_cache()
     monkeypatch.setattr(module, "_meta_request", _fake_meta_request)
     result = module.fetch_phone_number_metadata(wa_phone_id="999", wa_token="EAABC1234567890TOKEN")
     assert result["success"] is True
@@ -165,3 +167,65 @@ def test_discover_waba_phone_candidates_deduplicates_phone_ids(monkeypatch):
     rows = module.discover_waba_phone_candidates(wa_token="EAABC1234567890TOKEN")
     ids = sorted([r["phone_id"] for r in rows])
     assert ids == ["111", "222", "333"]
+
+
+def test_meta_get_cached_serves_ttl_hits_and_revalidates_with_etag(monkeypatch):
+    calls = []
+    responses = [
+        _FakeResponse(200, {"data": [{"id": "t1", "name": "promo", "status": "PENDING"}]}, headers={"ETag": '"v1"'}),
+        _FakeResponse(304),
+        _FakeResponse(200, {"data": []}),
+    ]
+
+    def _fake_meta_request(method, path, **kwargs):
+        calls.append((method, path, kwargs.get("extra_headers")))
+        return responses.pop(0)
+
+    module.clear_graph_cache()
+    monkeypatch.setattr(module, "_meta_request", _fake_meta_request)
+
+    first = module._list_meta_templates(waba_id="waba_1", wa_token="EAATOKENONE")
+    cached = module._list_meta_templates(waba_id="waba_1", wa_token="EAATOKENONE")
+    revalidated = module._list_meta_templates(waba_id="waba_1", wa_token="EAATOKENONE", max_age_seconds=0)
+    other_token = module._list_meta_templates(waba_id="waba_1", wa_token="EAATOKENTWO")
+
+    assert first == cached == revalidated == {"promo": {"id": "t1", "name": "promo", "status": "PENDING"}}
+    assert other_token == {}
+    assert [headers for _method, _path, headers in calls] == [None, {"If-None-Match": '"v1"'}, None]
+
+
+def test_discovery_fans_out_and_caches_graph_pages(monkeypatch):
+    calls = []
+    pages = {
+        ("me", None): {"businesses": {"data": [{"id": "biz_1"}, {"id": "biz_2"}]}},
+        ("me/businesses", None): {"data": []},
+        ("biz_1/owned_whatsapp_business_accounts", None): {
+            "data": [{"id": "waba_1"}],
+            "paging": {"cursors": {"after": "c1"}},
+        },
+        ("biz_1/owned_whatsapp_business_accounts", "c1"): {"data": [{"id": "waba_2"}]},
+        ("biz_2/owned_whatsapp_business_accounts", None): {"data": [{"id": "waba_2"}]},
+        ("waba_1/phone_numbers", None): {"data": [{"id": "111", "display_phone_number": "+52 55 1111 1111"}]},
+        ("waba_2/phone_numbers", None): {"data": [{"id": "222"}]},
+    }
+
+    def _fake_meta_request(_method, path, **kwargs):
+        after = (kwargs.get("params") or {}).get("after")
+        calls.append((path, after))
+        return _FakeResponse(200, pages[(path, after)])
+
+    module.clear_graph_cache()
+    monkeypatch.setattr(module, "_meta_request", _fake_meta_request)
+
+    rows = module.discover_waba_phone_candidates(wa_token="EAADISCOVERYTOKEN")
+    first_pass_calls = len(calls)
+    again = module.discover_waba_phone_candidates(wa_token="EAADISCOVERYTOKEN")
+
+    assert [(row["business_id"], row["waba_id"], row["phone_id"]) for row in rows] == [
+        ("biz_1", "waba_1", "111"),
+        ("biz_1", "waba_2", "222"),
+    ]
+    assert again == rows
+    assert len(calls) == first_pass_calls
+    assert calls.count(("waba_2/phone_numbers", None)) == 1
+    assert module._resolve_waba_id_via_business_graph(wa_phone_id="222", wa_token="EAADISCOVERYTOKEN") == "waba_2"
@@ -0,0 +1,163 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+
+sys.path.insert(0, os.getcwd())
+
+from api.modules.whatsapp import status_ingest
+
+
+class _FakeQuery:
+    def __init__(self, db, table_name):
+        self.db = db
+        self.table_name = table_name
+        self.filters = []
+        self.op = "select"
+        self.payload = None
+
+    def select(self, _fields):
+        return self
+
+    def eq(self, key, value):
+        self.filters.append((key, (value,)))
+        return self
+
+    def in_(self, key, values):
+        self.filters.append((key, tuple(values)))
+        return self
+
+    def upsert(self, payload, on_conflict=None):
+        self.op, self.payload = "upsert", (payload, on_conflict)
+        return self
+
+    def insert(self, payload):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def execute(self):
+        self.db.calls.append((self.table_name, self.op))
+        if self.op == "upsert":
+            self.db.upserts.append(self.payload)
+            return SimpleNamespace(data=self.payload[0])
+        if self.op == "insert":
+            self.db.inserts.append(self.payload)
+            return SimpleNamespace(data=self.payload)
+        rows = list(self.db.rows)
+        for key, values in self.filters:
+            rows = [row for row in rows if row.get(key) in values]
+        return SimpleNamespace(data=rows)
+
+
+class _FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+        self.upserts = []
+        self.inserts = []
+
+    def table(self, name):
+        return _FakeQuery(self, name)
+
+
+def _recipient(message_id, key):
+    return {
+        "id": f"r-{key}",
+        "client_id": "client_1",
+        "campaign_id": "campaign_1",
+        "recipient_key": key,
+        "provider": "meta",
+        "provider_message_id": message_id,
+        "send_status": "sent",
+        "send_error": None,
+    }
+
+
+def test_apply_keeps_latest_transition_and_writes_in_bulk():
+    db = _FakeSupabase([_recipient("wamid.1", "phone:+525500000001"), _recipient("wamid.2", "phone:+525500000002")])
+    items = [
+        {"id": "wamid.1", "status": "sent", "timestamp": "100"},
+        {"id": "wamid.1", "status": "read", "timestamp": "102"},
+        {"id": "wamid.1", "status": "delivered", "timestamp": "101"},
+        {"id": "wamid.2", "status": "sent", "timestamp": "100"},
+        {"id": "wamid.2", "status": "failed", "timestamp": "103", "errors": [{"code": 131026, "title": "Undeliverable"}]},
+        {"id": "wamid.unknown", "status": "delivered"},
+    ]
+
+    assert status_ingest.apply_status_callbacks(items, supabase_client=db) == 2
+
+    assert db.calls == [
+        ("marketing_campaign_recipients", "select"),
+        ("marketing_campaign_recipients", "upsert"),
+        ("marketing_campaign_recipients", "upsert"),
+        ("marketing_campaign_events", "insert"),
+    ]
+    assert {on_conflict for _, on_conflict in db.upserts} == {"campaign_id,recipient_key"}
+    (failed_row,), _ = db.upserts[0]
+    (read_row,), _ = db.upserts[1]
+    assert failed_row["recipient_key"] == "phone:+525500000002"
+    assert failed_row["send_status"] == "failed"
+    assert failed_row["send_error"] == "131026 | Undeliverable"
+    # Un read/delivered solo toca updated_at: no reescribe send_status/send_error leídos.
+    assert read_row["recipient_key"] == "phone:+525500000001"
+    assert "send_status" not in read_row and "send_error" not in read_row
+    assert sorted(event["event_type"] for event in db.inserts[0]) == ["meta_failed", "meta_read"]
+
+
+def test_buffer_coalesces_payloads_within_window(monkeypatch):
+    db = _FakeSupabase([_recipient("wamid.1", "phone:+525500000001")])
+    monkeypatch.setenv("EVOLVIAN_META_STATUS_WINDOW_MS", "20")
+    buffer = status_ingest.MetaStatusBuffer(supabase_client=db)
+
+    async def _run():
+        await buffer.submit([{"id": "wamid.1", "status": "sent", "timestamp": "100"}])
+        await buffer.submit([{"id": "wamid.1", "status": "delivered", "timestamp": "101"}])
+        assert db.calls == []
+        await asyncio.sleep(0.1)
+
+    asyncio.run(_run())
+
+    assert db.calls.count(("marketing_campaign_events", "insert")) == 1
+    assert [event["event_type"] for event in db.inserts[0]] == ["meta_delivered"]
+
+
+def test_buffer_applies_failures_immediately_and_flush_drains_rest(monkeypatch):
+    db = _FakeSupabase([_recipient("wamid.1", "phone:+525500000001"), _recipient("wamid.2", "phone:+525500000002")])
+    monkeypatch.setenv("EVOLVIAN_META_STATUS_WINDOW_MS", "60000")
+    buffer = status_ingest.MetaStatusBuffer(supabase_client=db)
+
+    async def _run():
+        await buffer.submit([{"id": "wamid.1", "status": "delivered", "timestamp": "100"}])
+        assert db.calls == []
+        await buffer.submit([{"id": "wamid.2", "status": "failed", "timestamp": "101"}])
+        assert sorted(event["event_type"] for event in db.inserts[0]) == ["meta_delivered", "meta_failed"]
+        await buffer.submit([{"id": "wamid.1", "status": "read", "timestamp": "102"}])
+        assert len(db.inserts) == 1
+        assert await buffer.flush() == 1
+
+    asyncio.run(_run())
+
+    assert [event["event_type"] for event in db.inserts[1]] == ["meta_read"]
+
+
+def test_webhook_statuses_go_through_ingest(monkeypatch):
+    from api.modules.whatsapp import webhook as module
+
+    submitted = []
+
+    async def _fake_submit(items):
+        submitted.append(list(items))
+
+    monkeypatch.setattr(module, "submit_meta_status_callbacks", _fake_submit)
+    payload = {
+        "entry": [{"changes": [{"value": {"statuses": [
+            {"id": "wamid.1", "status": "sent"},
+            "bogus",
+            {"id": "wamid.2", "status": "read"},
+        ]}}]}]
+    }
+
+    asyncio.run(module.process_whatsapp_payload(payload))
+
+    assert [[item["id"] for item in batch] for batch in submitted] == [["wamid.1", "wamid.2"]]
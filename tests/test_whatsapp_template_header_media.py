@@ -107,3 +107,133 @@ def test_send_meta_template_builds_header_component_from_buttons_json(monkeypatc
             }
         ],
     }
+
+
+class _FakeImageResponse:
+    def __init__(self, body: bytes, *, status_code: int = 200, etag: str | None = None):
+        self.status_code = status_code
+        self._body = body
+        self.headers = {"content-type": "image/png"}
+        if etag:
+            self.headers["etag"] = etag
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self._body), chunk_size):
+            yield self._body[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+
+class _MissingMediaTable:
+    def table(self, name):
+        raise Exception(f'relation "public.{name}" does not exist')
+
+
+def _install_fake_images(monkeypatch, module, images):
+    requests_seen = []
+
+    def _fake_get(url, **kwargs):
+        headers = kwargs.get("headers") or {}
+        requests_seen.append((url, headers.get("If-None-Match")))
+        body, etag = images[url]
+        if headers.get("If-None-Match") and headers["If-None-Match"] == etag:
+            return _FakeImageResponse(b"", status_code=304)
+        return _FakeImageResponse(body, etag=etag)
+
+    monkeypatch.setattr(module.requests, "get", _fake_get)
+    return requests_seen
+
+
+def test_header_media_registry_dedupes_by_content_and_revalidates_by_etag(monkeypatch):
+    from api.modules.whatsapp import template_media as module
+
+    module.clear_media_registry()
+    monkeypatch.setattr(module, "TEMPLATE_MEDIA_CHUNK_BYTES", 4)
+    footer = b"\x89PNG-footer-image-bytes"
+    requests_seen = _install_fake_images(
+        monkeypatch,
+        module,
+        {
+            "https://cdn.example.com/footer.png": (footer, '"f1"'),
+            "https://cdn.example.com/copy-of-footer.png": (footer, None),
+        },
+    )
+    uploads = []
+
+    def _upload(media):
+        uploads.append((media.sha256, media.length, media.file.read()))
+        return f"handle-{len(uploads)}"
+
+    kwargs = {"waba_id": "waba_1", "upload": _upload, "supabase_client": _MissingMediaTable()}
+    first = module.resolve_header_media_handle(image_url="https://cdn.example.com/footer.png", **kwargs)
+    same_bytes = module.resolve_header_media_handle(image_url="https://cdn.example.com/copy-of-footer.png", **kwargs)
+    revisited = module.resolve_header_media_handle(image_url="https://cdn.example.com/footer.png", **kwargs)
+    other_waba = module.resolve_header_media_handle(
+        image_url="https://cdn.example.com/footer.png",
+        waba_id="waba_2",
+        upload=_upload,
+        supabase_client=_MissingMediaTable(),
+    )
+
+    assert first == same_bytes == revisited == "handle-1"
+    assert other_waba == "handle-2"
+    assert uploads[0][1:] == (len(footer), footer)
+    assert requests_seen[2] == ("https://cdn.example.com/footer.png", '"f1"')
+
+
+def test_header_media_registry_uploads_concurrent_requests_once(monkeypatch):
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    from api.modules.whatsapp import template_media as module
+
+    module.clear_media_registry()
+    _install_fake_images(monkeypatch, module, {"https://cdn.example.com/promo.png": (b"promo-bytes", None)})
+    uploads = []
+    lock = threading.Lock()
+
+    def _slow_upload(media):
+        with lock:
+            uploads.append(media.sha256)
+        time.sleep(0.05)
+        return "handle-promo"
+
+    def _resolve(_index):
+        return module.resolve_header_media_handle(
+            waba_id="waba_1",
+            image_url="https://cdn.example.com/promo.png",
+            upload=_slow_upload,
+            supabase_client=_MissingMediaTable(),
+        )
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        handles = list(pool.map(_resolve, range(6)))
+
+    assert handles == ["handle-promo"] * 6
+    assert len(uploads) == 1
+
+
+def test_header_media_registry_reuploads_expired_handles(monkeypatch):
+    from api.modules.whatsapp import template_media as module
+
+    module.clear_media_registry()
+    _install_fake_images(monkeypatch, module, {"https://cdn.example.com/a.png": (b"a-bytes", None)})
+    uploads = []
+
+    def _upload(media):
+        uploads.append(media.sha256)
+        return f"handle-{len(uploads)}"
+
+    kwargs = {"waba_id": "waba_1", "image_url": "https://cdn.example.com/a.png", "upload": _upload,
+              "supabase_client": _MissingMediaTable()}
+    assert module.resolve_header_media_handle(**kwargs) == "handle-1"
+    monkeypatch.setattr(module, "handle_ttl_seconds", lambda: module.TEMPLATE_MEDIA_EXPIRY_MARGIN_SECONDS)
+    module.clear_media_registry()
+    assert module.resolve_header_media_handle(**kwargs) == "handle-2"
+    assert module.resolve_header_media_handle(**kwargs) == "handle-3"